@@ -0,0 +1,91 @@
+import importlib
+import sys
+import threading
+import types
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterable, Iterator, TypeVar
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class LazyModule(types.ModuleType):
+  """Stand-in for a module that is only imported on first attribute access.
+
+     sympy = LazyModule("sympy")
+     sympy.Symbol('x')  # imports sympy here
+  """
+  def __init__(self, name: str):
+    super().__init__(name)
+    self.__dict__['_lock'] = threading.Lock()
+    self.__dict__['_module'] = None
+
+  def _load(self) -> types.ModuleType:
+    module = self.__dict__['_module']
+    if module is None:
+      with self.__dict__['_lock']:
+        module = self.__dict__['_module']
+        if module is None:
+          module = importlib.import_module(self.__name__)
+          self.__dict__['_module'] = module
+    return module
+
+  @property
+  def loaded(self) -> bool:
+    return self.__dict__['_module'] is not None
+
+  def __getattr__(self, name: str) -> Any:
+    # only called for attributes not found on the stand-in itself
+    return getattr(self._load(), name)
+
+  def __dir__(self) -> Iterable[str]:
+    return dir(self._load())
+
+
+def lazy_import(name: str) -> types.ModuleType:
+  """Returns the module if it is already imported, otherwise a LazyModule for it"""
+  module = sys.modules.get(name)
+  return module if module is not None else LazyModule(name)
+
+
+class LazyDict(Mapping):
+  """Read only mapping with a fixed set of keys, where each value is built by
+     `loader(key)` the first time it is looked up and kept afterwards. Iterating
+     and membership tests don't load anything."""
+  def __init__(self, keys: Iterable[K], loader: Callable[[K], V]):
+    self._keys = list(keys)
+    self._key_set = set(self._keys)
+    self._loader = loader
+    self._values: Dict[K, V] = {}
+    self._lock = threading.RLock()
+
+  def __getitem__(self, key: K) -> V:
+    try:
+      return self._values[key]
+    except KeyError:
+      pass
+
+    if key not in self._key_set:
+      raise KeyError(key)
+
+    with self._lock:
+      if key not in self._values:
+        self._values[key] = self._loader(key)
+      return self._values[key]
+
+  def __contains__(self, key: object) -> bool:
+    return key in self._key_set
+
+  def __iter__(self) -> Iterator[K]:
+    return iter(self._keys)
+
+  def __len__(self) -> int:
+    return len(self._keys)
+
+  def loaded(self) -> int:
+    """Number of values built so far"""
+    return len(self._values)
+
+  def load_all(self) -> None:
+    for key in self._keys:
+      self[key]
@@ -34,7 +34,7 @@ class SwagFormatter(logging.Formatter):
     self.host = socket.gethostname()
 
   def format_dict(self, record):
-    record_dict = NiceOrderedDict()
+    record_dict = {}
 
     if isinstance(record.msg, dict):
       record_dict['msg'] = record.msg
@@ -112,12 +112,6 @@ class SwagErrorFilter(logging.Filter):
   def filter(self, record):
     return record.levelno < logging.ERROR
 
-def _tmpfunc():
-  return 0
-
-def _srcfile():
-  return os.path.normcase(_tmpfunc.__code__.co_filename)
-
 class SwagLogger(logging.Logger):
   def __init__(self):
     logging.Logger.__init__(self, "swaglog")
@@ -191,27 +185,21 @@ class SwagLogger(logging.Logger):
       stacklevel -= 1
     if not f:
       f = orig_f
-    rv = "(unknown file)", 0, "(unknown function)", None
-    while hasattr(f, "f_code"):
-      co = f.f_code
-      filename = os.path.normcase(co.co_filename)
-
-      # TODO: is this pylint exception correct?
-      if filename == _srcfile:  # pylint: disable=comparison-with-callable
-        f = f.f_back
-        continue
-      sinfo = None
-      if stack_info:
-        sio = io.StringIO()
-        sio.write('Stack (most recent call last):\n')
-        traceback.print_stack(f, file=sio)
-        sinfo = sio.getvalue()
-        if sinfo[-1] == '\n':
-          sinfo = sinfo[:-1]
-        sio.close()
-      rv = (co.co_filename, f.f_lineno, co.co_name, sinfo)
-      break
-    return rv
+    if f is None:
+      return "(unknown file)", 0, "(unknown function)", None
+
+    # the caller is always at a fixed depth, no need to walk and compare file names
+    co = f.f_code
+    sinfo = None
+    if stack_info:
+      sio = io.StringIO()
+      sio.write('Stack (most recent call last):\n')
+      traceback.print_stack(f, file=sio)
+      sinfo = sio.getvalue()
+      if sinfo[-1] == '\n':
+        sinfo = sinfo[:-1]
+      sio.close()
+    return co.co_filename, f.f_lineno, co.co_name, sinfo
 
 if __name__ == "__main__":
   log = SwagLogger()
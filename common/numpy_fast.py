@@ -1,3 +1,6 @@
+from bisect import bisect_left
+
+
 def clip(x, lo, hi):
   return max(lo, min(hi, x))
 
@@ -15,5 +18,37 @@ def interp(x, xp, fp):
 
   return [get_interp(v) for v in x] if hasattr(x, '__iter__') else get_interp(x)
 
+class Interp:
+  """interp() over fixed breakpoints and values, compiled once. Gives exactly the same
+  results as interp for scalars. Tables sharing breakpoints can share one segment lookup."""
+  def __init__(self, xp, fp):
+    self.xp = tuple(xp)
+    self.fp = tuple(fp)
+    self.n = len(self.xp)
+    # interp scans linearly, which is a bisect when the breakpoints are sorted
+    self.sorted = all(a <= b for a, b in zip(self.xp, self.xp[1:]))
+    self.dxp = (0.,) + tuple(self.xp[i] - self.xp[i - 1] for i in range(1, self.n))
+    self.dfp = (0.,) + tuple(self.fp[i] - self.fp[i - 1] for i in range(1, self.n))
+
+  def segment(self, x):
+    """Index of the first breakpoint not below x, interp's hi"""
+    if self.sorted:
+      return bisect_left(self.xp, x)
+    hi = 0
+    while hi < self.n and x > self.xp[hi]:
+      hi += 1
+    return hi
+
+  def value(self, hi, x):
+    if hi == 0:
+      return self.fp[0]
+    elif hi == self.n:
+      return self.fp[-1]
+    low = hi - 1
+    return (x - self.xp[low]) * self.dfp[hi] / self.dxp[hi] + self.fp[low]
+
+  def __call__(self, x):
+    return self.value(self.segment(x), x)
+
 def mean(x):
   return sum(x) / len(x)
@@ -5,8 +5,9 @@
 #include "common/statlog.h"
 #include "common/util.h"
 
-#include <stdio.h>
+#include <cstring>
 #include <mutex>
+#include <string>
 #include <zmq.h>
 
 class StatlogState : public LogState {
@@ -16,31 +17,23 @@ class StatlogState : public LogState {
 
 static StatlogState s = {};
 
-static void log(const char* metric_type, const char* metric, const char* fmt, ...) {
+static void log(int metric_type, const char* metric, double value) {
   std::lock_guard lk(s.lock);
   if (!s.initialized) s.initialize();
 
-  char* value_buf = nullptr;
-  va_list args;
-  va_start(args, fmt);
-  int ret = vasprintf(&value_buf, fmt, args);
-  va_end(args);
-
-  if (ret > 0 && value_buf) {
-    char* line_buf = nullptr;
-    ret = asprintf(&line_buf, "%s:%s|%s", metric, value_buf, metric_type);
-    if (ret > 0 && line_buf) {
-      zmq_send(s.sock, line_buf, ret, ZMQ_NOBLOCK);
-      free(line_buf);
-    }
-    free(value_buf);
-  }
+  // type code, little endian double, name
+  size_t name_len = strlen(metric);
+  std::string buf(1 + sizeof(value) + name_len, '\0');
+  buf[0] = (char)metric_type;
+  memcpy(&buf[1], &value, sizeof(value));
+  memcpy(&buf[1 + sizeof(value)], metric, name_len);
+  zmq_send(s.sock, buf.data(), buf.size(), ZMQ_NOBLOCK);
 }
 
-void statlog_log(const char* metric_type, const char* metric, int value) {
-  log(metric_type, metric, "%d", value);
+void statlog_log(int metric_type, const char* metric, int value) {
+  log(metric_type, metric, value);
 }
 
-void statlog_log(const char* metric_type, const char* metric, float value) {
-  log(metric_type, metric, "%f", value);
+void statlog_log(int metric_type, const char* metric, float value) {
+  log(metric_type, metric, value);
 }
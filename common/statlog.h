@@ -1,10 +1,13 @@
 #pragma once
 
-#define STATLOG_GAUGE "g"
-#define STATLOG_SAMPLE "sa"
+// metric type codes of the binary statsd message format, see selfdrive/statsd.py
+#define STATLOG_GAUGE 0
+#define STATLOG_SAMPLE 1
+#define STATLOG_TIMING 2
 
-void statlog_log(const char* metric_type, const char* metric, int value);
-void statlog_log(const char* metric_type, const char* metric, float value);
+void statlog_log(int metric_type, const char* metric, int value);
+void statlog_log(int metric_type, const char* metric, float value);
 
 #define statlog_gauge(metric, value) statlog_log(STATLOG_GAUGE, metric, value)
 #define statlog_sample(metric, value) statlog_log(STATLOG_SAMPLE, metric, value)
+#define statlog_timing(metric, value) statlog_log(STATLOG_TIMING, metric, value)
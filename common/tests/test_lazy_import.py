@@ -0,0 +1,80 @@
+import subprocess
+import sys
+import threading
+import unittest
+
+from common.lazy_import import LazyDict, LazyModule, lazy_import
+
+
+class TestLazyImport(unittest.TestCase):
+  def test_lazy_module(self):
+    # in a fresh interpreter, so the module isn't imported yet
+    code = "\n".join([
+      "import sys",
+      "from common.lazy_import import lazy_import",
+      "fractions = lazy_import('fractions')",
+      "assert 'fractions' not in sys.modules and not fractions.loaded",
+      "assert fractions.Fraction(1, 2) * 2 == 1",
+      "assert 'fractions' in sys.modules and fractions.loaded",
+    ])
+    subprocess.check_call([sys.executable, "-c", code])
+
+  def test_already_imported(self):
+    self.assertIs(lazy_import("unittest"), unittest)
+    self.assertIsInstance(lazy_import("not_imported_yet"), LazyModule)
+
+  def test_missing_module(self):
+    mod = lazy_import("module_that_does_not_exist")
+    with self.assertRaises(ModuleNotFoundError):
+      mod.anything
+
+  def test_lazy_dict(self):
+    loads = []
+
+    def loader(key):
+      loads.append(key)
+      return key * 2
+
+    d = LazyDict(["a", "b", "c"], loader)
+    self.assertEqual(list(d), ["a", "b", "c"])
+    self.assertEqual(len(d), 3)
+    self.assertIn("b", d)
+    self.assertNotIn("d", d)
+    self.assertEqual(loads, [])
+
+    self.assertEqual(d["b"], "bb")
+    self.assertEqual(d["b"], "bb")
+    self.assertEqual(loads, ["b"])
+    self.assertEqual(d.loaded(), 1)
+    with self.assertRaises(KeyError):
+      d["d"]
+
+    self.assertEqual(dict(d.items()), {"a": "aa", "b": "bb", "c": "cc"})
+    self.assertEqual(sorted(loads), ["a", "b", "c"])
+
+  def test_lazy_dict_threads(self):
+    loads = []
+    ready = threading.Barrier(8)
+
+    def loader(key):
+      loads.append(key)
+      return object()
+
+    d = LazyDict(["x"], loader)
+    results = []
+
+    def get():
+      ready.wait()
+      results.append(d["x"])
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(loads, ["x"])
+    self.assertEqual(len({id(r) for r in results}), 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,7 +1,7 @@
 import numpy as np
 import unittest
 
-from common.numpy_fast import interp
+from common.numpy_fast import Interp, interp
 
 
 class InterpTest(unittest.TestCase):
@@ -21,6 +21,23 @@ class InterpTest(unittest.TestCase):
       actual = interp(v_ego, _A_CRUISE_MIN_BP, _A_CRUISE_MIN_V)
       np.testing.assert_equal(actual, expected)
 
+  def test_compiled(self):
+    rng = np.random.default_rng(0)
+    tables = [
+      ([0.], [0.3]),
+      ([0, 10, 20], [500, 500, 200]),
+      ([-0.2, 0.2], [-0.1, 0.1]),
+      ([0., 5., 5., 35.], [1.2, 0.8, 0.9, 0.5]),  # repeated breakpoint
+      ([10., 0., 20.], [1., 2., 3.]),  # unsorted, interp's linear scan
+      (np.asarray([0., 5., 10., 20., 40.]), np.asarray([-1.0, -.8, -.67, -.5, -.30])),
+    ]
+    for xp, fp in tables:
+      compiled = Interp(xp, fp)
+      xs = list(rng.uniform(-10, 50, 1000)) + list(xp) + [-1e-12, 0, 7, float('inf'), -float('inf'), float('nan')]
+      for x in xs:
+        # the same floats, not just close
+        self.assertEqual(repr(compiled(x)), repr(interp(x, xp, fp)), msg=f"{xp} at {x}")
+
 
 if __name__ == "__main__":
   unittest.main()
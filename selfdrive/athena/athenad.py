@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import base64
-import bz2
 import hashlib
 import io
 import json
@@ -10,13 +9,13 @@ import random
 import select
 import socket
 import subprocess
-import sys
 import tempfile
 import threading
 import time
 from collections import namedtuple
 from datetime import datetime
 from functools import partial
+from pathlib import Path
 from typing import Any, Dict
 
 import requests
@@ -29,26 +28,28 @@ from cereal import log
 from cereal.services import service_list
 from common.api import Api
 from common.basedir import PERSIST
-from common.file_helpers import CallbackReader
 from common.params import Params
 from common.realtime import sec_since_boot, set_core_affinity
 from system.hardware import HARDWARE, PC, AGNOS
-from selfdrive.loggerd.config import ROOT
-from selfdrive.loggerd.xattr_cache import getxattr, setxattr
-from selfdrive.statsd import STATS_DIR
+from selfdrive.athena import log_shipper
+from selfdrive.athena.upload_scheduler import DEFAULT_PRIORITY, PriorityUploadQueue, UploadLog, backoff_delay
+from selfdrive.loggerd.chunked_upload import BandwidthLimiter, upload_file
+from selfdrive.loggerd.config import ROOT, STATS_DIR
 from system.swaglog import SWAGLOG_DIR, cloudlog
 from system.version import get_commit, get_origin, get_short_branch, get_version
 
 ATHENA_HOST = os.getenv('ATHENA_HOST', 'wss://athena.comma.ai')
 HANDLER_THREADS = int(os.getenv('HANDLER_THREADS', "4"))
+UPLOAD_WORKERS = int(os.getenv('ATHENA_UPLOAD_WORKERS', "2"))
+UPLOAD_BANDWIDTH = float(os.getenv('ATHENA_UPLOAD_BANDWIDTH', "0"))  # bytes per second shared by all workers, 0 is unlimited
+UPLOAD_QUEUE_LOG = os.getenv('ATHENA_UPLOAD_QUEUE_LOG', os.path.join(str(Path.home()), ".comma", "athena_upload_queue.log") if PC
+                             else "/data/athena_upload_queue.log")
 LOCAL_PORT_WHITELIST = {8022}
 
-LOG_ATTR_NAME = 'user.upload'
-LOG_ATTR_VALUE_MAX_UNIX_TIME = int.to_bytes(2147483647, 4, sys.byteorder)
 RECONNECT_TIMEOUT_S = 70
 
-RETRY_DELAY = 10  # seconds
-MAX_RETRY_COUNT = 30  # Try for at most 5 minutes if upload fails immediately
+RETRY_DELAY = 10  # seconds, before retries that don't count towards MAX_RETRY_COUNT
+MAX_RETRY_COUNT = 10  # with the exponential backoff of backoff_delay, retries span ~15 minutes on average
 MAX_AGE = 31 * 24 * 3600  # seconds
 WS_FRAME_SIZE = 4096
 
@@ -57,11 +58,13 @@ NetworkType = log.DeviceState.NetworkType
 dispatcher["echo"] = lambda s: s
 recv_queue: Any = queue.Queue()
 send_queue: Any = queue.Queue()
-upload_queue: Any = queue.Queue()
+upload_queue: Any = PriorityUploadQueue()
+upload_limiter = BandwidthLimiter(UPLOAD_BANDWIDTH)
 low_priority_send_queue: Any = queue.Queue()
 log_recv_queue: Any = queue.Queue()
 cancelled_uploads: Any = set()
-UploadItem = namedtuple('UploadItem', ['path', 'url', 'headers', 'created_at', 'id', 'retry_count', 'current', 'progress', 'allow_cellular'], defaults=(0, False, 0, False))
+UploadItem = namedtuple('UploadItem', ['path', 'url', 'headers', 'created_at', 'id', 'retry_count', 'current', 'progress', 'allow_cellular', 'priority'],
+                        defaults=(0, False, 0, False, DEFAULT_PRIORITY))
 
 cur_upload_items: Dict[int, Any] = {}
 
@@ -77,25 +80,33 @@ class AbortTransferException(Exception):
 
 
 class UploadQueueCache():
-  params = Params()
+  log = UploadLog(UPLOAD_QUEUE_LOG)
 
   @staticmethod
   def initialize(upload_queue):
     try:
-      upload_queue_json = UploadQueueCache.params.get("AthenadUploadQueue")
+      items = UploadQueueCache.log.load()
+
+      # migrate queue stored by older versions
+      params = Params()
+      upload_queue_json = params.get("AthenadUploadQueue")
       if upload_queue_json is not None:
-        for item in json.loads(upload_queue_json):
-          upload_queue.put(UploadItem(**item))
+        items += json.loads(upload_queue_json)
+        UploadQueueCache.log.rewrite(items)
+        params.delete("AthenadUploadQueue")
+
+      for item in items:
+        upload_queue.put_nowait(UploadItem(**item))
     except Exception:
       cloudlog.exception("athena.UploadQueueCache.initialize.exception")
 
   @staticmethod
-  def cache(upload_queue):
-    try:
-      items = [i._asdict() for i in upload_queue.queue if i.id not in cancelled_uploads]
-      UploadQueueCache.params.put("AthenadUploadQueue", json.dumps(items))
-    except Exception:
-      cloudlog.exception("athena.UploadQueueCache.cache.exception")
+  def add(item):
+    UploadQueueCache.log.put(item._replace(current=False, progress=0)._asdict())
+
+  @staticmethod
+  def remove(item_id):
+    UploadQueueCache.log.delete(item_id)
 
 
 def handle_long_poll(ws):
@@ -104,9 +115,11 @@ def handle_long_poll(ws):
   threads = [
     threading.Thread(target=ws_recv, args=(ws, end_event), name='ws_recv'),
     threading.Thread(target=ws_send, args=(ws, end_event), name='ws_send'),
-    threading.Thread(target=upload_handler, args=(end_event,), name='upload_handler'),
     threading.Thread(target=log_handler, args=(end_event,), name='log_handler'),
     threading.Thread(target=stat_handler, args=(end_event,), name='stat_handler'),
+  ] + [
+    threading.Thread(target=upload_handler, args=(end_event,), name=f'upload_handler_{x}')
+    for x in range(UPLOAD_WORKERS)
   ] + [
     threading.Thread(target=jsonrpc_handler, args=(end_event,), name=f'worker_{x}')
     for x in range(HANDLER_THREADS)
@@ -146,9 +159,9 @@ def jsonrpc_handler(end_event):
       send_queue.put_nowait(json.dumps({"error": str(e)}))
 
 
-def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = True) -> None:
-  if cur_upload_items[tid].retry_count < MAX_RETRY_COUNT:
-    item = cur_upload_items[tid]
+def retry_upload(tid: int, increase_count: bool = True) -> None:
+  item = cur_upload_items[tid]
+  if item.retry_count < MAX_RETRY_COUNT:
     new_retry_count = item.retry_count + 1 if increase_count else item.retry_count
 
     item = item._replace(
@@ -156,15 +169,12 @@ def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = Tr
       progress=0,
       current=False
     )
-    upload_queue.put_nowait(item)
-    UploadQueueCache.cache(upload_queue)
-
-    cur_upload_items[tid] = None
+    upload_queue.put_nowait(item, delay=backoff_delay(item.retry_count) if increase_count else RETRY_DELAY)
+    UploadQueueCache.add(item)
+  else:
+    UploadQueueCache.remove(item.id)
 
-    for _ in range(RETRY_DELAY):
-      time.sleep(1)
-      if end_event.is_set():
-        break
+  cur_upload_items[tid] = None
 
 
 def upload_handler(end_event: threading.Event) -> None:
@@ -185,6 +195,7 @@ def upload_handler(end_event: threading.Event) -> None:
       age = datetime.now() - datetime.fromtimestamp(cur_upload_items[tid].created_at / 1000)
       if age.total_seconds() > MAX_AGE:
         cloudlog.event("athena.upload_handler.expired", item=cur_upload_items[tid], error=True)
+        UploadQueueCache.remove(cur_upload_items[tid].id)
         continue
 
       # Check if uploading over metered connection is allowed
@@ -192,7 +203,7 @@ def upload_handler(end_event: threading.Event) -> None:
       metered = sm['deviceState'].networkMetered
       network_type = sm['deviceState'].networkType.raw
       if metered and (not cur_upload_items[tid].allow_cellular):
-        retry_upload(tid, end_event, False)
+        retry_upload(tid, False)
         continue
 
       try:
@@ -216,22 +227,25 @@ def upload_handler(end_event: threading.Event) -> None:
 
         if response.status_code not in (200, 201, 401, 403, 412):
           cloudlog.event("athena.upload_handler.retry", status_code=response.status_code, fn=fn, sz=sz, network_type=network_type, metered=metered)
-          retry_upload(tid, end_event)
+          retry_upload(tid)
         else:
           cloudlog.event("athena.upload_handler.success", fn=fn, sz=sz, network_type=network_type, metered=metered)
-
-        UploadQueueCache.cache(upload_queue)
+          UploadQueueCache.remove(cur_upload_items[tid].id)
       except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.SSLError):
         cloudlog.event("athena.upload_handler.timeout", fn=fn, sz=sz, network_type=network_type, metered=metered)
-        retry_upload(tid, end_event)
+        retry_upload(tid)
       except AbortTransferException:
         cloudlog.event("athena.upload_handler.abort", fn=fn, sz=sz, network_type=network_type, metered=metered)
-        retry_upload(tid, end_event, False)
+        retry_upload(tid, False)
 
     except queue.Empty:
       pass
     except Exception:
       cloudlog.exception("athena.upload_handler.exception")
+      # not retried, don't bring it back after a restart either
+      item = cur_upload_items.get(tid)
+      if item is not None:
+        UploadQueueCache.remove(item.id)
 
 
 def _do_upload(upload_item, callback=None):
@@ -242,24 +256,9 @@ def _do_upload(upload_item, callback=None):
   if not os.path.exists(path) and os.path.exists(strip_bz2_extension(path)):
     path = strip_bz2_extension(path)
     compress = True
+    cloudlog.event("athena.upload_handler.compress", fn=path, fn_orig=upload_item.path)
 
-  with open(path, "rb") as f:
-    if compress:
-      cloudlog.event("athena.upload_handler.compress", fn=path, fn_orig=upload_item.path)
-      data = bz2.compress(f.read())
-      size = len(data)
-      data = io.BytesIO(data)
-    else:
-      size = os.fstat(f.fileno()).st_size
-      data = f
-
-    if callback:
-      data = CallbackReader(data, callback, size)
-
-    return requests.put(upload_item.url,
-                        data=data,
-                        headers={**upload_item.headers, 'Content-Length': str(size)},
-                        timeout=30)
+  return upload_file(upload_item.url, upload_item.headers, path, compress=compress, timeout=30, callback=callback, limiter=upload_limiter)
 
 
 # security: user should be able to request any message from their car
@@ -376,14 +375,14 @@ def uploadFilesToUrls(files_data):
       created_at=int(time.time() * 1000),
       id=None,
       allow_cellular=file.get('allow_cellular', False),
+      priority=file.get('priority', DEFAULT_PRIORITY),
     )
     upload_id = hashlib.sha1(str(item).encode()).hexdigest()
     item = item._replace(id=upload_id)
     upload_queue.put_nowait(item)
+    UploadQueueCache.add(item)
     items.append(item._asdict())
 
-  UploadQueueCache.cache(upload_queue)
-
   resp = {"enqueued": len(items), "items": items}
   if failed:
     resp["failed"] = failed
@@ -408,6 +407,8 @@ def cancelUpload(upload_id):
     return 404
 
   cancelled_uploads.update(cancelled_ids)
+  for upload_id in cancelled_ids:
+    UploadQueueCache.remove(upload_id)
   return {"success": 1}
 
 
@@ -515,82 +516,22 @@ def takeSnapshot():
 
 
 def get_logs_to_send_sorted():
-  # TODO: scan once then use inotify to detect file creation/deletion
-  curr_time = int(time.time())
-  logs = []
-  for log_entry in os.listdir(SWAGLOG_DIR):
-    log_path = os.path.join(SWAGLOG_DIR, log_entry)
-    try:
-      time_sent = int.from_bytes(getxattr(log_path, LOG_ATTR_NAME), sys.byteorder)
-    except (ValueError, TypeError):
-      time_sent = 0
-    # assume send failed and we lost the response if sent more than one hour ago
-    if not time_sent or curr_time - time_sent > 3600:
-      logs.append(log_entry)
-  # excluding most recent (active) log file
-  return sorted(logs)[:-1]
+  return log_shipper.get_logs_to_send_sorted(SWAGLOG_DIR)
 
 
 def log_handler(end_event):
   if PC:
     return
 
-  log_files = []
-  last_scan = 0
-  while not end_event.is_set():
-    try:
-      curr_scan = sec_since_boot()
-      if curr_scan - last_scan > 10:
-        log_files = get_logs_to_send_sorted()
-        last_scan = curr_scan
-
-      # send one log
-      curr_log = None
-      if len(log_files) > 0:
-        log_entry = log_files.pop() # newest log file
-        cloudlog.debug(f"athena.log_handler.forward_request {log_entry}")
-        try:
-          curr_time = int(time.time())
-          log_path = os.path.join(SWAGLOG_DIR, log_entry)
-          setxattr(log_path, LOG_ATTR_NAME, int.to_bytes(curr_time, 4, sys.byteorder))
-          with open(log_path) as f:
-            jsonrpc = {
-              "method": "forwardLogs",
-              "params": {
-                "logs": f.read()
-              },
-              "jsonrpc": "2.0",
-              "id": log_entry
-            }
-            low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
-            curr_log = log_entry
-        except OSError:
-          pass  # file could be deleted by log rotation
-
-      # wait for response up to ~100 seconds
-      # always read queue at least once to process any old responses that arrive
-      for _ in range(100):
-        if end_event.is_set():
-          break
-        try:
-          log_resp = json.loads(log_recv_queue.get(timeout=1))
-          log_entry = log_resp.get("id")
-          log_success = "result" in log_resp and log_resp["result"].get("success")
-          cloudlog.debug(f"athena.log_handler.forward_response {log_entry} {log_success}")
-          if log_entry and log_success:
-            log_path = os.path.join(SWAGLOG_DIR, log_entry)
-            try:
-              setxattr(log_path, LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME)
-            except OSError:
-              pass  # file could be deleted by log rotation
-          if curr_log == log_entry:
-            break
-        except queue.Empty:
-          if curr_log is None:
-            break
-
-    except Exception:
-      cloudlog.exception("athena.log_handler.exception")
+  shipper = log_shipper.LogShipper(SWAGLOG_DIR, low_priority_send_queue.put_nowait, log_recv_queue)
+  try:
+    while not end_event.is_set():
+      try:
+        shipper.step()
+      except Exception:
+        cloudlog.exception("athena.log_handler.exception")
+  finally:
+    shipper.close()
 
 
 def stat_handler(end_event):
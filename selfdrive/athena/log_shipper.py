@@ -0,0 +1,181 @@
+import json
+import os
+import queue
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from common.inotify import Inotify, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_MOVED_FROM, IN_MOVED_TO, IN_Q_OVERFLOW
+from selfdrive.loggerd.xattr_cache import getxattrs, invalidate, setxattr
+from system.swaglog import cloudlog
+
+LOG_ATTR_NAME = 'user.upload'
+LOG_ATTR_VALUE_MAX_UNIX_TIME = int.to_bytes(2147483647, 4, sys.byteorder)
+
+WINDOW = 4  # batches sent without acknowledgement
+BATCH_FILES = 8
+BATCH_BYTES = 1024 * 1024
+ACK_TIMEOUT = 100.  # seconds
+RESEND_AGE = 3600  # seconds, a log sent this long ago without acknowledgement is sent again
+RECONCILE_INTERVAL = 600.  # seconds, full rescan even when inotify is available
+
+
+def get_logs_to_send_sorted(log_dir: str) -> List[str]:
+  curr_time = int(time.time())
+  logs = []
+  log_entries = os.listdir(log_dir)
+  attrs = getxattrs([os.path.join(log_dir, log_entry) for log_entry in log_entries], LOG_ATTR_NAME)
+  for log_entry in log_entries:
+    try:
+      time_sent = int.from_bytes(attrs[os.path.join(log_dir, log_entry)], sys.byteorder)
+    except (ValueError, TypeError):
+      time_sent = 0
+    # assume send failed and we lost the response if sent more than one hour ago
+    if not time_sent or curr_time - time_sent > RESEND_AGE:
+      logs.append(log_entry)
+  # excluding most recent (active) log file
+  return sorted(logs)[:-1]
+
+
+class LogShipper:
+  """Forwards swaglog files as JSON-RPC batches, newest first.
+
+  New files are picked up from inotify as soon as the log rotates. Up to `window` batches
+  are in flight at once; a batch without a response after `ack_timeout` frees its slot and
+  its files are sent again once RESEND_AGE has passed, like after a restart.
+  """
+
+  def __init__(self, log_dir: str, send: Callable[[str], None], recv_queue: queue.Queue,
+               window: int = WINDOW, batch_files: int = BATCH_FILES, batch_bytes: int = BATCH_BYTES,
+               ack_timeout: float = ACK_TIMEOUT):
+    self.log_dir = log_dir
+    self.send = send
+    self.recv_queue = recv_queue
+    self.window = window
+    self.batch_files = batch_files
+    self.batch_bytes = batch_bytes
+    self.ack_timeout = ack_timeout
+
+    self.unsent: Set[str] = set()
+    self.newest = ""
+    self.in_flight: Dict[str, Tuple[float, Set[str]]] = OrderedDict()
+    self.last_reconcile: Optional[float] = None
+
+    # stats
+    self.sent = 0
+    self.acked = 0
+    self.batches = 0
+
+    self.inotify: Optional[Inotify]
+    try:
+      self.inotify = Inotify()
+      self.inotify.add_watch(log_dir, IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM)
+    except OSError:
+      cloudlog.exception("athena.log_shipper: inotify unavailable, falling back to rescanning")
+      self.inotify = None
+
+  def close(self) -> None:
+    if self.inotify is not None:
+      self.inotify.close()
+      self.inotify = None
+
+  def reconcile(self) -> None:
+    self.last_reconcile = time.monotonic()
+    try:
+      names = os.listdir(self.log_dir)
+    except OSError:
+      return
+    self.newest = max(names, default="")
+
+    in_flight = set().union(*(files for _, files in self.in_flight.values()))
+    self.unsent = set(get_logs_to_send_sorted(self.log_dir)) - in_flight
+
+  def update_files(self) -> None:
+    interval = RECONCILE_INTERVAL if self.inotify is not None else 10.
+    if self.last_reconcile is None or time.monotonic() - self.last_reconcile > interval:
+      self.reconcile()
+      return
+
+    if self.inotify is None:
+      return
+
+    for ev in self.inotify.read():
+      if ev.mask & IN_Q_OVERFLOW:
+        self.reconcile()
+        return
+      if ev.mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE):
+        if ev.name > self.newest:
+          # the previously active log file is complete
+          if self.newest:
+            self.unsent.add(self.newest)
+          self.newest = ev.name
+      elif ev.mask & (IN_DELETE | IN_MOVED_FROM):
+        # deleted by log rotation
+        self.unsent.discard(ev.name)
+        invalidate(os.path.join(self.log_dir, ev.name))
+
+  def send_batches(self) -> None:
+    while len(self.in_flight) < self.window and self.unsent:
+      requests, files, size = [], set(), 0
+      for log_entry in sorted(self.unsent, reverse=True)[:self.batch_files]:
+        self.unsent.discard(log_entry)
+        log_path = os.path.join(self.log_dir, log_entry)
+        try:
+          setxattr(log_path, LOG_ATTR_NAME, int.to_bytes(int(time.time()), 4, sys.byteorder))
+          with open(log_path) as f:
+            logs = f.read()
+        except OSError:
+          continue  # file could be deleted by log rotation
+
+        requests.append({"method": "forwardLogs", "params": {"logs": logs}, "jsonrpc": "2.0", "id": log_entry})
+        files.add(log_entry)
+        size += len(logs)
+        if size >= self.batch_bytes:
+          break
+
+      if not requests:
+        continue
+
+      cloudlog.debug(f"athena.log_handler.forward_request {sorted(files)}")
+      self.send(json.dumps(requests[0] if len(requests) == 1 else requests))
+      self.in_flight[max(files)] = (time.monotonic(), files)
+      self.sent += len(files)
+      self.batches += 1
+
+  def handle_response(self, data: str) -> None:
+    resp = json.loads(data)
+    for r in resp if isinstance(resp, list) else [resp]:
+      log_entry = r.get("id")
+      log_success = "result" in r and r["result"].get("success")
+      cloudlog.debug(f"athena.log_handler.forward_response {log_entry} {log_success}")
+      if log_entry and log_success:
+        try:
+          setxattr(os.path.join(self.log_dir, log_entry), LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME)
+        except OSError:
+          pass  # file could be deleted by log rotation
+        self.acked += 1
+
+      for key, (_, files) in list(self.in_flight.items()):
+        files.discard(log_entry)
+        if not files:
+          del self.in_flight[key]
+
+  def expire(self) -> None:
+    now = time.monotonic()
+    for key, (t, _) in list(self.in_flight.items()):
+      if now - t > self.ack_timeout:
+        del self.in_flight[key]
+
+  def step(self, timeout: float = 1.) -> None:
+    self.update_files()
+    self.expire()
+    self.send_batches()
+
+    # always read queue at least once to process any old responses that arrive
+    try:
+      self.handle_response(self.recv_queue.get(timeout=timeout))
+      while True:
+        self.handle_response(self.recv_queue.get_nowait())
+    except queue.Empty:
+      pass
@@ -76,6 +76,9 @@ class MockParams():
       raise KeyError(f"key: {k} not in MockParams")
     MockParams.params[k] = v
 
+  def delete(self, k):
+    MockParams.params.pop(k, None)
+
 
 class MockWebsocket():
   def __init__(self, recv_queue, send_queue):
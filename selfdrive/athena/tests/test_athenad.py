@@ -35,7 +35,8 @@ class TestAthenadMethods(unittest.TestCase):
 
   def setUp(self):
     MockParams.restore_defaults()
-    athenad.upload_queue = queue.Queue()
+    athenad.upload_queue = athenad.PriorityUploadQueue()
+    athenad.UploadQueueCache.log = athenad.UploadLog(os.path.join(tempfile.mkdtemp(), "upload_queue.log"))
     athenad.cur_upload_items.clear()
     athenad.cancelled_uploads.clear()
 
@@ -213,8 +214,33 @@ class TestAthenadMethods(unittest.TestCase):
         end_event.set()
 
       if retry:
-        self.assertEqual(athenad.upload_queue.get().retry_count, 1)
+        self.assertEqual(athenad.upload_queue.queue[0].retry_count, 1)
 
+  @mock.patch('selfdrive.athena.athenad._do_upload', side_effect=ValueError)
+  def test_upload_handler_exception(self, _):
+    fn = os.path.join(athenad.ROOT, 'qlog.bz2')
+    Path(fn).touch()
+    item = athenad.UploadItem(path=fn, url="http://localhost:44444/qlog.bz2", headers={}, created_at=int(time.time()*1000), id='id', allow_cellular=True)
+    athenad.UploadQueueCache.add(item)
+
+    end_event = threading.Event()
+    thread = threading.Thread(target=athenad.upload_handler, args=(end_event,))
+    thread.start()
+
+    athenad.upload_queue.put_nowait(item)
+    try:
+      self.wait_for_upload()
+      time.sleep(0.1)
+    finally:
+      end_event.set()
+      thread.join()
+
+    # failed items are dropped, and not loaded again after a restart
+    self.assertEqual(athenad.upload_queue.qsize(), 0)
+    athenad.UploadQueueCache.initialize(athenad.upload_queue)
+    self.assertEqual(athenad.upload_queue.qsize(), 0)
+
+  @mock.patch('selfdrive.loggerd.chunked_upload.RETRY_DELAY', 0.)
   def test_upload_handler_timeout(self):
     """When an upload times out or fails to connect it should be placed back in the queue"""
     fn = os.path.join(athenad.ROOT, 'qlog.bz2')
@@ -240,11 +266,25 @@ class TestAthenadMethods(unittest.TestCase):
 
       # Check that upload item was put back in the queue with incremented retry count
       self.assertEqual(athenad.upload_queue.qsize(), 1)
-      self.assertEqual(athenad.upload_queue.get().retry_count, 1)
+      self.assertEqual(athenad.upload_queue.queue[0].retry_count, 1)
 
     finally:
       end_event.set()
 
+  @mock.patch('selfdrive.athena.athenad.backoff_delay', return_value=0.)
+  def test_retry_upload_delay(self, _):
+    item = athenad.UploadItem(path="qlog.bz2", url="http://localhost:44444/qlog.bz2", headers={}, created_at=int(time.time()*1000), id='id', allow_cellular=True)
+    with mock.patch.object(athenad.upload_queue, 'put_nowait') as put_nowait:
+      # retries that don't count, e.g. while metered, are not sped up by the backoff
+      athenad.cur_upload_items[0] = item
+      athenad.retry_upload(0, False)
+      self.assertEqual(put_nowait.call_args.kwargs['delay'], athenad.RETRY_DELAY)
+
+      athenad.cur_upload_items[0] = item
+      athenad.retry_upload(0)
+      self.assertEqual(put_nowait.call_args.kwargs['delay'], 0.)
+      self.assertEqual(put_nowait.call_args.args[0].retry_count, 1)
+
   def test_cancelUpload(self):
     item = athenad.UploadItem(path="qlog.bz2", url="http://localhost:44444/qlog.bz2", headers={}, created_at=int(time.time()*1000), id='id', allow_cellular=True)
     athenad.upload_queue.put_nowait(item)
@@ -328,22 +368,55 @@ class TestAthenadMethods(unittest.TestCase):
     item1 = athenad.UploadItem(path="_", url="_", headers={}, created_at=int(time.time()), id='id1')
     item2 = athenad.UploadItem(path="_", url="_", headers={}, created_at=int(time.time()), id='id2')
 
-    athenad.upload_queue.put_nowait(item1)
-    athenad.upload_queue.put_nowait(item2)
+    for item in (item1, item2):
+      athenad.upload_queue.put_nowait(item)
+      athenad.UploadQueueCache.add(item)
 
     # Ensure cancelled items are not persisted
-    athenad.cancelled_uploads.add(item2.id)
-
-    # serialize item
-    athenad.UploadQueueCache.cache(athenad.upload_queue)
+    dispatcher["cancelUpload"](item2.id)
 
     # deserialize item
-    athenad.upload_queue.queue.clear()
+    athenad.upload_queue.clear()
     athenad.UploadQueueCache.initialize(athenad.upload_queue)
 
     self.assertEqual(athenad.upload_queue.qsize(), 1)
     self.assertDictEqual(athenad.upload_queue.queue[-1]._asdict(), item1._asdict())
 
+  def test_upload_queue_persistence_incremental(self):
+    items = [athenad.UploadItem(path="_", url="_", headers={}, created_at=int(time.time()), id=f'id{i}') for i in range(3)]
+    for item in items:
+      athenad.UploadQueueCache.add(item)
+    athenad.UploadQueueCache.remove(items[1].id)
+    athenad.UploadQueueCache.add(items[2]._replace(retry_count=2))
+
+    athenad.UploadQueueCache.initialize(athenad.upload_queue)
+    self.assertEqual([i.id for i in athenad.upload_queue.queue], ['id0', 'id2'])
+    self.assertEqual(athenad.upload_queue.queue[1].retry_count, 2)
+
+  @with_http_server
+  def test_upload_handler_workers(self, host):
+    n_items, n_workers = 20, 4
+    for i in range(n_items):
+      fn = os.path.join(athenad.ROOT, f'qlog{i}')
+      Path(fn).touch()
+      athenad.upload_queue.put_nowait(athenad.UploadItem(path=fn, url=f"{host}/qlog{i}", headers={},
+                                                         created_at=int(time.time()*1000), id=f'id{i}', allow_cellular=True))
+
+    end_event = threading.Event()
+    threads = [threading.Thread(target=athenad.upload_handler, args=(end_event,)) for _ in range(n_workers)]
+    start = time.monotonic()
+    for t in threads:
+      t.start()
+    try:
+      self.wait_for_upload()
+      while any(i is not None for i in athenad.cur_upload_items.values()) and time.monotonic() - start < 5:
+        time.sleep(0.01)
+      self.assertEqual(athenad.upload_queue.qsize(), 0)
+    finally:
+      end_event.set()
+      for t in threads:
+        t.join()
+
   @mock.patch('selfdrive.athena.athenad.create_connection')
   def test_startLocalProxy(self, mock_create_connection):
     end_event = threading.Event()
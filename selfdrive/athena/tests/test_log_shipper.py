@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from selfdrive.athena.log_shipper import LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME, LogShipper
+
+
+class WebsocketStandIn:
+  """Answers forwardLogs requests like athena, after a fixed round trip delay"""
+  def __init__(self, rtt=0.05, drop=False):
+    self.send_queue = queue.Queue()
+    self.recv_queue = queue.Queue()
+    self.rtt = rtt
+    self.drop = drop
+    self.received = {}
+    self.round_trips = 0
+    self.end_event = threading.Event()
+    self.thread = threading.Thread(target=self.run, daemon=True)
+    self.thread.start()
+
+  def run(self):
+    while not self.end_event.is_set():
+      try:
+        data = json.loads(self.send_queue.get(timeout=0.1))
+      except queue.Empty:
+        continue
+      self.round_trips += 1
+      reqs = data if isinstance(data, list) else [data]
+      for r in reqs:
+        self.received[r['id']] = time.monotonic()
+      if not self.drop:
+        resp = [{"result": {"success": 1}, "id": r['id'], "jsonrpc": "2.0"} for r in reqs]
+        threading.Timer(self.rtt, self.recv_queue.put_nowait, [json.dumps(resp if isinstance(data, list) else resp[0])]).start()
+
+  def stop(self):
+    self.end_event.set()
+    self.thread.join()
+
+
+class TestLogShipper(unittest.TestCase):
+  def setUp(self):
+    self.log_dir = tempfile.mkdtemp()
+    self.idx = 0
+
+  def tearDown(self):
+    shutil.rmtree(self.log_dir)
+
+  def rotate(self, n=1, size=1000):
+    for _ in range(n):
+      with open(os.path.join(self.log_dir, f"swaglog.{self.idx:010}"), "w") as f:
+        f.write("x" * size)
+      self.idx += 1
+
+  def acked(self):
+    return sorted(f for f in os.listdir(self.log_dir)
+                  if LOG_ATTR_NAME in os.listxattr(os.path.join(self.log_dir, f)) and
+                  os.getxattr(os.path.join(self.log_dir, f), LOG_ATTR_NAME) == LOG_ATTR_VALUE_MAX_UNIX_TIME)
+
+  def run_shipper(self, shipper, until, timeout=5):
+    start = time.monotonic()
+    while not until() and time.monotonic() - start < timeout:
+      shipper.step(timeout=0.01)
+
+  def test_backlog_batched(self):
+    self.rotate(41)
+    ws = WebsocketStandIn()
+    shipper = LogShipper(self.log_dir, ws.send_queue.put_nowait, ws.recv_queue, window=4, batch_files=8)
+    try:
+      self.run_shipper(shipper, lambda: len(self.acked()) == 40)
+    finally:
+      shipper.close()
+      ws.stop()
+
+    # everything except the active file, in 5 round trips instead of 40
+    self.assertEqual(self.acked(), sorted(os.listdir(self.log_dir))[:-1])
+    self.assertEqual(ws.round_trips, 5)
+
+  def test_backlog_after_boot(self):
+    # monotonic time counts from boot, the backlog is shipped right away even shortly after it
+    self.rotate(3)
+    ws = WebsocketStandIn()
+    with mock.patch('selfdrive.athena.log_shipper.time', SimpleNamespace(time=time.time, monotonic=lambda: 1.)):
+      shipper = LogShipper(self.log_dir, ws.send_queue.put_nowait, ws.recv_queue, ack_timeout=1e9)
+      try:
+        self.run_shipper(shipper, lambda: len(self.acked()) == 2)
+      finally:
+        shipper.close()
+        ws.stop()
+    self.assertEqual(self.acked(), sorted(os.listdir(self.log_dir))[:-1])
+
+  def test_new_files(self):
+    ws = WebsocketStandIn(rtt=0.01)
+    shipper = LogShipper(self.log_dir, ws.send_queue.put_nowait, ws.recv_queue)
+    try:
+      self.rotate()
+      for i in range(20):
+        self.rotate()
+        self.run_shipper(shipper, lambda: len(self.acked()) == i + 1)
+        self.assertEqual(len(self.acked()), i + 1)
+    finally:
+      shipper.close()
+      ws.stop()
+
+  def test_restart(self):
+    self.rotate(5)
+    ws = WebsocketStandIn(drop=True)
+    shipper = LogShipper(self.log_dir, ws.send_queue.put_nowait, ws.recv_queue, batch_files=2, ack_timeout=0.1)
+    self.run_shipper(shipper, lambda: len(ws.received) == 4)
+    shipper.close()
+    ws.stop()
+    self.assertEqual(self.acked(), [])
+
+    # sent, but unacknowledged logs are not sent again right away after a restart
+    self.rotate()
+    ws = WebsocketStandIn()
+    shipper = LogShipper(self.log_dir, ws.send_queue.put_nowait, ws.recv_queue)
+    self.run_shipper(shipper, lambda: len(self.acked()) == 1)
+    shipper.close()
+    ws.stop()
+    self.assertEqual(self.acked(), [f"swaglog.{4:010}"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import namedtuple
+
+import selfdrive.athena.upload_scheduler as upload_scheduler
+from selfdrive.athena.upload_scheduler import PriorityUploadQueue, UploadLog, backoff_delay
+from selfdrive.loggerd.chunked_upload import BandwidthLimiter
+
+Item = namedtuple('Item', ['id', 'priority'])
+
+
+class TestPriorityUploadQueue(unittest.TestCase):
+  def test_priority_order(self):
+    q = PriorityUploadQueue()
+    for i, p in enumerate([10, 0, 10, 5]):
+      q.put_nowait(Item(f'id{i}', p))
+    self.assertEqual([i.id for i in q.queue], ['id1', 'id3', 'id0', 'id2'])
+    self.assertEqual([q.get(timeout=0).id for _ in range(4)], ['id1', 'id3', 'id0', 'id2'])
+    with self.assertRaises(queue.Empty):
+      q.get(timeout=0)
+
+  def test_delay(self):
+    q = PriorityUploadQueue()
+    q.put_nowait(Item('delayed', 0), delay=0.2)
+    q.put_nowait(Item('ready', 10))
+    self.assertEqual(q.get(timeout=0).id, 'ready')
+    with self.assertRaises(queue.Empty):
+      q.get(timeout=0.05)
+    t = time.monotonic()
+    self.assertEqual(q.get(timeout=1).id, 'delayed')
+    self.assertAlmostEqual(time.monotonic() - t, 0.15, delta=0.1)
+
+  def test_wakes_waiting_worker(self):
+    q = PriorityUploadQueue()
+    threading.Timer(0.05, lambda: q.put_nowait(Item('a', 0))).start()
+    self.assertEqual(q.get(timeout=1).id, 'a')
+
+  def test_backoff(self):
+    for retry_count in range(10):
+      delays = [backoff_delay(retry_count) for _ in range(100)]
+      self.assertTrue(all(0 <= d <= min(upload_scheduler.BACKOFF_MAX, upload_scheduler.BACKOFF_BASE * 2 ** retry_count) for d in delays))
+
+
+class TestUploadLog(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmp, "upload_queue.log")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def test_append_and_compact(self):
+    log = UploadLog(self.path)
+    for i in range(upload_scheduler.COMPACT_MIN_RECORDS // 2):
+      log.put({'id': f'id{i}', 'retry_count': 0})
+      log.delete(f'id{i}')
+    log.put({'id': 'kept', 'retry_count': 0})
+    log.put({'id': 'kept', 'retry_count': 1})
+    log.put({'id': 'kept2', 'retry_count': 0})
+
+    with open(self.path) as f:
+      lines = len(f.readlines())
+    self.assertLess(lines, upload_scheduler.COMPACT_MIN_RECORDS)
+
+    # torn last record is ignored
+    with open(self.path, 'a') as f:
+      f.write('{"put": {"id"')
+
+    log = UploadLog(self.path)
+    items = log.load()
+    self.assertEqual(sorted((i['id'], i['retry_count']) for i in items), [('kept', 1), ('kept2', 0)])
+
+    # records appended after loading a torn log are not lost
+    log.put({'id': 'new', 'retry_count': 0})
+    items = UploadLog(self.path).load()
+    self.assertEqual(sorted(i['id'] for i in items), ['kept', 'kept2', 'new'])
+
+
+class TestBandwidthLimiter(unittest.TestCase):
+  def test_rate(self):
+    rate = 1e6
+    limiter = BandwidthLimiter(rate, burst=10e3)
+    n = 0
+    t = time.monotonic()
+    while time.monotonic() - t < 0.3:
+      limiter.consume(8192)
+      n += 8192
+    self.assertAlmostEqual(n / (time.monotonic() - t), rate, delta=rate * 0.15)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,152 @@
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from common.file_helpers import atomic_write_in_dir
+from system.swaglog import cloudlog
+
+DEFAULT_PRIORITY = 10  # lower is more urgent
+BACKOFF_BASE = 10.  # seconds
+BACKOFF_MAX = 300.  # seconds
+COMPACT_MIN_RECORDS = 100
+
+
+def backoff_delay(retry_count: int) -> float:
+  """Exponential backoff with full jitter"""
+  return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** retry_count))
+
+
+class PriorityUploadQueue:
+  """Thread-safe queue of upload items ordered by priority, then insertion order.
+  Items can be put with a delay, they are only handed out once it has passed."""
+
+  def __init__(self):
+    self.cv = threading.Condition()
+    self.heap: List[Any] = []
+    self.counter = itertools.count()
+
+  def put_nowait(self, item, delay: float = 0.) -> None:
+    with self.cv:
+      heapq.heappush(self.heap, (time.monotonic() + delay, item.priority, next(self.counter), item))
+      self.cv.notify()
+
+  def get(self, timeout: Optional[float] = None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with self.cv:
+      while True:
+        now = time.monotonic()
+        ready = [e for e in self.heap if e[0] <= now]
+        if ready:
+          entry = min(ready, key=lambda e: e[1:3])
+          self.heap.remove(entry)
+          heapq.heapify(self.heap)
+          return entry[3]
+
+        wait = self.heap[0][0] - now if self.heap else None
+        if deadline is not None:
+          if now >= deadline:
+            raise queue.Empty
+          wait = deadline - now if wait is None else min(wait, deadline - now)
+        self.cv.wait(wait)
+
+  def qsize(self) -> int:
+    with self.cv:
+      return len(self.heap)
+
+  def empty(self) -> bool:
+    return self.qsize() == 0
+
+  @property
+  def queue(self) -> List[Any]:
+    with self.cv:
+      return [e[3] for e in sorted(self.heap, key=lambda e: e[1:3])]
+
+  def remove(self, ids: Iterable[str]) -> None:
+    ids = set(ids)
+    with self.cv:
+      self.heap = [e for e in self.heap if e[3].id not in ids]
+      heapq.heapify(self.heap)
+
+  def clear(self) -> None:
+    with self.cv:
+      self.heap.clear()
+
+
+class UploadLog:
+  """Append-only persistence of queued upload items. Every change is one appended line,
+  the file is rewritten from the live items once stale records dominate."""
+
+  def __init__(self, path: str):
+    self.path = path
+    self.lock = threading.Lock()
+    self.items: Dict[str, Dict[str, Any]] = {}
+    self.records = 0
+
+  def load(self) -> List[Dict[str, Any]]:
+    with self.lock:
+      self.items.clear()
+      self.records = 0
+      torn = False
+      try:
+        with open(self.path) as f:
+          for line in f:
+            try:
+              record = json.loads(line)
+            except ValueError:
+              torn = True  # torn write at the end of the log
+              continue
+            self.records += 1
+            if 'put' in record:
+              self.items[record['put']['id']] = record['put']
+            elif 'del' in record:
+              self.items.pop(record['del'], None)
+      except FileNotFoundError:
+        pass
+      except Exception:
+        cloudlog.exception("athena.UploadLog.load.exception")
+
+      # the next append would continue the torn line and be lost with it
+      if torn:
+        self._compact()
+      return list(self.items.values())
+
+  def put(self, item: Dict[str, Any]) -> None:
+    self._append({'put': item}, lambda: self.items.__setitem__(item['id'], item))
+
+  def delete(self, item_id: str) -> None:
+    if item_id in self.items:
+      self._append({'del': item_id}, lambda: self.items.pop(item_id, None))
+
+  def rewrite(self, items: List[Dict[str, Any]]) -> None:
+    with self.lock:
+      self.items = {i['id']: i for i in items}
+      self._compact()
+
+  def _append(self, record: Dict[str, Any], apply: Callable[[], Any]) -> None:
+    with self.lock:
+      apply()
+      try:
+        with open(self.path, 'a') as f:
+          f.write(json.dumps(record) + '\n')
+        self.records += 1
+      except OSError:
+        cloudlog.exception("athena.UploadLog.append.exception")
+
+      if self.records > max(COMPACT_MIN_RECORDS, 2 * len(self.items)):
+        self._compact()
+
+  def _compact(self) -> None:
+    try:
+      os.makedirs(os.path.dirname(self.path), exist_ok=True)
+      with atomic_write_in_dir(self.path, overwrite=True) as f:
+        for item in self.items.values():
+          f.write(json.dumps({'put': item}) + '\n')
+      self.records = len(self.items)
+    except OSError:
+      cloudlog.exception("athena.UploadLog.compact.exception")
@@ -1,10 +1,12 @@
 import os
 import time
+from functools import lru_cache
 from typing import Dict, List
 
 from cereal import car
 from common.params import Params
 from common.basedir import BASEDIR
+from common.lazy_import import LazyDict
 from system.version import is_comma_remote, is_tested_branch
 from selfdrive.car.interfaces import get_interface_attr
 from selfdrive.car.fingerprints import eliminate_incompatible_cars, all_legacy_fingerprint_cars
@@ -40,25 +42,29 @@ def get_one_can(logcan):
       return can
 
 
-def load_interfaces(brand_names):
-  ret = {}
-  for brand_name in brand_names:
-    path = f'selfdrive.car.{brand_name}'
-    CarInterface = __import__(path + '.interface', fromlist=['CarInterface']).CarInterface
+@lru_cache(maxsize=None)
+def load_interface(brand_name):
+  path = f'selfdrive.car.{brand_name}'
+  CarInterface = __import__(path + '.interface', fromlist=['CarInterface']).CarInterface
 
-    if os.path.exists(BASEDIR + '/' + path.replace('.', '/') + '/carstate.py'):
-      CarState = __import__(path + '.carstate', fromlist=['CarState']).CarState
-    else:
-      CarState = None
+  if os.path.exists(BASEDIR + '/' + path.replace('.', '/') + '/carstate.py'):
+    CarState = __import__(path + '.carstate', fromlist=['CarState']).CarState
+  else:
+    CarState = None
 
-    if os.path.exists(BASEDIR + '/' + path.replace('.', '/') + '/carcontroller.py'):
-      CarController = __import__(path + '.carcontroller', fromlist=['CarController']).CarController
-    else:
-      CarController = None
+  if os.path.exists(BASEDIR + '/' + path.replace('.', '/') + '/carcontroller.py'):
+    CarController = __import__(path + '.carcontroller', fromlist=['CarController']).CarController
+  else:
+    CarController = None
+
+  return CarInterface, CarController, CarState
 
-    for model_name in brand_names[brand_name]:
-      ret[model_name] = (CarInterface, CarController, CarState)
-  return ret
+
+def load_interfaces(brand_names):
+  # a brand's interface, carstate and carcontroller modules are only imported
+  # the first time one of its models is looked up
+  model_brands = {model_name: brand_name for brand_name in brand_names for model_name in brand_names[brand_name]}
+  return LazyDict(model_brands, lambda model_name: load_interface(model_brands[model_name]))
 
 
 def _get_interface_names() -> Dict[str, List[str]]:
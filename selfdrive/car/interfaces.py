@@ -2,7 +2,7 @@ import yaml
 import os
 import time
 from abc import abstractmethod, ABC
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Tuple, List, Set
 
 from cereal import car
 from common.basedir import BASEDIR
@@ -64,6 +64,7 @@ class CarInterfaceBase(ABC):
 
     self.CS = None
     self.can_parsers = []
+    self.can_updated: List[Set[int]] = []
     if CarState is not None:
       self.CS = CarState(CP)
 
@@ -73,6 +74,7 @@ class CarInterfaceBase(ABC):
       self.cp_body = self.CS.get_body_can_parser(CP)
       self.cp_loopback = self.CS.get_loopback_can_parser(CP)
       self.can_parsers = [self.cp, self.cp_cam, self.cp_adas, self.cp_body, self.cp_loopback]
+      self.can_updated = [set() for _ in self.can_parsers]
 
     self.CC = None
     if CarController is not None:
@@ -151,10 +153,10 @@ class CarInterfaceBase(ABC):
     pass
 
   def update(self, c: car.CarControl, can_strings: List[bytes]) -> car.CarState:
-    # parse can
-    for cp in self.can_parsers:
+    # parse can, keeping track of the messages each parser received new values for
+    for i, cp in enumerate(self.can_parsers):
       if cp is not None:
-        cp.update_strings(can_strings)
+        self.can_updated[i] = cp.update_strings(can_strings)
 
     # get CarState
     ret = self._update(c)
@@ -169,6 +171,10 @@ class CarInterfaceBase(ABC):
 
     return reader
 
+  def can_changed(self) -> bool:
+    """True if any parser received new values during the last update"""
+    return any(len(addrs) > 0 for addrs in self.can_updated)
+
   @abstractmethod
   def apply(self, c: car.CarControl) -> Tuple[car.CarControl.Actuators, List[bytes]]:
     pass
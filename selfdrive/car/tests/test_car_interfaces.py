@@ -9,6 +9,13 @@ from selfdrive.car.fingerprints import all_known_cars
 from selfdrive.car.car_helpers import interfaces
 from selfdrive.car.fingerprints import _FINGERPRINTS as FINGERPRINTS
 
+
+class FakeCanParser:
+  # every address in the strings is new
+  def update_strings(self, strings):
+    return {addr for s in strings for addr in s}
+
+
 class TestCarInterfaces(unittest.TestCase):
 
   @parameterized.expand([(car,) for car in all_known_cars()])
@@ -52,6 +59,7 @@ class TestCarInterfaces(unittest.TestCase):
       car_interface.update(CC, [])
       car_interface.apply(CC)
       car_interface.apply(CC)
+    self.assertFalse(car_interface.can_changed())
 
     CC = car.CarControl.new_message()
     CC.enabled = True
@@ -71,5 +79,26 @@ class TestCarInterfaces(unittest.TestCase):
        hasattr(radar_interface, '_update') and hasattr(radar_interface, 'trigger_msg'):
       radar_interface._update([radar_interface.trigger_msg])
 
+  def test_can_changed(self):
+    car_name = sorted(all_known_cars())[0]
+    CarInterface, CarController, CarState = interfaces[car_name]
+    car_params = CarInterface.get_params(car_name, {i: {} for i in range(3)}, [])
+    car_interface = CarInterface(car_params, CarController, CarState)
+    car_interface.can_parsers = [FakeCanParser(), None, FakeCanParser()]
+    car_interface.can_updated = [set() for _ in car_interface.can_parsers]
+    CC = car.CarControl.new_message()
+
+    car_interface.update(CC, [])
+    self.assertFalse(car_interface.can_changed())
+
+    car_interface.update(CC, [[0x10, 0x20]])
+    self.assertTrue(car_interface.can_changed())
+    self.assertEqual(car_interface.can_updated, [{0x10, 0x20}, set(), {0x10, 0x20}])
+
+    # only the last update counts
+    car_interface.update(CC, [])
+    self.assertFalse(car_interface.can_changed())
+    self.assertEqual(car_interface.can_updated, [set(), set(), set()])
+
 if __name__ == "__main__":
   unittest.main()
@@ -7,8 +7,13 @@ STEER_ANGLE_SATURATION_THRESHOLD = 2.5  # Degrees
 
 
 class LatControlAngle(LatControl):
+  def __init__(self, CP, CI):
+    super().__init__(CP, CI)
+    self.angle_log = log.ControlsState.LateralAngleState.new_message()
+
   def update(self, active, CS, VM, params, last_actuators, desired_curvature, desired_curvature_rate, llk):
-    angle_log = log.ControlsState.LateralAngleState.new_message()
+    # every field is written on each update
+    angle_log = self.angle_log
 
     if CS.vEgo < MIN_STEER_SPEED or not active:
       angle_log.active = False
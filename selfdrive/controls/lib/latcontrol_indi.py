@@ -3,7 +3,7 @@ import numpy as np
 
 from cereal import log
 from common.filter_simple import FirstOrderFilter
-from common.numpy_fast import clip, interp
+from common.numpy_fast import Interp, clip
 from common.realtime import DT_CTRL
 from selfdrive.controls.lib.latcontrol import LatControl, MIN_STEER_SPEED
 
@@ -34,29 +34,30 @@ class LatControlINDI(LatControl):
     self.A_K = A - np.dot(K, C)
     self.x = np.array([[0.], [0.], [0.]])
 
-    self._RC = (CP.lateralTuning.indi.timeConstantBP, CP.lateralTuning.indi.timeConstantV)
-    self._G = (CP.lateralTuning.indi.actuatorEffectivenessBP, CP.lateralTuning.indi.actuatorEffectivenessV)
-    self._outer_loop_gain = (CP.lateralTuning.indi.outerLoopGainBP, CP.lateralTuning.indi.outerLoopGainV)
-    self._inner_loop_gain = (CP.lateralTuning.indi.innerLoopGainBP, CP.lateralTuning.indi.innerLoopGainV)
+    self._RC = Interp(CP.lateralTuning.indi.timeConstantBP, CP.lateralTuning.indi.timeConstantV)
+    self._G = Interp(CP.lateralTuning.indi.actuatorEffectivenessBP, CP.lateralTuning.indi.actuatorEffectivenessV)
+    self._outer_loop_gain = Interp(CP.lateralTuning.indi.outerLoopGainBP, CP.lateralTuning.indi.outerLoopGainV)
+    self._inner_loop_gain = Interp(CP.lateralTuning.indi.innerLoopGainBP, CP.lateralTuning.indi.innerLoopGainV)
+    self.indi_log = log.ControlsState.LateralINDIState.new_message()
 
     self.steer_filter = FirstOrderFilter(0., self.RC, DT_CTRL)
     self.reset()
 
   @property
   def RC(self):
-    return interp(self.speed, self._RC[0], self._RC[1])
+    return self._RC(self.speed)
 
   @property
   def G(self):
-    return interp(self.speed, self._G[0], self._G[1])
+    return self._G(self.speed)
 
   @property
   def outer_loop_gain(self):
-    return interp(self.speed, self._outer_loop_gain[0], self._outer_loop_gain[1])
+    return self._outer_loop_gain(self.speed)
 
   @property
   def inner_loop_gain(self):
-    return interp(self.speed, self._inner_loop_gain[0], self._inner_loop_gain[1])
+    return self._inner_loop_gain(self.speed)
 
   def reset(self):
     super().reset()
@@ -69,7 +70,10 @@ class LatControlINDI(LatControl):
     y = np.array([[math.radians(CS.steeringAngleDeg)], [math.radians(CS.steeringRateDeg)]])
     self.x = np.dot(self.A_K, self.x) + np.dot(self.K, y)
 
-    indi_log = log.ControlsState.LateralINDIState.new_message()
+    # reused while active, every field is written on each update
+    indi_log = self.indi_log
+    if indi_log.active and (CS.vEgo < MIN_STEER_SPEED or not active):
+      self.indi_log = indi_log = log.ControlsState.LateralINDIState.new_message()
     indi_log.steeringAngleDeg = math.degrees(self.x[0])
     indi_log.steeringRateDeg = math.degrees(self.x[1])
     indi_log.steeringAccelDeg = math.degrees(self.x[2])
@@ -83,7 +87,6 @@ class LatControlINDI(LatControl):
     indi_log.steeringRateDesiredDeg = math.degrees(rate_des)
 
     if CS.vEgo < MIN_STEER_SPEED or not active:
-      indi_log.active = False
       self.steer_filter.x = 0.0
       output_steer = 0
     else:
@@ -12,13 +12,17 @@ class LatControlPID(LatControl):
                              (CP.lateralTuning.pid.kiBP, CP.lateralTuning.pid.kiV),
                              k_f=CP.lateralTuning.pid.kf, pos_limit=self.steer_max, neg_limit=-self.steer_max)
     self.get_steer_feedforward = CI.get_steer_feedforward_function()
+    self.pid_log = log.ControlsState.LateralPIDState.new_message()
 
   def reset(self):
     super().reset()
     self.pid.reset()
 
   def update(self, active, CS, VM, params, last_actuators, desired_curvature, desired_curvature_rate, llk):
-    pid_log = log.ControlsState.LateralPIDState.new_message()
+    # reused while active, every field is written on each update
+    pid_log = self.pid_log
+    if pid_log.active and (CS.vEgo < MIN_STEER_SPEED or not active):
+      self.pid_log = pid_log = log.ControlsState.LateralPIDState.new_message()
     pid_log.steeringAngleDeg = float(CS.steeringAngleDeg)
     pid_log.steeringRateDeg = float(CS.steeringRateDeg)
 
@@ -30,7 +34,6 @@ class LatControlPID(LatControl):
     pid_log.angleError = error
     if CS.vEgo < MIN_STEER_SPEED or not active:
       output_steer = 0.0
-      pid_log.active = False
       self.pid.reset()
     else:
       # offset does not contribute to resistive torque
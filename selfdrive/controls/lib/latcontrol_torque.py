@@ -1,7 +1,7 @@
 import math
 
 from cereal import log
-from common.numpy_fast import interp
+from common.numpy_fast import Interp, interp
 from selfdrive.controls.lib.latcontrol import LatControl, MIN_STEER_SPEED
 from selfdrive.controls.lib.pid import PIDController
 from selfdrive.controls.lib.drive_helpers import apply_deadzone
@@ -20,6 +20,7 @@ from selfdrive.controls.lib.vehicle_model import ACCELERATION_DUE_TO_GRAVITY
 
 
 FRICTION_THRESHOLD = 0.2
+LOW_SPEED_FACTOR = Interp([0, 10, 20], [500, 500, 200])
 
 
 class LatControlTorque(LatControl):
@@ -32,13 +33,17 @@ class LatControlTorque(LatControl):
     self.friction = CP.lateralTuning.torque.friction
     self.kf = CP.lateralTuning.torque.kf
     self.steering_angle_deadzone_deg = CP.lateralTuning.torque.steeringAngleDeadzoneDeg
+    self.friction_compensation = Interp([-FRICTION_THRESHOLD, FRICTION_THRESHOLD], [-self.friction, self.friction])
+    self.pid_log = log.ControlsState.LateralTorqueState.new_message()
 
   def update(self, active, CS, VM, params, last_actuators, desired_curvature, desired_curvature_rate, llk):
-    pid_log = log.ControlsState.LateralTorqueState.new_message()
+    # reused while active, every field is written on each update
+    pid_log = self.pid_log
 
     if CS.vEgo < MIN_STEER_SPEED or not active:
       output_torque = 0.0
-      pid_log.active = False
+      if pid_log.active:
+        self.pid_log = pid_log = log.ControlsState.LateralTorqueState.new_message()
     else:
       if self.use_steering_angle:
         actual_curvature = -VM.calc_curvature(math.radians(CS.steeringAngleDeg - params.angleOffsetDeg), CS.vEgo, params.roll)
@@ -56,7 +61,7 @@ class LatControlTorque(LatControl):
       lateral_accel_deadzone = curvature_deadzone * CS.vEgo ** 2
 
 
-      low_speed_factor = interp(CS.vEgo, [0, 10, 20], [500, 500, 200])
+      low_speed_factor = LOW_SPEED_FACTOR(CS.vEgo)
       setpoint = desired_lateral_accel + low_speed_factor * desired_curvature
       measurement = actual_lateral_accel + low_speed_factor * actual_curvature
       error = setpoint - measurement
@@ -64,7 +69,7 @@ class LatControlTorque(LatControl):
 
       ff = desired_lateral_accel - params.roll * ACCELERATION_DUE_TO_GRAVITY
       # convert friction into lateral accel units for feedforward
-      friction_compensation = interp(apply_deadzone(error, lateral_accel_deadzone), [-FRICTION_THRESHOLD, FRICTION_THRESHOLD], [-self.friction, self.friction])
+      friction_compensation = self.friction_compensation(apply_deadzone(error, lateral_accel_deadzone))
       ff += friction_compensation / self.kf
       freeze_integrator = CS.steeringRateLimited or CS.steeringPressed or CS.vEgo < 5
       output_torque = self.pid.update(error,
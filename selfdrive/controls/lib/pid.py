@@ -1,7 +1,7 @@
 import numpy as np
 from numbers import Number
 
-from common.numpy_fast import clip, interp
+from common.numpy_fast import Interp, clip
 
 
 class PIDController():
@@ -17,26 +17,27 @@ class PIDController():
     if isinstance(self._k_d, Number):
       self._k_d = [[0], [self._k_d]]
 
+    # gain schedules compiled once, gains sharing breakpoints use one lookup
+    schedules = {}
+    for name, (bp, v) in (('k_p', self._k_p), ('k_i', self._k_i), ('k_d', self._k_d)):
+      schedules.setdefault(tuple(bp), []).append((name, Interp(bp, v)))
+    self._gain_schedules = list(schedules.values())
+
     self.pos_limit = pos_limit
     self.neg_limit = neg_limit
 
     self.i_unwind_rate = 0.3 / rate
     self.i_rate = 1.0 / rate
-    self.speed = 0.0
+    self.set_speed(0.0)
 
     self.reset()
 
-  @property
-  def k_p(self):
-    return interp(self.speed, self._k_p[0], self._k_p[1])
-
-  @property
-  def k_i(self):
-    return interp(self.speed, self._k_i[0], self._k_i[1])
-
-  @property
-  def k_d(self):
-    return interp(self.speed, self._k_d[0], self._k_d[1])
+  def set_speed(self, speed):
+    self.speed = speed
+    for gains in self._gain_schedules:
+      hi = gains[0][1].segment(speed)
+      for name, schedule in gains:
+        setattr(self, name, schedule.value(hi, speed))
 
   @property
   def error_integral(self):
@@ -50,7 +51,7 @@ class PIDController():
     self.control = 0
 
   def update(self, error, error_rate=0.0, speed=0.0, override=False, feedforward=0., freeze_integrator=False):
-    self.speed = speed
+    self.set_speed(speed)
 
     self.p = float(error) * self.k_p
     self.f = feedforward * self.k_f
@@ -64,6 +64,42 @@ class TestVehicleModel(unittest.TestCase):
 
           np.testing.assert_almost_equal(x1, x2, decimal=3)
 
+  def test_batch(self):
+    u = np.linspace(0, 30, num=31)
+    sa = np.linspace(math.radians(-20), math.radians(20), num=31)
+    roll = np.linspace(math.radians(-5), math.radians(5), num=31)
+
+    curvature = self.VM.calc_curvature(sa, u, roll)
+    steer = self.VM.get_steer_from_curvature(curvature, u, roll)
+    sols = self.VM.steady_state_sols(sa, u, roll)
+    for i in range(len(u)):
+      self.assertEqual(curvature[i], self.VM.calc_curvature(sa[i], u[i], roll[i]))
+      self.assertEqual(steer[i], self.VM.get_steer_from_curvature(curvature[i], u[i], roll[i]))
+      np.testing.assert_allclose(sols[i], self.VM.steady_state_sol(sa[i], u[i], roll[i])[:, 0], rtol=1e-12)
+
+  def test_cache_invalidation(self):
+    u, sa, roll = 20., math.radians(5), math.radians(2)
+    steer_ratio = self.VM.sR
+    curvature = self.VM.calc_curvature(sa, u, roll)
+    sol = dyn_ss_sol(sa, u, roll, self.VM)
+
+    self.VM.update_params(0.8, 13.)
+    self.assertNotEqual(self.VM.calc_curvature(sa, u, roll), curvature)
+    self.assertFalse(np.allclose(dyn_ss_sol(sa, u, roll, self.VM), sol))
+
+    # same inputs as a fresh model with those params
+    CP = CarInterface.get_params(CAR.CIVIC)
+    CP.steerRatio = 13.
+    CP.tireStiffnessFront *= 0.8
+    CP.tireStiffnessRear *= 0.8
+    VM = VehicleModel(CP)
+    self.assertEqual(self.VM.calc_curvature(sa, u, roll), VM.calc_curvature(sa, u, roll))
+    np.testing.assert_array_equal(dyn_ss_sol(sa, u, roll, self.VM), dyn_ss_sol(sa, u, roll, VM))
+
+    self.VM.update_params(1.0, steer_ratio)
+    self.assertEqual(self.VM.calc_curvature(sa, u, roll), curvature)
+    np.testing.assert_array_equal(dyn_ss_sol(sa, u, roll, self.VM), sol)
+
 
 
 if __name__ == "__main__":
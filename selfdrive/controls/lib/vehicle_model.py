@@ -12,7 +12,7 @@ x_dot = A*x + B*u
 
 A depends on longitudinal speed, u [m/s], and vehicle parameters CP
 """
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
 import numpy as np
 from numpy.linalg import solve
@@ -20,6 +20,7 @@ from numpy.linalg import solve
 from cereal import car
 
 ACCELERATION_DUE_TO_GRAVITY = 9.8
+DYN_CACHE_SIZE = 64  # speeds to keep state matrices for
 
 
 class VehicleModel:
@@ -38,14 +39,24 @@ class VehicleModel:
 
     self.cF_orig: float = CP.tireStiffnessFront
     self.cR_orig: float = CP.tireStiffnessRear
+
+    self.last_params: Optional[Tuple[float, float]] = None
     self.update_params(1.0, CP.steerRatio)
 
   def update_params(self, stiffness_factor: float, steer_ratio: float) -> None:
-    """Update the vehicle model with a new stiffness factor and steer ratio"""
+    """Update the vehicle model with a new stiffness factor and steer ratio.
+    Derived quantities are only recomputed when these change."""
+    if (stiffness_factor, steer_ratio) == self.last_params:
+      return
+    self.last_params = (stiffness_factor, steer_ratio)
+
     self.cF: float = stiffness_factor * self.cF_orig
     self.cR: float = stiffness_factor * self.cR_orig
     self.sR: float = steer_ratio
 
+    self.sf: float = calc_slip_factor(self)
+    self.dyn_cache: Dict[float, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
   def steady_state_sol(self, sa: float, u: float, roll: float) -> np.ndarray:
     """Returns the steady state solution.
 
@@ -65,13 +76,48 @@ class VehicleModel:
     else:
       return kin_ss_sol(sa, u, self)
 
+  def steady_state_sols(self, sa: np.ndarray, u: np.ndarray, roll: np.ndarray) -> np.ndarray:
+    """steady_state_sol over arrays of steering angles, speeds and roll, broadcast together.
+
+    Returns:
+      Nx2 array of steady state solutions (lateral speed, rotational speed)
+    """
+    sa, u, roll = np.broadcast_arrays(np.asarray(sa, dtype=float), np.asarray(u, dtype=float), np.asarray(roll, dtype=float))
+    sa, u, roll = sa.ravel(), u.ravel(), roll.ravel()
+    sol = np.empty((len(u), 2))
+
+    dyn = u > 0.1
+    if np.any(dyn):
+      A, B = create_dyn_state_matrices(u[dyn], self)
+      inp = np.stack((sa[dyn], roll[dyn]), axis=-1)[:, :, None]
+      sol[dyn] = (-solve(A, B) @ inp)[:, :, 0]
+
+    kin = ~dyn
+    sol[kin, 0] = self.aR / self.sR / self.l * u[kin] * sa[kin]
+    sol[kin, 1] = 1. / self.sR / self.l * u[kin] * sa[kin]
+    return sol
+
+  def dyn_state_matrices(self, u: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """A, B and the steady state gain -A^{-1} B at speed u, cached until the parameters
+    change. The arrays are read only."""
+    matrices = self.dyn_cache.get(u)
+    if matrices is None:
+      if len(self.dyn_cache) >= DYN_CACHE_SIZE:
+        self.dyn_cache.clear()
+      A, B = create_dyn_state_matrices(u, self)
+      gain = -solve(A, B)
+      for m in (A, B, gain):
+        m.flags.writeable = False
+      matrices = self.dyn_cache[u] = (A, B, gain)
+    return matrices
+
   def calc_curvature(self, sa: float, u: float, roll: float) -> float:
     """Returns the curvature. Multiplied by the speed this will give the yaw rate.
 
     Args:
-      sa: Steering wheel angle [rad]
-      u: Speed [m/s]
-      roll: Road Roll [rad]
+      sa: Steering wheel angle [rad], scalar or array
+      u: Speed [m/s], scalar or array
+      roll: Road Roll [rad], scalar or array
 
     Returns:
       Curvature factor [1/m]
@@ -88,16 +134,15 @@ class VehicleModel:
     Returns:
       Curvature factor [1/m]
     """
-    sf = calc_slip_factor(self)
-    return (1. - self.chi) / (1. - sf * u**2) / self.l
+    return (1. - self.chi) / (1. - self.sf * u**2) / self.l
 
   def get_steer_from_curvature(self, curv: float, u: float, roll: float) -> float:
     """Calculates the required steering wheel angle for a given curvature
 
     Args:
-      curv: Desired curvature [1/m]
-      u: Speed [m/s]
-      roll: Road Roll [rad]
+      curv: Desired curvature [1/m], scalar or array
+      u: Speed [m/s], scalar or array
+      roll: Road Roll [rad], scalar or array
 
     Returns:
       Steering wheel angle [rad]
@@ -115,7 +160,7 @@ class VehicleModel:
     Returns:
       Roll compensation curvature [rad]
     """
-    sf = calc_slip_factor(self)
+    sf = self.sf
 
     if abs(sf) < 1e-6:
       return 0
@@ -173,11 +218,11 @@ def create_dyn_state_matrices(u: float, VM: VehicleModel) -> Tuple[np.ndarray, n
   """Returns the A and B matrix for the dynamics system
 
   Args:
-    u: Vehicle speed [m/s]
+    u: Vehicle speed [m/s], or an array of N speeds
     VM: Vehicle model
 
   Returns:
-    A tuple with the 2x2 A matrix, and 2x2 B matrix
+    A tuple with the 2x2 A matrix, and 2x2 B matrix, Nx2x2 for an array of speeds
 
   Parameters in the vehicle model:
     cF: Tire stiffness Front [N/rad]
@@ -189,19 +234,19 @@ def create_dyn_state_matrices(u: float, VM: VehicleModel) -> Tuple[np.ndarray, n
     sR: Steering ratio [-]
     chi: Steer ratio rear [-]
   """
-  A = np.zeros((2, 2))
-  B = np.zeros((2, 2))
-  A[0, 0] = - (VM.cF + VM.cR) / (VM.m * u)
-  A[0, 1] = - (VM.cF * VM.aF - VM.cR * VM.aR) / (VM.m * u) - u
-  A[1, 0] = - (VM.cF * VM.aF - VM.cR * VM.aR) / (VM.j * u)
-  A[1, 1] = - (VM.cF * VM.aF**2 + VM.cR * VM.aR**2) / (VM.j * u)
+  A = np.zeros(np.shape(u) + (2, 2))
+  B = np.zeros(np.shape(u) + (2, 2))
+  A[..., 0, 0] = - (VM.cF + VM.cR) / (VM.m * u)
+  A[..., 0, 1] = - (VM.cF * VM.aF - VM.cR * VM.aR) / (VM.m * u) - u
+  A[..., 1, 0] = - (VM.cF * VM.aF - VM.cR * VM.aR) / (VM.j * u)
+  A[..., 1, 1] = - (VM.cF * VM.aF**2 + VM.cR * VM.aR**2) / (VM.j * u)
 
   # Steering input
-  B[0, 0] = (VM.cF + VM.chi * VM.cR) / VM.m / VM.sR
-  B[1, 0] = (VM.cF * VM.aF - VM.chi * VM.cR * VM.aR) / VM.j / VM.sR
+  B[..., 0, 0] = (VM.cF + VM.chi * VM.cR) / VM.m / VM.sR
+  B[..., 1, 0] = (VM.cF * VM.aF - VM.chi * VM.cR * VM.aR) / VM.j / VM.sR
 
   # Roll input
-  B[0, 1] = -ACCELERATION_DUE_TO_GRAVITY
+  B[..., 0, 1] = -ACCELERATION_DUE_TO_GRAVITY
 
   return A, B
 
@@ -219,9 +264,9 @@ def dyn_ss_sol(sa: float, u: float, roll: float, VM: VehicleModel) -> np.ndarray
   Returns:
     2x1 matrix with steady state solution
   """
-  A, B = create_dyn_state_matrices(u, VM)
+  _, _, gain = VM.dyn_state_matrices(u)
   inp = np.array([[sa], [roll]])
-  return -solve(A, B) @ inp  # type: ignore
+  return gain @ inp
 
 
 def calc_slip_factor(VM: VehicleModel) -> float:
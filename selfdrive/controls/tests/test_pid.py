@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import unittest
+
+import numpy as np
+
+from common.numpy_fast import interp
+from selfdrive.controls.lib.pid import PIDController
+
+
+class TestPIDController(unittest.TestCase):
+  def test_gain_schedules(self):
+    k_p = ([0., 5., 35.], [3.6, 2.4, 1.5])
+    k_i = ([0., 35.], [0.54, 0.36])
+    k_d = ([0., 5., 35.], [0.1, 0.2, 0.3])
+    pid = PIDController(k_p, k_i, k_d=k_d, k_f=1., pos_limit=2., neg_limit=-3.5)
+
+    rng = np.random.default_rng(0)
+    for speed in rng.uniform(-1., 40., 1000):
+      pid.update(rng.normal(), error_rate=rng.normal(), speed=speed)
+      self.assertEqual(pid.k_p, interp(speed, *k_p))
+      self.assertEqual(pid.k_i, interp(speed, *k_i))
+      self.assertEqual(pid.k_d, interp(speed, *k_d))
+      self.assertEqual(pid.error_integral, pid.i / interp(speed, *k_i))
+
+  def test_scalar_gains(self):
+    pid = PIDController(0.115, k_i=0.23, rate=100)
+    self.assertEqual((pid.k_p, pid.k_i, pid.k_d), (0.115, 0.23, 0.))
+    pid.update(1., speed=20.)
+    self.assertEqual((pid.k_p, pid.k_i, pid.k_d), (0.115, 0.23, 0.))
+    self.assertEqual(pid.control, 0.115 + 0.23 / 100)
+
+
+if __name__ == "__main__":
+  unittest.main()
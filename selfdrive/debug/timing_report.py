@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+
+from tools.lib.logreader import LogReader
+from tools.lib.route import get_log_paths
+from tools.lib.timing import TimingAnalyzer, compare_reports
+
+
+def print_report(report):
+  print(f"{report['duration']:.1f} s")
+  print(f"\n{'service':<30} {'Hz':>7} {'expected':>8} {'dt p50':>8} {'p99':>8} {'max':>8} {'rsd':>6}")
+  for s, r in report['services'].items():
+    if r['dt']['count']:
+      print(f"{s:<30} {r['frequency']:7.2f} {r['expected_frequency']:8.1f} {r['dt']['p50']:8.2f} {r['dt']['p99']:8.2f} "
+            f"{r['dt']['max']:8.2f} {r.get('rsd', float('nan')):6.3f}")
+
+  for section in ('execution', 'lag', 'e2e'):
+    print(f"\n{section:<40} {'mean ms':>8} {'p50':>8} {'p99':>8} {'max':>8}")
+    for k, r in report[section].items():
+      if r['count']:
+        print(f"{k:<40} {r['mean']:8.2f} {r['p50']:8.2f} {r['p99']:8.2f} {r['max']:8.2f}")
+
+  print(f"\n{'process':<40} {'cpu %':>8}")
+  for proc, usage in report['cpu'].items():
+    print(f"{proc:<40} {usage:8.2f}")
+  if len(report['cores']):
+    print("cores " + " ".join(f"{c:.1f}%" for c in report['cores']))
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Service frequencies, jitter, execution times, lag and CPU usage of logs, "
+                                               "one segment in memory at a time")
+  parser.add_argument("logs", nargs='+', help="log files, segments or routes, analyzed as one drive")
+  parser.add_argument("--qlog", action="store_true", help="use the qlogs of segments and routes")
+  parser.add_argument("--json", type=str, help="write the report to this file")
+  parser.add_argument("--baseline", type=str, help="report to compare against, exits 1 on regressions")
+  parser.add_argument("--rtol", type=float, default=0.15, help="relative increase that is a regression")
+  parser.add_argument("--atol", type=float, default=1.0, help="absolute increase in ms or %% that is a regression")
+  args = parser.parse_args()
+
+  analyzer = TimingAnalyzer()
+  for name in args.logs:
+    for path in get_log_paths(name, args.qlog):
+      for msg in LogReader(path):
+        analyzer.update(msg)
+  report = analyzer.report()
+
+  print_report(report)
+  if args.json is not None:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+
+  if args.baseline is not None:
+    with open(args.baseline) as f:
+      diffs = compare_reports(json.load(f), report, args.rtol, args.atol)
+    print("\nregressions:" if len(diffs) else "\nno regressions")
+    for d in diffs:
+      print("  " + d)
+    sys.exit(int(len(diffs) > 0))
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""Offline bench for the rednose filters in locationd/models: a FilterModel pulls the
+observations a filter gets from its daemon out of logs, they're run through the filter in
+time order and optionally RTS smoothed per segment afterwards. Segments run in parallel,
+one process each. CarModel runs CarKalman like paramsd, other filters can be run with a
+FilterModel subclass of their own.
+
+Reported per observation kind are the innovation statistics, the fraction of observations
+outside the Mahalanobis gate and the filter throughput, so tuning and codegen changes can be
+compared without running paramsd, laikad or locationd."""
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+import numpy as np
+
+from selfdrive.locationd.models.constants import GENERATED_DIR, ObservationKind
+
+MAHA_THRESH = 0.95  # chi-squared quantile of the Mahalanobis gate the outlier rate is counted at
+
+SET_TIME = -1  # pseudo kind, moves the filter time forward without predicting like paramsd does while inactive
+STATE = None  # z of an observation of the filter's own estimate at the time it's made
+
+
+class Observations:
+  """The observations of one segment as (t, kind, z, R) batches, R None for the model's default noise"""
+  def __init__(self):
+    self.batches = []
+    self.init = {}  # keyword arguments to initialize the filter with
+    self.globals = {}  # values of the filter's global variables
+
+  def add(self, t, kind, z=STATE, R=None):
+    self.batches.append((t, kind, z, R))
+
+  def __len__(self):
+    return len(self.batches)
+
+  def sorted(self):
+    # sensor timestamps aren't in log order, sorting saves the filter from rewinding
+    return sorted(self.batches, key=lambda b: b[0])
+
+  @property
+  def duration(self):
+    if not len(self.batches):
+      return 0.
+    t = [b[0] for b in self.batches]
+    return max(t) - min(t)
+
+
+class FilterModel(ABC):
+  """A filter, how its observations are read from a log and how they're fed to it.
+  The results are the estimate tuples of EKF_sym.predict_and_update_batch."""
+
+  @staticmethod
+  @abstractmethod
+  def observations(msgs) -> Observations:
+    pass
+
+  def __init__(self, obs):
+    self.kf = None
+    self.tester = None  # an EKF_sym to run Mahalanobis tests with, None if there's none
+
+  @property
+  def filter(self):
+    return self.kf.filter
+
+  def observe(self, t, kind, z, R):
+    if R is None:
+      R = self.noise(kind, z)
+    return self.filter.predict_and_update_batch(t, kind, z, R)
+
+  def noise(self, kind, z):
+    return self.kf.get_R(kind, len(z))
+
+  @abstractmethod
+  def state_observation(self, kind):
+    """z of an observation of the filter's own estimate, for STATE observations"""
+
+  def set_time(self, t):
+    self.filter.set_filter_time(t)
+    self.filter.reset_rewind()
+
+  def maha_test(self, x, P, kind, z, R, extra_args, maha_thresh):
+    """Whether z passes the Mahalanobis gate at the predicted x and P, None if it can't be tested"""
+    if self.tester is None:
+      return None
+    return self.tester.maha_test(x, P, kind, z, R, extra_args=extra_args, maha_thresh=maha_thresh)
+
+  def smooth(self, estimates):
+    """RTS smoothed states and covariances of the estimates, None if the filter can't smooth"""
+    return self.filter.rts_smooth(estimates, norm_quats=False)
+
+
+class CarModel(FilterModel):
+  """CarKalman with paramsd's observations"""
+
+  @staticmethod
+  def observations(msgs):
+    from selfdrive.locationd.paramsd import ROLL_MAX, ROLL_MAX_DELTA, ROLL_MIN
+
+    obs = Observations()
+    active = False
+    roll = 0.0
+    for msg in msgs:
+      which = msg.which()
+      t = msg.logMonoTime * 1e-9
+      if which == 'carParams':
+        CP = msg.carParams
+        obs.globals = {
+          'mass': CP.mass,
+          'rotational_inertia': CP.rotationalInertia,
+          'center_to_front': CP.centerToFront,
+          'center_to_rear': CP.wheelbase - CP.centerToFront,
+          'stiffness_front': CP.tireStiffnessFront,
+          'stiffness_rear': CP.tireStiffnessRear,
+        }
+        obs.init.setdefault('steer_ratio', CP.steerRatio)
+        continue
+      elif which == 'liveParameters':
+        # start from what paramsd had learned, the stiffness is reset every drive
+        if 'angle_offset' not in obs.init:
+          obs.init.update(steer_ratio=msg.liveParameters.steerRatio, angle_offset=math.radians(msg.liveParameters.angleOffsetAverageDeg))
+        continue
+
+      elif which == 'liveLocationKalman':
+        llk = msg.liveLocationKalman
+        yaw_rate = llk.angularVelocityCalibrated.value[2]
+        yaw_rate_std = llk.angularVelocityCalibrated.std[2]
+        localizer_roll = llk.orientationNED.value[0]
+        localizer_roll_std = np.radians(1) if np.isnan(llk.orientationNED.std[0]) else llk.orientationNED.std[0]
+        if llk.orientationNED.valid and ROLL_MIN < localizer_roll < ROLL_MAX:
+          new_roll, roll_std = localizer_roll, 2 * localizer_roll_std
+        else:
+          new_roll, roll_std = 0.0, np.radians(10.0)
+        roll = float(np.clip(new_roll, roll - ROLL_MAX_DELTA, roll + ROLL_MAX_DELTA))
+        yaw_rate_valid = llk.angularVelocityCalibrated.valid and 0 < yaw_rate_std < 10 and abs(yaw_rate) < 1
+
+        if active:
+          if llk.posenetOK:
+            if yaw_rate_valid:
+              obs.add(t, ObservationKind.ROAD_FRAME_YAW_RATE, np.array([[-yaw_rate]]), np.array([np.atleast_2d(yaw_rate_std**2)]))
+            obs.add(t, ObservationKind.ROAD_ROLL, np.array([[roll]]), np.array([np.atleast_2d(roll_std**2)]))
+          obs.add(t, ObservationKind.ANGLE_OFFSET_FAST, np.array([[0]]))
+          # paramsd observes the current stiffness and steer ratio to bound their stds
+          obs.add(t, ObservationKind.STIFFNESS)
+          obs.add(t, ObservationKind.STEER_RATIO)
+
+      elif which == 'carState':
+        cs = msg.carState
+        in_linear_region = abs(cs.steeringAngleDeg) < 45 or not cs.steeringPressed
+        active = cs.vEgo > 5 and in_linear_region
+        if active:
+          obs.add(t, ObservationKind.STEER_ANGLE, np.array([[math.radians(cs.steeringAngleDeg)]]))
+          obs.add(t, ObservationKind.ROAD_FRAME_X_SPEED, np.array([[cs.vEgo]]))
+      else:
+        continue
+
+      if not active:
+        obs.add(t, SET_TIME)
+    return obs
+
+  def __init__(self, obs):
+    from selfdrive.locationd.models.car_kf import CarKalman, States
+
+    super().__init__(obs)
+    self.kf = CarKalman(GENERATED_DIR, **obs.init)
+    for k, v in obs.globals.items():
+      self.filter.set_global(k, v)
+
+    # every observation is of states directly
+    self.observed = {
+      ObservationKind.ROAD_FRAME_YAW_RATE: States.YAW_RATE,
+      ObservationKind.ROAD_FRAME_XY_SPEED: States.VELOCITY,
+      ObservationKind.ROAD_FRAME_X_SPEED: slice(States.VELOCITY.start, States.VELOCITY.start + 1),
+      ObservationKind.STEER_ANGLE: States.STEER_ANGLE,
+      ObservationKind.ANGLE_OFFSET_FAST: States.ANGLE_OFFSET_FAST,
+      ObservationKind.STEER_RATIO: States.STEER_RATIO,
+      ObservationKind.STIFFNESS: States.STIFFNESS,
+      ObservationKind.ROAD_ROLL: States.ROAD_ROLL,
+    }
+
+  def state_observation(self, kind):
+    return np.array([[float(self.kf.x[self.observed[kind]][0])]])
+
+  def maha_test(self, x, P, kind, z, R, extra_args, maha_thresh):
+    # the cython filter has no maha_test, with observations of states it's the gate of EKF_sym.maha_test
+    from scipy.stats import chi2
+
+    s = self.observed[kind]
+    y = np.asarray(z, dtype=np.float64) - x[s]
+    return float(y @ np.linalg.solve(P[s, s] + R, y)) <= chi2.ppf(maha_thresh, len(y))
+
+  def smooth(self, estimates):
+    return None  # the cython filter has no rts_smooth
+
+
+def load_model(spec):
+  """FilterModel subclass from a 'package.module:Class' spec"""
+  module, _, name = spec.partition(':')
+  model_cls = getattr(importlib.import_module(module), name)
+  assert issubclass(model_cls, FilterModel), spec
+  return model_cls
+
+
+class KindStats:
+  """Innovations of one observation kind, as sums so segments can be merged"""
+  def __init__(self):
+    self.count = 0
+    self.skipped = 0  # too old to rewind the filter to
+    self.tested = 0
+    self.outliers = 0  # outside the Mahalanobis gate
+    self.y_sum = self.y_sq = self.y_max = self.normalized_sq = 0.
+
+  def add(self, y, R):
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    sigma = np.sqrt(np.array([np.diag(r) for r in R]))
+    self.count += len(y)
+    self.y_sum = self.y_sum + y.sum(axis=0)
+    self.y_sq = self.y_sq + (y**2).sum(axis=0)
+    self.y_max = np.maximum(self.y_max, np.abs(y).max(axis=0))
+    self.normalized_sq = self.normalized_sq + ((y / sigma)**2).sum(axis=0)
+
+  def merge(self, other):
+    for k in ('count', 'skipped', 'tested', 'outliers'):
+      setattr(self, k, getattr(self, k) + getattr(other, k))
+    self.y_sum = self.y_sum + other.y_sum
+    self.y_sq = self.y_sq + other.y_sq
+    self.y_max = np.maximum(self.y_max, other.y_max)
+    self.normalized_sq = self.normalized_sq + other.normalized_sq
+
+  def summary(self):
+    s = {'count': self.count, 'skipped': self.skipped}
+    if self.count:
+      mean = self.y_sum / self.count
+      s['mean'] = np.atleast_1d(mean).tolist()
+      s['std'] = np.atleast_1d(np.sqrt(np.maximum(self.y_sq / self.count - mean**2, 0.))).tolist()
+      s['max'] = np.atleast_1d(self.y_max).tolist()
+      # ~1 when the innovations are as big as the observation noise says
+      s['normalized_rms'] = np.atleast_1d(np.sqrt(self.normalized_sq / self.count)).tolist()
+    s['outlier_rate'] = self.outliers / self.tested if self.tested else None
+    return s
+
+
+class BatchStats:
+  def __init__(self):
+    self.kinds = defaultdict(KindStats)
+    self.segments = 0
+    self.duration = 0.  # s of log
+    self.filter_time = 0.  # s in the filter's predict and update
+    self.observations = 0
+    self.diverged = []  # segments the filter gave up on
+    self.smooth_count = 0
+    self.smooth_sq = self.smooth_std_ratio = 0.
+
+  def add_smoothed(self, estimates, smoothed):
+    # difference between the smoothed and the filtered estimates, and how much smoothing shrunk the stds
+    states, covs = smoothed
+    dim = min(states.shape[1], len(estimates[0][1]))
+    filtered = np.array([e[1][:dim] for e in estimates])
+    filtered_std = np.array([np.sqrt(np.diag(e[3])[:dim]) for e in estimates])
+    smoothed_std = np.sqrt(np.array([np.diag(c)[:dim] for c in covs]))
+    self.smooth_count += len(estimates)
+    self.smooth_sq = self.smooth_sq + ((states[:, :dim] - filtered)**2).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      self.smooth_std_ratio = self.smooth_std_ratio + np.nan_to_num(smoothed_std / filtered_std, nan=1.).sum(axis=0)
+
+  def merge(self, other):
+    for kind, ks in other.kinds.items():
+      self.kinds[kind].merge(ks)
+    for k in ('segments', 'duration', 'filter_time', 'observations', 'smooth_count'):
+      setattr(self, k, getattr(self, k) + getattr(other, k))
+    self.diverged += other.diverged
+    self.smooth_sq = self.smooth_sq + other.smooth_sq
+    self.smooth_std_ratio = self.smooth_std_ratio + other.smooth_std_ratio
+
+  def summary(self):
+    s = {
+      'segments': self.segments,
+      'duration': self.duration,
+      'filter_time': self.filter_time,
+      'observations': self.observations,
+      'observations_per_s': self.observations / self.filter_time if self.filter_time > 0 else 0.,
+      'realtime_factor': self.duration / self.filter_time if self.filter_time > 0 else 0.,
+      'diverged': self.diverged,
+      'kinds': {kind_name(k): v.summary() for k, v in sorted(self.kinds.items())},
+    }
+    if self.smooth_count:
+      s['smoothing'] = {
+        'rms_change': np.sqrt(self.smooth_sq / self.smooth_count).tolist(),
+        'std_ratio': (self.smooth_std_ratio / self.smooth_count).tolist(),
+      }
+    return s
+
+
+def kind_name(kind):
+  return ObservationKind.to_string(kind) if 0 <= kind < len(ObservationKind.names) else str(kind)
+
+
+def run_filter(model, obs, smooth=False, maha_thresh=MAHA_THRESH, name=''):
+  """Runs a FilterModel over a segment's Observations in time order"""
+  stats = BatchStats()
+  stats.segments = 1
+  stats.duration = obs.duration
+  estimates = []
+  for t, kind, z, R in obs.sorted():
+    if kind == SET_TIME:
+      model.set_time(t)
+      continue
+    if z is STATE:
+      z = model.state_observation(kind)
+
+    start = time.perf_counter()
+    try:
+      res = model.observe(t, kind, z, R)
+    except RuntimeError:
+      # the filter gave up on its state
+      stats.diverged.append(f"{name} {t:.3f}")
+      break
+    stats.filter_time += time.perf_counter() - start
+    stats.observations += len(z)
+
+    ks = stats.kinds[kind]
+    if res is None:
+      ks.skipped += len(z)
+      continue
+    R = model.noise(kind, z) if R is None else R
+    ks.add(res[6], R)
+    xk1, _, Pk1, _, _, _, _, zs, extra_args = res
+    for i, zi in enumerate(zs):
+      passed = model.maha_test(xk1, Pk1, kind, zi, R[i], extra_args[i] if len(extra_args) else [], maha_thresh)
+      if passed is None:
+        break
+      ks.outliers += not passed
+      ks.tested += 1
+    if smooth:
+      estimates.append(res)
+
+  smoothed = model.smooth(estimates) if len(estimates) > 1 else None
+  if smoothed is not None:
+    stats.add_smoothed(estimates, smoothed)
+  return stats
+
+
+def run_segment(job):
+  model, path, smooth, maha_thresh = job
+  from tools.lib.logreader import LogReader
+
+  model_cls = load_model(model)
+  obs = model_cls.observations(LogReader(path))
+  return run_filter(model_cls(obs), obs, smooth, maha_thresh, name=path)
+
+
+def run_batch(model, paths, smooth=False, maha_thresh=MAHA_THRESH, workers=0):
+  """Runs a model over every segment, across worker processes, and merges the stats.
+  Smoothing keeps every estimate of a segment in memory until the segment is done."""
+  jobs = [(model, p, smooth, maha_thresh) for p in paths]
+  if workers == 1:
+    results = [run_segment(j) for j in jobs]
+  else:
+    with multiprocessing.Pool(workers or None) as pool:
+      results = pool.map(run_segment, jobs, chunksize=1)
+
+  stats = BatchStats()
+  for r in results:
+    stats.merge(r)
+  return stats
+
+
+def print_summary(s):
+  print(f"{s['segments']} segments, {s['duration']:.1f} s of log, {s['observations']} observations in {s['filter_time']:.2f} s: "
+        f"{s['observations_per_s']:.0f} observations/s, {s['realtime_factor']:.0f}x realtime")
+  for d in s['diverged']:
+    print(f"diverged: {d}")
+
+  print(f"\n{'kind':<32} {'count':>8} {'skipped':>8} {'outliers':>9}  {'normalized rms':<24} mean")
+  for kind, k in s['kinds'].items():
+    outliers = f"{k['outlier_rate'] * 100:8.2f}%" if k['outlier_rate'] is not None else f"{'-':>9}"
+    normalized = " ".join(f"{x:.2f}" for x in k.get('normalized_rms', []))
+    mean = " ".join(f"{x:.3g}" for x in k.get('mean', []))
+    print(f"{kind:<32} {k['count']:8d} {k['skipped']:8d} {outliers}  {normalized:<24} {mean}")
+
+  if 'smoothing' in s:
+    print("\nstate  rms(smoothed - filtered)  smoothed/filtered std")
+    for i, (change, ratio) in enumerate(zip(s['smoothing']['rms_change'], s['smoothing']['std_ratio'])):
+      print(f"{i:5d}  {change:24.4g}  {ratio:21.3f}")
+
+
+def main():
+  from tools.lib.route import get_log_paths
+
+  parser = argparse.ArgumentParser(description="Run a locationd filter over the observations in logs, one process per segment")
+  parser.add_argument("model", help="FilterModel subclass to run, as package.module:Class")
+  parser.add_argument("logs", nargs='+', help="log files, segments or routes")
+  parser.add_argument("--smooth", action="store_true", help="RTS smooth each segment after filtering it")
+  parser.add_argument("--maha-thresh", type=float, default=MAHA_THRESH, help="chi-squared quantile of the Mahalanobis gate")
+  parser.add_argument("--workers", type=int, default=0, help="processes, defaults to one per core")
+  parser.add_argument("--json", type=str, help="write the stats to this file")
+  args = parser.parse_args()
+
+  paths = [p for name in args.logs for p in get_log_paths(name)]
+  stats = run_batch(args.model, paths, args.smooth, args.maha_thresh, args.workers).summary()
+  print_summary(stats)
+  if args.json is not None:
+    with open(args.json, "w") as f:
+      json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+  main()
@@ -12,6 +12,7 @@ from typing import List, Optional
 import numpy as np
 
 from cereal import log, messaging
+from common.lazy_import import LazyDict
 from common.params import Params, put_nonblocking
 from laika import AstroDog
 from laika.constants import SECS_IN_HR, SECS_IN_MIN
@@ -57,7 +58,8 @@ class Laikad:
     self.save_ephemeris = save_ephemeris
     self.load_cache()
 
-    self.posfix_functions = {constellation: get_posfix_sympy_fun(constellation) for constellation in (ConstellationId.GPS, ConstellationId.GLONASS)}
+    # lambdified on the first fix that needs them
+    self.posfix_functions = LazyDict((ConstellationId.GPS, ConstellationId.GLONASS), get_posfix_sympy_fun)
     self.last_pos_fix = []
     self.last_pos_residual = []
     self.last_pos_fix_t = None
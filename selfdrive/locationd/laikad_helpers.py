@@ -1,9 +1,14 @@
+from functools import lru_cache
+
 import numpy as np
-import sympy
 
+from common.lazy_import import lazy_import
 from laika.constants import EARTH_ROTATION_RATE, SPEED_OF_LIGHT
 from laika.helpers import ConstellationId
 
+# only needed to build the posfix functions, on the first fix
+sympy = lazy_import('sympy')
+
 
 def calc_pos_fix_gauss_newton(measurements, posfix_functions, x0=None, signal='C1C', min_measurements=6):
   '''
@@ -58,6 +63,7 @@ def gauss_newton(fun, b, xtol=1e-8, max_n=25):
   return b
 
 
+@lru_cache(maxsize=None)
 def get_posfix_sympy_fun(constellation):
   # Unknowns
   x, y, z = sympy.Symbol('x'), sympy.Symbol('y'), sympy.Symbol('z')
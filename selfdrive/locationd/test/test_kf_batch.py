@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import math
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from selfdrive.locationd.kf_batch import SET_TIME, BatchStats, CarModel, FilterModel, Observations, load_model, run_filter
+from selfdrive.locationd.models.constants import ObservationKind
+
+CHI2_95 = 3.841  # 95% quantile of chi-squared with 1 dof
+KIND = ObservationKind.STEER_ANGLE
+
+
+class ScalarFilter:
+  # a random walk observed directly, with EKF_sym's results
+  def __init__(self, q):
+    self.q = q
+    self.x, self.P = np.zeros(1), np.eye(1) * 100.
+    self.t = None
+    self.set_times = []
+
+  def predict_and_update_batch(self, t, kind, z, R, extra_args=[[]]):  # pylint: disable=dangerous-default-value
+    if self.t is not None and t < self.t:
+      return None
+    xk1, Pk1 = self.x.copy(), self.P + self.q * (t - self.t if self.t is not None else 0.)
+    self.t = t
+    x, P, ys = xk1, Pk1, []
+    for zi, Ri in zip(z, R):
+      y = zi - x
+      K = P @ np.linalg.inv(P + Ri)
+      x, P = x + K @ y, (np.eye(1) - K) @ P
+      ys.append(y)
+    self.x, self.P = x, P
+    return xk1, x, Pk1, P, t, kind, ys, z, []
+
+  def maha_test(self, x, P, kind, z, R, extra_args=[], maha_thresh=0.95):  # pylint: disable=dangerous-default-value
+    y = z - x
+    return float(y @ np.linalg.inv(P + R) @ y) < CHI2_95
+
+  def set_filter_time(self, t):
+    self.t = t
+    self.set_times.append(t)
+
+  def reset_rewind(self):
+    pass
+
+  def rts_smooth(self, estimates, norm_quats=False):
+    xs, Ps = [estimates[-1][1]], [estimates[-1][3]]
+    for k in range(len(estimates) - 2, -1, -1):
+      xk1_k, _, Pk1_k, _ = estimates[k + 1][:4]
+      _, xk_k, _, Pk_k = estimates[k][:4]
+      C = Pk_k @ np.linalg.inv(Pk1_k)
+      xs.append(xk_k + C @ (xs[-1] - xk1_k))
+      Ps.append(Pk_k + C @ (Ps[-1] - Pk1_k) @ C.T)
+    return np.array(xs[::-1]), np.array(Ps[::-1])
+
+
+class ScalarModel(FilterModel):
+  def __init__(self, obs, q=0.01, r=0.5):
+    super().__init__(obs)
+    self.kf = SimpleNamespace(filter=ScalarFilter(q), get_R=lambda kind, n: np.full((n, 1, 1), r**2))
+    self.tester = self.filter
+
+  @staticmethod
+  def observations(msgs):
+    obs = Observations()
+    for msg in msgs:
+      if msg.which() == 'carState':
+        obs.add(msg.logMonoTime * 1e-9, KIND, np.array([[msg.carState.steeringAngleDeg]]))
+    return obs
+
+  def state_observation(self, kind):
+    return np.array([self.filter.x])
+
+
+def random_walk(n=2000, q=0.01, r=0.5, dt=0.1, seed=0):
+  rng = np.random.default_rng(seed)
+  truth = np.cumsum(rng.normal(0, math.sqrt(q * dt), n))
+  obs = Observations()
+  for i, x in enumerate(truth):
+    obs.add(i * dt, KIND, np.array([[x + rng.normal(0, r)]]))
+  return obs
+
+
+def make_msg(which, t, **fields):
+  return SimpleNamespace(which=lambda: which, logMonoTime=int(t * 1e9), **{which: SimpleNamespace(**fields)})
+
+
+CP = SimpleNamespace(mass=1500., rotationalInertia=2500., centerToFront=1.2, wheelbase=2.7,
+                     tireStiffnessFront=200000., tireStiffnessRear=250000., steerRatio=15.)
+
+
+def make_drive(duration=60., seed=0):
+  # a stop, then weaving at speed, carState at 100 Hz and liveLocationKalman at 20 Hz
+  rng = np.random.default_rng(seed)
+  msgs = [make_msg('carParams', 0., **vars(CP))]
+  for i in range(int(duration * 100)):
+    t = 1. + i * 0.01
+    v = 0. if t < 5. else 20.
+    angle = 5. * math.sin(t)
+    msgs.append(make_msg('carState', t, vEgo=v, steeringAngleDeg=angle + rng.normal(0, 0.05), steeringPressed=False))
+    if i % 5 == 0:
+      yaw_rate = v * math.radians(angle) / CP.steerRatio / CP.wheelbase
+      msgs.append(make_msg('liveLocationKalman', t + 0.001, posenetOK=True,
+                           angularVelocityCalibrated=SimpleNamespace(value=[0., 0., yaw_rate + rng.normal(0, 0.01)], std=[0.01] * 3, valid=True),
+                           orientationNED=SimpleNamespace(value=[math.radians(2.), 0., 0.], std=[math.radians(0.5)] * 3, valid=True)))
+  return msgs
+
+
+class TestKfBatch(unittest.TestCase):
+  def test_consistent_filter(self):
+    obs = random_walk()
+    stats = run_filter(ScalarModel(obs), obs)
+    s = stats.summary()['kinds'][ObservationKind.to_string(KIND)]
+    self.assertEqual(s['count'], 2000)
+    self.assertEqual(s['skipped'], 0)
+    self.assertAlmostEqual(s['mean'][0], 0., delta=0.05)
+    self.assertAlmostEqual(s['normalized_rms'][0], 1., delta=0.1)
+    self.assertAlmostEqual(s['outlier_rate'], 0.05, delta=0.02)
+    self.assertEqual(stats.observations, 2000)
+    self.assertGreater(stats.summary()['observations_per_s'], 0.)
+    self.assertAlmostEqual(stats.duration, 199.9)
+
+  def test_outliers(self):
+    obs = random_walk()
+    for i in range(0, len(obs), 10):
+      t, kind, z, R = obs.batches[i]
+      obs.batches[i] = (t, kind, z + 50., R)
+    s = run_filter(ScalarModel(obs), obs).summary()['kinds'][ObservationKind.to_string(KIND)]
+    self.assertGreater(s['outlier_rate'], 0.1)
+    self.assertGreater(s['normalized_rms'][0], 5.)
+
+  def test_time_order(self):
+    obs = random_walk(100)
+    obs.batches.reverse()
+    model = ScalarModel(obs)
+    stats = run_filter(model, obs)
+    self.assertEqual(stats.kinds[KIND].count, 100)
+    self.assertEqual(stats.kinds[KIND].skipped, 0)
+
+    # set_time only moves the filter, state observations are of its estimate at the time
+    obs.add(5.05, SET_TIME)
+    obs.add(5.05, ObservationKind.STIFFNESS)
+    model = ScalarModel(obs)
+    stats = run_filter(model, obs)
+    self.assertEqual(model.filter.set_times, [5.05])
+    self.assertEqual(stats.kinds[ObservationKind.STIFFNESS].count, 1)
+    self.assertEqual(stats.kinds[ObservationKind.STIFFNESS].y_max, 0.)
+    self.assertEqual(stats.observations, 101)
+
+  def test_smoothing(self):
+    obs = random_walk(500)
+    s = run_filter(ScalarModel(obs), obs, smooth=True).summary()
+    self.assertGreater(s['smoothing']['rms_change'][0], 0.)
+    self.assertLess(s['smoothing']['std_ratio'][0], 0.9)
+    self.assertNotIn('smoothing', run_filter(ScalarModel(obs), obs).summary())
+
+  def test_merge(self):
+    a, b = random_walk(seed=1), random_walk(seed=2)
+    stats = BatchStats()
+    for obs in (a, b):
+      stats.merge(run_filter(ScalarModel(obs), obs, smooth=True))
+    self.assertEqual(stats.segments, 2)
+    self.assertEqual(stats.kinds[KIND].count, 4000)
+    self.assertEqual(stats.smooth_count, 4000)
+    self.assertAlmostEqual(stats.duration, 2 * 199.9)
+    self.assertAlmostEqual(stats.summary()['kinds'][ObservationKind.to_string(KIND)]['normalized_rms'][0], 1., delta=0.1)
+
+  def test_observations(self):
+    msgs = [make_msg('carState', 1., steeringAngleDeg=1.), make_msg('carParams', 1.5), make_msg('carState', 2., steeringAngleDeg=2.)]
+    obs = ScalarModel.observations(msgs)
+    self.assertEqual([(t, kind, z[0, 0]) for t, kind, z, _ in obs.sorted()], [(1., KIND, 1.), (2., KIND, 2.)])
+    self.assertEqual(run_filter(ScalarModel(obs), obs).kinds[KIND].count, 2)
+
+  def test_car_observations(self):
+    msgs = make_drive(10.)
+    obs = CarModel.observations(msgs)
+    self.assertEqual(obs.globals['center_to_rear'], CP.wheelbase - CP.centerToFront)
+    self.assertEqual(obs.init, {'steer_ratio': CP.steerRatio})
+
+    # liveLocationKalman is only used while the last carState was active
+    moving = [m.carState.vEgo > 5 for m in msgs if m.which() == 'carState']
+    kinds = [kind for _, kind, _, _ in obs.sorted()]
+    for kind in (ObservationKind.STEER_ANGLE, ObservationKind.ROAD_FRAME_X_SPEED):
+      self.assertEqual(kinds.count(kind), sum(moving))
+    for kind in (ObservationKind.ROAD_FRAME_YAW_RATE, ObservationKind.ROAD_ROLL, ObservationKind.ANGLE_OFFSET_FAST):
+      self.assertEqual(kinds.count(kind), sum(moving[::5]))
+    self.assertEqual(kinds.count(SET_TIME), len(moving) - sum(moving) + len(moving[::5]) - sum(moving[::5]))
+    # stiffness and steer ratio are observed at the filter's estimate
+    self.assertTrue(all(z is None for _, kind, z, _ in obs.batches if kind in (ObservationKind.STIFFNESS, ObservationKind.STEER_RATIO)))
+
+  def test_load_model(self):
+    self.assertIs(load_model(f"{__name__}:ScalarModel"), ScalarModel)
+    with self.assertRaises(AssertionError):
+      load_model(f"{__name__}:ScalarFilter")
+    with self.assertRaises(TypeError):
+      FilterModel(Observations())  # pylint: disable=abstract-class-instantiated
+
+
+class TestCarModel(unittest.TestCase):
+  def test_matches_paramsd(self):
+    from selfdrive.locationd.paramsd import ParamsLearner
+
+    msgs = make_drive()
+    learner = ParamsLearner(CP, CP.steerRatio, 1.0, 0.0)
+    for msg in msgs:
+      if msg.which() != 'carParams':
+        learner.handle_log(msg.logMonoTime * 1e-9, msg.which(), getattr(msg, msg.which()))
+
+    obs = CarModel.observations(msgs)
+    model = CarModel(obs)
+    stats = run_filter(model, obs, smooth=True)
+    np.testing.assert_allclose(model.kf.x, learner.kf.x)
+    np.testing.assert_allclose(model.kf.P, learner.kf.P)
+
+    s = stats.summary()
+    self.assertEqual(s['diverged'], [])
+    self.assertNotIn('smoothing', s)
+    for kind in (ObservationKind.STEER_ANGLE, ObservationKind.ROAD_FRAME_YAW_RATE, ObservationKind.STIFFNESS):
+      k = s['kinds'][ObservationKind.to_string(kind)]
+      self.assertGreater(k['count'], 0)
+      self.assertIsNotNone(k['outlier_rate'])
+      self.assertLess(k['outlier_rate'], 0.5)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,198 @@
+import base64
+import bz2
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+
+from selfdrive.loggerd.xattr_cache import getxattr, removexattr, setxattr
+from system.swaglog import cloudlog
+
+CHUNK_SIZE = 4 * 1024 * 1024  # bytes of source file per block
+BLOCK_RETRIES = 2
+RETRY_DELAY = 0.5  # seconds
+RESUME_ATTR_NAME = 'user.upload_resume'
+
+# only valid on the blob as a whole
+BLOB_ONLY_HEADERS = ('x-ms-blob-type',)
+
+
+class BandwidthLimiter:
+  """Token bucket shared between uploads, rate in bytes per second (0 is unlimited)"""
+  def __init__(self, rate: float, burst: float = 256 * 1024):
+    self.rate = rate
+    self.burst = burst
+    self.tokens = burst
+    self.last = time.monotonic()
+    self.lock = threading.Lock()
+
+  def consume(self, n: int) -> None:
+    if self.rate <= 0:
+      return
+
+    with self.lock:
+      now = time.monotonic()
+      self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate) - n
+      self.last = now
+      wait = -self.tokens / self.rate if self.tokens < 0 else 0.
+    # sleep outside the lock, others queue up behind the debt
+    if wait > 0:
+      time.sleep(wait)
+
+
+class PayloadReader:
+  """File-like view of a payload, streamed by requests. Takes tokens from a limiter and
+  reports the bytes read so far before handing out each piece, so the progress callback
+  can abort the transfer while it's in flight"""
+  def __init__(self, data: bytes, limiter: Optional[BandwidthLimiter] = None,
+               progress: Optional[Callable[[int], None]] = None):
+    self.data = memoryview(data)
+    self.limiter = limiter
+    self.progress = progress
+    self.pos = 0
+
+  def __len__(self):
+    return len(self.data)
+
+  def read(self, n: int = -1) -> bytes:
+    end = len(self.data) if n < 0 else min(len(self.data), self.pos + n)
+    chunk = self.data[self.pos:end].tobytes()
+    self.pos = end
+    if len(chunk):
+      if self.limiter is not None:
+        self.limiter.consume(len(chunk))
+      if self.progress is not None:
+        self.progress(self.pos)
+    return chunk
+
+
+class UploadStats:
+  def __init__(self):
+    self.bytes_sent = 0
+    self.retransmitted_bytes = 0
+    self.chunks_sent = 0
+    self.chunks_skipped = 0
+    self.peak_buffer = 0
+
+
+def read_chunks(path: str, compress: bool, chunk_size: int, start_chunk: int = 0) -> Iterator[Tuple[int, bytes, int]]:
+  """Yields (chunk index, payload, source bytes read so far) for the file, starting at start_chunk.
+  When compressing, every chunk is a separate bz2 stream, so a file that fits in one chunk
+  compresses exactly like bz2.compress of the whole file, and larger files are multi-stream bz2."""
+  with open(path, "rb") as f:
+    f.seek(start_chunk * chunk_size)
+    idx = start_chunk
+    while True:
+      raw = f.read(chunk_size)
+      if not raw and idx > start_chunk:
+        break
+      yield idx, bz2.compress(raw) if compress else raw, f.tell()
+      if len(raw) < chunk_size:
+        break
+      idx += 1
+
+
+def block_id(idx: int) -> str:
+  # all block ids of a blob need the same length
+  return base64.b64encode(f"{idx:08d}".encode()).decode()
+
+
+def with_query(url: str, query: str) -> str:
+  return url + ('&' if '?' in url else '?') + query
+
+
+def get_checkpoint(path: str, base_url: str, chunk_size: int) -> int:
+  try:
+    state = json.loads(getxattr(path, RESUME_ATTR_NAME) or b'{}')
+  except (OSError, ValueError):
+    return 0
+
+  if state.get('url') != base_url or state.get('chunk_size') != chunk_size:
+    return 0
+  return int(state.get('chunks', 0))
+
+
+def set_checkpoint(path: str, base_url: str, chunk_size: int, chunks: int) -> None:
+  try:
+    if chunks == 0:
+      removexattr(path, RESUME_ATTR_NAME)
+    else:
+      setxattr(path, RESUME_ATTR_NAME, json.dumps({'url': base_url, 'chunk_size': chunk_size, 'chunks': chunks}).encode())
+  except OSError:
+    pass  # not resumable, but the upload itself can still succeed
+
+
+def put(url: str, data: bytes, headers: Dict[str, str], timeout: float, stats: UploadStats,
+        limiter: Optional[BandwidthLimiter] = None, progress: Optional[Callable[[int], None]] = None) -> requests.Response:
+  for attempt in range(BLOCK_RETRIES + 1):
+    if attempt > 0:
+      stats.retransmitted_bytes += len(data)
+      time.sleep(RETRY_DELAY * attempt)
+    stats.bytes_sent += len(data)
+    body = data if limiter is None and progress is None else PayloadReader(data, limiter, progress)
+    try:
+      return requests.put(url, data=body, headers={**headers, 'Content-Length': str(len(data))}, timeout=timeout)
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+      if attempt == BLOCK_RETRIES:
+        raise
+  raise AssertionError("unreachable")
+
+
+def chunk_progress(callback: Optional[Callable[[int, int], None]], sz: int, start: int, end: int,
+                   payload_size: int) -> Optional[Callable[[int], None]]:
+  # callback(file size, source bytes sent) from the bytes of a chunk's payload read so far
+  if callback is None:
+    return None
+  return lambda pos: callback(sz, start + (end - start) * pos // max(payload_size, 1))
+
+
+def upload_file(url: str, headers: Dict[str, str], path: str, compress: bool = False, chunk_size: int = CHUNK_SIZE,
+                timeout: float = 30, callback: Optional[Callable[[int, int], None]] = None,
+                stats: Optional[UploadStats] = None, limiter: Optional[BandwidthLimiter] = None) -> requests.Response:
+  """Uploads path to a blob url with bounded memory. Files larger than one chunk are sent as
+  blocks and committed with a block list, the number of acknowledged blocks is checkpointed
+  in an xattr so an interrupted upload resumes from the last acknowledged block.
+
+  callback(file size, bytes sent) is called while the data is streamed, an exception it
+  raises aborts the transfer."""
+  if stats is None:
+    stats = UploadStats()
+
+  sz = os.path.getsize(path)
+  n_chunks = max(1, -(-sz // chunk_size))
+  if n_chunks == 1:
+    _, data, read = next(read_chunks(path, compress, chunk_size))
+    stats.peak_buffer = max(stats.peak_buffer, read + len(data))
+    stats.chunks_sent += 1
+    return put(url, data, headers, timeout, stats, limiter, chunk_progress(callback, sz, 0, read, len(data)))
+
+  base_url = url.split('?')[0]
+  block_headers = {k: v for k, v in headers.items() if k.lower() not in BLOB_ONLY_HEADERS}
+  start = get_checkpoint(path, base_url, chunk_size)
+  if start >= n_chunks:
+    start = 0
+  stats.chunks_skipped += start
+  if start > 0:
+    cloudlog.event("upload_resume", fn=path, chunk=start, chunks=n_chunks)
+
+  for idx, data, read in read_chunks(path, compress, chunk_size, start):
+    stats.peak_buffer = max(stats.peak_buffer, min(chunk_size, sz - idx * chunk_size) + len(data))
+    stats.chunks_sent += 1
+    progress = chunk_progress(callback, sz, idx * chunk_size, read, len(data))
+    resp = put(with_query(url, f"comp=block&blockid={quote(block_id(idx))}"), data, block_headers, timeout, stats, limiter, progress)
+    if resp.status_code not in (200, 201):
+      return resp
+
+    set_checkpoint(path, base_url, chunk_size, idx + 1)
+
+  block_list = "".join(f"<Latest>{block_id(i)}</Latest>" for i in range(n_chunks))
+  body = f'<?xml version="1.0" encoding="utf-8"?><BlockList>{block_list}</BlockList>'.encode()
+  resp = put(with_query(url, "comp=blocklist"), body, block_headers, timeout, stats, limiter)
+  if resp.status_code in (200, 201) or 400 <= resp.status_code < 500:
+    # committed, or the staged blocks are not usable anymore
+    set_checkpoint(path, base_url, chunk_size, 0)
+  return resp
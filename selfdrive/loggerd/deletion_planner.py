@@ -0,0 +1,156 @@
+import os
+import shutil
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from selfdrive.loggerd.upload_index import UPLOAD_ATTR_NAME
+from selfdrive.loggerd.uploader import get_directory_sort
+from system.swaglog import cloudlog
+
+BATCH_SIZE = 8  # directories removed between free space checks
+RESCAN_INTERVAL = 60.  # seconds, new segments are only picked up by a rescan
+MIN_RESCAN_INTERVAL = 2.  # seconds, between rescans for lack of anything left to delete in the index
+
+
+class Segment(NamedTuple):
+  name: str
+  size: int  # bytes on disk
+  uploaded: bool  # every file is marked as uploaded
+  locked: bool
+
+
+def scan_segment(path: str, name: str) -> Segment:
+  if os.path.isfile(path):
+    return Segment(name, os.stat(path).st_blocks * 512, False, False)
+
+  size, locked, files = 0, False, []
+  with os.scandir(path) as it:
+    for entry in it:
+      if entry.name.endswith(".lock"):
+        locked = True
+      try:
+        size += entry.stat(follow_symlinks=False).st_blocks * 512
+      except OSError:
+        continue
+      if entry.is_file(follow_symlinks=False):
+        files.append(entry.path)
+  uploaded = all(is_uploaded(fn) for fn in files)
+  return Segment(name, size, uploaded, locked)
+
+
+def is_uploaded(path: str) -> bool:
+  # not cached, the uploader marks files from its own process
+  try:
+    return bool(os.getxattr(path, UPLOAD_ATTR_NAME))
+  except OSError:
+    return False  # not marked, or removed while scanning
+
+
+def bytes_needed(path: str, min_bytes: int, min_percent: float) -> int:
+  """Bytes to free to get back above both thresholds, 0 if statvfs fails"""
+  try:
+    st = os.statvfs(path)
+  except OSError:
+    return 0
+  available = st.f_bavail * st.f_frsize
+  return max(0, int(min_bytes - available), int(st.f_blocks * st.f_frsize * min_percent / 100. - available))
+
+
+class DeletionPlanner:
+  """Index of the directories under root in deletion order, oldest first with the
+  `delete_last` names at the end, along with their size and upload state.
+
+  The index is built with one scan and kept across calls, deleted entries are dropped
+  in place, so the root is only listed again after RESCAN_INTERVAL or once what is left
+  in the index can't free enough, at most every MIN_RESCAN_INTERVAL while space stays short.
+  """
+
+  def __init__(self, root: str, delete_last: List[str], rescan_interval: float = RESCAN_INTERVAL,
+               min_rescan_interval: float = MIN_RESCAN_INTERVAL):
+    self.root = root
+    self.delete_last = delete_last
+    self.rescan_interval = rescan_interval
+    self.min_rescan_interval = min_rescan_interval
+    self.segments: Dict[str, Segment] = {}
+    self.order: List[str] = []
+    self.last_scan: Optional[float] = None
+
+    # stats
+    self.scans = 0
+    self.deleted = 0
+    self.deleted_bytes = 0
+
+  def scan(self) -> None:
+    self.scans += 1
+    self.last_scan = time.monotonic()
+    self.segments.clear()
+    try:
+      names = os.listdir(self.root)
+    except OSError:
+      names = []
+
+    for name in names:
+      try:
+        self.segments[name] = scan_segment(os.path.join(self.root, name), name)
+      except OSError:
+        pass  # removed while scanning
+    self.order = sorted(self.segments, key=lambda d: (d in self.delete_last, get_directory_sort(d)))
+
+  def stale(self, interval: float) -> bool:
+    return self.last_scan is None or time.monotonic() - self.last_scan > interval
+
+  def plan(self, needed: int) -> List[Segment]:
+    """Shortest run of unlocked directories, in deletion order, that frees at least `needed` bytes"""
+    if self.stale(self.rescan_interval):
+      self.scan()
+
+    plan, freed = self._plan(needed)
+    if freed < needed and self.stale(self.min_rescan_interval):
+      # segments written since the last scan aren't indexed yet
+      self.scan()
+      plan, freed = self._plan(needed)
+    return plan
+
+  def _plan(self, needed: int) -> Tuple[List[Segment], int]:
+    plan, freed = [], 0
+    for name in self.order:
+      seg = self.segments[name]
+      if seg.locked:
+        continue
+      plan.append(seg)
+      freed += seg.size
+      if freed >= needed:
+        break
+    return plan, freed
+
+  def delete(self, seg: Segment) -> bool:
+    delete_path = os.path.join(self.root, seg.name)
+    try:
+      # locks only come and go on the newest segments, but check right before deleting
+      if os.path.isdir(delete_path) and any(name.endswith(".lock") for name in os.listdir(delete_path)):
+        self.segments[seg.name] = seg._replace(locked=True)
+        return False
+
+      cloudlog.info(f"deleting {delete_path}")
+      if not seg.uploaded:
+        cloudlog.event("deleter.not_uploaded", path=delete_path, size=seg.size)
+      if os.path.isfile(delete_path):
+        os.remove(delete_path)
+      else:
+        shutil.rmtree(delete_path)
+    except FileNotFoundError:
+      pass
+    except OSError:
+      cloudlog.exception(f"issue deleting {delete_path}")
+      # not retried until the next scan
+      self.drop(seg.name)
+      return False
+
+    self.drop(seg.name)
+    self.deleted += 1
+    self.deleted_bytes += seg.size
+    return True
+
+  def drop(self, name: str) -> None:
+    self.segments.pop(name, None)
+    self.order.remove(name)
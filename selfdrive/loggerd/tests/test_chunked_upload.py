@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+import bz2
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from collections import defaultdict
+from urllib.parse import parse_qs, urlparse
+
+import selfdrive.loggerd.chunked_upload as chunked_upload
+from selfdrive.loggerd.chunked_upload import RESUME_ATTR_NAME, UploadStats, upload_file
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobServer(http.server.ThreadingHTTPServer):
+  """Stand-in for a blob store supporting single puts and block uploads, with failure injection"""
+  def __init__(self):
+    super().__init__(('127.0.0.1', 0), BlobRequestHandler)
+    self.blobs = {}
+    self.blocks = defaultdict(dict)
+    self.requests = 0
+    self.drop_every = 0  # drop the connection on every nth block
+    self.fail_block = None  # respond with 503 to this block index
+
+  @property
+  def url(self):
+    return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class BlobRequestHandler(http.server.BaseHTTPRequestHandler):
+  def log_message(self, *args):
+    pass
+
+  def do_PUT(self):
+    srv = self.server
+    url = urlparse(self.path)
+    query = parse_qs(url.query)
+    data = self.rfile.read(int(self.headers['Content-Length']))
+    srv.requests += 1
+    if len(data) < int(self.headers['Content-Length']):
+      # the client went away mid-transfer
+      return
+
+    comp = query.get('comp', [None])[0]
+    if comp == 'block':
+      idx = int(chunked_upload.base64.b64decode(query['blockid'][0]))
+      if srv.drop_every and srv.requests % srv.drop_every == 0:
+        self.close_connection = True
+        self.connection.shutdown(2)
+        return
+      if idx == srv.fail_block:
+        self.send_response(503)
+        self.end_headers()
+        return
+      srv.blocks[url.path][query['blockid'][0]] = data
+    elif comp == 'blocklist':
+      ids = [l.split('</Latest>')[0] for l in data.decode().split('<Latest>')[1:]]
+      srv.blobs[url.path] = b''.join(srv.blocks[url.path][i] for i in ids)
+    else:
+      srv.blobs[url.path] = data
+
+    self.send_response(201)
+    self.end_headers()
+
+
+class TestChunkedUpload(unittest.TestCase):
+  def setUp(self):
+    chunked_upload.RETRY_DELAY = 0
+    self.tmp = tempfile.mkdtemp()
+    self.server = BlobServer()
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    self.thread.start()
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+    shutil.rmtree(self.tmp)
+
+  def make_file(self, size):
+    fn = os.path.join(self.tmp, "rlog")
+    with open(fn, "wb") as f:
+      # compressible, but not trivially
+      f.write(bytes((i * 7 + i // 1000) % 251 for i in range(size)))
+    return fn
+
+  def read(self, fn):
+    with open(fn, "rb") as f:
+      return f.read()
+
+  def test_single_chunk(self):
+    fn = self.make_file(CHUNK_SIZE // 2)
+    resp = upload_file(f"{self.server.url}/qlog.bz2?sig=abc", {}, fn, compress=True, chunk_size=CHUNK_SIZE)
+    self.assertEqual(resp.status_code, 201)
+    self.assertEqual(self.server.blobs['/qlog.bz2'], bz2.compress(self.read(fn)))
+
+  def test_chunked_with_dropped_connections(self):
+    fn = self.make_file(CHUNK_SIZE * 60 + 123)
+    self.server.drop_every = 4
+    stats = UploadStats()
+
+    # bzip2 needs a fixed working buffer regardless of input size
+    tracemalloc.start()
+    bz2.compress(b'\0')
+    _, bz2_workspace = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    resp = upload_file(f"{self.server.url}/rlog.bz2?sig=abc", {'x-ms-blob-type': 'BlockBlob'}, fn,
+                       compress=True, chunk_size=CHUNK_SIZE, stats=stats)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # not counting what the stand-in server keeps
+    peak -= sum(len(b) for b in self.server.blocks['/rlog.bz2'].values()) + len(self.server.blobs['/rlog.bz2'])
+
+    self.assertEqual(resp.status_code, 201)
+    self.assertEqual(bz2.decompress(self.server.blobs['/rlog.bz2']), self.read(fn))
+    self.assertGreater(stats.retransmitted_bytes, 0)
+    self.assertLess(peak, bz2_workspace + 8 * CHUNK_SIZE)
+    self.assertNotIn(RESUME_ATTR_NAME, os.listxattr(fn))
+
+  def test_resume(self):
+    fn = self.make_file(CHUNK_SIZE * 10)
+    url = f"{self.server.url}/fcamera.hevc?sig=abc"
+
+    self.server.fail_block = 6
+    resp = upload_file(url, {}, fn, chunk_size=CHUNK_SIZE)
+    self.assertEqual(resp.status_code, 503)
+    self.assertNotIn('/fcamera.hevc', self.server.blobs)
+
+    # a new signature for the same blob resumes after the acknowledged blocks
+    self.server.fail_block = None
+    stats = UploadStats()
+    resp = upload_file(url.replace("abc", "def"), {}, fn, chunk_size=CHUNK_SIZE, stats=stats)
+    self.assertEqual(resp.status_code, 201)
+    self.assertEqual(stats.chunks_skipped, 6)
+    self.assertEqual(stats.chunks_sent, 4)
+    self.assertEqual(self.server.blobs['/fcamera.hevc'], self.read(fn))
+
+  def test_progress(self):
+    for size in (CHUNK_SIZE // 2, CHUNK_SIZE * 3 + 10):
+      fn = self.make_file(size)
+      progress = []
+      resp = upload_file(f"{self.server.url}/qlog", {}, fn, chunk_size=CHUNK_SIZE,
+                         callback=lambda sz, cur: progress.append((sz, cur)))
+      self.assertEqual(resp.status_code, 201)
+      # reported while the data is streamed, not once per chunk
+      self.assertGreater(len(progress), max(size // CHUNK_SIZE, 1))
+      self.assertEqual(progress, sorted(progress))
+      self.assertEqual(progress[-1], (size, size))
+
+  def test_abort(self):
+    class Abort(Exception):
+      pass
+
+    def cb(sz, cur):
+      if cur > sz // 4:
+        raise Abort
+
+    # aborted while the only chunk is in flight
+    fn = self.make_file(CHUNK_SIZE // 2)
+    with self.assertRaises(Abort):
+      upload_file(f"{self.server.url}/rlog", {}, fn, chunk_size=CHUNK_SIZE, callback=cb)
+    self.assertNotIn('/rlog', self.server.blobs)
+
+  def test_connection_error(self):
+    fn = self.make_file(10)
+    with self.assertRaises(chunked_upload.requests.exceptions.ConnectionError):
+      upload_file("http://127.0.0.1:1/qlog", {}, fn)
+
+
+if __name__ == "__main__":
+  unittest.main()
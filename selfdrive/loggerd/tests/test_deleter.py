@@ -4,10 +4,14 @@ import time
 import threading
 import unittest
 from collections import namedtuple
+from unittest import mock
 
 from common.timeout import Timeout, TimeoutException
 import selfdrive.loggerd.deleter as deleter
+import selfdrive.loggerd.deletion_planner as deletion_planner
+from selfdrive.loggerd.deletion_planner import DeletionPlanner
 from selfdrive.loggerd.tests.loggerd_tests_common import UploaderTestCase
+from selfdrive.loggerd.upload_index import UPLOAD_ATTR_NAME
 
 Stats = namedtuple("Stats", ['f_bavail', 'f_blocks', 'f_frsize'])
 
@@ -20,8 +24,23 @@ class TestDeleter(UploaderTestCase):
     self.f_type = "fcamera.hevc"
     super().setUp()
     self.fake_stats = Stats(f_bavail=0, f_blocks=10, f_frsize=4096)
-    deleter.os.statvfs = self.fake_statvfs
+    deletion_planner.os.statvfs = self.fake_statvfs
     deleter.ROOT = self.root
+    self.deleted = []
+
+  def tearDown(self):
+    deleter.MIN_BYTES = 5 * 1024 * 1024 * 1024
+    super().tearDown()
+
+  def record_delete(self):
+    orig = DeletionPlanner.delete
+    def delete(planner, seg):
+      self.planner = planner
+      ret = orig(planner, seg)
+      if ret:
+        self.deleted.append(seg)
+      return ret
+    return mock.patch.object(DeletionPlanner, "delete", delete)
 
   def start_thread(self):
     self.end_event = threading.Event()
@@ -52,17 +71,17 @@ class TestDeleter(UploaderTestCase):
     self.seg_dir = self.seg_format.format(self.seg_num)
     f_path_2 = self.make_file_with_data(self.seg_dir, self.f_type)
 
-    self.start_thread()
-
-    with Timeout(5, "Timeout waiting for file to be deleted"):
-      while os.path.exists(f_path_1) and os.path.exists(f_path_2):
-        time.sleep(0.01)
+    with self.record_delete():
+      self.start_thread()
 
-    self.join_thread()
+      with Timeout(5, "Timeout waiting for file to be deleted"):
+        while os.path.exists(f_path_1) or os.path.exists(f_path_2):
+          time.sleep(0.01)
 
-    self.assertFalse(os.path.exists(f_path_1), "Older file not deleted")
+      self.join_thread()
 
-    self.assertTrue(os.path.exists(f_path_2), "Newer file deleted before older file")
+    self.assertEqual([seg.name for seg in self.deleted], [self.seg_format.format(self.seg_num - 1), self.seg_dir],
+                     "Newer file deleted before older file")
 
   def test_no_delete_when_available_space(self):
     f_path = self.make_file_with_data(self.seg_dir, self.f_type)
@@ -100,6 +119,74 @@ class TestDeleter(UploaderTestCase):
 
     self.assertTrue(os.path.exists(f_path), "File deleted when locked")
 
+  def test_delete_minimal_set(self):
+    n_segments, seg_bytes, block_size = 200, 16 * 1024, 4096
+    for i in range(n_segments):
+      self.make_file_with_data(self.seg_format.format(i), self.f_type, size_mb=seg_bytes / 1024 / 1024)
+    self.make_file_with_data(self.seg_format.format(n_segments), self.f_type, lock=True)
+
+    # disk is short by 30 segments worth of space, refilled as the deleter frees it
+    deleter.MIN_BYTES = 1024 * 1024 * 1024
+    short = 30 * seg_bytes
+    def fake_statvfs(d):
+      freed = sum(seg.size for seg in self.deleted)
+      return Stats(f_bavail=(deleter.MIN_BYTES - short + freed) // block_size, f_blocks=10**6, f_frsize=block_size)
+    deletion_planner.os.statvfs = fake_statvfs
+
+    with self.record_delete():
+      self.start_thread()
+      with Timeout(10, "Timeout waiting for free space"):
+        while sum(seg.size for seg in self.deleted) < short:
+          time.sleep(0.01)
+      time.sleep(0.5)
+      self.join_thread()
+
+    self.assertEqual([seg.name for seg in self.deleted], [self.seg_format.format(i) for i in range(30)])
+    self.assertEqual(self.planner.scans, 1)
+
+  def test_delete_new_segments(self):
+    f_path = self.make_file_with_data(self.seg_dir, self.f_type)
+
+    with self.record_delete():
+      self.start_thread()
+      with Timeout(5, "Timeout waiting for file to be deleted"):
+        while os.path.exists(f_path):
+          time.sleep(0.01)
+
+      # disk fills up again with segments written after the index was used up
+      self.seg_num += 1
+      self.seg_dir = self.seg_format.format(self.seg_num)
+      f_path = self.make_file_with_data(self.seg_dir, self.f_type)
+      with Timeout(5, "Timeout waiting for new file to be deleted"):
+        while os.path.exists(f_path):
+          time.sleep(0.01)
+      self.join_thread()
+
+    self.assertEqual(len(self.deleted), 2)
+
+  def test_rescan_rate_limited(self):
+    self.make_file_with_data(self.seg_dir, self.f_type)
+    planner = DeletionPlanner(self.root, deleter.DELETE_LAST, min_rescan_interval=0.5)
+
+    # nothing more to delete while space stays short, the root isn't listed on every call
+    for _ in range(10):
+      self.assertEqual(len(planner.plan(2**40)), 1)
+    self.assertEqual(planner.scans, 1)
+
+    time.sleep(0.6)
+    planner.plan(2**40)
+    self.assertEqual(planner.scans, 2)
+
+  def test_upload_state_from_other_process(self):
+    f_path = self.make_file_with_data(self.seg_dir, self.f_type)
+    planner = DeletionPlanner(self.root, deleter.DELETE_LAST)
+    self.assertFalse(planner.plan(1)[0].uploaded)
+
+    # the uploader marks the file in its own process, bypassing this process' xattr cache
+    os.setxattr(f_path, UPLOAD_ATTR_NAME, b'1')
+    planner.scan()
+    self.assertTrue(planner.plan(1)[0].uploaded)
+
 
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from selfdrive.loggerd.upload_index import UploadIndex, UPLOAD_ATTR_NAME
+from selfdrive.loggerd.uploader import get_directory_sort
+
+SEG_FORMAT = "2019-04-18--12-52-54--{}"
+PRIORITY = {"qlog": 0, "qcamera.ts": 1}
+
+
+def priority_fn(logname, name):
+  if logname == "boot":
+    return (0, get_directory_sort(logname), 0, name)
+  if name in PRIORITY:
+    return (1, get_directory_sort(logname), PRIORITY[name], name)
+  return None
+
+
+class TestUploadIndex(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.index = UploadIndex(self.root, priority_fn)
+
+  def tearDown(self):
+    self.index.close()
+    shutil.rmtree(self.root)
+
+  def make_file(self, logname, name, size=10):
+    os.makedirs(os.path.join(self.root, logname), exist_ok=True)
+    fn = os.path.join(self.root, logname, name)
+    with open(fn, "wb") as f:
+      f.write(b"\0" * size)
+    return fn
+
+  def drain(self):
+    keys = []
+    while (d := self.index.next()) is not None:
+      keys.append(d[1])
+      os.setxattr(d[2], UPLOAD_ATTR_NAME, b'1')
+      self.index.mark_uploaded(d[2])
+    return keys
+
+  def test_order(self):
+    for i in (10, 2, 1):
+      for name in ("rlog", "qcamera.ts", "qlog"):
+        self.make_file(SEG_FORMAT.format(i), name)
+    self.make_file("boot", SEG_FORMAT.format(3))
+
+    expected = [f"boot/{SEG_FORMAT.format(3)}"]
+    for i in (1, 2, 10):
+      expected += [f"{SEG_FORMAT.format(i)}/qlog", f"{SEG_FORMAT.format(i)}/qcamera.ts"]
+    self.assertEqual(self.drain(), expected)
+    self.assertEqual(self.index.count(PRIORITY), 0)
+
+  def test_follows_filesystem(self):
+    self.assertIsNone(self.index.next())
+    scans = self.index.scans
+
+    seg = SEG_FORMAT.format(0)
+    self.make_file(seg, "qlog.lock")
+    fn = self.make_file(seg, "qlog", size=100)
+    self.assertIsNone(self.index.next(), "locked file selected")
+
+    os.unlink(fn + ".lock")
+    self.assertEqual(self.index.next()[1], f"{seg}/qlog")
+    self.assertEqual(self.index.count(PRIORITY), 1)
+    self.assertEqual(self.index.size(PRIORITY), 100)
+
+    shutil.rmtree(os.path.join(self.root, seg))
+    self.assertIsNone(self.index.next())
+    self.assertEqual(self.index.count(PRIORITY), 0)
+    self.assertEqual(self.index.scans, scans, "changes should not need a rescan")
+
+  def test_skips_uploaded(self):
+    fn = self.make_file(SEG_FORMAT.format(0), "qlog")
+    os.setxattr(fn, UPLOAD_ATTR_NAME, b'1')
+    self.assertIsNone(self.index.next())
+
+  def test_reads_only_candidates(self):
+    for name in ("rlog", "fcamera.hevc", "qlog", "rlog.lock"):
+      self.make_file(SEG_FORMAT.format(0), name)
+
+    # files that are never uploaded aren't read, only the qlog
+    with mock.patch("selfdrive.loggerd.xattr_cache._read", return_value=None) as read:
+      self.assertIsNone(self.index.next())
+    self.assertEqual([c.args[0] for c in read.call_args_list], [os.path.join(self.root, SEG_FORMAT.format(0), "qlog")])
+
+  def test_no_rescan(self):
+    n = 100
+    for i in range(n):
+      self.make_file(SEG_FORMAT.format(i), "qlog")
+      os.setxattr(os.path.join(self.root, SEG_FORMAT.format(i), "qlog"), UPLOAD_ATTR_NAME, b'1')
+    self.make_file(SEG_FORMAT.format(n), "qlog")
+
+    # the first query indexes the whole tree, later ones don't list anything
+    self.assertEqual(self.index.next()[1], f"{SEG_FORMAT.format(n)}/qlog")
+    with mock.patch("os.listdir", wraps=os.listdir) as listdir:
+      for _ in range(100):
+        self.index.next()
+      self.assertEqual(listdir.call_count, 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -20,12 +20,14 @@ class TestLogHandler(logging.Handler):
   def reset(self):
     self.upload_order = list()
     self.upload_ignored = list()
+    self.transfers = list()
 
   def emit(self, record):
     try:
       j = json.loads(record.getMessage())
       if j["event"] == "upload_success":
         self.upload_order.append(j["key"])
+        self.transfers.append(j["transfer"])
       if j["event"] == "upload_ignored":
         self.upload_ignored.append(j["key"])
     except Exception:
@@ -85,6 +87,7 @@ class TestUploader(UploaderTestCase):
       self.assertTrue(os.getxattr(os.path.join(self.root, f_path.replace('.bz2', '')), uploader.UPLOAD_ATTR_NAME), "All files not uploaded")
 
     self.assertTrue(log_handler.upload_order == exp_order, "Files uploaded in wrong order")
+    self.assertTrue(all("bytes_sent" in t for t in log_handler.transfers), "Transfer stats not logged")
 
   def test_upload_ignored(self):
     self.set_ignore()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import selfdrive.loggerd.xattr_cache as xattr_cache
+from selfdrive.loggerd.xattr_cache import XattrCache, getxattr, getxattrs, invalidate, removexattr, setxattr
+
+ATTR = 'user.upload'
+
+
+class TestXattrCache(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    xattr_cache._cache = XattrCache(max_entries=100)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+    xattr_cache._cache = XattrCache()
+
+  def make_file(self, *path):
+    fn = os.path.join(self.root, *path)
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    with open(fn, "wb"):
+      pass
+    return fn
+
+  def test_get_set(self):
+    fn = self.make_file("a")
+    self.assertIsNone(getxattr(fn, ATTR))
+    os.setxattr(fn, ATTR, b'1')
+    # served from the cache
+    self.assertIsNone(getxattr(fn, ATTR))
+
+    setxattr(fn, ATTR, b'2')
+    self.assertEqual(getxattr(fn, ATTR), b'2')
+    removexattr(fn, ATTR)
+    self.assertIsNone(getxattr(fn, ATTR))
+    self.assertEqual(xattr_cache.stats()['misses'], 1)
+
+  def test_lru_bound(self):
+    fns = [self.make_file(f"{i}") for i in range(150)]
+    getxattr(fns[0], ATTR)
+    for fn in fns[1:100]:
+      getxattr(fn, ATTR)
+    # touching the oldest entry keeps it
+    getxattr(fns[0], ATTR)
+    for fn in fns[100:]:
+      getxattr(fn, ATTR)
+
+    stats = xattr_cache.stats()
+    self.assertEqual(stats['entries'], 100)
+    self.assertEqual(stats['evictions'], 50)
+    self.assertIn((fns[0], ATTR), xattr_cache._cache.entries)
+    self.assertNotIn((fns[1], ATTR), xattr_cache._cache.entries)
+
+  def test_invalidate_directory(self):
+    seg = [self.make_file("seg", n) for n in ("qlog", "rlog")]
+    other = self.make_file("seg2", "qlog")
+    for fn in seg + [other]:
+      setxattr(fn, ATTR, b'1')
+
+    shutil.rmtree(os.path.join(self.root, "seg"))
+    invalidate(os.path.join(self.root, "seg"))
+    self.assertEqual(xattr_cache.stats()['entries'], 1)
+    self.assertEqual(xattr_cache.stats()['bytes'], xattr_cache._entry_size((other, ATTR), b'1'))
+
+    # a new file at the same path is not confused with the deleted one
+    self.make_file("seg", "qlog")
+    self.assertIsNone(getxattr(seg[0], ATTR))
+
+  def test_batched_missing(self):
+    fns = [self.make_file(f"{i}") for i in range(10)]
+    setxattr(fns[3], ATTR, b'1')
+    os.remove(fns[5])
+
+    attrs = getxattrs(fns, ATTR)
+    self.assertEqual(attrs[fns[3]], b'1')
+    self.assertIsNone(attrs[fns[5]])
+    self.assertEqual(sum(v is not None for v in attrs.values()), 1)
+    with self.assertRaises(FileNotFoundError):
+      getxattr(fns[5], ATTR)
+
+  def test_changed_while_reading(self):
+    fn = self.make_file("seg", "qlog")
+    read = xattr_cache._read
+
+    def replaced():
+      # rewritten by another process, then invalidated along with its directory
+      os.setxattr(fn, ATTR, b'2')
+      invalidate(os.path.join(self.root, "seg"))
+
+    for change in (replaced, lambda: setxattr(fn, ATTR, b'3')):
+      def read_then_change(path, attr_name):
+        value = read(path, attr_name)
+        change()
+        return value
+
+      # the value read before the change is returned, but not cached over it
+      old = os.getxattr(fn, ATTR) if ATTR in os.listxattr(fn) else None
+      with mock.patch.object(xattr_cache, '_read', side_effect=read_then_change):
+        self.assertEqual(getxattr(fn, ATTR), old)
+      self.assertEqual(getxattr(fn, ATTR), os.getxattr(fn, ATTR))
+      self.assertEqual(xattr_cache._cache.generations, {})
+      invalidate(fn)
+
+  def test_long_recording(self):
+    # one minute segments, the uploader re-checks pending files and the deleter
+    # keeps the newest 50 segments on disk
+    files = ("rlog", "qlog", "qcamera.ts", "fcamera.hevc")
+    segments, kept = 200, 50
+    xattr_cache._cache = XattrCache()
+
+    for i in range(segments):
+      seg = [self.make_file(f"seg--{i}", n) for n in files]
+      for _ in range(3):
+        getxattrs(seg, ATTR)
+      for fn in seg[:2]:
+        setxattr(fn, ATTR, b'1')
+      getxattrs(seg, ATTR)
+
+      if i >= kept:
+        old = os.path.join(self.root, f"seg--{i - kept}")
+        shutil.rmtree(old)
+        invalidate(old)
+
+    # bounded by what is on disk, not by how long it has been recording
+    stats = xattr_cache.stats()
+    self.assertEqual(stats['entries'], kept * len(files))
+    self.assertEqual(stats['evictions'], 0)
+    self.assertGreater(stats['hit_rate'], 0.7)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,286 @@
+import heapq
+import os
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from common.inotify import Inotify, IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_IGNORED, \
+                           IN_ISDIR, IN_MOVED_FROM, IN_MOVED_TO, IN_ONLYDIR, IN_Q_OVERFLOW
+from selfdrive.loggerd.xattr_cache import getxattr, getxattrs, invalidate
+from system.swaglog import cloudlog
+
+UPLOAD_ATTR_NAME = 'user.upload'
+
+RECONCILE_INTERVAL = 600.  # seconds between full rescans when inotify is available
+
+ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_TO | IN_MOVED_FROM | IN_ONLYDIR
+DIR_MASK = IN_CREATE | IN_CLOSE_WRITE | IN_DELETE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE_SELF | IN_ONLYDIR
+
+# (logname, name) -> sort key, or None if the file should never be uploaded by the index user
+PriorityFn = Callable[[str, str], Optional[Tuple]]
+
+
+class DirState:
+  def __init__(self, wd: Optional[int]):
+    self.wd = wd
+    self.locks: Set[str] = set()
+    self.files: Set[str] = set()
+
+
+class UploadIndex:
+  """In-memory index of files pending upload under root.
+
+  Kept up to date with inotify events that are drained on every query, with a periodic
+  full rescan to reconcile anything missed. Files in a directory holding a .lock file are
+  held back until the lock is removed. Selecting the next file is a heap peek.
+  """
+
+  def __init__(self, root: str, priority_fn: PriorityFn, reconcile_interval: float = RECONCILE_INTERVAL):
+    self.root = root
+    self.priority_fn = priority_fn
+    self.reconcile_interval = reconcile_interval
+    self.last_reconcile = 0.
+
+    self.dirs: Dict[str, DirState] = {}
+    self.wds: Dict[int, str] = {}
+    self.pending: Dict[str, Tuple] = {}
+    self.sizes: Dict[str, int] = {}
+    self.heap: List[Tuple[Tuple, str]] = []
+
+    # count and total size of pending files per file name
+    self.name_count: Dict[str, int] = defaultdict(int)
+    self.name_size: Dict[str, int] = defaultdict(int)
+
+    # stats
+    self.scans = 0
+    self.events = 0
+
+    self.inotify: Optional[Inotify]
+    try:
+      self.inotify = Inotify()
+    except OSError:
+      cloudlog.exception("upload_index: inotify unavailable, falling back to rescanning")
+      self.inotify = None
+    self.root_wd: Optional[int] = None
+    self.watch_failed = False
+
+  def close(self) -> None:
+    if self.inotify is not None:
+      self.inotify.close()
+      self.inotify = None
+
+  # *** queries ***
+
+  def next(self) -> Optional[Tuple[str, str, str]]:
+    """Returns (name, key, fn) of the highest priority pending file"""
+    self.update()
+
+    while self.heap:
+      key, fn = self.heap[0]
+      if self.pending.get(fn) == key:
+        logname, name = fn.rsplit('/', 2)[-2:]
+        return name, os.path.join(logname, name), fn
+      heapq.heappop(self.heap)
+    return None
+
+  def count(self, names) -> int:
+    return sum(self.name_count.get(n, 0) for n in names)
+
+  def size(self, names) -> int:
+    return sum(self.name_size.get(n, 0) for n in names)
+
+  def mark_uploaded(self, fn: str) -> None:
+    self._remove_pending(fn)
+    logname, name = fn.rsplit('/', 2)[-2:]
+    if logname in self.dirs:
+      self.dirs[logname].files.discard(name)
+
+  # *** maintenance ***
+
+  def update(self) -> None:
+    if self.inotify is None or self.root_wd is None or time.monotonic() - self.last_reconcile > self.reconcile_interval:
+      self.reconcile()
+      return
+
+    for ev in self.inotify.read():
+      self.events += 1
+      if ev.mask & IN_Q_OVERFLOW:
+        cloudlog.warning("upload_index: inotify queue overflow, rescanning")
+        self.reconcile()
+        return
+
+      if ev.wd == self.root_wd:
+        if ev.mask & IN_IGNORED:
+          # root itself went away, rescan until it is back
+          self.root_wd = None
+          return
+        if not ev.mask & IN_ISDIR:
+          continue
+        if ev.mask & (IN_CREATE | IN_MOVED_TO):
+          self._add_dir(ev.name)
+        elif ev.mask & (IN_DELETE | IN_MOVED_FROM):
+          self._remove_dir(ev.name)
+          invalidate(os.path.join(self.root, ev.name))
+        continue
+
+      logname = self.wds.get(ev.wd)
+      if logname is None:
+        continue
+
+      if ev.mask & (IN_DELETE_SELF | IN_IGNORED):
+        self._remove_dir(logname)
+      elif ev.mask & IN_ISDIR:
+        continue
+      elif ev.mask & (IN_CREATE | IN_CLOSE_WRITE | IN_MOVED_TO):
+        self._add_file(logname, ev.name)
+      elif ev.mask & (IN_DELETE | IN_MOVED_FROM):
+        self._remove_file(logname, ev.name)
+        invalidate(os.path.join(self.root, logname, ev.name))
+
+  def reconcile(self) -> None:
+    self.last_reconcile = time.monotonic()
+    self.scans += 1
+
+    self.pending.clear()
+    self.sizes.clear()
+    self.heap = []
+    self.name_count.clear()
+    self.name_size.clear()
+    for logname in list(self.dirs):
+      self._remove_dir(logname)
+    # events queued before the rescan are covered by it
+    if self.inotify is not None:
+      self.inotify.read()
+
+    if not os.path.isdir(self.root):
+      self.root_wd = None
+      return
+
+    if self.inotify is not None and self.root_wd is None:
+      try:
+        self.root_wd = self.inotify.add_watch(self.root, ROOT_MASK)
+      except OSError:
+        cloudlog.exception("upload_index: failed to watch root")
+
+    try:
+      lognames = os.listdir(self.root)
+    except OSError:
+      cloudlog.exception("upload_index: listdir failed")
+      return
+
+    for logname in lognames:
+      self._add_dir(logname)
+
+  def _add_dir(self, logname: str) -> None:
+    path = os.path.join(self.root, logname)
+    if logname in self.dirs or not os.path.isdir(path):
+      return
+
+    # watch before listing, files created in between show up twice which is harmless
+    wd = None
+    if self.inotify is not None:
+      try:
+        wd = self.inotify.add_watch(path, DIR_MASK)
+        self.wds[wd] = logname
+      except OSError:
+        # out of watches, the periodic rescan still picks up changes
+        if not self.watch_failed:
+          cloudlog.exception("upload_index: failed to watch %s", path)
+          self.watch_failed = True
+    self.dirs[logname] = DirState(wd)
+
+    try:
+      names = os.listdir(path)
+    except OSError:
+      return
+
+    for name in names:
+      if name.endswith(".lock"):
+        self.dirs[logname].locks.add(name)
+    # prefetch what _add_file looks up, files that won't be uploaded aren't read
+    candidates = [name for name in names if not name.endswith(".lock") and self.priority_fn(logname, name) is not None]
+    getxattrs([os.path.join(path, name) for name in candidates], UPLOAD_ATTR_NAME)
+    for name in names:
+      self._add_file(logname, name)
+
+  def _remove_dir(self, logname: str) -> None:
+    d = self.dirs.pop(logname, None)
+    if d is None:
+      return
+
+    if d.wd is not None:
+      self.wds.pop(d.wd, None)
+      if self.inotify is not None:
+        try:
+          self.inotify.rm_watch(d.wd)
+        except OSError:
+          pass  # already removed along with the directory
+
+    path = os.path.join(self.root, logname)
+    for name in d.files:
+      self._remove_pending(os.path.join(path, name))
+
+  def _add_file(self, logname: str, name: str) -> None:
+    d = self.dirs.get(logname)
+    if d is None:
+      return
+
+    if name.endswith(".lock"):
+      d.locks.add(name)
+      path = os.path.join(self.root, logname)
+      for f in d.files:
+        self._remove_pending(os.path.join(path, f))
+      return
+
+    key = self.priority_fn(logname, name)
+    if key is None:
+      return
+
+    fn = os.path.join(self.root, logname, name)
+    try:
+      if getxattr(fn, UPLOAD_ATTR_NAME):
+        return
+      size = os.path.getsize(fn)
+    except OSError:
+      return  # deleter could have deleted
+
+    d.files.add(name)
+    if not d.locks:
+      self._add_pending(fn, name, key, size)
+
+  def _remove_file(self, logname: str, name: str) -> None:
+    d = self.dirs.get(logname)
+    if d is None:
+      return
+
+    if name in d.locks:
+      d.locks.discard(name)
+      if not d.locks:
+        for f in list(d.files):
+          d.files.discard(f)
+          self._add_file(logname, f)
+      return
+
+    d.files.discard(name)
+    self._remove_pending(os.path.join(self.root, logname, name))
+
+  def _add_pending(self, fn: str, name: str, key: Tuple, size: int) -> None:
+    self._remove_pending(fn)
+    self.pending[fn] = key
+    self.sizes[fn] = size
+    self.name_count[name] += 1
+    self.name_size[name] += size
+    heapq.heappush(self.heap, (key, fn))
+
+    # drop stale entries once they dominate the heap
+    if len(self.heap) > 2 * len(self.pending) + 64:
+      self.heap = [(k, f) for f, k in self.pending.items()]
+      heapq.heapify(self.heap)
+
+  def _remove_pending(self, fn: str) -> None:
+    if self.pending.pop(fn, None) is None:
+      return
+
+    name = os.path.basename(fn)
+    self.name_count[name] -= 1
+    self.name_size[name] -= self.sizes.pop(fn)
@@ -1,10 +1,7 @@
 #!/usr/bin/env python3
-import bz2
-import io
 import json
 import os
 import random
-import requests
 import threading
 import time
 import traceback
@@ -16,12 +13,13 @@ from common.api import Api
 from common.params import Params
 from common.realtime import set_core_affinity
 from system.hardware import TICI
-from selfdrive.loggerd.xattr_cache import getxattr, setxattr
+from selfdrive.loggerd.chunked_upload import UploadStats, upload_file
+from selfdrive.loggerd.xattr_cache import setxattr
 from selfdrive.loggerd.config import ROOT
+from selfdrive.loggerd.upload_index import UploadIndex, UPLOAD_ATTR_NAME
 from system.swaglog import cloudlog
 
 NetworkType = log.DeviceState.NetworkType
-UPLOAD_ATTR_NAME = 'user.upload'
 UPLOAD_ATTR_VALUE = b'1'
 
 UPLOAD_QLOG_QCAM_MAX_SIZE = 100 * 1e6  # MB
@@ -72,67 +70,35 @@ class Uploader():
     self.last_time = 0.0
     self.last_speed = 0.0
     self.last_filename = ""
+    self.upload_stats = UploadStats()  # transfer of the last file, logged with its upload_success or upload_failed
 
     self.immediate_folders = ["crash/", "boot/"]
     self.immediate_priority = {"qlog": 0, "qlog.bz2": 0, "qcamera.ts": 1}
 
+    self.index = UploadIndex(root, self.get_upload_priority)
+
   def get_upload_sort(self, name):
     if name in self.immediate_priority:
       return self.immediate_priority[name]
     return 1000
 
-  def list_upload_files(self):
-    if not os.path.isdir(self.root):
-      return
-
-    self.immediate_size = 0
-    self.immediate_count = 0
-
-    for logname in listdir_by_creation(self.root):
-      path = os.path.join(self.root, logname)
-      try:
-        names = os.listdir(path)
-      except OSError:
-        continue
-
-      if any(name.endswith(".lock") for name in names):
-        continue
-
-      for name in sorted(names, key=self.get_upload_sort):
-        key = os.path.join(logname, name)
-        fn = os.path.join(path, name)
-        # skip files already uploaded
-        try:
-          is_uploaded = getxattr(fn, UPLOAD_ATTR_NAME)
-        except OSError:
-          cloudlog.event("uploader_getxattr_failed", exc=self.last_exc, key=key, fn=fn)
-          is_uploaded = True  # deleter could have deleted
-        if is_uploaded:
-          continue
-
-        try:
-          if name in self.immediate_priority:
-            self.immediate_count += 1
-            self.immediate_size += os.path.getsize(fn)
-        except OSError:
-          pass
-
-        yield (name, key, fn)
+  def get_upload_priority(self, logname, name):
+    # immediate folders first, then qlogs and qcameras, oldest segment first
+    key = os.path.join(logname, name)
+    if any(f in key for f in self.immediate_folders):
+      return (0, get_directory_sort(logname), self.get_upload_sort(name), name)
+    if name in self.immediate_priority:
+      return (1, get_directory_sort(logname), self.get_upload_sort(name), name)
+    return None
 
   def next_file_to_upload(self):
-    upload_files = list(self.list_upload_files())
-
-    for name, key, fn in upload_files:
-      if any(f in fn for f in self.immediate_folders):
-        return (name, key, fn)
-
-    for name, key, fn in upload_files:
-      if name in self.immediate_priority:
-        return (name, key, fn)
-
-    return None
+    d = self.index.next()
+    self.immediate_count = self.index.count(self.immediate_priority)
+    self.immediate_size = self.index.size(self.immediate_priority)
+    return d
 
   def do_upload(self, key, fn):
+    self.upload_stats = UploadStats()
     try:
       url_resp = self.api.get("v1.4/" + self.dongle_id + "/upload_url/", timeout=10, path=key, access_token=self.api.get_token())
       if url_resp.status_code == 412:
@@ -153,14 +119,8 @@ class Uploader():
 
         self.last_resp = FakeResponse()
       else:
-        with open(fn, "rb") as f:
-          if key.endswith('.bz2') and not fn.endswith('.bz2'):
-            data = bz2.compress(f.read())
-            data = io.BytesIO(data)
-          else:
-            data = f
-
-          self.last_resp = requests.put(url, data=data, headers=headers, timeout=10)
+        compress = key.endswith('.bz2') and not fn.endswith('.bz2')
+        self.last_resp = upload_file(url, headers, fn, compress=compress, timeout=10, stats=self.upload_stats)
     except Exception as e:
       self.last_exc = (e, traceback.format_exc())
       raise
@@ -199,10 +159,12 @@ class Uploader():
         self.last_time = time.monotonic() - start_time
         self.last_speed = (sz / 1e6) / self.last_time
         success = True
-        cloudlog.event("upload_success" if stat.status_code != 412 else "upload_ignored", key=key, fn=fn, sz=sz, network_type=network_type, metered=metered)
+        cloudlog.event("upload_success" if stat.status_code != 412 else "upload_ignored", key=key, fn=fn, sz=sz, network_type=network_type, metered=metered,
+                       transfer=vars(self.upload_stats))
       else:
         success = False
-        cloudlog.event("upload_failed", stat=stat, exc=self.last_exc, key=key, fn=fn, sz=sz, network_type=network_type, metered=metered)
+        cloudlog.event("upload_failed", stat=stat, exc=self.last_exc, key=key, fn=fn, sz=sz, network_type=network_type, metered=metered,
+                       transfer=vars(self.upload_stats))
 
     if success:
       # tag file as uploaded
@@ -210,6 +172,7 @@ class Uploader():
         setxattr(fn, UPLOAD_ATTR_NAME, UPLOAD_ATTR_VALUE)
       except OSError:
         cloudlog.event("uploader_setxattr_failed", exc=self.last_exc, key=key, fn=fn, sz=sz)
+      self.index.mark_uploaded(fn)
 
     return success
 
@@ -1,23 +1,197 @@
 import os
 import errno
-from typing import Dict, Tuple, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
 
-_cached_attributes: Dict[Tuple, Optional[bytes]] = {}
+MAX_ENTRIES = 8192
+ENTRY_OVERHEAD = 200  # approximate bytes of dict slots, tuple and objects around one entry
 
-def getxattr(path: str, attr_name: str) -> Optional[bytes]:
-  key = (path, attr_name)
-  if key not in _cached_attributes:
+
+class XattrCache:
+  """Bounded LRU cache of extended attributes. Entries are invalidated by path, which
+  drops everything cached for the path itself and for files below it.
+
+  Attributes are read outside of the lock. A value read while its path, or a directory
+  above it, is set or invalidated is returned but not cached, as it could be stale."""
+
+  def __init__(self, max_entries: int = MAX_ENTRIES):
+    self.max_entries = max_entries
+    self.lock = threading.Lock()
+    self.entries: OrderedDict[Tuple[str, str], Optional[bytes]] = OrderedDict()
+    self.by_dir: Dict[str, Set[str]] = {}
+    self.by_path: Dict[str, Set[str]] = {}
+    self.generations: Dict[str, int] = {}  # sets and invalidations per path, while reads are in flight
+    self.reads = 0
+
+    # stats
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+    self.bytes = 0
+
+  def get(self, path: str, attr_name: str) -> Optional[bytes]:
+    return self.get_many([path], attr_name)[path]
+
+  def get_many(self, paths: Iterable[str], attr_name: str, missing_ok: bool = False) -> Dict[str, Optional[bytes]]:
+    ret, missing = {}, []
+    with self.lock:
+      for path in paths:
+        key = (path, attr_name)
+        if key in self.entries:
+          self.hits += 1
+          self.entries.move_to_end(key)
+          ret[path] = self.entries[key]
+        else:
+          self.misses += 1
+          missing.append(path)
+      if not missing:
+        return ret
+      self.reads += 1
+      generations = {path: self._generation(path) for path in missing}
+
+    # read outside of the lock, other threads keep hitting the cache meanwhile
+    read = {}
     try:
-      response = os.getxattr(path, attr_name)
-    except OSError as e:
-      # ENODATA means attribute hasn't been set
-      if e.errno == errno.ENODATA:
-        response = None
-      else:
-        raise
-    _cached_attributes[key] = response
-  return _cached_attributes[key]
+      for path in missing:
+        try:
+          read[path] = _read(path, attr_name)
+        except FileNotFoundError:
+          if not missing_ok:
+            raise
+          ret[path] = None
+    finally:
+      with self.lock:
+        for path, value in read.items():
+          if self._generation(path) == generations[path]:
+            self._put(path, attr_name, value)
+        self.reads -= 1
+        if not self.reads:
+          self.generations.clear()
+    ret.update(read)
+    return ret
+
+  def set(self, path: str, attr_name: str, value: Optional[bytes]) -> None:
+    with self.lock:
+      self._changed(path)
+      self._put(path, attr_name, value)
+
+  def invalidate(self, path: str) -> None:
+    path = path.rstrip('/')
+    with self.lock:
+      self._changed(path)
+      self._invalidate(path)
+
+  def clear(self) -> None:
+    with self.lock:
+      self.entries.clear()
+      self.by_dir.clear()
+      self.by_path.clear()
+      self.bytes = 0
+
+  def stats(self) -> Dict[str, float]:
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        'entries': len(self.entries),
+        'bytes': self.bytes,
+        'hits': self.hits,
+        'misses': self.misses,
+        'hit_rate': self.hits / lookups if lookups else 0.,
+        'evictions': self.evictions,
+        'invalidations': self.invalidations,
+      }
+
+  def _changed(self, path: str) -> None:
+    # only reads in flight compare generations, there's nothing to keep otherwise
+    if self.reads:
+      self.generations[path] = self.generations.get(path, 0) + 1
+
+  def _generation(self, path: str) -> int:
+    # changes of the path and the directories above it
+    generation = 0
+    while True:
+      generation += self.generations.get(path, 0)
+      parent = os.path.dirname(path)
+      if parent == path:
+        return generation
+      path = parent
+
+  def _put(self, path: str, attr_name: str, value: Optional[bytes]) -> None:
+    key = (path, attr_name)
+    if key in self.entries:
+      self._drop(key)
+    self.entries[key] = value
+    self.by_path.setdefault(path, set()).add(attr_name)
+    self.by_dir.setdefault(os.path.dirname(path), set()).add(path)
+    self.bytes += _entry_size(key, value)
+
+    while len(self.entries) > self.max_entries:
+      self._drop(next(iter(self.entries)))
+      self.evictions += 1
+
+  def _drop(self, key: Tuple[str, str]) -> None:
+    path, attr_name = key
+    self.bytes -= _entry_size(key, self.entries.pop(key))
+
+    attrs = self.by_path[path]
+    attrs.discard(attr_name)
+    if not attrs:
+      del self.by_path[path]
+      dirname = os.path.dirname(path)
+      children = self.by_dir[dirname]
+      children.discard(path)
+      if not children:
+        del self.by_dir[dirname]
+
+  def _invalidate(self, path: str) -> None:
+    for child in list(self.by_dir.get(path, ())):
+      self._invalidate(child)
+    for attr_name in list(self.by_path.get(path, ())):
+      self._drop((path, attr_name))
+      self.invalidations += 1
+
+
+def _read(path: str, attr_name: str) -> Optional[bytes]:
+  try:
+    return os.getxattr(path, attr_name)
+  except OSError as e:
+    # ENODATA means attribute hasn't been set
+    if e.errno == errno.ENODATA:
+      return None
+    raise
+
+
+def _entry_size(key: Tuple[str, str], value: Optional[bytes]) -> int:
+  return ENTRY_OVERHEAD + len(key[0]) + len(key[1]) + (len(value) if value is not None else 0)
+
+
+_cache = XattrCache()
+
+
+def getxattr(path: str, attr_name: str) -> Optional[bytes]:
+  return _cache.get(path, attr_name)
+
+def getxattrs(paths: Iterable[str], attr_name: str) -> Dict[str, Optional[bytes]]:
+  """getxattr of many files with one cache lookup and one store, files that are gone map to None"""
+  return _cache.get_many(paths, attr_name, missing_ok=True)
 
 def setxattr(path: str, attr_name: str, attr_value: bytes) -> None:
-  _cached_attributes.pop((path, attr_name), None)
-  return os.setxattr(path, attr_name, attr_value)
+  os.setxattr(path, attr_name, attr_value)
+  _cache.set(path, attr_name, attr_value)
+
+def removexattr(path: str, attr_name: str) -> None:
+  try:
+    os.removexattr(path, attr_name)
+  except OSError as e:
+    if e.errno != errno.ENODATA:
+      raise
+  _cache.set(path, attr_name, None)
+
+def invalidate(path: str) -> None:
+  """Drops cached attributes of a deleted or renamed file, or of everything below a directory"""
+  _cache.invalidate(path)
+
+def stats() -> Dict[str, float]:
+  return _cache.stats()
@@ -5,6 +5,7 @@ import signal
 import subprocess
 import sys
 import traceback
+import time
 from typing import List, Tuple, Union
 
 import cereal.messaging as messaging
@@ -15,7 +16,7 @@ from common.text_window import TextWindow
 from selfdrive.boardd.set_time import set_time
 from system.hardware import HARDWARE, PC
 from selfdrive.manager.helpers import unblock_stdout
-from selfdrive.manager.process import ensure_running
+from selfdrive.manager.process import ensure_running, stop_processes
 from selfdrive.manager.process_config import managed_processes
 from selfdrive.athena.registration import register, UNREGISTERED_DONGLE_ID
 from system.swaglog import cloudlog, add_file_handler
@@ -105,15 +106,11 @@ def manager_prepare() -> None:
 
 
 def manager_cleanup() -> None:
-  # send signals to kill all procs
-  for p in managed_processes.values():
-    p.stop(block=False)
-
-  # ensure all are killed
-  for p in managed_processes.values():
-    p.stop(block=True)
+  # signal all procs, then wait for them to exit together
+  t = time.monotonic()
+  stop_processes(managed_processes.values())
 
-  cloudlog.info("everything is dead")
+  cloudlog.info(f"everything is dead after {time.monotonic() - t:.2f}s")
 
 
 def manager_thread() -> None:
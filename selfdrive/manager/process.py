@@ -4,9 +4,11 @@ import signal
 import struct
 import time
 import subprocess
-from typing import Optional, Callable, List, ValuesView
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Callable, List, Tuple, ValuesView
 from abc import ABC, abstractmethod
 from multiprocessing import Process
+from multiprocessing.connection import wait
 
 from setproctitle import setproctitle  # pylint: disable=no-name-in-module
 
@@ -23,11 +25,17 @@ from cereal import log
 WATCHDOG_FN = "/dev/shm/wd_"
 ENABLE_WATCHDOG = os.getenv("NO_WATCHDOG") is None
 
+STOP_TIMEOUT = 5.  # seconds before escalating to SIGKILL
+UNKILLABLE_TIMEOUT = 15.  # additional seconds for unkillable processes before rebooting
+TIMELINE_LEN = 16
+
 
 def launcher(proc: str, name: str) -> None:
   try:
-    # import the process
+    # import the process, usually already done by prepare() before the fork
+    t = time.monotonic()
     mod = importlib.import_module(proc)
+    import_time = time.monotonic() - t
 
     # rename the process
     setproctitle(proc)
@@ -38,6 +46,7 @@ def launcher(proc: str, name: str) -> None:
     # add daemon name tag to logs
     cloudlog.bind(daemon=name)
     sentry.set_tag("daemon", name)
+    cloudlog.event("process_imported", module=proc, import_time=import_time)
 
     # exec the process
     getattr(mod, 'main')()
@@ -60,10 +69,55 @@ def nativelauncher(pargs: List[str], cwd: str, name: str) -> None:
 
 def join_process(process: Process, timeout: float) -> None:
   # Process().join(timeout) will hang due to a python 3 bug: https://bugs.python.org/issue28382
-  # We have to poll the exitcode instead
-  t = time.monotonic()
-  while time.monotonic() - t < timeout and process.exitcode is None:
-    time.sleep(0.001)
+  # Wait on the exit sentinel instead, then reap with exitcode
+  if process.exitcode is None:
+    wait([process.sentinel], timeout)
+
+
+def wait_for_exit(procs: Iterable['ManagerProcess'], retry: bool = True) -> None:
+  """Waits for signaled processes to exit, all at once. Every process gets its own deadline,
+  counted from when it was signaled, after which it is escalated like in ManagerProcess.stop"""
+  pending = {p.proc.sentinel: p for p in procs if p.proc is not None and p.proc.exitcode is None}
+  deadlines = {p.name: (p.stop_time or time.monotonic()) + STOP_TIMEOUT for p in pending.values()}
+  escalated = set()
+
+  while pending:
+    now = time.monotonic()
+    for sentinel, p in list(pending.items()):
+      if p.proc.exitcode is not None:
+        del pending[sentinel]
+      elif now >= deadlines[p.name]:
+        if not retry:
+          del pending[sentinel]
+        elif p.unkillable and p.name not in escalated:
+          cloudlog.critical(f"unkillable process {p.name} failed to exit! rebooting in 15 if it doesn't die")
+          escalated.add(p.name)
+          deadlines[p.name] = now + UNKILLABLE_TIMEOUT
+        elif p.unkillable:
+          cloudlog.critical(f"unkillable process {p.name} failed to die!")
+          os.system("date >> /data/unkillable_reboot")
+          os.sync()
+          HARDWARE.reboot()
+          raise RuntimeError
+        elif p.name not in escalated:
+          cloudlog.info(f"killing {p.name} with SIGKILL")
+          p.signal(signal.SIGKILL)
+          p.record("kill")
+          escalated.add(p.name)
+          deadlines[p.name] = float('inf')
+
+    if pending:
+      deadline = min(deadlines[p.name] for p in pending.values())
+      wait(list(pending), None if deadline == float('inf') else max(0., deadline - time.monotonic()))
+
+
+def stop_processes(procs: Iterable['ManagerProcess'], retry: bool = True) -> Dict[str, Optional[int]]:
+  """Signals all processes first, then waits for them concurrently"""
+  procs = list(procs)
+  for p in procs:
+    p.stop(block=False)
+  wait_for_exit(procs, retry)
+  return {p.name: p.stop(retry=retry) for p in procs}
 
 
 class ManagerProcess(ABC):
@@ -81,6 +135,11 @@ class ManagerProcess(ABC):
   watchdog_max_dt: Optional[int] = None
   watchdog_seen = False
   shutting_down = False
+  stop_time: Optional[float] = None
+
+  def __init__(self):
+    # (event, monotonic time) of recent starts, signals and exits
+    self.timeline: Deque[Tuple[str, float]] = deque(maxlen=TIMELINE_LEN)
 
   @abstractmethod
   def prepare(self) -> None:
@@ -94,6 +153,13 @@ class ManagerProcess(ABC):
     self.stop()
     self.start()
 
+  def record(self, event: str) -> None:
+    self.timeline.append((event, time.monotonic()))
+
+  def log_timeline(self) -> None:
+    t0 = self.timeline[0][1]
+    cloudlog.event("manager.process_timeline", name=self.name, timeline=[(e, round(t - t0, 4)) for e, t in self.timeline])
+
   def check_watchdog(self, started: bool) -> None:
     if self.watchdog_max_dt is None or self.proc is None:
       return
@@ -125,34 +191,22 @@ class ManagerProcess(ABC):
         sig = signal.SIGKILL if self.sigkill else signal.SIGINT
         self.signal(sig)
         self.shutting_down = True
+        self.stop_time = time.monotonic()
+        self.record("signal")
 
         if not block:
           return None
 
-      join_process(self.proc, 5)
-
-      # If process failed to die send SIGKILL or reboot
-      if self.proc.exitcode is None and retry:
-        if self.unkillable:
-          cloudlog.critical(f"unkillable process {self.name} failed to exit! rebooting in 15 if it doesn't die")
-          join_process(self.proc, 15)
-
-          if self.proc.exitcode is None:
-            cloudlog.critical(f"unkillable process {self.name} failed to die!")
-            os.system("date >> /data/unkillable_reboot")
-            os.sync()
-            HARDWARE.reboot()
-            raise RuntimeError
-        else:
-          cloudlog.info(f"killing {self.name} with SIGKILL")
-          self.signal(signal.SIGKILL)
-          self.proc.join()
+      wait_for_exit([self], retry)
 
     ret = self.proc.exitcode
     cloudlog.info(f"{self.name} is dead with {ret}")
 
     if self.proc.exitcode is not None:
+      self.record("exit")
+      self.log_timeline()
       self.shutting_down = False
+      self.stop_time = None
       self.proc = None
 
     return ret
@@ -185,6 +239,7 @@ class ManagerProcess(ABC):
 
 class NativeProcess(ManagerProcess):
   def __init__(self, name, cwd, cmdline, enabled=True, onroad=True, offroad=False, callback=None, unkillable=False, sigkill=False, watchdog_max_dt=None):
+    super().__init__()
     self.name = name
     self.cwd = cwd
     self.cmdline = cmdline
@@ -211,12 +266,14 @@ class NativeProcess(ManagerProcess):
     cloudlog.info(f"starting process {self.name}")
     self.proc = Process(name=self.name, target=nativelauncher, args=(self.cmdline, cwd, self.name))
     self.proc.start()
+    self.record("start")
     self.watchdog_seen = False
     self.shutting_down = False
 
 
 class PythonProcess(ManagerProcess):
   def __init__(self, name, module, enabled=True, onroad=True, offroad=False, callback=None, unkillable=False, sigkill=False, watchdog_max_dt=None):
+    super().__init__()
     self.name = name
     self.module = module
     self.enabled = enabled
@@ -243,6 +300,7 @@ class PythonProcess(ManagerProcess):
     cloudlog.info(f"starting python {self.module}")
     self.proc = Process(name=self.name, target=launcher, args=(self.module, self.name))
     self.proc.start()
+    self.record("start")
     self.watchdog_seen = False
     self.shutting_down = False
 
@@ -251,6 +309,7 @@ class DaemonProcess(ManagerProcess):
   """Python process that has to stay running across manager restart.
   This is used for athena so you don't lose SSH access when restarting manager."""
   def __init__(self, name, module, param_name, enabled=True):
+    super().__init__()
     self.name = name
     self.module = module
     self.param_name = param_name
@@ -294,6 +353,7 @@ def ensure_running(procs: ValuesView[ManagerProcess], started: bool, params=None
   if not_run is None:
     not_run = []
 
+  run_procs, stop_procs = [], []
   for p in procs:
     # Conditions that make a process run
     run = any((
@@ -309,9 +369,14 @@ def ensure_running(procs: ValuesView[ManagerProcess], started: bool, params=None
       p.name in not_run,
     ))
 
-    if run:
-      p.start()
-    else:
-      p.stop(block=False)
+    (run_procs if run else stop_procs).append(p)
 
+  # processes that are started again while still exiting are waited for together
+  wait_for_exit([p for p in run_procs if p.shutting_down])
+  for p in run_procs:
+    p.start()
+  for p in stop_procs:
+    p.stop(block=False)
+
+  for p in procs:
     p.check_watchdog(started)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import signal
+import sys
+import time
+import unittest
+
+import selfdrive.manager.process as process
+from selfdrive.manager.process import NativeProcess, ensure_running, stop_processes
+
+# stand-in for a daemon, takes a while to exit on SIGINT or ignores it
+DUMMY = """
+import signal, sys, time
+delay = float(sys.argv[1])
+def handler(signum, frame):
+  time.sleep(delay)
+  sys.exit(0)
+signal.signal(signal.SIGINT, signal.SIG_IGN if delay < 0 else handler)
+while True:
+  time.sleep(1)
+"""
+
+
+def dummy(name, exit_delay, **kwargs):
+  return NativeProcess(name, ".", [sys.executable, "-c", DUMMY, str(exit_delay)], **kwargs)
+
+
+class TestProcessLifecycle(unittest.TestCase):
+  def setUp(self):
+    self.procs = {}
+
+  def tearDown(self):
+    process.STOP_TIMEOUT = 5.
+    for p in self.procs.values():
+      if p.proc is not None:
+        p.signal(signal.SIGKILL)
+        p.proc.join()
+
+  def start_all(self):
+    ensure_running(self.procs.values(), started=False)
+    # let the interpreters install their signal handlers
+    time.sleep(1.)
+
+  def test_parallel_shutdown(self):
+    n, delay = 16, 0.5
+    self.procs = {f"dummy{i}": dummy(f"dummy{i}", delay, offroad=True) for i in range(n)}
+    self.start_all()
+    self.assertTrue(all(p.proc.is_alive() for p in self.procs.values()))
+
+    exit_codes = stop_processes(self.procs.values())
+    self.assertEqual(set(exit_codes.values()), {0})
+    for p in self.procs.values():
+      self.assertIsNone(p.proc)
+      self.assertEqual([e for e, _ in p.timeline], ["start", "signal", "exit"])
+
+    # all are signalled before waiting on any of them
+    signalled = max(dict(p.timeline)["signal"] for p in self.procs.values())
+    exited = min(dict(p.timeline)["exit"] for p in self.procs.values())
+    self.assertLess(signalled, exited)
+
+  def test_deadline_escalation(self):
+    process.STOP_TIMEOUT = 0.5
+    self.procs = {
+      "stuck": dummy("stuck", -1, offroad=True),
+      "slow": dummy("slow", 0.2, offroad=True),
+    }
+    self.start_all()
+
+    exit_codes = stop_processes(self.procs.values())
+    self.assertEqual(exit_codes, {"stuck": -signal.SIGKILL, "slow": 0})
+    self.assertEqual([e for e, _ in self.procs["stuck"].timeline], ["start", "signal", "kill", "exit"])
+
+  def test_ensure_running_restart(self):
+    self.procs = {
+      "offroad": dummy("offroad", 0.3, onroad=False, offroad=True),
+      "onroad": dummy("onroad", 0.3, onroad=True, offroad=False),
+    }
+    self.start_all()
+    self.assertIsNotNone(self.procs["offroad"].proc)
+    self.assertIsNone(self.procs["onroad"].proc)
+
+    # going onroad signals offroad processes without waiting for them
+    ensure_running(self.procs.values(), started=True)
+    self.assertTrue(self.procs["offroad"].shutting_down)
+    self.assertIsNotNone(self.procs["offroad"].proc)
+
+    # and back offroad while it's still exiting waits for it before starting again
+    ensure_running(self.procs.values(), started=False)
+    self.assertFalse(self.procs["offroad"].shutting_down)
+    self.assertEqual([e for e, _ in self.procs["offroad"].timeline], ["start", "signal", "exit", "start"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+import json
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from selfdrive.modeld.thneed.lib import diff_thneed, load_thneed, save_thneed
+
+
+def make_thneed(seed=0):
+  rng = np.random.default_rng(seed)
+  objects, binaries = [], []
+  for i in range(6):
+    o = {'id': chr(0x80 + i) * 8, 'arg_type': "image2d_t" if i % 2 else "float*", 'size': 64 * (i + 1), 'needs_load': i != 3}
+    if o['needs_load']:
+      o['data'] = rng.standard_normal(o['size'] // 2).astype(np.float16).tobytes()
+    objects.append(o)
+  for name in ("conv", "pool"):
+    data = rng.integers(0, 256, 100, dtype=np.uint8).tobytes()
+    binaries.append({'name': name, 'length': len(data), 'data': data})
+  kernels = [{'name': "conv", 'work_dim': 2, 'args': [objects[0]['id'], objects[1]['id']]},
+             {'name': "pool", 'work_dim': 2, 'args': [objects[1]['id'], objects[2]['id']]}]
+  return {'objects': objects, 'binaries': binaries, 'kernels': kernels, 'programs': {'conv': "__kernel void conv() {}"},
+          'output_size': 128}
+
+
+def write_thneed(jdat, fn):
+  # the original all in memory writer
+  weights = b''.join(o['data'] for o in jdat['objects'] + jdat['binaries'] if 'data' in o)
+  stripped = dict(jdat)
+  stripped['objects'] = [{k: v for k, v in o.items() if k != 'data'} for o in jdat['objects']]
+  stripped['binaries'] = [{k: v for k, v in o.items() if k != 'data'} for o in jdat['binaries']]
+  j = json.dumps(stripped, ensure_ascii=False).encode('latin_1')
+  with open(fn, "wb") as f:
+    f.write(struct.pack("I", len(j)))
+    f.write(j)
+    f.write(weights)
+
+
+class TestThneedLib(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.TemporaryDirectory()
+    self.fn = os.path.join(self.tmp.name, "model.thneed")
+    self.jdat = make_thneed()
+    write_thneed(self.jdat, self.fn)
+
+  def tearDown(self):
+    self.tmp.cleanup()
+
+  def test_load(self):
+    jdat = load_thneed(self.fn)
+    self.assertEqual(diff_thneed(jdat, self.jdat), [])
+    for o in jdat['objects'] + jdat['binaries']:
+      if 'data' in o:
+        self.assertIsInstance(o['data'], memoryview)
+        self.assertTrue(o['data'].readonly)
+    self.assertNotIn('data', jdat['objects'][3])
+
+  def test_round_trip(self):
+    fn = os.path.join(self.tmp.name, "saved.thneed")
+    save_thneed(load_thneed(self.fn), fn)
+    with open(self.fn, "rb") as f1, open(fn, "rb") as f2:
+      self.assertEqual(f1.read(), f2.read())
+
+  def test_save_keeps_data(self):
+    jdat = load_thneed(self.fn)
+    save_thneed(jdat, os.path.join(self.tmp.name, "saved.thneed"))
+    self.assertEqual(diff_thneed(jdat, self.jdat), [])
+
+  def test_save_over_source(self):
+    jdat = load_thneed(self.fn)
+    jdat['objects'][0]['data'] = np.zeros(jdat['objects'][0]['size'], dtype=np.uint8).tobytes()
+    save_thneed(jdat, self.fn)
+    self.assertEqual(diff_thneed(load_thneed(self.fn), jdat), [])
+    self.assertFalse(os.path.exists(self.fn + ".tmp"))
+
+  def test_save_wrong_size(self):
+    jdat = load_thneed(self.fn)
+    jdat['binaries'][0]['data'] = b'\x00'
+    with self.assertRaises(AssertionError):
+      save_thneed(jdat, self.fn)
+
+  def test_truncated(self):
+    with open(self.fn, "r+b") as f:
+      f.truncate(os.path.getsize(self.fn) - 10)
+    with self.assertRaises(AssertionError):
+      load_thneed(self.fn)
+
+  def test_diff(self):
+    other = make_thneed()
+    data = bytearray(other['objects'][1]['data'])
+    data[:4] = b'\x00\x3c\x00\x3c'
+    other['objects'][1]['data'] = bytes(data)
+    other['objects'][2]['needs_load'] = False
+    other['binaries'][1]['data'] = b'\x00' * 100
+    other['kernels'][0]['work_dim'] = 3
+    other['programs']['pool'] = ""
+    other['output_size'] = 64
+
+    diffs = diff_thneed(load_thneed(self.fn), other)
+    obj1, obj2 = (self.jdat['objects'][i]['id'].encode('latin_1').hex() for i in (1, 2))
+    self.assertTrue(any(d.startswith(f"object {obj1}: data ") and "max abs error" in d for d in diffs), diffs)
+    self.assertIn(f"object {obj2}: needs_load True != False", diffs)
+    self.assertTrue(any(d.startswith("binary pool: ") for d in diffs), diffs)
+    self.assertIn("kernel 0 (conv): work_dim differs", diffs)
+    self.assertIn("program pool: only in second", diffs)
+    self.assertIn("output_size: 128 != 64", diffs)
+
+
+if __name__ == "__main__":
+  unittest.main()
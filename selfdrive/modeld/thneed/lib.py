@@ -1,31 +1,110 @@
-import struct, json
+import os, struct, json, mmap
+import numpy as np
 
-def load_thneed(fn):
-  with open(fn, "rb") as f:
-    json_len = struct.unpack("I", f.read(4))[0]
-    jdat = json.loads(f.read(json_len).decode('latin_1'))
-    weights = f.read()
-  ptr = 0
+# weights are stored after the json, in this order, without padding
+def _weight_sizes(jdat):
   for o in jdat['objects']:
     if o['needs_load']:
-      nptr = ptr + o['size']
-      o['data'] = weights[ptr:nptr]
-      ptr = nptr
+      yield o, o['size']
   for o in jdat['binaries']:
-    nptr = ptr + o['length']
-    o['data'] = weights[ptr:nptr]
-    ptr = nptr
+    yield o, o['length']
+
+def load_thneed(fn):
+  # the weights stay in the page cache, every 'data' is a read only view into the mapping
+  with open(fn, "rb") as f:
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+  json_len = struct.unpack_from("I", mm, 0)[0]
+  jdat = json.loads(mm[4:4+json_len].decode('latin_1'))
+  weights = memoryview(mm)
+  ptr = 4 + json_len
+  for o, sz in _weight_sizes(jdat):
+    o['data'] = weights[ptr:ptr+sz]
+    ptr += sz
+  assert ptr <= len(mm), f"{fn}: truncated, {ptr - len(mm)} bytes of weights missing"
   return jdat
 
 def save_thneed(jdat, fn):
-  new_weights = []
-  for o in jdat['objects'] + jdat['binaries']:
-    if 'data' in o:
-      new_weights.append(o['data'])
-      del o['data']
-  new_weights_bytes = b''.join(new_weights)
-  with open(fn, "wb") as f:
-    j = json.dumps(jdat, ensure_ascii=False).encode('latin_1')
+  # streams the weights out one object at a time, jdat is left untouched. written next to
+  # fn and moved over it, so the weights can be views into a mapping of fn itself
+  stripped = dict(jdat)
+  stripped['objects'] = [{k: v for k, v in o.items() if k != 'data'} for o in jdat['objects']]
+  stripped['binaries'] = [{k: v for k, v in o.items() if k != 'data'} for o in jdat['binaries']]
+  j = json.dumps(stripped, ensure_ascii=False).encode('latin_1')
+  tmp_fn = fn + ".tmp"
+  with open(tmp_fn, "wb") as f:
     f.write(struct.pack("I", len(j)))
     f.write(j)
-    f.write(new_weights_bytes)
+    for o, sz in _weight_sizes(jdat):
+      assert memoryview(o['data']).nbytes == sz, f"{o.get('name', 'object')} has {memoryview(o['data']).nbytes} bytes, expected {sz}"
+      f.write(o['data'])
+  os.replace(tmp_fn, fn)
+
+def _id(o):
+  return o['id'].encode('latin_1').hex()
+
+def _data_diff(a, b):
+  da, db = np.frombuffer(a, dtype=np.uint8), np.frombuffer(b, dtype=np.uint8)
+  if len(da) != len(db):
+    return f"{len(da)} != {len(db)} bytes"
+  if np.array_equal(da, db):
+    return None
+  return f"{np.count_nonzero(da != db)} of {len(da)} bytes differ"
+
+def diff_thneed(a, b):
+  """Structural differences between two loaded containers, empty if they're the same"""
+  diffs = []
+  for k in sorted(set(a) | set(b)):
+    if k not in ('objects', 'binaries', 'kernels', 'programs') and a.get(k) != b.get(k):
+      diffs.append(f"{k}: {a.get(k)!r} != {b.get(k)!r}")
+
+  objs_a = {_id(o): o for o in a['objects']}
+  objs_b = {_id(o): o for o in b['objects']}
+  for i in sorted(objs_a.keys() ^ objs_b.keys()):
+    diffs.append(f"object {i}: only in {'first' if i in objs_a else 'second'}")
+  for i in sorted(objs_a.keys() & objs_b.keys()):
+    oa, ob = objs_a[i], objs_b[i]
+    for k in sorted((set(oa) | set(ob)) - {'data'}):
+      if oa.get(k) != ob.get(k):
+        diffs.append(f"object {i}: {k} {oa.get(k)!r} != {ob.get(k)!r}")
+    if 'data' in oa and 'data' in ob:
+      d = _data_diff(oa['data'], ob['data'])
+      if d is not None:
+        if oa['arg_type'] == "image2d_t" and oa.get('size') == ob.get('size'):
+          err = np.abs(np.frombuffer(oa['data'], dtype=np.float16).astype(np.float32) -
+                       np.frombuffer(ob['data'], dtype=np.float16).astype(np.float32))
+          d += f", max abs error {np.nanmax(err):.3g}"
+        diffs.append(f"object {i}: data {d}")
+
+  bins_a = {o['name']: o for o in a['binaries']}
+  bins_b = {o['name']: o for o in b['binaries']}
+  for n in sorted(bins_a.keys() ^ bins_b.keys()):
+    diffs.append(f"binary {n}: only in {'first' if n in bins_a else 'second'}")
+  for n in sorted(bins_a.keys() & bins_b.keys()):
+    d = _data_diff(bins_a[n]['data'], bins_b[n]['data'])
+    if d is not None:
+      diffs.append(f"binary {n}: {d}")
+
+  progs_a, progs_b = a.get('programs', {}), b.get('programs', {})
+  for n in sorted(progs_a.keys() ^ progs_b.keys()):
+    diffs.append(f"program {n}: only in {'first' if n in progs_a else 'second'}")
+  for n in sorted(progs_a.keys() & progs_b.keys()):
+    if progs_a[n] != progs_b[n]:
+      diffs.append(f"program {n}: source differs")
+
+  ka, kb = a['kernels'], b['kernels']
+  if len(ka) != len(kb):
+    diffs.append(f"kernels: {len(ka)} != {len(kb)}")
+  for n, (x, y) in enumerate(zip(ka, kb)):
+    for k in sorted(set(x) | set(y)):
+      if x.get(k) != y.get(k):
+        diffs.append(f"kernel {n} ({x.get('name')}): {k} differs")
+  return diffs
+
+if __name__ == "__main__":
+  import sys
+  if len(sys.argv) != 3:
+    print(f"usage: {sys.argv[0]} a.thneed b.thneed")
+    sys.exit(1)
+  diffs = diff_thneed(load_thneed(sys.argv[1]), load_thneed(sys.argv[2]))
+  print("\n".join(diffs) if len(diffs) else "same")
+  sys.exit(int(len(diffs) > 0))
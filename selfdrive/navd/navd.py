@@ -13,9 +13,8 @@ from common.params import Params
 from common.realtime import Ratekeeper
 from common.transformations.coordinates import ecef2geodetic
 from selfdrive.navd.helpers import (Coordinate, coordinate_from_param,
-                                    distance_along_geometry, maxspeed_to_ms,
-                                    minimum_distance,
-                                    parse_banner_instructions)
+                                    maxspeed_to_ms, parse_banner_instructions)
+from selfdrive.navd.route_geometry import RouteGeometry
 from system.swaglog import cloudlog
 
 REROUTE_DISTANCE = 25
@@ -162,7 +161,7 @@ class RouteEngine:
             coords.append(coord)
             maxspeed_idx += 1
 
-          self.route_geometry.append(coords)
+          self.route_geometry.append(RouteGeometry(coords))
           maxspeed_idx -= 1  # Every segment ends with the same coordinate as the start of the next
 
         self.step_idx = 0
@@ -186,7 +185,7 @@ class RouteEngine:
 
     step = self.route[self.step_idx]
     geometry = self.route_geometry[self.step_idx]
-    along_geometry = distance_along_geometry(geometry, self.last_position)
+    along_geometry = geometry.distance_along(self.last_position)
     distance_to_maneuver_along_geometry = step['distance'] - along_geometry
 
     # Current instruction
@@ -210,10 +209,11 @@ class RouteEngine:
     msg.navInstruction.timeRemainingTypical = total_time_typical
 
     # Speed limit
-    closest_idx, closest = min(enumerate(geometry), key=lambda p: p[1].distance_to(self.last_position))
+    closest_idx = geometry.nearest_point(self.last_position)
+    closest = geometry[closest_idx]
     if closest_idx > 0:
       # If we are not past the closest point, show previous
-      if along_geometry < distance_along_geometry(geometry, geometry[closest_idx]):
+      if along_geometry < geometry.distance_along(closest):
         closest = geometry[closest_idx - 1]
 
     if ('maxspeed' in closest.annotations) and self.localizer_valid:
@@ -268,17 +268,9 @@ class RouteEngine:
     if self.step_idx == len(self.route) - 1:
       return False
 
-    # Compute closest distance to all line segments in the current path
-    min_d = REROUTE_DISTANCE + 1
+    # Compute closest distance to the line segments in the current path, only the nearby ones are checked
     path = self.route_geometry[self.step_idx]
-    for i in range(len(path) - 1):
-      a = path[i]
-      b = path[i + 1]
-
-      if a.distance_to(b) < 1.0:
-        continue
-
-      min_d = min(min_d, minimum_distance(a, b, self.last_position))
+    _, min_d = path.nearest_segment(self.last_position, min_length=1.0, max_distance=REROUTE_DISTANCE)
 
     return min_d > REROUTE_DISTANCE
 
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from typing import Callable, DefaultDict, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from selfdrive.navd.helpers import EARTH_MEAN_RADIUS, Coordinate
+
+CELL_SIZE = 100.  # meters, edge of a grid cell at the route's widest latitude
+BRUTE_FORCE_RATIO = 0.25  # fall back to checking every segment after visiting this many cells per segment
+
+
+def haversine(lat1, lon1, lat2, lon2):
+  """Vectorized Coordinate.distance_to, in meters"""
+  lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
+  y = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+  return 2 * np.arcsin(np.sqrt(y)) * EARTH_MEAN_RADIUS
+
+
+class RouteGeometry:
+  """A route step's coordinates as numpy arrays, with cumulative distances and a uniform
+  grid of the cells each segment passes through. Nearest segment and distance along
+  queries only look at the segments near the position, and give the same results as
+  minimum_distance and distance_along_geometry in helpers.
+
+  The grid is in degrees, like the projection minimum_distance uses. Search goes out
+  ring by ring around the position's cell, and stops once no unvisited cell can hold
+  anything closer than the best segment found so far.
+
+  Indexing and iterating gives the original Coordinates, with their annotations."""
+
+  def __init__(self, coordinates: List[Coordinate], cell_size: float = CELL_SIZE):
+    self.coordinates = coordinates
+    self.lat = np.array([c.latitude for c in coordinates], dtype=np.float64)
+    self.lon = np.array([c.longitude for c in coordinates], dtype=np.float64)
+
+    # same summation order as distance_along_geometry
+    self.segment_lengths = haversine(self.lat[:-1], self.lon[:-1], self.lat[1:], self.lon[1:])
+    self.cumulative_distance = np.concatenate(([0.], np.cumsum(self.segment_lengths)))
+
+    # the lower bound of the distance across a cell in longitude is at the widest latitude
+    self.max_abs_lat = float(np.max(np.abs(self.lat))) if len(self.lat) else 0.
+    self.cell_lat = math.degrees(cell_size / EARTH_MEAN_RADIUS)
+    self.cell_lon = self.cell_lat / max(math.cos(math.radians(self.max_abs_lat)), 1e-6)
+
+    self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+    self.cell_bounds = (0, 0, -1, -1)
+    if len(self.segment_lengths):
+      self._build_index()
+
+  def __len__(self) -> int:
+    return len(self.coordinates)
+
+  def __getitem__(self, idx: int) -> Coordinate:
+    return self.coordinates[idx]
+
+  def __iter__(self) -> Iterator[Coordinate]:
+    return iter(self.coordinates)
+
+  @property
+  def length(self) -> float:
+    return float(self.cumulative_distance[-1])
+
+  def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+    return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+  def _build_index(self) -> None:
+    cells: DefaultDict[Tuple[int, int], List[int]] = defaultdict(list)
+    gy = self.lat / self.cell_lat
+    gx = self.lon / self.cell_lon
+    for i in range(len(self.segment_lengths)):
+      for cell in self._traverse(gy[i], gx[i], gy[i + 1], gx[i + 1]):
+        segments = cells[cell]
+        if not segments or segments[-1] != i:
+          segments.append(i)
+
+    self.cells = {cell: np.array(idx, dtype=np.int64) for cell, idx in cells.items()}
+    ys = [c[0] for c in self.cells]
+    xs = [c[1] for c in self.cells]
+    self.cell_bounds = (min(ys), min(xs), max(ys), max(xs))
+
+  @staticmethod
+  def _traverse(y0: float, x0: float, y1: float, x1: float) -> Iterator[Tuple[int, int]]:
+    # every grid cell the straight line from (y0, x0) to (y1, x1) touches (Amanatides & Woo)
+    cy, cx = math.floor(y0), math.floor(x0)
+    ey, ex = math.floor(y1), math.floor(x1)
+    dy, dx = y1 - y0, x1 - x0
+    step_y = 1 if dy > 0 else -1
+    step_x = 1 if dx > 0 else -1
+    t_delta_y = abs(1. / dy) if dy != 0 else math.inf
+    t_delta_x = abs(1. / dx) if dx != 0 else math.inf
+    t_max_y = ((cy + (step_y > 0) - y0) / dy) if dy != 0 else math.inf
+    t_max_x = ((cx + (step_x > 0) - x0) / dx) if dx != 0 else math.inf
+
+    yield cy, cx
+    for _ in range(abs(ey - cy) + abs(ex - cx)):
+      if t_max_y < t_max_x:
+        cy += step_y
+        t_max_y += t_delta_y
+      elif t_max_x < t_max_y:
+        cx += step_x
+        t_max_x += t_delta_x
+      else:
+        # through a corner, also mark both neighbours so rounding can't skip a cell
+        yield cy + step_y, cx
+        yield cy, cx + step_x
+        cy += step_y
+        cx += step_x
+        t_max_y += t_delta_y
+        t_max_x += t_delta_x
+      yield cy, cx
+      if (cy, cx) == (ey, ex):
+        return
+    yield ey, ex
+
+  def _ring_bound(self, k: int, lat: float) -> float:
+    """Lower bound of the distance from a position at lat to any point of the route k or
+    more whole cells away in latitude or longitude. The great circle angle is at least the
+    latitude difference, and its haversine at least cos(lat1) * cos(lat2) * hav(dlon)."""
+    if k <= 0:
+      return 0.
+    lat_bound = math.radians(k * self.cell_lat) * EARTH_MEAN_RADIUS
+    cos_lat = math.cos(math.radians(self.max_abs_lat)) * math.cos(math.radians(lat))
+    s = math.sqrt(cos_lat) * math.sin(min(math.radians(k * self.cell_lon), math.pi) / 2.)
+    lon_bound = 2 * math.asin(min(s, 1.)) * EARTH_MEAN_RADIUS
+    return min(lat_bound, lon_bound)
+
+  def segment_distances(self, idx: np.ndarray, pos: Coordinate) -> np.ndarray:
+    """Vectorized minimum_distance from pos to the segments starting at idx"""
+    a_lat, a_lon = self.lat[idx], self.lon[idx]
+    ab_lat, ab_lon = self.lat[idx + 1] - a_lat, self.lon[idx + 1] - a_lon
+    ap_lat, ap_lon = pos.latitude - a_lat, pos.longitude - a_lon
+
+    degenerate = self.segment_lengths[idx] < 0.01
+    denom = np.where(degenerate, 1., ab_lat * ab_lat + ab_lon * ab_lon)
+    t = np.clip((ap_lat * ab_lat + ap_lon * ab_lon) / denom, 0.0, 1.0)
+    t[degenerate] = 0.
+    return haversine(a_lat + ab_lat * t, a_lon + ab_lon * t, pos.latitude, pos.longitude)
+
+  def _search(self, pos: Coordinate, evaluate: Callable[[np.ndarray], float], max_distance: float) -> np.ndarray:
+    """Segments near pos: every segment that can hold something closer than the best
+    distance `evaluate` returns for the segments visited so far"""
+    n = len(self.segment_lengths)
+    py, px = self._cell(pos.latitude, pos.longitude)
+    y0, x0, y1, x1 = self.cell_bounds
+    first_ring = max(y0 - py, py - y1, x0 - px, px - x1, 0)
+    last_ring = max(abs(py - y0), abs(py - y1), abs(px - x0), abs(px - x1))
+
+    found: List[np.ndarray] = []
+    best = math.inf
+    visited = 0
+    for k in range(first_ring, last_ring + 1):
+      # cells in ring k are at least k - 1 whole cells away
+      if self._ring_bound(k - 1, pos.latitude) > min(best, max_distance):
+        break
+
+      new = []
+      for cell in self._ring_cells(py, px, k):
+        idx = self.cells.get(cell)
+        if idx is not None:
+          new.append(idx)
+        visited += 1
+
+      if visited > BRUTE_FORCE_RATIO * n:
+        # far from the route, cheaper to check everything
+        return np.arange(n)
+
+      if new:
+        found += new
+        best = min(best, evaluate(np.unique(np.concatenate(new))))
+
+    return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int64)
+
+  def _ring_cells(self, py: int, px: int, k: int) -> Iterator[Tuple[int, int]]:
+    # cells at Chebyshev distance k from (py, px), clipped to the grid
+    y0, x0, y1, x1 = self.cell_bounds
+    if k == 0:
+      yield py, px
+      return
+    for y in (py - k, py + k):
+      if y0 <= y <= y1:
+        for x in range(max(px - k, x0), min(px + k, x1) + 1):
+          yield y, x
+    for x in (px - k, px + k):
+      if x0 <= x <= x1:
+        for y in range(max(py - k + 1, y0), min(py + k - 1, y1) + 1):
+          yield y, x
+
+  def nearest_segment(self, pos: Coordinate, min_length: float = 0., max_distance: float = math.inf) -> Tuple[Optional[int], float]:
+    """Index of the segment closest to pos by minimum_distance and that distance, the first
+    one on ties. Segments shorter than min_length are skipped. Returns (None, inf) when
+    there's no segment, or none within max_distance."""
+    def distances(idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+      if min_length > 0:
+        idx = idx[self.segment_lengths[idx] >= min_length]
+      return idx, self.segment_distances(idx, pos)
+
+    def evaluate(idx: np.ndarray) -> float:
+      _, d = distances(idx)
+      return float(np.min(d)) if len(d) else math.inf
+
+    idx, d = distances(self._search(pos, evaluate, max_distance))
+    if not len(idx):
+      return None, math.inf
+    i = int(np.argmin(d))
+    if d[i] > max_distance:
+      return None, math.inf
+    return int(idx[i]), float(d[i])
+
+  def nearest_point(self, pos: Coordinate) -> int:
+    """Index of the coordinate closest to pos, the first one on ties"""
+    if len(self.coordinates) <= 1:
+      return 0
+
+    # points are in the cells of the segments they start or end
+    def distances(idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+      points = np.unique(np.concatenate((idx, idx + 1)))
+      return points, haversine(self.lat[points], self.lon[points], pos.latitude, pos.longitude)
+
+    points, d = distances(self._search(pos, lambda idx: float(np.min(distances(idx)[1])), math.inf))
+    return int(points[np.argmin(d)])
+
+  def distance_along(self, pos: Coordinate) -> float:
+    """Same as distance_along_geometry"""
+    if len(self.coordinates) <= 2:
+      return self.coordinates[0].distance_to(pos)
+
+    i, _ = self.nearest_segment(pos)
+    assert i is not None
+    return float(self.cumulative_distance[i]) + self.coordinates[i].distance_to(pos)
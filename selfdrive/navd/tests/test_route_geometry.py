@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import math
+import unittest
+
+import numpy as np
+
+from selfdrive.navd.helpers import Coordinate, distance_along_geometry, minimum_distance
+from selfdrive.navd.route_geometry import RouteGeometry
+
+METERS_PER_DEG = 111195.
+
+
+def synthetic_route(n, lat0, lon0, seed=0):
+  # winding road with the odd duplicate point and very short segment, like mapbox geometry
+  rng = np.random.default_rng(seed)
+  heading = rng.uniform(0, 2 * math.pi)
+  lat, lon = lat0, lon0
+  coords = []
+  for i in range(n):
+    coords.append(Coordinate(lat, lon))
+    if i % 97 == 0:
+      continue
+    step = 0.5 if i % 53 == 0 else rng.uniform(5, 60)
+    heading += rng.normal(0, 0.3)
+    lat += step * math.cos(heading) / METERS_PER_DEG
+    lon += step * math.sin(heading) / (METERS_PER_DEG * math.cos(math.radians(lat)))
+  return coords
+
+
+def offset(c, rng, max_dist):
+  d = rng.uniform(0, max_dist)
+  a = rng.uniform(0, 2 * math.pi)
+  return Coordinate(c.latitude + d * math.cos(a) / METERS_PER_DEG,
+                    c.longitude + d * math.sin(a) / (METERS_PER_DEG * math.cos(math.radians(c.latitude))))
+
+
+def nearest_segment(geometry, pos, min_length=0.):
+  # the loop RouteEngine.should_recompute used
+  best, best_i = math.inf, None
+  for i in range(len(geometry) - 1):
+    if geometry[i].distance_to(geometry[i + 1]) < min_length:
+      continue
+    d = minimum_distance(geometry[i], geometry[i + 1], pos)
+    if d < best:
+      best, best_i = d, i
+  return best_i, best
+
+
+class TestRouteGeometry(unittest.TestCase):
+  def check_route(self, coords, queries):
+    geometry = RouteGeometry(coords)
+    for pos in queries:
+      self.assertAlmostEqual(geometry.distance_along(pos), distance_along_geometry(coords, pos), delta=1e-6)
+
+      i, d = geometry.nearest_segment(pos, min_length=1.0)
+      ref_i, ref_d = nearest_segment(coords, pos, min_length=1.0)
+      self.assertEqual(i, ref_i)
+      self.assertAlmostEqual(d, ref_d, delta=1e-6)
+
+      closest_idx, _ = min(enumerate(coords), key=lambda p: p[1].distance_to(pos))
+      self.assertEqual(geometry.nearest_point(pos), closest_idx)
+
+  def test_matches_reference(self):
+    rng = np.random.default_rng(1)
+    for lat0, lon0 in ((32.7, -117.1), (0.1, 103.8), (64.1, -21.9)):
+      coords = synthetic_route(10000, lat0, lon0)
+      queries = [offset(coords[int(rng.integers(len(coords)))], rng, 40) for _ in range(10)]
+      queries += [coords[0], coords[-1], coords[5000], offset(coords[0], rng, 5000), Coordinate(lat0 + 1, lon0 + 1)]
+      with self.subTest(lat=lat0):
+        self.check_route(coords, queries)
+
+  def test_short_routes(self):
+    rng = np.random.default_rng(2)
+    for n in (1, 2, 3, 10):
+      coords = synthetic_route(n, 48.1, 11.6, seed=n)
+      self.check_route(coords, [offset(coords[0], rng, 100) for _ in range(5)])
+
+  def test_max_distance(self):
+    coords = [Coordinate(52.0, 13.0), Coordinate(52.0, 13.01)]
+    geometry = RouteGeometry(coords)
+    i, d = geometry.nearest_segment(Coordinate(52.0001, 13.005), max_distance=25)
+    self.assertEqual(i, 0)
+    self.assertAlmostEqual(d, 11.1, delta=0.1)
+    self.assertEqual(geometry.nearest_segment(Coordinate(52.001, 13.005), max_distance=25), (None, math.inf))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,14 +1,65 @@
 import os
 import time
 import select
+import binascii
+from collections import deque
+from typing import Deque
 from serial import Serial
-from crcmod import mkCrcFun
 from struct import pack, unpack_from, calcsize
 
+ESCAPE_CHAR = b'\x7d'
+TRAILER_CHAR = b'\x7e'
+ESCAPED_ESCAPE = bytes([ESCAPE_CHAR[0], ESCAPE_CHAR[0] ^ 0x20])
+ESCAPED_TRAILER = bytes([ESCAPE_CHAR[0], TRAILER_CHAR[0] ^ 0x20])
+
+BIT_REVERSE = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+def ccitt_crc16(data):
+  # reflected CRC-16/CCITT (poly 0x1021, init and xorout 0xffff), computed as binascii's
+  # non-reflected one over bit reversed bytes so the whole buffer is done in C
+  crc = binascii.crc_hqx(data.translate(BIT_REVERSE), 0xffff)
+  return ((BIT_REVERSE[crc & 0xff] << 8) | BIT_REVERSE[crc >> 8]) ^ 0xffff
+
+def hdlc_encapsulate(payload):
+  payload += pack('<H', ccitt_crc16(payload))
+  payload = payload.replace(ESCAPE_CHAR, ESCAPED_ESCAPE)
+  payload = payload.replace(TRAILER_CHAR, ESCAPED_TRAILER)
+  payload += TRAILER_CHAR
+  return payload
+
+def hdlc_unescape(frame):
+  # frame without its trailer, returns the payload without the crc
+  if ESCAPE_CHAR in frame:
+    frame = frame.replace(ESCAPED_TRAILER, TRAILER_CHAR)
+    frame = frame.replace(ESCAPED_ESCAPE, ESCAPE_CHAR)
+  assert len(frame) >= 3
+  assert frame[-2:] == pack('<H', ccitt_crc16(frame[:-2]))
+  return frame[:-2]
+
+class HdlcDecoder:
+  """Splits a diag byte stream into frames a whole read at a time, so a read with many
+  frames in it costs one split instead of a copy of the remaining buffer per frame.
+  Frames that fail the crc are dropped and counted, empty ones between trailers skipped."""
+  def __init__(self):
+    self.pend = b''
+    self.frames: Deque[bytes] = deque()
+    self.errors = 0
+
+  def feed(self, data):
+    chunks = (self.pend + data).split(TRAILER_CHAR)
+    self.pend = chunks.pop()
+    for chunk in chunks:
+      if not chunk:
+        continue
+      try:
+        self.frames.append(hdlc_unescape(chunk))
+      except AssertionError:
+        self.errors += 1
+
 class ModemDiag:
   def __init__(self):
     self.serial = self.open_serial()
-    self.pend = b''
+    self.decoder = HdlcDecoder()
 
   def open_serial(self):
     def op():
@@ -28,41 +79,24 @@ class ModemDiag:
     serial.reset_output_buffer()
     return serial
 
-  ccitt_crc16 = mkCrcFun(0x11021, initCrc=0, xorOut=0xffff)
-  ESCAPE_CHAR = b'\x7d'
-  TRAILER_CHAR = b'\x7e'
-
   def hdlc_encapsulate(self, payload):
-    payload += pack('<H', ModemDiag.ccitt_crc16(payload))
-    payload = payload.replace(self.ESCAPE_CHAR, bytes([self.ESCAPE_CHAR[0], self.ESCAPE_CHAR[0] ^ 0x20]))
-    payload = payload.replace(self.TRAILER_CHAR, bytes([self.ESCAPE_CHAR[0], self.TRAILER_CHAR[0] ^ 0x20]))
-    payload += self.TRAILER_CHAR
-    return payload
+    return hdlc_encapsulate(payload)
 
   def hdlc_decapsulate(self, payload):
     assert len(payload) >= 3
-    assert payload[-1:] == self.TRAILER_CHAR
-    payload = payload[:-1]
-    payload = payload.replace(bytes([self.ESCAPE_CHAR[0], self.TRAILER_CHAR[0] ^ 0x20]), self.TRAILER_CHAR)
-    payload = payload.replace(bytes([self.ESCAPE_CHAR[0], self.ESCAPE_CHAR[0] ^ 0x20]), self.ESCAPE_CHAR)
-    assert payload[-2:] == pack('<H', ModemDiag.ccitt_crc16(payload[:-2]))
-    return payload[:-2]
+    assert payload[-1:] == TRAILER_CHAR
+    return hdlc_unescape(payload[:-1])
 
   def recv(self):
     # self.serial.read_until makes tons of syscalls!
-    raw_payload = [self.pend]
-    while self.TRAILER_CHAR not in raw_payload[-1]:
+    while not self.decoder.frames:
       select.select([self.serial.fd], [], [])
-      raw = self.serial.read(0x10000)
-      raw_payload.append(raw)
-    raw_payload = b''.join(raw_payload)
-    raw_payload, self.pend = raw_payload.split(self.TRAILER_CHAR, 1)
-    raw_payload += self.TRAILER_CHAR
-    unframed_message = self.hdlc_decapsulate(raw_payload)
+      self.decoder.feed(self.serial.read(0x10000))
+    unframed_message = self.decoder.frames.popleft()
     return unframed_message[0], unframed_message[1:]
 
   def send(self, packet_type, packet_payload):
-    self.serial.write(self.hdlc_encapsulate(bytes([packet_type]) + packet_payload))
+    self.serial.write(hdlc_encapsulate(bytes([packet_type]) + packet_payload))
 
 # *** end class ***
 
@@ -13,7 +13,7 @@ from cereal import log
 from system.swaglog import cloudlog
 
 from selfdrive.sensord.rawgps.modemdiag import ModemDiag, DIAG_LOG_F, setup_logs, send_recv
-from selfdrive.sensord.rawgps.structs import dict_unpacker
+from selfdrive.sensord.rawgps.structs import array_unpacker, dict_unpacker, status_bits
 from selfdrive.sensord.rawgps.structs import gps_measurement_report, gps_measurement_report_sv
 from selfdrive.sensord.rawgps.structs import glonass_measurement_report, glonass_measurement_report_sv
 from selfdrive.sensord.rawgps.structs import oemdre_measurement_report, oemdre_measurement_report_sv
@@ -65,15 +65,20 @@ measurementStatusGlonassFields = {
   "glonassTimeMarkValid": 17
 }
 
+def set_sv_column(svs, name, values, status=False):
+  for sv, v in zip(svs, values):
+    setattr(sv.measurementStatus if status else sv, name, v)
+
 def main() -> NoReturn:
+  # the per satellite records are unpacked into arrays, one column per field
   unpack_gps_meas, size_gps_meas = dict_unpacker(gps_measurement_report, True)
-  unpack_gps_meas_sv, size_gps_meas_sv = dict_unpacker(gps_measurement_report_sv, True)
+  unpack_gps_meas_sv, size_gps_meas_sv = array_unpacker(gps_measurement_report_sv, True)
 
   unpack_glonass_meas, size_glonass_meas = dict_unpacker(glonass_measurement_report, True)
-  unpack_glonass_meas_sv, size_glonass_meas_sv = dict_unpacker(glonass_measurement_report_sv, True)
+  unpack_glonass_meas_sv, size_glonass_meas_sv = array_unpacker(glonass_measurement_report_sv, True)
 
   unpack_oemdre_meas, size_oemdre_meas = dict_unpacker(oemdre_measurement_report, True)
-  unpack_oemdre_meas_sv, size_oemdre_meas_sv = dict_unpacker(oemdre_measurement_report_sv, True)
+  unpack_oemdre_meas_sv, size_oemdre_meas_sv = array_unpacker(oemdre_measurement_report_sv, True)
 
   log_types = [
     LOG_GNSS_GPS_MEASUREMENT_REPORT,
@@ -177,25 +182,24 @@ def main() -> NoReturn:
           setattr(report, k, v)
 
       report.init('sv', dat['svCount'])
-      sats = log_payload[size_oemdre_meas:]
-      for i in range(dat['svCount']):
-        sat = unpack_oemdre_meas_sv(sats[size_oemdre_meas_sv*i:size_oemdre_meas_sv*(i+1)])
-        sv = report.sv[i]
+      sats = unpack_oemdre_meas_sv(log_payload, size_oemdre_meas, dat['svCount'])
+      svs = [report.sv[i] for i in range(dat['svCount'])]
+      for sv in svs:
         sv.init('measurementStatus')
-        for k,v in sat.items():
-          if k in ["unkn", "measurementStatus2"]:
-            pass
-          elif k == "multipathEstimateValid":
-            sv.measurementStatus.multipathEstimateIsValid = bool(v)
-          elif k == "directionValid":
-            sv.measurementStatus.directionIsValid = bool(v)
-          elif k == "goodParity":
-            setattr(sv, k, bool(v))
-          elif k == "measurementStatus":
-            for kk,vv in measurementStatusFields.items():
-              setattr(sv.measurementStatus, kk, bool(v & (1<<vv)))
-          else:
-            setattr(sv, k, v)
+      for k in sats.dtype.names:
+        if k in ["unkn", "measurementStatus2"]:
+          pass
+        elif k == "multipathEstimateValid":
+          set_sv_column(svs, "multipathEstimateIsValid", sats[k].astype(bool).tolist(), status=True)
+        elif k == "directionValid":
+          set_sv_column(svs, "directionIsValid", sats[k].astype(bool).tolist(), status=True)
+        elif k == "goodParity":
+          set_sv_column(svs, k, sats[k].astype(bool).tolist())
+        elif k == "measurementStatus":
+          for kk, bits in status_bits(sats[k], measurementStatusFields.items()).items():
+            set_sv_column(svs, kk, bits, status=True)
+        else:
+          set_sv_column(svs, k, sats[k].tolist())
       pm.send('qcomGnss', msg)
     elif log_type == LOG_GNSS_POSITION_REPORT:
       report = unpack_position(log_payload)
@@ -232,14 +236,12 @@ def main() -> NoReturn:
 
       if log_type == LOG_GNSS_GPS_MEASUREMENT_REPORT:
         dat = unpack_gps_meas(log_payload)
-        sats = log_payload[size_gps_meas:]
-        unpack_meas_sv, size_meas_sv = unpack_gps_meas_sv, size_gps_meas_sv
+        size_meas, unpack_meas_sv, size_meas_sv = size_gps_meas, unpack_gps_meas_sv, size_gps_meas_sv
         report.source = 0  # gps
         measurement_status_fields = (measurementStatusFields.items(), measurementStatusGPSFields.items())
       elif log_type == LOG_GNSS_GLONASS_MEASUREMENT_REPORT:
         dat = unpack_glonass_meas(log_payload)
-        sats = log_payload[size_glonass_meas:]
-        unpack_meas_sv, size_meas_sv = unpack_glonass_meas_sv, size_glonass_meas_sv
+        size_meas, unpack_meas_sv, size_meas_sv = size_glonass_meas, unpack_glonass_meas_sv, size_glonass_meas_sv
         report.source = 1  # glonass
         measurement_status_fields = (measurementStatusFields.items(), measurementStatusGlonassFields.items())
       else:
@@ -256,28 +258,28 @@ def main() -> NoReturn:
           setattr(report, k, v)
       report.init('sv', dat['svCount'])
       if dat['svCount'] > 0:
-        assert len(sats)//dat['svCount'] == size_meas_sv
-        for i in range(dat['svCount']):
-          sv = report.sv[i]
+        assert (len(log_payload) - size_meas)//dat['svCount'] == size_meas_sv
+        sats = unpack_meas_sv(log_payload, size_meas, dat['svCount'])
+        svs = [report.sv[i] for i in range(dat['svCount'])]
+        for sv in svs:
           sv.init('measurementStatus')
-          sat = unpack_meas_sv(sats[size_meas_sv*i:size_meas_sv*(i+1)])
-          for k,v in sat.items():
-            if k == "parityErrorCount":
-              sv.gpsParityErrorCount = v
-            elif k == "frequencyIndex":
-              sv.glonassFrequencyIndex = v
-            elif k == "hemmingErrorCount":
-              sv.glonassHemmingErrorCount = v
-            elif k == "measurementStatus":
-              for kk,vv in itertools.chain(*measurement_status_fields):
-                setattr(sv.measurementStatus, kk, bool(v & (1<<vv)))
-            elif k == "miscStatus":
-              for kk,vv in miscStatusFields.items():
-                setattr(sv.measurementStatus, kk, bool(v & (1<<vv)))
-            elif k == "pad":
-              pass
-            else:
-              setattr(sv, k, v)
+        for k in sats.dtype.names:
+          if k == "parityErrorCount":
+            set_sv_column(svs, "gpsParityErrorCount", sats[k].tolist())
+          elif k == "frequencyIndex":
+            set_sv_column(svs, "glonassFrequencyIndex", sats[k].tolist())
+          elif k == "hemmingErrorCount":
+            set_sv_column(svs, "glonassHemmingErrorCount", sats[k].tolist())
+          elif k == "measurementStatus":
+            for kk, bits in status_bits(sats[k], itertools.chain(*measurement_status_fields)).items():
+              set_sv_column(svs, kk, bits, status=True)
+          elif k == "miscStatus":
+            for kk, bits in status_bits(sats[k], miscStatusFields.items()).items():
+              set_sv_column(svs, kk, bits, status=True)
+          elif k == "pad":
+            pass
+          else:
+            set_sv_column(svs, k, sats[k].tolist())
 
       pm.send('qcomGnss', msg)
 
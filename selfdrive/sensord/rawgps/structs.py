@@ -1,3 +1,4 @@
+import numpy as np
 from struct import unpack_from, calcsize
 
 LOG_GNSS_POSITION_REPORT = 0x1476
@@ -311,3 +312,22 @@ def dict_unpacker(ss, camelcase = False):
     nams = [name_to_camelcase(x) for x in nams]
   sz = calcsize(st)
   return lambda x: dict(zip(nams, unpack_from(st, x))), sz
+
+NUMPY_TYPES = {"B": "u1", "b": "i1", "H": "u2", "h": "i2", "I": "u4", "i": "i4", "Q": "u8", "f": "f4", "d": "f8"}
+
+def struct_dtype(ss, camelcase = False):
+  st, nams = parse_struct(ss)
+  if camelcase:
+    nams = [name_to_camelcase(x) for x in nams]
+  # packed like the struct format, no alignment padding
+  return np.dtype({'names': nams, 'formats': ["<" + NUMPY_TYPES[c] for c in st[1:]]})
+
+def array_unpacker(ss, camelcase = False):
+  """Like dict_unpacker for repeated records: unpacks count records starting at offset
+  into a numpy structured array in one go, x[name] is the column of a field"""
+  dt = struct_dtype(ss, camelcase)
+  return lambda x, offset=0, count=-1: np.frombuffer(x, dtype=dt, count=count, offset=offset), dt.itemsize
+
+def status_bits(values, fields):
+  """Bit flags of a status column, as lists of bools per flag name"""
+  return {name: ((values >> bit) & 1).astype(bool).tolist() for name, bit in fields}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import random
+import unittest
+from struct import pack
+
+from selfdrive.sensord.rawgps.modemdiag import DIAG_LOG_F, TRAILER_CHAR, HdlcDecoder, ccitt_crc16, hdlc_encapsulate
+from selfdrive.sensord.rawgps.structs import (LOG_GNSS_GPS_MEASUREMENT_REPORT, array_unpacker, dict_unpacker,
+                                              gps_measurement_report, gps_measurement_report_sv, status_bits)
+
+
+def crc16_bytewise(data):
+  # the byte at a time crc the diag framing used, reflected CRC-16/CCITT
+  crc = 0xffff
+  for b in data:
+    crc ^= b
+    for _ in range(8):
+      crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+  return crc ^ 0xffff
+
+
+def decode_frame_by_frame(reads):
+  # how ModemDiag.recv used to split the stream, one frame per call
+  pend, frames = b'', []
+  for raw in reads:
+    pend += raw
+    while TRAILER_CHAR in pend:
+      frame, pend = pend.split(TRAILER_CHAR, 1)
+      frame = frame.replace(b'\x7d\x5e', b'\x7e').replace(b'\x7d\x5d', b'\x7d')
+      assert frame[-2:] == pack('<H', crc16_bytewise(frame[:-2]))
+      frames.append(frame[:-2])
+  return frames
+
+
+def gps_measurement_frame(rng, sv_count):
+  # a recorded-like DIAG_LOG_F packet: outer header, log header, report and the sv records
+  _, size = dict_unpacker(gps_measurement_report)
+  _, sv_size = dict_unpacker(gps_measurement_report_sv)
+  report = bytes([0]) + rng.randbytes(size - 2) + bytes([sv_count])
+  log = report + rng.randbytes(sv_size * sv_count)
+  inner = pack('<HHQ', len(log) + 12, LOG_GNSS_GPS_MEASUREMENT_REPORT, rng.getrandbits(64)) + log
+  return bytes([DIAG_LOG_F]) + pack('<BH', 0, len(inner)) + inner
+
+
+def record_stream(rng, n_frames):
+  payloads = [gps_measurement_frame(rng, rng.randint(0, 16)) for _ in range(n_frames)]
+  stream = b''.join(hdlc_encapsulate(p) for p in payloads)
+  # reads of random sizes, like the serial port hands them out
+  reads, i = [], 0
+  while i < len(stream):
+    n = rng.randint(1, 4096)
+    reads.append(stream[i:i + n])
+    i += n
+  return payloads, reads
+
+
+class TestRawgpsDiag(unittest.TestCase):
+  def test_crc(self):
+    rng = random.Random(0)
+    for n in (0, 1, 2, 7, 100, 4096):
+      data = rng.randbytes(n)
+      self.assertEqual(ccitt_crc16(data), crc16_bytewise(data))
+
+  def test_framing(self):
+    rng = random.Random(1)
+    payloads, reads = record_stream(rng, 500)
+    # escapes are exercised
+    self.assertTrue(any(b'\x7d' in r for r in reads))
+
+    decoder = HdlcDecoder()
+    for raw in reads:
+      decoder.feed(raw)
+    self.assertEqual(list(decoder.frames), payloads)
+    self.assertEqual(list(decoder.frames), decode_frame_by_frame(reads))
+    self.assertEqual(decoder.errors, 0)
+    self.assertEqual(decoder.pend, b'')
+
+  def test_corrupt_frame(self):
+    rng = random.Random(2)
+    payloads = [gps_measurement_frame(rng, 2) for _ in range(3)]
+    frames = [hdlc_encapsulate(p) for p in payloads]
+    # flip a bit that doesn't make or break an escape or trailer
+    corrupt = bytearray(frames[1])
+    i = next(i for i, b in enumerate(corrupt) if b not in (0x7c, 0x7d, 0x7e, 0x7f))
+    corrupt[i] ^= 0x01
+
+    decoder = HdlcDecoder()
+    decoder.feed(TRAILER_CHAR + frames[0] + bytes(corrupt) + frames[2][:10])
+    decoder.feed(frames[2][10:])
+    self.assertEqual(list(decoder.frames), [payloads[0], payloads[2]])
+    self.assertEqual(decoder.errors, 1)
+
+  def test_sv_arrays(self):
+    rng = random.Random(3)
+    unpack_sv, sv_size = dict_unpacker(gps_measurement_report_sv, True)
+    unpack_svs, sv_size_array = array_unpacker(gps_measurement_report_sv, True)
+    self.assertEqual(sv_size, sv_size_array)
+
+    header = rng.randbytes(37)
+    data = header + rng.randbytes(sv_size * 12)
+    svs = unpack_svs(data, len(header), 12)
+    for i in range(12):
+      ref = unpack_sv(data[len(header) + sv_size * i:len(header) + sv_size * (i + 1)])
+      self.assertEqual({k: svs[k][i].item() for k in svs.dtype.names}, ref)
+
+    fields = {"subMillisecondIsValid": 0, "freshMeasurementIndicator": 27}
+    bits = status_bits(svs["measurementStatus"], fields.items())
+    for kk, vv in fields.items():
+      self.assertEqual(bits[kk], [bool(int(v) & (1 << vv)) for v in svs["measurementStatus"]])
+
+
+if __name__ == "__main__":
+  unittest.main()
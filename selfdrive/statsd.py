@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
+import io
+import math
 import os
+import struct
 import zmq
 import time
 from pathlib import Path
-from collections import defaultdict
 from datetime import datetime, timezone
-from typing import NoReturn, Union, List, Dict
+from typing import NoReturn, Union, Dict, Optional, Tuple
 
 from common.params import Params
 from cereal.messaging import SubMaster
@@ -19,6 +21,33 @@ from selfdrive.loggerd.config import STATS_DIR, STATS_DIR_FILE_LIMIT, STATS_SOCK
 class METRIC_TYPE:
   GAUGE = 'g'
   SAMPLE = 'sa'
+  TIMING = 'ms'
+
+# binary messages are a type code and a little endian double, followed by the utf-8 name.
+# codes are below any printable character, so text messages ("name:value|type") are still accepted
+METRIC_CODES = [METRIC_TYPE.GAUGE, METRIC_TYPE.SAMPLE, METRIC_TYPE.TIMING]
+METRIC_HEADER = struct.Struct('<Bd')
+
+SKETCH_ALPHA = 0.01  # relative accuracy of quantiles
+SKETCH_MAX_BUCKETS = 2048
+PERCENTILES = [0.05, 0.5, 0.95]
+
+
+def encode_metric(name: str, value: float, metric_type: str) -> bytes:
+  return METRIC_HEADER.pack(METRIC_CODES.index(metric_type), value) + name.encode()
+
+
+def decode_metric(msg: bytes) -> Tuple[str, float, str]:
+  if msg[0] < len(METRIC_CODES):
+    code, value = METRIC_HEADER.unpack_from(msg)
+    return msg[METRIC_HEADER.size:].decode(), value, METRIC_CODES[code]
+
+  metric = msg.decode()
+  metric_type = metric.split('|')[1]
+  metric_name = metric.split(':')[0]
+  metric_value = float(metric.split('|')[0].split(':')[1])
+  return metric_name, metric_value, metric_type
+
 
 class StatLog:
   def __init__(self):
@@ -31,41 +60,165 @@ class StatLog:
     self.sock.connect(STATS_SOCKET)
     self.pid = os.getpid()
 
-  def _send(self, metric: str) -> None:
+  def _send(self, name: str, value: float, metric_type: str) -> None:
     if os.getpid() != self.pid:
       self.connect()
 
     try:
-      self.sock.send_string(metric, zmq.NOBLOCK)
+      self.sock.send(encode_metric(name, value, metric_type), zmq.NOBLOCK)
     except zmq.error.Again:
       # drop :/
       pass
 
   def gauge(self, name: str, value: float) -> None:
-    self._send(f"{name}:{value}|{METRIC_TYPE.GAUGE}")
+    self._send(name, value, METRIC_TYPE.GAUGE)
 
-  # Samples will be recorded in a buffer and at aggregation time,
+  # Samples will be recorded in a sketch and at aggregation time,
   # statistical properties will be logged (mean, count, percentiles, ...)
   def sample(self, name: str, value: float):
-    self._send(f"{name}:{value}|{METRIC_TYPE.SAMPLE}")
+    self._send(name, value, METRIC_TYPE.SAMPLE)
 
+  # Same as samples, in milliseconds
+  def timing(self, name: str, ms: float):
+    self._send(name, ms, METRIC_TYPE.TIMING)
 
-def main() -> NoReturn:
-  dongle_id = Params().get("DongleId", encoding='utf-8')
-  def get_influxdb_line(measurement: str, value: Union[float, Dict[str, float]],  timestamp: datetime, tags: dict) -> str:
-    res = f"{measurement}"
+
+class QuantileSketch:
+  """Fixed memory quantile sketch over log spaced buckets (DDSketch). Quantiles are within
+  `alpha` relative error of the exact value at the same rank, as long as the values span fewer
+  than `max_buckets` buckets. Beyond that, the buckets of the smallest magnitudes are merged."""
+
+  def __init__(self, alpha: float = SKETCH_ALPHA, max_buckets: int = SKETCH_MAX_BUCKETS):
+    self.gamma = (1 + alpha) / (1 - alpha)
+    self.log_gamma = math.log(self.gamma)
+    self.max_buckets = max_buckets
+    self.min_value = 1e-9
+    self.pos: Dict[int, int] = {}
+    self.neg: Dict[int, int] = {}
+    self.zero = 0
+    self.count = 0
+    self.sum = 0.
+    self.min = math.inf
+    self.max = -math.inf
+
+  def add(self, value: float) -> None:
+    self.count += 1
+    self.sum += value
+    self.min = min(self.min, value)
+    self.max = max(self.max, value)
+
+    if value > self.min_value:
+      store = self.pos
+    elif value < -self.min_value:
+      store = self.neg
+    else:
+      self.zero += 1
+      return
+
+    idx = math.ceil(math.log(abs(value)) / self.log_gamma)
+    store[idx] = store.get(idx, 0) + 1
+    if len(self.pos) + len(self.neg) > self.max_buckets:
+      self._collapse()
+
+  def _collapse(self) -> None:
+    store = self.pos if len(self.pos) >= len(self.neg) else self.neg
+    lowest = sorted(store)[:2]
+    store[lowest[1]] += store.pop(lowest[0])
+
+  def _value(self, idx: int) -> float:
+    return 2 * self.gamma ** idx / (self.gamma + 1)
+
+  def quantile(self, q: float) -> float:
+    if self.count == 0:
+      return math.nan
+
+    rank = int(round(q * (self.count - 1)))
+    seen = 0
+    for idx in sorted(self.neg, reverse=True):
+      seen += self.neg[idx]
+      if seen > rank:
+        return max(self.min, -self._value(idx))
+    seen += self.zero
+    if seen > rank:
+      return 0.
+    for idx in sorted(self.pos):
+      seen += self.pos[idx]
+      if seen > rank:
+        return min(self.max, self._value(idx))
+    return self.max
+
+
+class MetricAggregator:
+  """Collects gauges and sketches of samples and timings between flushes,
+  and renders them as influxdb lines into a buffer that is reused across flushes."""
+
+  def __init__(self, dongle_id: Optional[str]):
+    self.dongle_id = dongle_id
+    self.gauges: Dict[str, float] = {}
+    self.sketches: Dict[str, Dict[str, QuantileSketch]] = {METRIC_TYPE.SAMPLE: {}, METRIC_TYPE.TIMING: {}}
+    self.buf = io.StringIO()
+
+  def ingest(self, msg: bytes) -> None:
+    try:
+      name, value, metric_type = decode_metric(msg)
+    except Exception:
+      cloudlog.event("malformed metric", metric=msg)
+      return
+
+    if metric_type == METRIC_TYPE.GAUGE:
+      self.gauges[name] = value
+    elif metric_type in self.sketches:
+      sketches = self.sketches[metric_type]
+      if name not in sketches:
+        sketches[name] = QuantileSketch()
+      sketches[name].add(value)
+    else:
+      cloudlog.event("unknown metric type", metric_type=metric_type)
+
+  def write_line(self, measurement: str, value: Union[float, Dict[str, float]], timestamp: datetime, tags: dict) -> None:
+    w = self.buf.write
+    w(measurement)
     for k, v in tags.items():
-      res += f",{k}={str(v)}"
-    res += " "
+      w(f",{k}={str(v)}")
+    w(" ")
 
     if isinstance(value, float):
       value = {'value': value}
 
     for k, v in value.items():
-      res += f"{k}={v},"
+      w(f"{k}={v},")
+
+    w(f"dongle_id=\"{self.dongle_id}\" {int(timestamp.timestamp() * 1e9)}\n")
+
+  def flush(self, timestamp: datetime, tags: dict) -> str:
+    self.buf.seek(0)
+    self.buf.truncate()
+
+    for key, value in self.gauges.items():
+      self.write_line(f"gauge.{key}", value, timestamp, tags)
+
+    for metric_type, prefix in ((METRIC_TYPE.SAMPLE, "sample"), (METRIC_TYPE.TIMING, "timing")):
+      for key, sketch in self.sketches[metric_type].items():
+        stats = {
+          'count': sketch.count,
+          'min': sketch.min,
+          'max': sketch.max,
+          'mean': sketch.sum / sketch.count,
+        }
+        for percentile in PERCENTILES:
+          stats[f"p{int(percentile * 100)}"] = sketch.quantile(percentile)
+
+        self.write_line(f"{prefix}.{key}", stats, timestamp, tags)
 
-    res += f"dongle_id=\"{dongle_id}\" {int(timestamp.timestamp() * 1e9)}\n"
-    return res
+    # clear intermediate data
+    self.gauges.clear()
+    for sketches in self.sketches.values():
+      sketches.clear()
+    return self.buf.getvalue()
+
+
+def main() -> NoReturn:
+  aggregator = MetricAggregator(Params().get("DongleId", encoding='utf-8'))
 
   # open statistics socket
   ctx = zmq.Context().instance()
@@ -90,8 +243,6 @@ def main() -> NoReturn:
 
   idx = 0
   last_flush_time = time.monotonic()
-  gauges = {}
-  samples: Dict[str, List[float]] = defaultdict(list)
   while True:
     started_prev = sm['deviceState'].started
     sm.update()
@@ -99,52 +250,15 @@ def main() -> NoReturn:
     # Update metrics
     while True:
       try:
-        metric = sock.recv_string(zmq.NOBLOCK)
-        try:
-          metric_type = metric.split('|')[1]
-          metric_name = metric.split(':')[0]
-          metric_value = float(metric.split('|')[0].split(':')[1])
-
-          if metric_type == METRIC_TYPE.GAUGE:
-            gauges[metric_name] = metric_value
-          elif metric_type == METRIC_TYPE.SAMPLE:
-            samples[metric_name].append(metric_value)
-          else:
-            cloudlog.event("unknown metric type", metric_type=metric_type)
-        except Exception:
-          cloudlog.event("malformed metric", metric=metric)
+        aggregator.ingest(sock.recv(zmq.NOBLOCK))
       except zmq.error.Again:
         break
 
     # flush when started state changes or after FLUSH_TIME_S
     if (time.monotonic() > last_flush_time + STATS_FLUSH_TIME_S) or (sm['deviceState'].started != started_prev):
-      result = ""
       current_time = datetime.utcnow().replace(tzinfo=timezone.utc)
       tags['started'] = sm['deviceState'].started
-
-      for key, value in gauges.items():
-        result += get_influxdb_line(f"gauge.{key}", value, current_time, tags)
-
-      for key, values in samples.items():
-        values.sort()
-        sample_count = len(values)
-        sample_sum = sum(values)
-
-        stats = {
-          'count': sample_count,
-          'min': values[0],
-          'max': values[-1],
-          'mean': sample_sum / sample_count,
-        }
-        for percentile in [0.05, 0.5, 0.95]:
-          value = values[int(round(percentile * (sample_count - 1)))]
-          stats[f"p{int(percentile * 100)}"] = value
-
-        result += get_influxdb_line(f"sample.{key}", stats, current_time, tags)
-
-      # clear intermediate data
-      gauges.clear()
-      samples.clear()
+      result = aggregator.flush(current_time, tags)
       last_flush_time = time.monotonic()
 
       # check that we aren't filling up the drive
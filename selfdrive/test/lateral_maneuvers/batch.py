@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from selfdrive.car.fingerprints import all_known_cars
+from selfdrive.test.lateral_maneuvers.maneuver import LateralManeuver, get_car
+from selfdrive.test.lateral_maneuvers.metrics import LateralMetrics
+
+REGRESSION_TOLERANCE = 0.1  # relative increase of a tracking metric that counts as a regression
+REGRESSION_METRICS = ("rms_offset", "max_offset", "rms_curvature_error", "saturated_time")
+
+maneuvers = [
+  LateralManeuver(
+    "recover from 0.5m offset on a straight at 25m/s",
+    duration=10.,
+    speed=25.,
+    initial_offset=0.5,
+  ),
+  LateralManeuver(
+    "enter a 500m radius curve at 30m/s",
+    duration=15.,
+    speed=30.,
+    curvature_bp=[100., 250.],
+    curvature_v=[0., 1 / 500.],
+  ),
+  LateralManeuver(
+    "s-curve at 20m/s, 150m radius",
+    duration=20.,
+    speed=20.,
+    curvature_bp=[50., 100., 150., 200., 250., 300., 350.],
+    curvature_v=[0., 1 / 150., 1 / 150., -1 / 150., -1 / 150., 0., 0.],
+  ),
+  LateralManeuver(
+    "tight left curve at 12m/s, 60m radius",
+    duration=15.,
+    speed=12.,
+    curvature_bp=[20., 50., 120., 150.],
+    curvature_v=[0., -1 / 60., -1 / 60., 0.],
+  ),
+]
+
+
+def lateral_cars() -> List[str]:
+  cars = []
+  for car_name in sorted(all_known_cars()):
+    CP, _ = get_car(car_name)
+    if not CP.notCar:
+      cars.append(car_name)
+  return cars
+
+
+def run_maneuver(job: Tuple[str, int]) -> LateralMetrics:
+  car_name, idx = job
+  return maneuvers[idx].metrics(car_name)
+
+
+def run_maneuvers(cars: Sequence[str], workers: int = 0) -> List[LateralMetrics]:
+  """Every maneuver on every car, across worker processes"""
+  os.environ['SIMULATION'] = "1"
+  jobs = list(itertools.product(cars, range(len(maneuvers))))
+  if workers == 1:
+    return [run_maneuver(j) for j in jobs]
+
+  with multiprocessing.Pool(workers or None) as pool:
+    return pool.map(run_maneuver, jobs, chunksize=1)
+
+
+def find_regressions(results: List[LateralMetrics], baseline: List[Dict], tolerance: float = REGRESSION_TOLERANCE) -> List[str]:
+  """Tracking metrics that got worse by more than tolerance against a previous --json run"""
+  previous = {(b["car"], b["title"]): b for b in baseline}
+  regressions = []
+  for r in results:
+    b = previous.get((r.car, r.title))
+    if b is None:
+      continue
+    for name in REGRESSION_METRICS:
+      new, old = getattr(r, name), b[name]
+      # absolute floor so metrics that are ~0 don't flag on noise
+      if new > old * (1 + tolerance) + 1e-3:
+        regressions.append(f"{r.car}, {r.title}: {name} {old:.4f} -> {new:.4f}")
+  return regressions
+
+
+def print_metrics(results: List[LateralMetrics]) -> None:
+  print(f"{'car':<36} {'ctrl':<7} {'rms off':>7} {'max off':>7} {'lat err':>7} {'limit':>6} {'sat':>5} "
+        f"{'rate':>6} {'ctrl us':>7} {'sim s':>6}  maneuver")
+  for r in results:
+    print(f"{r.car:<36} {r.controller:<7} {r.rms_offset:>7.3f} {r.max_offset:>7.3f} {r.max_lat_accel_error:>7.2f} "
+          f"{r.at_limit:>6.1%} {r.saturated_time:>5.1f} {r.max_steering_rate:>6.0f} {r.controller_us:>7.0f} "
+          f"{r.sim_time:>6.1f}  {r.title}")
+
+  # controller CPU cost per step
+  times = defaultdict(list)
+  for r in results:
+    times[r.controller].append(r.controller_us)
+  print()
+  for controller, t in sorted(times.items()):
+    print(f"{controller}: {sum(t) / len(t):.0f} us per update, {max(t):.0f} us worst car")
+  print(f"lateral planner: {sum(r.planner_ms for r in results) / len(results):.2f} ms per update")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run lateral maneuvers on every car, faster than real time")
+  parser.add_argument("--cars", nargs="*", help="only run cars containing these strings")
+  parser.add_argument("--workers", type=int, default=0, help="worker processes, default one per core")
+  parser.add_argument("--json", help="write the metrics to this file")
+  parser.add_argument("--baseline", help="metrics from a previous --json run, exits non-zero on regressions")
+  parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+  args = parser.parse_args()
+
+  cars = lateral_cars()
+  if args.cars:
+    cars = [c for c in cars if any(s.upper() in c for s in args.cars)]
+
+  t = time.monotonic()
+  results = run_maneuvers(cars, args.workers)
+  wall_time = time.monotonic() - t
+
+  print_metrics(results)
+  sim_duration = sum(m.duration for m in maneuvers) * len(cars)
+  print(f"\n{len(cars)} cars, {len(results)} runs, {sim_duration:.0f}s simulated in {wall_time:.1f}s "
+        f"({sim_duration / wall_time:.0f}x real time)")
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump([r._asdict() for r in results], f, indent=2)
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      regressions = find_regressions(results, json.load(f), args.tolerance)
+    print(f"\n{len(regressions)} regressions against {args.baseline}")
+    for r in regressions:
+      print("  " + r)
+    sys.exit(int(len(regressions) > 0))
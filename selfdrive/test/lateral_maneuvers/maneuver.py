@@ -0,0 +1,125 @@
+import time
+
+import numpy as np
+
+import cereal.messaging as messaging
+from cereal import car
+from common.realtime import DT_CTRL, DT_MDL
+from selfdrive.car.car_helpers import interfaces
+from selfdrive.car.fingerprints import _FINGERPRINTS as FINGERPRINTS
+from selfdrive.controls.lib.drive_helpers import CONTROL_N, get_lag_adjusted_curvature
+from selfdrive.controls.lib.latcontrol_angle import LatControlAngle
+from selfdrive.controls.lib.latcontrol_indi import LatControlINDI
+from selfdrive.controls.lib.latcontrol_pid import LatControlPID
+from selfdrive.controls.lib.latcontrol_torque import LatControlTorque
+from selfdrive.controls.lib.lateral_planner import LateralPlanner
+from selfdrive.controls.lib.vehicle_model import VehicleModel
+from selfdrive.test.lateral_maneuvers.metrics import LateralMetrics, lateral_metrics
+from selfdrive.test.lateral_maneuvers.plant import ROAD_LOOKAHEAD, LateralPlant, Road
+
+PLAN_FRAMES = int(round(DT_MDL / DT_CTRL))
+
+
+def get_car(car_name):
+  """CarParams and CarInterface like test_car_interfaces builds them"""
+  CarInterface, CarController, CarState = interfaces[car_name]
+  fingerprint = FINGERPRINTS[car_name][0] if car_name in FINGERPRINTS else {}
+  CP = CarInterface.get_params(car_name, {0: fingerprint, 1: fingerprint, 2: fingerprint}, [])
+  return CP, CarInterface(CP, CarController, CarState)
+
+
+def get_lat_controller(CP, CI):
+  # same choice as controlsd
+  if CP.steerControlType == car.CarParams.SteerControlType.angle:
+    return 'angle', LatControlAngle(CP, CI)
+  controller = CP.lateralTuning.which()
+  return controller, {'pid': LatControlPID, 'indi': LatControlINDI, 'torque': LatControlTorque}[controller](CP, CI)
+
+
+class LateralManeuver():
+  def __init__(self, title, duration, speed, **kwargs):
+    self.title = title
+    self.duration = duration
+    self.speed = speed
+
+    # road curvature over distance travelled, positive to the right
+    self.curvature_bp = kwargs.get("curvature_bp", [0.])
+    self.curvature_v = kwargs.get("curvature_v", [0.])
+    self.initial_offset = kwargs.get("initial_offset", 0.)
+
+  def road(self):
+    return Road(self.speed * self.duration + ROAD_LOOKAHEAD, self.curvature_bp, self.curvature_v)
+
+  def evaluate(self, car_name):
+    """Closed loop: the lateral planner on a perfect model path at 20Hz, and the car's
+    lateral controller, like controlsd runs it, at 100Hz. Returns the controller type,
+    logs and time spent per controller and planner update."""
+    CP, CI = get_car(car_name)
+    controller, LaC = get_lat_controller(CP, CI)
+    VM = VehicleModel(CP)
+    plant = LateralPlant(CP, self.speed, self.road(), self.initial_offset)
+    planner = LateralPlanner(use_lanelines=False)
+
+    params = messaging.new_message('liveParameters').liveParameters
+    params.steerRatio = CP.steerRatio
+    params.stiffnessFactor = 1.
+    llk = messaging.new_message('liveLocationKalman').liveLocationKalman
+    last_actuators = car.CarControl.new_message().actuators
+    lat_active = self.speed > CP.minSteerSpeed
+
+    psis, curvatures, curvature_rates = [], [], []
+    logs, controller_times, planner_times = [], [], []
+    while plant.current_time() < self.duration:
+      CS = car.CarState.new_message()
+      CS.vEgo = self.speed
+      CS.steeringAngleDeg = plant.steering_angle
+      CS.steeringRateDeg = plant.steering_rate
+
+      if plant.frame % PLAN_FRAMES == 0:
+        controls_state = messaging.new_message('controlsState').controlsState
+        controls_state.active = lat_active
+        controls_state.curvature = plant.curvature
+        model = messaging.new_message('modelV2').modelV2
+        t, x, y, z, yaw = plant.model_path()
+        model.position.t = model.orientation.t = t.tolist()
+        model.position.x, model.position.y, model.position.z = x.tolist(), y.tolist(), z.tolist()
+        model.orientation.x, model.orientation.y, model.orientation.z = z.tolist(), z.tolist(), yaw.tolist()
+
+        start = time.perf_counter()
+        planner.update({'carState': CS, 'controlsState': controls_state, 'modelV2': model})
+        planner_times.append(time.perf_counter() - start)
+
+        psis = planner.lat_mpc.x_sol[0:CONTROL_N, 2].tolist()
+        curvatures = planner.lat_mpc.x_sol[0:CONTROL_N, 3].tolist()
+        curvature_rates = [float(x) for x in planner.lat_mpc.u_sol[0:CONTROL_N - 1]] + [0.0]
+
+      desired_curvature, desired_curvature_rate = get_lag_adjusted_curvature(CP, self.speed, psis, curvatures, curvature_rates)
+      llk.angularVelocityCalibrated.value = [0., 0., plant.yaw_rate]
+      if not lat_active:
+        LaC.reset()
+
+      start = time.perf_counter()
+      steer, steering_angle_deg, lac_log = LaC.update(lat_active, CS, VM, params, last_actuators,
+                                                      desired_curvature, desired_curvature_rate, llk)
+      controller_times.append(time.perf_counter() - start)
+      last_actuators.steer, last_actuators.steeringAngleDeg = steer, steering_angle_deg
+
+      logs.append(np.array([plant.current_time(),
+                            plant.offset,
+                            plant.heading_error,
+                            desired_curvature,
+                            plant.curvature,
+                            steer,
+                            plant.steering_angle,
+                            plant.steering_rate,
+                            lac_log.saturated,
+                            lat_active]))
+      plant.step(steer, steering_angle_deg)
+
+    return controller, np.array(logs), controller_times, planner_times
+
+  def metrics(self, car_name) -> LateralMetrics:
+    t = time.monotonic()
+    controller, logs, controller_times, planner_times = self.evaluate(car_name)
+    return lateral_metrics(self.title, car_name, controller, self.speed, logs, controller_times, planner_times,
+                           sim_time=time.monotonic() - t)
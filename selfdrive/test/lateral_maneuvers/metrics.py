@@ -0,0 +1,58 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# columns of the logs LateralManeuver.evaluate returns
+T, OFFSET, HEADING_ERROR, DESIRED_CURVATURE, CURVATURE, STEER, STEERING_ANGLE, STEERING_RATE, SATURATED, ACTIVE = range(10)
+
+STEER_LIMIT = 1.0 - 1e-3  # torque command at the limit
+
+
+class LateralMetrics(NamedTuple):
+  title: str
+  car: str
+  controller: str
+  speed: float
+  active: float  # fraction of the maneuver lateral control was active
+  rms_offset: float  # m from the road centerline
+  max_offset: float
+  rms_curvature_error: float  # 1/m, desired minus achieved
+  max_lat_accel_error: float  # m/s^2
+  at_limit: float  # fraction of active time the torque command is at its limit
+  saturated_time: float  # s the controller reported itself saturated
+  rms_steering_rate: float  # deg/s
+  max_steering_rate: float
+  controller_us: float  # mean controller update time
+  controller_us_p99: float
+  planner_ms: float  # mean lateral planner update time
+  sim_time: float = 0.  # s of wall time the simulation took
+
+
+def lateral_metrics(title: str, car: str, controller: str, speed: float, logs: np.ndarray,
+                    controller_times, planner_times, sim_time: float = 0.) -> LateralMetrics:
+  dt = logs[1, T] - logs[0, T] if len(logs) > 1 else 0.
+  active = logs[:, ACTIVE] > 0
+  curvature_error = (logs[:, DESIRED_CURVATURE] - logs[:, CURVATURE])[active]
+  if not len(curvature_error):
+    curvature_error = np.zeros(1)
+  controller_us = np.asarray(controller_times) * 1e6
+
+  return LateralMetrics(
+    title=title,
+    car=car,
+    controller=controller,
+    speed=speed,
+    active=float(np.mean(active)),
+    rms_offset=float(np.sqrt(np.mean(logs[:, OFFSET] ** 2))),
+    max_offset=float(np.max(np.abs(logs[:, OFFSET]))),
+    rms_curvature_error=float(np.sqrt(np.mean(curvature_error ** 2))),
+    max_lat_accel_error=float(np.max(np.abs(curvature_error)) * speed ** 2),
+    at_limit=float(np.mean(np.abs(logs[active, STEER]) >= STEER_LIMIT)) if np.any(active) else 0.,
+    saturated_time=float(np.count_nonzero(logs[:, SATURATED]) * dt),
+    rms_steering_rate=float(np.sqrt(np.mean(logs[:, STEERING_RATE] ** 2))),
+    max_steering_rate=float(np.max(np.abs(logs[:, STEERING_RATE]))),
+    controller_us=float(np.mean(controller_us)),
+    controller_us_p99=float(np.percentile(controller_us, 99)),
+    planner_ms=float(np.mean(planner_times) * 1e3),
+    sim_time=sim_time,
+  )
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import math
+from collections import deque
+
+import numpy as np
+
+from cereal import car
+from common.realtime import DT_CTRL
+from selfdrive.controls.lib.vehicle_model import VehicleModel, kin_ss_sol
+from selfdrive.modeld.constants import T_IDXS
+
+ROAD_STEP = 0.5  # m between centerline points
+ROAD_LOOKAHEAD = 250.  # m of road past the end of the maneuver, the model path needs it
+STEER_BANDWIDTH = 2.0  # Hz, natural frequency of the steering rack
+STEER_DAMPING = 0.7
+ANGLE_TIME_CONSTANT = 0.1  # s, steering angle response of angle control cars
+KINEMATIC_SPEED = 1.0  # m/s, below this tire slip is undefined and the kinematic model is used
+
+
+class Road:
+  """Road centerline with a scripted curvature profile over distance. Same conventions as
+  the model frame: x forward, y to the right, positive curvature turns right."""
+
+  def __init__(self, length, curvature_bp, curvature_v):
+    self.s = np.arange(0., length + ROAD_STEP, ROAD_STEP)
+    self.curvature = np.interp(self.s, curvature_bp, curvature_v)
+    self.heading = np.concatenate(([0.], np.cumsum((self.curvature[1:] + self.curvature[:-1]) / 2 * ROAD_STEP)))
+    mid_heading = (self.heading[1:] + self.heading[:-1]) / 2
+    self.x = np.concatenate(([0.], np.cumsum(np.cos(mid_heading) * ROAD_STEP)))
+    self.y = np.concatenate(([0.], np.cumsum(np.sin(mid_heading) * ROAD_STEP)))
+    self.idx = 0
+
+  def project(self, x, y):
+    """Distance along the road, offset to the right of it and road heading at the point
+    closest to (x, y). Searches forward from the last projection, the car only moves a
+    fraction of ROAD_STEP per step."""
+    lo, hi = max(self.idx - 4, 0), min(self.idx + 40, len(self.s) - 1)
+    d = (self.x[lo:hi] - x) ** 2 + (self.y[lo:hi] - y) ** 2
+    self.idx = i = lo + int(np.argmin(d))
+
+    heading = self.heading[i]
+    dx, dy = x - self.x[i], y - self.y[i]
+    along = dx * math.cos(heading) + dy * math.sin(heading)
+    offset = -dx * math.sin(heading) + dy * math.cos(heading)
+    return self.s[i] + along, offset, heading + self.curvature[i] * along
+
+
+class LateralPlant:
+  """Dynamic bicycle model from VehicleModel driven by a steering rack, driving at constant
+  speed on a Road. Stepped at DT_CTRL in virtual time.
+
+  The rack has the car's steerActuatorDelay of dead time, then a second order response
+  towards the steering angle the command settles at. That angle comes from the car's own
+  tuning: the torque controller's lateral acceleration factor, the inverse of the default
+  PID feedforward, or maxLateralAccel for INDI. Angle control cars follow the commanded
+  angle with a first order lag."""
+
+  def __init__(self, CP, speed, road, initial_offset=0.):
+    self.CP = CP
+    self.VM = VehicleModel(CP)
+    self.speed = speed
+    self.road = road
+    self.angle_control = CP.steerControlType == car.CarParams.SteerControlType.angle
+
+    # pose in the road's frame
+    self.x, self.y, self.yaw = 0., initial_offset, 0.
+    # lateral speed and yaw rate, VehicleModel convention (left positive)
+    self.state = np.zeros(2)
+    self.steering_angle = 0.  # deg, steering wheel, left positive
+    self.steering_rate = 0.  # deg/s
+
+    self.commands = deque([0.] * max(int(round(CP.steerActuatorDelay / DT_CTRL)), 0))
+    self.frame = 0
+    self.s, self.offset, self.road_heading = road.project(self.x, self.y)
+
+  @property
+  def yaw_rate(self):
+    """Yaw rate [rad/s], positive turning right like the calibrated frame"""
+    return -float(self.state[1])
+
+  @property
+  def curvature(self):
+    return self.yaw_rate / max(self.speed, KINEMATIC_SPEED)
+
+  @property
+  def heading_error(self):
+    return self.yaw - self.road_heading
+
+  def current_time(self):
+    return self.frame * DT_CTRL
+
+  def steady_state_angle(self, steer):
+    """Steering wheel angle [deg] the rack settles at for a torque command"""
+    v = max(self.speed, KINEMATIC_SPEED)
+    tuning = self.CP.lateralTuning.which()
+    if tuning == 'pid' and self.CP.lateralTuning.pid.kf > 0:
+      return steer / (self.CP.lateralTuning.pid.kf * v ** 2)
+    elif tuning == 'torque':
+      lat_accel = steer / self.CP.lateralTuning.torque.kf
+    else:
+      lat_accel = steer * self.CP.maxLateralAccel
+    return math.degrees(self.VM.get_steer_from_curvature(lat_accel / v ** 2, v, 0.))
+
+  def step(self, steer, steering_angle_deg):
+    # actuator
+    self.commands.append(steering_angle_deg if self.angle_control else steer)
+    command = self.commands.popleft()
+    last_angle = self.steering_angle
+    if self.angle_control:
+      self.steering_angle += (command - self.steering_angle) * DT_CTRL / (ANGLE_TIME_CONSTANT + DT_CTRL)
+      self.steering_rate = (self.steering_angle - last_angle) / DT_CTRL
+    else:
+      w = 2 * math.pi * STEER_BANDWIDTH
+      accel = w ** 2 * (self.steady_state_angle(command) - self.steering_angle) - 2 * STEER_DAMPING * w * self.steering_rate
+      self.steering_rate += accel * DT_CTRL
+      self.steering_angle += self.steering_rate * DT_CTRL
+
+    # vehicle
+    sa = math.radians(self.steering_angle)
+    if self.speed > KINEMATIC_SPEED:
+      A, B, _ = self.VM.dyn_state_matrices(self.speed)
+      # implicit euler, the tire dynamics get stiff at low speed
+      self.state = np.linalg.solve(np.eye(2) - DT_CTRL * A, self.state + DT_CTRL * B[:, 0] * sa)
+    else:
+      self.state = kin_ss_sol(sa, self.speed, self.VM)[:, 0]
+
+    lateral_speed = -float(self.state[0])
+    yaw = self.yaw + self.yaw_rate * DT_CTRL / 2
+    self.x += (self.speed * math.cos(yaw) - lateral_speed * math.sin(yaw)) * DT_CTRL
+    self.y += (self.speed * math.sin(yaw) + lateral_speed * math.cos(yaw)) * DT_CTRL
+    self.yaw += self.yaw_rate * DT_CTRL
+    self.s, self.offset, self.road_heading = self.road.project(self.x, self.y)
+    self.frame += 1
+
+  def model_path(self):
+    """Road centerline ahead in the car's frame at the model's T_IDXS, the path a perfect
+    model would predict: x, y, z and yaw"""
+    t = np.array(T_IDXS)
+    s = self.s + self.speed * t
+    dx = np.interp(s, self.road.s, self.road.x) - self.x
+    dy = np.interp(s, self.road.s, self.road.y) - self.y
+    cos_yaw, sin_yaw = math.cos(self.yaw), math.sin(self.yaw)
+    x = dx * cos_yaw + dy * sin_yaw
+    y = -dx * sin_yaw + dy * cos_yaw
+    yaw = np.interp(s, self.road.s, self.road.heading) - self.yaw
+    return t, x, y, np.zeros_like(t), yaw
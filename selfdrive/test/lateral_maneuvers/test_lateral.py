@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+import unittest
+
+from selfdrive.test.lateral_maneuvers.batch import lateral_cars, maneuvers
+from selfdrive.test.lateral_maneuvers.maneuver import get_car, get_lat_controller
+
+MAX_OFFSET = 1.0  # m, stay inside the lane
+
+
+class TestLateralManeuvers(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    # one car for each lateral controller
+    cls.cars = {}
+    for car_name in lateral_cars():
+      controller, _ = get_lat_controller(*get_car(car_name))
+      cls.cars.setdefault(controller, car_name)
+
+  def test_maneuvers(self):
+    for controller, car_name in self.cars.items():
+      for maneuver in maneuvers:
+        with self.subTest(car=car_name, maneuver=maneuver.title):
+          m = maneuver.metrics(car_name)
+          if m.active < 1.:
+            continue
+          self.assertLess(m.max_offset, MAX_OFFSET)
+
+
+if __name__ == "__main__":
+  unittest.main()
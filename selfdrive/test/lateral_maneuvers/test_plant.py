@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import math
+import unittest
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+
+from selfdrive.controls.lib.vehicle_model import VehicleModel
+from selfdrive.test.lateral_maneuvers.plant import LateralPlant, Road
+
+
+def car_params(controller='torque'):
+  # CIVIC_BOSCH like
+  lateral_tuning = SimpleNamespace(which=lambda: controller, torque=SimpleNamespace(kf=1 / 2.5),
+                                   pid=SimpleNamespace(kf=0.00006))
+  return SimpleNamespace(mass=1326. + 136., rotationalInertia=2500., wheelbase=2.7, centerToFront=2.7 * 0.4,
+                         steerRatio=15.38, steerRatioRear=0., tireStiffnessFront=192150., tireStiffnessRear=202500.,
+                         steerActuatorDelay=0.1, steerControlType=None, lateralTuning=lateral_tuning,
+                         maxLateralAccel=2.5)
+
+
+class TestLateralPlant(unittest.TestCase):
+  def test_road(self):
+    radius = 200.
+    road = Road(400., [0.], [1 / radius])
+    # constant curvature to the right is a circle centered to the right of the start
+    np.testing.assert_allclose(np.hypot(road.x, road.y - radius), radius, atol=1e-3)
+    s, offset, heading = road.project(road.x[20], road.y[20] + 0.5)
+    self.assertAlmostEqual(s, road.s[20] + 0.5 * math.sin(road.heading[20]), delta=0.01)
+    self.assertAlmostEqual(offset, 0.5 * math.cos(road.heading[20]), delta=0.01)
+    self.assertAlmostEqual(heading, road.heading[20], delta=1e-3)
+
+  def test_steady_state(self):
+    # a constant torque settles at the curvature the tuning maps it to
+    for controller in ('torque', 'pid', 'indi'):
+      CP = car_params(controller)
+      plant = LateralPlant(CP, 20., Road(1000., [0.], [0.]))
+      for _ in range(500):
+        plant.step(0.2, 0.)
+
+      angle = plant.steady_state_angle(0.2)
+      self.assertAlmostEqual(plant.steering_angle, angle, delta=0.01)
+      self.assertAlmostEqual(plant.steering_rate, 0., delta=0.01)
+      expected = -VehicleModel(CP).calc_curvature(math.radians(angle), 20., 0.)
+      self.assertAlmostEqual(plant.curvature, expected, delta=1e-6)
+      if controller == 'torque':
+        self.assertAlmostEqual(-plant.curvature * 20. ** 2, 0.2 * 2.5, delta=1e-3)
+
+  def test_follows_road(self):
+    # steering at the road's curvature keeps the offset
+    CP = car_params()
+    radius = 150.
+    plant = LateralPlant(CP, 15., Road(1000., [0.], [1 / radius]))
+    VM = VehicleModel(CP)
+    sa = VM.get_steer_from_curvature(-1 / radius, 15., 0.)
+    torque = -15. ** 2 / radius / 2.5
+    self.assertAlmostEqual(plant.steady_state_angle(torque), math.degrees(sa), delta=1e-6)
+
+    # start in the steady state turn
+    plant.steering_angle = math.degrees(sa)
+    plant.state = VM.steady_state_sol(sa, 15., 0.)[:, 0]
+    plant.commands = deque([torque] * len(plant.commands))
+    # heading off the road by the sideslip, so the car moves along it
+    slip = math.atan2(plant.state[0], 15.)
+    plant.yaw = slip
+    for _ in range(1000):
+      plant.step(torque, 0.)
+    self.assertLess(abs(plant.offset), 0.05)
+    self.assertAlmostEqual(plant.heading_error, slip, delta=1e-3)
+
+  def test_model_path(self):
+    plant = LateralPlant(car_params(), 20., Road(1000., [0.], [0.]), initial_offset=0.5)
+    t, x, y, z, yaw = plant.model_path()
+    np.testing.assert_allclose(x, 20. * t)
+    # the road is to the left of the car
+    np.testing.assert_allclose(y, -0.5)
+    np.testing.assert_allclose(yaw, 0.)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from typing import Iterable, Iterator, List
+
+from selfdrive.test.longitudinal_maneuvers.maneuver import Maneuver
+from selfdrive.test.longitudinal_maneuvers.metrics import ManeuverMetrics
+
+MATRIX_SPEEDS = [10., 20., 30.]  # m/s
+MATRIX_LEAD_DECELS = [1., 2., 3., 4.]  # m/s^2
+MATRIX_DISTANCES = [20., 35., 50.]  # m
+MATRIX_HOLD = 5.  # s of steady following before the lead brakes
+MATRIX_STOPPED = 10.  # s behind the stopped lead
+
+
+def scenario_matrix(speeds: Iterable[float] = MATRIX_SPEEDS, lead_decels: Iterable[float] = MATRIX_LEAD_DECELS,
+                    distances: Iterable[float] = MATRIX_DISTANCES) -> Iterator[Maneuver]:
+  """Following a lead at speed, which then brakes to a stop, for every combination"""
+  for speed, decel, distance in itertools.product(speeds, lead_decels, distances):
+    stop_time = MATRIX_HOLD + speed / decel
+    yield Maneuver(
+      f'following at {speed:.0f}m/s, {distance:.0f}m, lead decel to 0mph at {decel:.0f}m/s^2',
+      duration=stop_time + MATRIX_STOPPED,
+      initial_speed=speed,
+      lead_relevancy=True,
+      initial_distance_lead=distance,
+      speed_lead_values=[speed, speed, 0.],
+      breakpoints=[0., MATRIX_HOLD, stop_time],
+    )
+
+
+def run_maneuver(maneuver: Maneuver) -> ManeuverMetrics:
+  return maneuver.metrics()
+
+
+def run_maneuvers(maneuvers: List[Maneuver], workers: int = 0) -> List[ManeuverMetrics]:
+  """Runs each maneuver in its own planner, across worker processes. Results are in the
+  order of maneuvers."""
+  os.environ['SIMULATION'] = "1"
+  if workers == 1:
+    return [run_maneuver(m) for m in maneuvers]
+
+  # maneuvers take very different times, hand them out one at a time
+  with multiprocessing.Pool(workers or None) as pool:
+    return pool.map(run_maneuver, maneuvers, chunksize=1)
+
+
+def fmt(v, spec=".1f"):
+  return "-" if v is None else format(v, spec)
+
+
+def print_metrics(results: List[ManeuverMetrics]) -> None:
+  print(f"{'':<4} {'min gap':>8} {'end gap':>8} {'decel':>6} {'jerk':>6} {'fcw':>4} {'start':>6} {'sim':>6}  maneuver")
+  for r in results:
+    print(f"{'ok' if r.valid else 'FAIL':<4} {fmt(r.min_gap):>8} {fmt(r.final_gap):>8} {fmt(r.max_decel):>6} "
+          f"{fmt(r.max_jerk):>6} {r.fcw_events:>4} {fmt(r.time_to_start):>6} {fmt(r.sim_time, '.2f'):>6}  {r.title}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Run longitudinal maneuvers faster than real time, in parallel")
+  parser.add_argument("--suite", choices=["tests", "matrix"], default="tests",
+                      help="the maneuvers from test_longitudinal, or the speed x lead decel x distance matrix")
+  parser.add_argument("--workers", type=int, default=0, help="worker processes, default one per core")
+  parser.add_argument("--json", help="write the metrics to this file")
+  args = parser.parse_args()
+
+  if args.suite == "tests":
+    from selfdrive.test.longitudinal_maneuvers.test_longitudinal import maneuvers
+  else:
+    maneuvers = list(scenario_matrix())
+
+  t = time.monotonic()
+  results = run_maneuvers(maneuvers, args.workers)
+  wall_time = time.monotonic() - t
+
+  print_metrics(results)
+  sim_duration = sum(r.duration for r in results)
+  print(f"\n{len(results)} maneuvers, {sum(not r.valid for r in results)} failed, "
+        f"{sim_duration:.0f}s simulated in {wall_time:.1f}s ({sim_duration / wall_time:.0f}x real time)")
+
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump([r._asdict() for r in results], f, indent=2)
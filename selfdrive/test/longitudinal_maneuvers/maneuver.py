@@ -1,4 +1,7 @@
+import time
+
 import numpy as np
+from selfdrive.test.longitudinal_maneuvers.metrics import ManeuverMetrics, maneuver_metrics
 from selfdrive.test.longitudinal_maneuvers.plant import Plant
 
 
@@ -21,13 +24,14 @@ class Maneuver():
     self.duration = duration
     self.title = title
 
-  def evaluate(self):
+  def evaluate(self, verbose=True):
     plant = Plant(
       lead_relevancy=self.lead_relevancy,
       speed=self.speed,
       distance_lead=self.distance_lead,
       only_lead2=self.only_lead2,
-      only_radar=self.only_radar
+      only_radar=self.only_radar,
+      verbose=verbose,
     )
 
     valid = True
@@ -47,15 +51,24 @@ class Maneuver():
                             log['distance_lead'],
                             log['speed'],
                             speed_lead,
-                            log['acceleration']]))
+                            log['acceleration'],
+                            log['fcw']]))
 
       if d_rel < .4 and (self.only_radar or prob > 0.5):
-        print("Crashed!!!!")
+        if verbose:
+          print("Crashed!!!!")
         valid = False
 
       if self.ensure_start and log['v_rel'] > 0 and log['speeds'][-1] <= 0.1:
-        print('Planner not starting!')
+        if verbose:
+          print('Planner not starting!')
         valid = False
 
-    print("maneuver end", valid)
+    if verbose:
+      print("maneuver end", valid)
     return valid, np.array(logs)
+
+  def metrics(self) -> ManeuverMetrics:
+    t = time.monotonic()
+    valid, logs = self.evaluate(verbose=False)
+    return maneuver_metrics(self.title, valid, logs, bool(self.lead_relevancy), sim_time=time.monotonic() - t)
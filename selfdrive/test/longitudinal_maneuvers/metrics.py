@@ -0,0 +1,62 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from common.realtime import DT_MDL
+
+# columns of the logs Maneuver.evaluate returns
+T, DISTANCE, DISTANCE_LEAD, SPEED, SPEED_LEAD, ACCELERATION, FCW = range(7)
+
+START_SPEED = 0.5  # m/s, ego counts as started above this
+LEAD_START_SPEED = 0.1  # m/s
+
+
+class ManeuverMetrics(NamedTuple):
+  title: str
+  valid: bool
+  duration: float
+  min_gap: Optional[float]  # m, None without a relevant lead
+  final_gap: Optional[float]
+  final_speed: float
+  max_accel: float
+  max_decel: float
+  max_jerk: float  # m/s^3, of the planned acceleration
+  fcw_events: int
+  time_to_start: Optional[float]  # s from the lead pulling away until ego follows, None if the lead never stops and goes
+  sim_time: float = 0.  # s of wall time the simulation took
+
+
+def maneuver_metrics(title: str, valid: bool, logs: np.ndarray, lead_relevancy: bool, sim_time: float = 0.) -> ManeuverMetrics:
+  accel = logs[:, ACCELERATION]
+  jerk = np.abs(np.diff(accel)) / DT_MDL if len(accel) > 1 else np.zeros(1)
+  gap = logs[:, DISTANCE_LEAD] - logs[:, DISTANCE]
+
+  # count every time FCW turns on
+  fcw = logs[:, FCW] > 0
+  fcw_events = int(np.count_nonzero(fcw[1:] & ~fcw[:-1]) + (fcw[0] if len(fcw) else 0))
+
+  # after standing still behind a stopped lead, how long until ego follows it
+  time_to_start = None
+  stopped = (logs[:, SPEED] < START_SPEED) & (logs[:, SPEED_LEAD] < LEAD_START_SPEED)
+  if lead_relevancy and np.any(stopped):
+    after = np.argmax(stopped)
+    lead_moving = np.nonzero(logs[after:, SPEED_LEAD] >= LEAD_START_SPEED)[0]
+    if len(lead_moving):
+      lead_start = after + lead_moving[0]
+      ego_moving = np.nonzero(logs[lead_start:, SPEED] >= START_SPEED)[0]
+      time_to_start = float(logs[lead_start + ego_moving[0], T] - logs[lead_start, T]) if len(ego_moving) else float('inf')
+
+  return ManeuverMetrics(
+    title=title,
+    valid=valid,
+    duration=float(logs[-1, T]) if len(logs) else 0.,
+    min_gap=float(np.min(gap)) if lead_relevancy else None,
+    final_gap=float(gap[-1]) if lead_relevancy else None,
+    final_speed=float(logs[-1, SPEED]),
+    max_accel=float(max(np.max(accel), 0.)),
+    max_decel=float(max(-np.min(accel), 0.)),
+    max_jerk=float(np.max(jerk)),
+    fcw_events=fcw_events,
+    time_to_start=time_to_start,
+    sim_time=sim_time,
+  )
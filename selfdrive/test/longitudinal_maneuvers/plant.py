@@ -1,27 +1,22 @@
 #!/usr/bin/env python3
-import time
 import numpy as np
 
 from cereal import log
 import cereal.messaging as messaging
-from common.realtime import Ratekeeper, DT_MDL
+from common.realtime import DT_MDL
 from selfdrive.controls.lib.longcontrol import LongCtrlState
 from selfdrive.controls.lib.longitudinal_planner import Planner
 
 
 class Plant():
-  messaging_initialized = False
+  """Ego car and lead car stepped together with the longitudinal planner in virtual
+  time, DT_MDL per step. The planner is called directly, no sockets and no sleeping,
+  so a maneuver runs as fast as the MPC solves."""
 
   def __init__(self, lead_relevancy=False, speed=0.0, distance_lead=2.0,
-               only_lead2=False, only_radar=False):
+               only_lead2=False, only_radar=False, verbose=True):
     self.rate = 1. / DT_MDL
-
-    if not Plant.messaging_initialized:
-      Plant.radar = messaging.pub_sock('radarState')
-      Plant.controls_state = messaging.pub_sock('controlsState')
-      Plant.car_state = messaging.pub_sock('carState')
-      Plant.plan = messaging.sub_sock('longitudinalPlan')
-      Plant.messaging_initialized = True
+    self.verbose = verbose
 
     self.v_lead_prev = 0.0
 
@@ -36,17 +31,15 @@ class Plant():
     self.only_lead2=only_lead2
     self.only_radar=only_radar
 
-    self.rk = Ratekeeper(self.rate, print_delay_threshold=100.0)
+    self.frame = 0
     self.ts = 1. / self.rate
-    time.sleep(1)
-    self.sm = messaging.SubMaster(['longitudinalPlan'])
 
     from selfdrive.car.honda.values import CAR
     from selfdrive.car.honda.interface import CarInterface
     self.planner = Planner(CarInterface.get_params(CAR.CIVIC), init_v=self.speed)
 
   def current_time(self):
-    return float(self.rk.frame) / self.rate
+    return float(self.frame) / self.rate
 
   def step(self, v_lead=0.0, prob=1.0, v_cruise=50.):
     # ******** publish a fake model going straight and fake calibration ********
@@ -119,13 +112,13 @@ class Plant():
       v_rel = 0.
 
     # print at 5hz
-    if (self.rk.frame % (self.rate // 5)) == 0:
+    if self.verbose and (self.frame % (self.rate // 5)) == 0:
       print("%2.2f sec   %6.2f m  %6.2f m/s  %6.2f m/s2   lead_rel: %6.2f m  %6.2f m/s"
             % (self.current_time(), self.distance, self.speed, self.acceleration, d_rel, v_rel))
 
 
     # ******** update prevs ********
-    self.rk.monitor_time()
+    self.frame += 1
 
     return {
       "distance": self.distance,
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import unittest
+
+import numpy as np
+
+from common.realtime import DT_MDL
+from selfdrive.test.longitudinal_maneuvers.metrics import maneuver_metrics
+
+
+def synthetic_logs(speed_lead, accel, distance_lead=30., fcw=None):
+  # ego follows the given acceleration profile, columns like Maneuver.evaluate
+  n = len(speed_lead)
+  t = np.arange(n) * DT_MDL
+  speed = np.maximum(np.cumsum(accel) * DT_MDL, 0.)
+  distance = np.cumsum(speed) * DT_MDL
+  d_lead = distance_lead + np.cumsum(speed_lead) * DT_MDL
+  fcw = np.zeros(n) if fcw is None else fcw
+  return np.column_stack((t, distance, d_lead, speed, speed_lead, accel, fcw))
+
+
+class TestManeuverMetrics(unittest.TestCase):
+  def test_resume_from_stop(self):
+    n = 400
+    speed_lead = np.interp(np.arange(n) * DT_MDL, [0., 10., 15.], [0., 0., 2.])
+    # lead passes 0.1m/s at 10.25s, ego 0.5m/s at 11.5s
+    accel = np.where(np.arange(n) * DT_MDL >= 11., 1., 0.)
+    fcw = np.zeros(n)
+    fcw[50:55] = 1.
+    fcw[100] = 1.
+
+    m = maneuver_metrics("resume", True, synthetic_logs(speed_lead, accel, fcw=fcw), True, sim_time=0.5)
+    self.assertAlmostEqual(m.time_to_start, 1.25, delta=DT_MDL)
+    self.assertEqual(m.fcw_events, 2)
+    self.assertEqual(m.max_accel, 1.)
+    self.assertEqual(m.max_decel, 0.)
+    self.assertAlmostEqual(m.max_jerk, 1. / DT_MDL)
+    self.assertAlmostEqual(m.duration, (n - 1) * DT_MDL)
+    self.assertEqual(m.sim_time, 0.5)
+
+  def test_never_starts(self):
+    n = 200
+    speed_lead = np.interp(np.arange(n) * DT_MDL, [0., 5., 8.], [0., 0., 2.])
+    m = maneuver_metrics("stuck", False, synthetic_logs(speed_lead, np.zeros(n)), True)
+    self.assertEqual(m.time_to_start, float('inf'))
+    self.assertAlmostEqual(m.min_gap, 30.)
+    self.assertFalse(m.valid)
+
+  def test_braking(self):
+    n = 300
+    speed_lead = np.full(n, 20.)
+    accel = np.where(np.arange(n) < 100, 0., -2.)
+    logs = synthetic_logs(speed_lead, accel)
+    logs[:, 3] += 20.  # ego starts at lead speed
+    m = maneuver_metrics("brake", True, logs, True)
+    self.assertEqual(m.max_decel, 2.)
+    self.assertIsNone(m.time_to_start)
+    self.assertEqual(m.fcw_events, 0)
+
+  def test_no_lead(self):
+    n = 50
+    m = maneuver_metrics("cruise", True, synthetic_logs(np.zeros(n), np.full(n, 0.5)), False)
+    self.assertIsNone(m.min_gap)
+    self.assertIsNone(m.final_gap)
+    self.assertIsNone(m.time_to_start)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from selfdrive.athena import athenad
+from selfdrive.athena.tests.helpers import with_http_server
+
+
+@with_http_server
+def benchmark(n_items, n_workers, host):
+  for i in range(n_items):
+    fn = os.path.join(athenad.ROOT, f'qlog{i}')
+    Path(fn).touch()
+    athenad.upload_queue.put_nowait(athenad.UploadItem(path=fn, url=f"{host}/qlog{i}", headers={},
+                                                       created_at=int(time.time()*1000), id=f'id{i}', allow_cellular=True))
+
+  end_event = threading.Event()
+  threads = [threading.Thread(target=athenad.upload_handler, args=(end_event,)) for _ in range(n_workers)]
+  start = time.monotonic()
+  for t in threads:
+    t.start()
+  try:
+    while athenad.upload_queue.qsize() or any(i is not None for i in athenad.cur_upload_items.values()):
+      time.sleep(0.001)
+    return time.monotonic() - start
+  finally:
+    end_event.set()
+    for t in threads:
+      t.join()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Upload throughput of athenad's upload workers against a local server")
+  parser.add_argument("-n", type=int, default=100, help="files to upload")
+  parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+  args = parser.parse_args()
+
+  athenad.ROOT = tempfile.mkdtemp()
+  try:
+    print(f"{'workers':>8} {'uploads/s':>10}")
+    for n_workers in args.workers:
+      athenad.cur_upload_items.clear()
+      dt = benchmark(args.n, n_workers)
+      print(f"{n_workers:>8} {args.n / dt:>10.1f}")
+  finally:
+    shutil.rmtree(athenad.ROOT)
+
+
+if __name__ == "__main__":
+  main()
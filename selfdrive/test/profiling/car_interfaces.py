@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from cereal import car
+from selfdrive.boardd.boardd import can_list_to_can_capnp
+from selfdrive.car.car_helpers import interfaces
+from selfdrive.car.fingerprints import _FINGERPRINTS as FINGERPRINTS, all_known_cars
+
+
+PERIODS = (1, 2, 5, 10, 100)  # frames between messages of an address, 100Hz to 1Hz
+
+
+def get_can_strings(fingerprint, frames, drop, seed=0):
+  # one can packet per 10ms frame with the fingerprinted addresses that are due on the first three buses,
+  # a counter in the data so values change, and a share of frames where boardd delivered nothing
+  rng = np.random.default_rng(seed)
+  can_strings = []
+  for frame in range(frames):
+    if rng.random() < drop:
+      can_strings.append([])
+      continue
+    msgs = [[addr, 0, bytes([frame % 256]) * length, bus] for i, (addr, length) in enumerate(sorted(fingerprint.items()))
+            if frame % PERIODS[i % len(PERIODS)] == 0 for bus in (0, 1, 2)]
+    can_strings.append([can_list_to_can_capnp(msgs)])
+  return can_strings
+
+
+def benchmark_car(car_name, frames, drop):
+  fingerprint = FINGERPRINTS[car_name][0] if car_name in FINGERPRINTS else {}
+  CarInterface, CarController, CarState = interfaces[car_name]
+  car_params = CarInterface.get_params(car_name, {i: fingerprint for i in range(3)}, [])
+  CI = CarInterface(car_params, CarController, CarState)
+
+  CC = car.CarControl.new_message()
+  update_times, changed, updated = [], 0, 0
+  for can_strings in get_can_strings(fingerprint, frames, drop):
+    t = time.perf_counter()
+    CI.update(CC, can_strings)
+    update_times.append(time.perf_counter() - t)
+    changed += CI.can_changed()
+    updated += sum(len(addrs) for addrs in CI.can_updated)
+  return car_params.carName, np.array(update_times) * 1e6, changed / frames, updated / frames
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Per-brand CarInterface.update timing")
+  parser.add_argument("--frames", type=int, default=1000)
+  parser.add_argument("--brand", help="only benchmark cars of this brand")
+  parser.add_argument("--drop", type=float, default=0.1, help="share of frames without any CAN")
+  args = parser.parse_args()
+
+  results = defaultdict(list)
+  for car_name in sorted(all_known_cars()):
+    if args.brand is not None and not interfaces[car_name][0].__module__.startswith(f"selfdrive.car.{args.brand}."):
+      continue
+    brand, times, changed, updated = benchmark_car(car_name, args.frames, args.drop)
+    results[brand].append((times, changed, updated))
+
+  # changed: frames any parser got new values in, updated: addresses with new values per frame
+  print(f"{'brand':<12} {'cars':>4} {'mean us':>9} {'p50 us':>9} {'p99 us':>9} {'changed':>8} {'updated':>8}")
+  for brand, cars in sorted(results.items()):
+    times = np.concatenate([t for t, _, _ in cars])
+    changed = np.mean([c for _, c, _ in cars])
+    updated = np.mean([u for _, _, u in cars])
+    print(f"{brand:<12} {len(cars):>4} {np.mean(times):9.1f} {np.percentile(times, 50):9.1f} "
+          f"{np.percentile(times, 99):9.1f} {changed:8.1%} {updated:8.1f}")
+
+
+if __name__ == "__main__":
+  main()
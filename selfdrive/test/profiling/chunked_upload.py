@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import argparse
+import bz2
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import selfdrive.loggerd.chunked_upload as chunked_upload
+from selfdrive.loggerd.chunked_upload import UploadStats, upload_file
+from selfdrive.loggerd.tests.test_chunked_upload import BlobServer
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Memory and throughput of chunked uploads to a local blob server")
+  parser.add_argument("--size", type=int, default=64, help="file size in MB")
+  parser.add_argument("--chunk-size", type=int, default=chunked_upload.CHUNK_SIZE)
+  parser.add_argument("--drop-every", type=int, default=0, help="drop the connection on every nth block")
+  parser.add_argument("--compress", action="store_true")
+  args = parser.parse_args()
+
+  chunked_upload.RETRY_DELAY = 0
+  server = BlobServer()
+  server.drop_every = args.drop_every
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  tmp = tempfile.mkdtemp()
+  try:
+    fn = os.path.join(tmp, "rlog")
+    with open(fn, "wb") as f:
+      f.write(os.urandom(args.size * 1024 * 1024 // 2) + bytes(args.size * 1024 * 1024 // 2))
+
+    # bzip2 needs a fixed working buffer regardless of input size
+    tracemalloc.start()
+    bz2.compress(b'\0')
+    _, bz2_workspace = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    stats = UploadStats()
+    t = time.monotonic()
+    resp = upload_file(f"{server.url}/rlog?sig=abc", {}, fn, compress=args.compress, chunk_size=args.chunk_size, stats=stats)
+    dt = time.monotonic() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # not counting what the stand-in server keeps
+    peak -= sum(len(b) for b in server.blocks['/rlog'].values()) + len(server.blobs.get('/rlog', b''))
+
+    print(f"status {resp.status_code}, {args.size} MB in {dt:.2f} s, {args.size / dt:.1f} MB/s")
+    print(f"peak memory {(peak - bz2_workspace) / 1024:.0f} kB + {bz2_workspace / 1024:.0f} kB bzip2 workspace")
+    print(f"sent {stats.bytes_sent} bytes in {stats.chunks_sent} chunks, retransmitted {stats.retransmitted_bytes} bytes")
+  finally:
+    server.shutdown()
+    shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import argparse
+import threading
+import time
+
+import numpy as np
+import zmq
+
+import common.logging_extra as logging_extra
+from common.logging_extra import SwagFormatter
+from system.swaglog import SWAGLOG_IPC, UnixDomainSocketHandler, cloudlog
+
+
+def drain(sock, stop):
+  # stand-in for logmessaged
+  received = 0
+  while not stop.is_set():
+    if sock.poll(10):
+      received += len(sock.recv_multipart())
+  return received
+
+
+def benchmark(background, n, rate):
+  for h in [h for h in cloudlog.handlers if isinstance(h, UnixDomainSocketHandler)]:
+    cloudlog.removeHandler(h)
+  handler = UnixDomainSocketHandler(SwagFormatter(cloudlog), background=background)
+  cloudlog.addHandler(handler)
+
+  latencies = {'event': [], 'timestamp': []}
+  for i in range(n):
+    t = time.perf_counter()
+    cloudlog.event("benchmark", frame=i, values=[1.0, 2.0, 3.0])
+    t2 = time.perf_counter()
+    cloudlog.timestamp("benchmark")
+    t3 = time.perf_counter()
+    latencies['event'].append(t2 - t)
+    latencies['timestamp'].append(t3 - t2)
+    # realtime loop
+    time.sleep(max(0., 1. / rate - (t3 - t)))
+  handler.flush()
+  return latencies
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Caller side latency of cloudlog from a realtime loop")
+  parser.add_argument("-n", type=int, default=2000)
+  parser.add_argument("--rate", type=float, default=100., help="loop rate in Hz")
+  args = parser.parse_args()
+
+  logging_extra.LOG_TIMESTAMPS = True
+
+  ctx = zmq.Context()
+  sock = ctx.socket(zmq.PULL)
+  sock.bind(SWAGLOG_IPC)
+  stop = threading.Event()
+  threading.Thread(target=drain, args=(sock, stop), daemon=True).start()
+
+  for name, background in (("synchronous send", False), ("background send", True)):
+    latencies = benchmark(background, args.n, args.rate)
+    for fn, times in latencies.items():
+      us = np.array(times) * 1e6
+      print(f"{name:>16} cloudlog.{fn:<9}: median {np.median(us):6.1f} us, p99 {np.percentile(us, 99):6.1f} us, max {np.max(us):7.1f} us")
+  stop.set()
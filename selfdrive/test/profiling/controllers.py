@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import argparse
+import math
+import time
+
+import numpy as np
+
+import cereal.messaging as messaging
+from cereal import car
+from selfdrive.car.fingerprints import all_known_cars
+from selfdrive.controls.lib.drive_helpers import CONTROL_N
+from selfdrive.controls.lib.longcontrol import LongControl
+from selfdrive.controls.lib.vehicle_model import VehicleModel
+from selfdrive.modeld.constants import T_IDXS
+from selfdrive.test.lateral_maneuvers.maneuver import get_car, get_lat_controller
+
+
+def car_states(frames):
+  # speed sweeping through every gain breakpoint, steering back and forth
+  states = []
+  for i in range(frames):
+    CS = car.CarState.new_message()
+    CS.vEgo = 15. + 14. * math.sin(i / 300.)
+    CS.aEgo = math.cos(i / 300.)
+    CS.steeringAngleDeg = 10. * math.sin(i / 50.)
+    CS.steeringRateDeg = math.cos(i / 50.) / 5.
+    states.append(CS)
+  return states
+
+
+def benchmark_lateral(car_name, states):
+  CP, CI = get_car(car_name)
+  controller, LaC = get_lat_controller(CP, CI)
+  VM = VehicleModel(CP)
+  params = messaging.new_message('liveParameters').liveParameters
+  llk = messaging.new_message('liveLocationKalman').liveLocationKalman
+  llk.angularVelocityCalibrated.value = [0., 0., 0.01]
+  last_actuators = car.CarControl.new_message().actuators
+
+  times = []
+  for i, CS in enumerate(states):
+    curvature = 0.002 * math.sin(i / 40.)
+    t = time.perf_counter()
+    last_actuators.steer, last_actuators.steeringAngleDeg, _ = LaC.update(True, CS, VM, params, last_actuators,
+                                                                          curvature, 0., llk)
+    times.append(time.perf_counter() - t)
+  return controller, np.array(times) * 1e6
+
+
+def benchmark_longitudinal(car_name, states):
+  CP, _ = get_car(car_name)
+  LoC = LongControl(CP)
+  plan = messaging.new_message('longitudinalPlan').longitudinalPlan
+  plan.accels = [0.5] * CONTROL_N
+
+  times = []
+  for CS in states:
+    plan.speeds = [CS.vEgo + 0.5 * t for t in T_IDXS[:CONTROL_N]]
+    t = time.perf_counter()
+    LoC.update(True, CS, plan, [-3.5, 2.0], 0.02)
+    times.append(time.perf_counter() - t)
+  return np.array(times) * 1e6
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Per-update cost of the lateral and longitudinal controllers")
+  parser.add_argument("--frames", type=int, default=3000)
+  parser.add_argument("--cars", type=int, default=3, help="cars to benchmark per controller")
+  args = parser.parse_args()
+
+  states = car_states(args.frames)
+  lateral, longitudinal = {}, []
+  for car_name in sorted(all_known_cars()):
+    CP, CI = get_car(car_name)
+    if CP.notCar:
+      continue
+    controller, _ = get_lat_controller(CP, CI)
+    if len(lateral.setdefault(controller, [])) < args.cars:
+      lateral[controller].append(benchmark_lateral(car_name, states)[1])
+    if len(longitudinal) < args.cars:
+      longitudinal.append(benchmark_longitudinal(car_name, states))
+
+  print(f"{'controller':<12} {'cars':>4} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+  for name, runs in sorted(lateral.items()) + [("long", longitudinal)]:
+    times = np.concatenate(runs)
+    print(f"{name:<12} {len(runs):>4} {np.mean(times):9.1f} {np.percentile(times, 50):9.1f} {np.percentile(times, 99):9.1f}")
+
+
+if __name__ == "__main__":
+  main()
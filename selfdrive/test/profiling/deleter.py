@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import selfdrive.loggerd.deletion_planner as deletion_planner
+from selfdrive.loggerd.deletion_planner import BATCH_SIZE, DeletionPlanner, bytes_needed
+from selfdrive.loggerd.deleter import DELETE_LAST
+from selfdrive.loggerd.tests.test_deleter import Stats
+
+SEG_FORMAT = "2019-04-18--12-52-54--{}"
+MIN_BYTES = 1024 * 1024 * 1024
+BLOCK_SIZE = 4096
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Time and root scans for the deleter to free space in a large log root")
+  parser.add_argument("-n", type=int, default=2000, help="segments in the root")
+  parser.add_argument("--short", type=int, default=300, help="segments worth of space to free")
+  parser.add_argument("--seg-kb", type=int, default=16)
+  args = parser.parse_args()
+
+  root = tempfile.mkdtemp()
+  try:
+    for i in range(args.n):
+      os.mkdir(os.path.join(root, SEG_FORMAT.format(i)))
+      with open(os.path.join(root, SEG_FORMAT.format(i), "fcamera.hevc"), "wb") as f:
+        f.write(os.urandom(args.seg_kb * 1024))
+
+    # the disk is short by `short` segments, refilled as they are deleted
+    planner = DeletionPlanner(root, DELETE_LAST)
+    short = args.short * args.seg_kb * 1024
+    deletion_planner.os.statvfs = lambda d: Stats(f_bavail=(MIN_BYTES - short + planner.deleted_bytes) // BLOCK_SIZE,
+                                                  f_blocks=10**6, f_frsize=BLOCK_SIZE)
+
+    t = time.monotonic()
+    while (needed := bytes_needed(root, MIN_BYTES, 0)) > 0:
+      for seg in planner.plan(needed)[:BATCH_SIZE]:
+        planner.delete(seg)
+    dt = time.monotonic() - t
+
+    print(f"freed {planner.deleted_bytes / 1024 / 1024:.1f} MB in {dt:.2f} s, deleted {planner.deleted} of {args.n} segments, "
+          f"{planner.scans} root scans")
+  finally:
+    shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+  main()
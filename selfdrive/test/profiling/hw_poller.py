@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import selfdrive.thermald.thermald as thermald
+from selfdrive.thermald.hw_poller import HardwarePoller
+from selfdrive.thermald.tests.test_hw_poller import ZONES
+from system.hardware.sysfs import SysfsReader
+
+
+def make_sysfs(root):
+  for i, zone in enumerate(ZONES):
+    d = os.path.join(root, f"sys/devices/virtual/thermal/thermal_zone{i}")
+    os.makedirs(d)
+    with open(os.path.join(d, "type"), "w") as f:
+      f.write(zone + "\n")
+    with open(os.path.join(d, "temp"), "w") as f:
+      f.write(f"{40000 + i}\n")
+
+
+def cycle_cost(n):
+  def read_all():
+    return [thermald.read_tz(z) for z in ZONES]
+
+  def read_all_reopen():
+    ret = []
+    for z in ZONES:
+      with open(f"{thermald.sysfs.root}{thermald.THERMAL_ROOT}/thermal_zone{thermald.tz_by_type[z]}/temp") as f:
+        ret.append(int(f.read()))
+    return ret
+
+  read_all()
+  for name, fn in (("open per read", read_all_reopen), ("persistent fds", read_all)):
+    t = time.thread_time()
+    for _ in range(n):
+      fn()
+    print(f"{name:>15}: {(time.thread_time() - t) / n * 1e6:.0f} us cpu per cycle of {len(ZONES)} zones")
+
+
+def poller_cost(duration):
+  poller = HardwarePoller()
+  poller.add("true", lambda: subprocess.check_output(["true"]), interval=0.5, timeout=1.)
+  poller.add("sleep", lambda: subprocess.check_output(["sleep", "30"]), interval=0.5, timeout=0.3)
+
+  t = time.thread_time()
+  steps = 0
+  end = time.monotonic() + duration
+  while time.monotonic() < end:
+    poller.step()
+    steps += 1
+    time.sleep(0.05)
+  print(f"poller step {(time.thread_time() - t) / steps * 1e6:.0f} us cpu, probe runs " +
+        ", ".join(f"{p.name}: {p.runs} ({p.cpu_time * 1e3:.1f} ms cpu, {p.timeouts} timeouts)" for p in poller.probes.values()))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="CPU cost of thermal zone reads and of the hardware poller loop")
+  parser.add_argument("-n", type=int, default=500, help="read cycles")
+  parser.add_argument("--duration", type=float, default=3., help="seconds to run the poller")
+  parser.add_argument("--fake-sysfs", action="store_true", help="read from a fake sysfs instead of the device's")
+  args = parser.parse_args()
+
+  tmp = tempfile.mkdtemp()
+  try:
+    if args.fake_sysfs:
+      make_sysfs(tmp)
+      thermald.sysfs = SysfsReader(root=tmp)
+    cycle_cost(args.n)
+    poller_cost(args.duration)
+  finally:
+    shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+  main()
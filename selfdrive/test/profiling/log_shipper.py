@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from selfdrive.athena.log_shipper import LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME, LogShipper
+from selfdrive.athena.tests.test_log_shipper import WebsocketStandIn
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Delivery latency and CPU of swaglog shipping for newly rotated logs")
+  parser.add_argument("-n", type=int, default=100, help="log files to rotate")
+  parser.add_argument("--rtt", type=float, default=0.01, help="round trip time of the websocket stand-in")
+  args = parser.parse_args()
+
+  log_dir = tempfile.mkdtemp()
+  ws = WebsocketStandIn(rtt=args.rtt)
+  shipper = LogShipper(log_dir, ws.send_queue.put_nowait, ws.recv_queue)
+
+  def rotate(idx):
+    with open(os.path.join(log_dir, f"swaglog.{idx:010}"), "w") as f:
+      f.write("x" * 1000)
+
+  def acked(fn):
+    path = os.path.join(log_dir, fn)
+    return LOG_ATTR_NAME in os.listxattr(path) and os.getxattr(path, LOG_ATTR_NAME) == LOG_ATTR_VALUE_MAX_UNIX_TIME
+
+  latencies = []
+  t_cpu = time.process_time()
+  try:
+    rotate(0)
+    for i in range(1, args.n + 1):
+      t = time.monotonic()
+      rotate(i)
+      # the previous file is no longer active and can be sent
+      while not acked(f"swaglog.{i - 1:010}"):
+        shipper.step(timeout=0.01)
+      latencies.append(time.monotonic() - t)
+  finally:
+    shipper.close()
+    ws.stop()
+    shutil.rmtree(log_dir)
+
+  cpu = time.process_time() - t_cpu
+  latencies.sort()
+  print(f"delivery latency median {latencies[len(latencies) // 2] * 1e3:.1f} ms, max {latencies[-1] * 1e3:.1f} ms")
+  print(f"cpu {cpu / args.n * 1e3:.2f} ms per log")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import argparse
+import signal
+import time
+
+from selfdrive.manager.process import ensure_running, stop_processes
+from selfdrive.manager.test.test_process_lifecycle import dummy
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Manager startup and shutdown time of many slow-exiting processes")
+  parser.add_argument("-n", type=int, default=16, help="processes")
+  parser.add_argument("--exit-delay", type=float, default=0.5, help="seconds each process takes to exit on SIGINT")
+  args = parser.parse_args()
+
+  procs = [dummy(f"dummy{i}", args.exit_delay, offroad=True) for i in range(args.n)]
+  try:
+    t = time.monotonic()
+    ensure_running(procs, started=False)
+    startup = time.monotonic() - t
+    # let the interpreters install their signal handlers
+    time.sleep(1.)
+
+    t = time.monotonic()
+    stop_processes(procs)
+    shutdown = time.monotonic() - t
+  finally:
+    for p in procs:
+      if p.proc is not None:
+        p.signal(signal.SIGKILL)
+        p.proc.join()
+
+  print(f"{args.n} processes: startup {startup * 1e3:.0f} ms, shutdown {shutdown:.2f} s "
+        f"({args.n * args.exit_delay:.1f} s one at a time)")
+
+
+if __name__ == "__main__":
+  main()
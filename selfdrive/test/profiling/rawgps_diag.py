@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import time
+
+from selfdrive.sensord.rawgps.modemdiag import HdlcDecoder
+from selfdrive.sensord.rawgps.structs import array_unpacker, dict_unpacker, gps_measurement_report, gps_measurement_report_sv
+from selfdrive.sensord.test.test_rawgps_diag import decode_frame_by_frame, record_stream
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Decode throughput of recorded-like modem diag streams")
+  parser.add_argument("-n", type=int, default=2000, help="gps measurement frames")
+  args = parser.parse_args()
+
+  payloads, reads = record_stream(random.Random(4), args.n)
+  unpack_sv, sv_size = dict_unpacker(gps_measurement_report_sv, True)
+  unpack_svs, _ = array_unpacker(gps_measurement_report_sv, True)
+  _, size = dict_unpacker(gps_measurement_report)
+  offset = 4 + 12 + size
+
+  def byte_wise():
+    for frame in decode_frame_by_frame(reads):
+      sats = frame[offset:]
+      [unpack_sv(sats[sv_size * i:sv_size * (i + 1)]) for i in range(len(sats) // sv_size)]
+
+  def whole_buffer():
+    decoder = HdlcDecoder()
+    for raw in reads:
+      decoder.feed(raw)
+    for frame in decoder.frames:
+      svs = unpack_svs(frame, offset, (len(frame) - offset) // sv_size)
+      [svs[k].tolist() for k in svs.dtype.names]
+
+  mb = sum(len(r) for r in reads) / 1e6
+  print(f"{len(payloads)} frames, {mb:.2f} MB")
+  for name, fn in (("byte wise", byte_wise), ("whole buffer", whole_buffer)):
+    t = time.process_time()
+    fn()
+    print(f"{name:>12}: {mb / (time.process_time() - t):.1f} MB/s")
+
+
+if __name__ == "__main__":
+  main()
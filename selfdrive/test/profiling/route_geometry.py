@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import numpy as np
+
+from selfdrive.navd.helpers import distance_along_geometry
+from selfdrive.navd.route_geometry import RouteGeometry
+from selfdrive.navd.tests.test_route_geometry import nearest_segment, offset, synthetic_route
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Route progress queries with the segment index against the per-segment loop")
+  parser.add_argument("-n", type=int, default=20000, help="route points")
+  parser.add_argument("--queries", type=int, default=200)
+  parser.add_argument("--loop-queries", type=int, default=3, help="queries timed with the per-segment loop")
+  args = parser.parse_args()
+
+  rng = np.random.default_rng(3)
+  coords = synthetic_route(args.n, 37.4, -122.1)
+
+  t = time.perf_counter()
+  geometry = RouteGeometry(coords)
+  build = time.perf_counter() - t
+
+  queries = [offset(coords[int(rng.integers(len(coords)))], rng, 20) for _ in range(args.queries)]
+  t = time.perf_counter()
+  for pos in queries:
+    geometry.distance_along(pos)
+    geometry.nearest_segment(pos, min_length=1.0, max_distance=25)
+  indexed = (time.perf_counter() - t) / len(queries)
+
+  t = time.perf_counter()
+  for pos in queries[:args.loop_queries]:
+    distance_along_geometry(coords, pos)
+    nearest_segment(coords, pos, min_length=1.0)
+  loop = (time.perf_counter() - t) / args.loop_queries
+
+  print(f"{len(coords)} points: build {build * 1e3:.0f} ms")
+  print(f"query {indexed * 1e6:.0f} us indexed vs {loop * 1e3:.0f} ms per segment loop, {loop / indexed:.0f}x")
+
+
+if __name__ == "__main__":
+  main()
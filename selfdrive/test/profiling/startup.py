@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, NamedTuple, Optional
+
+from common.basedir import BASEDIR
+from selfdrive.manager.process import DaemonProcess, PythonProcess
+from selfdrive.manager.process_config import managed_processes
+
+# runs the daemon like the manager does, without the preimport
+LAUNCH = "from selfdrive.manager.process import launcher; launcher({module!r}, {name!r})"
+
+
+class ImportTime(NamedTuple):
+  module: str
+  self_us: int  # module body, i.e. import plus module level initialization
+  cumulative_us: int  # including the modules it imported
+  depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTime]:
+  # lines of `python -X importtime`: "import time:  self [us] | cumulative | imported package"
+  ret = []
+  for line in output.splitlines():
+    if not line.startswith("import time:"):
+      continue
+    fields = line[len("import time:"):].split("|")
+    if len(fields) != 3 or not fields[0].strip().isdigit():
+      continue
+    name = fields[2].rstrip()
+    depth = (len(name) - len(name.lstrip())) // 2
+    ret.append(ImportTime(name.strip(), int(fields[0]), int(fields[1]), depth))
+  return ret
+
+
+def profile_imports(module: str) -> List[ImportTime]:
+  proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BASEDIR,
+                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, encoding="utf8")
+  if proc.returncode != 0:
+    raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+  return parse_importtime(proc.stderr)
+
+
+def time_to_first_message(module: str, name: str, timeout: float) -> Optional[float]:
+  """Starts the daemon and waits for the first message it publishes on any service.
+  Run without the manager, so every message can be attributed to this daemon."""
+  import cereal.messaging as messaging
+  from cereal.services import service_list
+
+  poller = messaging.Poller()
+  socks = [messaging.sub_sock(s, poller=poller, conflate=True) for s in service_list]
+  # let the subscribers connect before the publisher comes up
+  time.sleep(0.1)
+
+  t = time.monotonic()
+  proc = subprocess.Popen([sys.executable, "-c", LAUNCH.format(module=module, name=name)], cwd=BASEDIR)
+  try:
+    while time.monotonic() - t < timeout and proc.poll() is None:
+      if len(poller.poll(100)):
+        return time.monotonic() - t
+    return None
+  finally:
+    proc.terminate()
+    try:
+      proc.wait(5)
+    except subprocess.TimeoutExpired:
+      proc.kill()
+      proc.wait()
+    del socks
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Import and startup cost of the python daemons",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+  parser.add_argument("procs", nargs="*", help="processes to profile, all python processes by default")
+  parser.add_argument("--top", type=int, default=10, help="slowest modules to show per process")
+  parser.add_argument("--first-message", action="store_true", help="also start each daemon and time its first published message")
+  parser.add_argument("--timeout", type=float, default=20., help="time to wait for the first message")
+  args = parser.parse_args()
+
+  names = args.procs or [n for n, p in managed_processes.items() if isinstance(p, (PythonProcess, DaemonProcess))]
+  os.environ["NOBOARD"] = "1"
+
+  summary = []
+  for name in names:
+    proc = managed_processes[name]
+    try:
+      times = profile_imports(proc.module)
+    except RuntimeError as e:
+      print(f"{name}: failed to import {proc.module}: {e}\n")
+      continue
+
+    total = sum(t.self_us for t in times)
+    print(f"{name} ({proc.module}): {len(times)} modules, {total / 1e3:.1f} ms")
+    for t in sorted(times, key=lambda t: t.self_us, reverse=True)[:args.top]:
+      print(f"  {t.self_us / 1e3:8.1f} ms self {t.cumulative_us / 1e3:8.1f} ms cumulative  {t.module}")
+
+    first_message = None
+    if args.first_message:
+      first_message = time_to_first_message(proc.module, name, args.timeout)
+      print(f"  first message after {first_message:.2f} s" if first_message is not None else
+            f"  no message within {args.timeout:.0f} s")
+    summary.append((name, total, first_message))
+    print()
+
+  print(f"{'process':<16} {'import ms':>10} {'first msg s':>12}")
+  for name, total, first_message in sorted(summary, key=lambda s: s[1], reverse=True):
+    ttfm = f"{first_message:.2f}" if first_message is not None else "-"
+    print(f"{name:<16} {total / 1e3:>10.1f} {ttfm:>12}")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from selfdrive.statsd import METRIC_TYPE, MetricAggregator, QuantileSketch, encode_metric
+from selfdrive.test.test_statsd import exact_quantile
+
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+def sketch_accuracy(n):
+  distributions = {
+    'uniform': [random.uniform(0, 100) for _ in range(n)],
+    'lognormal': [random.lognormvariate(0, 2) for _ in range(n)],
+    'signed': [random.gauss(0, 10) for _ in range(n)],
+  }
+  print(f"{'distribution':>12} {'max rel error':>14} {'buckets':>8}")
+  for name, values in distributions.items():
+    sketch = QuantileSketch()
+    for v in values:
+      sketch.add(v)
+    errors = [abs(sketch.quantile(q) - exact_quantile(values, q)) / max(abs(exact_quantile(values, q)), 1e-9) for q in QUANTILES]
+    print(f"{name:>12} {max(errors):>14.4f} {len(sketch.pos) + len(sketch.neg):>8}")
+
+
+def ingest_throughput(metrics, rate, interval):
+  names = [f"loop{i}.time" for i in range(metrics)]
+  msgs = [encode_metric(names[i % metrics], random.uniform(0, 20), METRIC_TYPE.TIMING) for i in range(metrics * rate * interval)]
+  agg = MetricAggregator("0000000000000000")
+
+  t = time.perf_counter()
+  for msg in msgs:
+    agg.ingest(msg)
+  ingest = time.perf_counter() - t
+  t = time.perf_counter()
+  agg.flush(datetime.now(timezone.utc), {'started': True})
+  flush = time.perf_counter() - t
+  print(f"ingested {len(msgs) / ingest:.0f} msgs/s, flush of {metrics} metrics {flush * 1e3:.1f} ms")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Quantile sketch accuracy and statsd aggregation throughput")
+  parser.add_argument("-n", type=int, default=20000, help="values per distribution")
+  parser.add_argument("--metrics", type=int, default=50)
+  parser.add_argument("--rate", type=int, default=100, help="Hz per metric")
+  parser.add_argument("--interval", type=int, default=60, help="seconds between flushes")
+  args = parser.parse_args()
+
+  random.seed(0)
+  sketch_accuracy(args.n)
+  ingest_throughput(args.metrics, args.rate, args.interval)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from selfdrive.modeld.thneed.lib import load_thneed, save_thneed
+
+# roughly supercombo: ~55MB of weights in a few hundred buffers, ~1MB of kernel source
+OBJECTS = 400
+WEIGHTS_SIZE = 55 * 1024 * 1024
+PROGRAMS_SIZE = 1024 * 1024
+
+
+def make_container(fn):
+  rng = np.random.default_rng(0)
+  sizes = rng.integers(1, 2 * WEIGHTS_SIZE // OBJECTS, OBJECTS) // 64 * 64
+  objects = [{'id': struct.pack("Q", i).decode('latin_1'), 'arg_type': "image2d_t", 'size': int(sz), 'needs_load': True,
+              'data': rng.integers(0, 256, sz, dtype=np.uint8).tobytes()} for i, sz in enumerate(sizes)]
+  binaries = [{'name': f"kernel_{i}", 'length': 4096, 'data': bytes(4096)} for i in range(50)]
+  programs = {f"kernel_{i}": "x" * (PROGRAMS_SIZE // 50) for i in range(50)}
+  save_thneed({'objects': objects, 'binaries': binaries, 'kernels': [], 'programs': programs}, fn)
+
+
+def load_thneed_read(fn):
+  # the original loader, the whole file read and every weight copied out of it
+  with open(fn, "rb") as f:
+    json_len = struct.unpack("I", f.read(4))[0]
+    jdat = json.loads(f.read(json_len).decode('latin_1'))
+    weights = f.read()
+  ptr = 0
+  for o in jdat['objects']:
+    if o['needs_load']:
+      o['data'] = weights[ptr:ptr + o['size']]
+      ptr += o['size']
+  for o in jdat['binaries']:
+    o['data'] = weights[ptr:ptr + o['length']]
+    ptr += o['length']
+  return jdat
+
+
+def peak_rss():
+  # not ru_maxrss, that's carried over from the parent across fork and exec
+  with open("/proc/self/status") as f:
+    return next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024
+
+
+def measure(method, fn):
+  # run in a fresh process, so peak rss is this method's alone
+  t = time.perf_counter()
+  if method == "none":
+    pass
+  elif method == "save":
+    save_thneed(load_thneed(fn), fn + ".out")
+  else:
+    jdat = load_thneed_read(fn) if method == "read" else load_thneed(fn)
+    if method.endswith("touch"):
+      # what uploading the weights to the gpu reads
+      sum(int(np.frombuffer(o['data'], dtype=np.uint64).sum()) for o in jdat['objects'])
+  dt = time.perf_counter() - t
+  print(json.dumps({'time': dt, 'rss': peak_rss()}))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="thneed container load time and peak memory, read into memory vs mapped")
+  parser.add_argument("--thneed", type=str, help="container to load, a synthetic supercombo sized one by default")
+  parser.add_argument("--measure", nargs=2, help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.measure is not None:
+    measure(*args.measure)
+    return
+
+  with tempfile.TemporaryDirectory() as tmp:
+    fn = args.thneed
+    if fn is None:
+      fn = os.path.join(tmp, "supercombo.thneed")
+      make_container(fn)
+    print(f"{fn}: {os.path.getsize(fn) / 1024**2:.1f} MB")
+    print(f"{'method':<12} {'ms':>8} {'peak rss MB':>12}")
+    for method in ("none", "read", "mmap", "mmap_touch", "save"):
+      out = subprocess.run([sys.executable, __file__, "--measure", method, fn], capture_output=True, check=True, text=True).stdout
+      r = json.loads(out)
+      print(f"{method:<12} {r['time'] * 1e3:8.1f} {r['rss']:12.1f}")
+    if os.path.exists(fn + ".out"):
+      os.remove(fn + ".out")
+
+
+if __name__ == "__main__":
+  main()
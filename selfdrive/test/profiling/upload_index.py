@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from selfdrive.loggerd.tests.test_upload_index import SEG_FORMAT, priority_fn
+from selfdrive.loggerd.upload_index import UPLOAD_ATTR_NAME, UploadIndex
+
+
+def make_tree(root, n):
+  # n uploaded segments and one that isn't
+  for i in range(n + 1):
+    os.makedirs(os.path.join(root, SEG_FORMAT.format(i)))
+    fn = os.path.join(root, SEG_FORMAT.format(i), "qlog")
+    with open(fn, "wb") as f:
+      f.write(b"\0" * 10)
+    if i < n:
+      os.setxattr(fn, UPLOAD_ATTR_NAME, b'1')
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Upload selection cost of the inotify index against a full rescan")
+  parser.add_argument("-n", type=int, default=10000, help="segments, one inotify watch each")
+  parser.add_argument("--selections", type=int, default=1000)
+  args = parser.parse_args()
+
+  root = tempfile.mkdtemp()
+  try:
+    make_tree(root, args.n)
+    index = UploadIndex(root, priority_fn)
+    t = time.process_time()
+    index.next()
+    print(f"{args.n} segments: first index {(time.process_time() - t) * 1e3:.1f} ms")
+
+    # a full rescan per selection, like listing all files on every loop iteration
+    with mock.patch("os.listdir", wraps=os.listdir) as listdir:
+      t = time.process_time()
+      for _ in range(3):
+        index.reconcile()
+      print(f"rescan {(time.process_time() - t) / 3 * 1e3:.2f} ms, {listdir.call_count / 3:.0f} listdirs per selection")
+
+    with mock.patch("os.listdir", wraps=os.listdir) as listdir:
+      t = time.process_time()
+      for _ in range(args.selections):
+        index.next()
+      print(f"index {(time.process_time() - t) / args.selections * 1e6:.2f} us, "
+            f"{listdir.call_count / args.selections:.0f} listdirs per selection")
+    index.close()
+  finally:
+    shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+  main()
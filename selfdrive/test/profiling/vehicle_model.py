@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import argparse
+import math
+import time
+
+import numpy as np
+from numpy.linalg import solve
+
+from selfdrive.car.honda.interface import CarInterface
+from selfdrive.car.honda.values import CAR
+from selfdrive.controls.lib.drive_helpers import CONTROL_N
+from selfdrive.controls.lib.vehicle_model import ACCELERATION_DUE_TO_GRAVITY, VehicleModel, calc_slip_factor, create_dyn_state_matrices
+
+
+def uncached_curvature(VM, sa, u, roll):
+  # calc_curvature recomputing the slip factor on every call
+  sf = calc_slip_factor(VM)
+  curvature_factor = (1. - VM.chi) / (1. - sf * u**2) / VM.l
+  return curvature_factor * sa / VM.sR + ACCELERATION_DUE_TO_GRAVITY * roll / ((1 / calc_slip_factor(VM)) - u**2)
+
+
+def uncached_ss_sol(VM, sa, u, roll):
+  A, B = create_dyn_state_matrices(u, VM)
+  return -solve(A, B) @ np.array([[sa], [roll]])
+
+
+def controlsd(VM, frames, cached):
+  # liveParameters barely move, the curvature is converted a few times per frame at the same speed
+  for i in range(frames):
+    VM.update_params(1.0, 15.38)
+    u, sa, roll = 20. + math.sin(i / 100.), math.sin(i / 10.) * 0.1, 0.01
+    for _ in range(3):
+      if cached:
+        VM.calc_curvature(sa, u, roll)
+      else:
+        uncached_curvature(VM, sa, u, roll)
+
+
+def plannerd(VM, frames, cached):
+  # the planned curvatures over the horizon, converted to steering angles
+  curvatures = np.linspace(-0.01, 0.01, CONTROL_N)
+  for i in range(frames):
+    u = 20. + math.sin(i / 100.)
+    if cached:
+      VM.get_steer_from_curvature(curvatures, u, 0.)
+    else:
+      [VM.get_steer_from_curvature(c, u, 0.) for c in curvatures]
+
+
+def paramsd(VM, frames, cached):
+  # steady state yaw rate at a slowly changing speed, with the stiffness and steer ratio learned
+  for i in range(frames):
+    if i % 100 == 0:
+      VM.update_params(1.0 + 0.01 * math.sin(i), 15.38 + 0.1 * math.sin(i))
+    u, sa = round(20. + math.sin(i / 500.), 1), math.sin(i / 10.) * 0.1
+    if cached:
+      VM.steady_state_sol(sa, u, 0.)
+    else:
+      uncached_ss_sol(VM, sa, u, 0.)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="VehicleModel cost in the controlsd, plannerd and paramsd call patterns")
+  parser.add_argument("--frames", type=int, default=10000)
+  args = parser.parse_args()
+
+  CP = CarInterface.get_params(CAR.CIVIC)
+  print(f"{'pattern':<10} {'uncached us':>12} {'cached us':>10} {'speedup':>8}")
+  for pattern in (controlsd, plannerd, paramsd):
+    times = []
+    for cached in (False, True):
+      VM = VehicleModel(CP)
+      t = time.perf_counter()
+      pattern(VM, args.frames, cached)
+      times.append((time.perf_counter() - t) / args.frames * 1e6)
+    print(f"{pattern.__name__:<10} {times[0]:12.2f} {times[1]:10.2f} {times[0] / times[1]:7.1f}x")
+
+
+if __name__ == "__main__":
+  main()
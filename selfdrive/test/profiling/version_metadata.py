@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import system.version as version
+from common.basedir import BASEDIR
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Cost of reading the version metadata by running git against the snapshot")
+  parser.add_argument("--basedir", default=BASEDIR, help="checkout to read")
+  parser.add_argument("--readers", type=int, default=4, help="processes that read the version info at startup")
+  args = parser.parse_args()
+
+  version.write_metadata(args.basedir)
+  print(f"{'':>15} {'subprocesses':>12} {'ms':>8}")
+  for name, read in (("git per reader", version.generate_metadata), ("snapshot", version.load_metadata)):
+    start = version.subprocess_calls
+    t = time.monotonic()
+    for _ in range(args.readers):
+      read(args.basedir)
+    print(f"{name:>15} {version.subprocess_calls - start:>12} {(time.monotonic() - t) * 1e3:>8.1f}")
+
+
+if __name__ == "__main__":
+  main()
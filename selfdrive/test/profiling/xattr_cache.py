@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+import selfdrive.loggerd.xattr_cache as xattr_cache
+from selfdrive.loggerd.xattr_cache import XattrCache, getxattrs, invalidate, setxattr
+
+ATTR = 'user.upload'
+FILES = ("rlog", "qlog", "qcamera.ts", "fcamera.hevc")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Memory of the xattr cache over a long recording")
+  parser.add_argument("--segments", type=int, default=2000, help="one minute segments recorded")
+  parser.add_argument("--kept", type=int, default=50, help="newest segments the deleter keeps on disk")
+  args = parser.parse_args()
+
+  root = tempfile.mkdtemp()
+  xattr_cache._cache = XattrCache()
+  tracemalloc.start()
+  try:
+    print(f"{'segments':>8} {'entries':>8} {'accounted kB':>13} {'traced kB':>10}")
+    for i in range(args.segments):
+      os.mkdir(os.path.join(root, f"seg--{i}"))
+      seg = [os.path.join(root, f"seg--{i}", n) for n in FILES]
+      for fn in seg:
+        open(fn, "wb").close()
+
+      # the uploader re-checks pending files, then marks the logs as uploaded
+      for _ in range(3):
+        getxattrs(seg, ATTR)
+      for fn in seg[:2]:
+        setxattr(fn, ATTR, b'1')
+      getxattrs(seg, ATTR)
+
+      if i >= args.kept:
+        old = os.path.join(root, f"seg--{i - args.kept}")
+        shutil.rmtree(old)
+        invalidate(old)
+      if (i + 1) % (args.segments // 10 or 1) == 0:
+        stats = xattr_cache.stats()
+        print(f"{i + 1:>8} {stats['entries']:>8} {stats['bytes'] / 1024:>13.0f} {tracemalloc.get_traced_memory()[0] / 1024:>10.0f}")
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+    shutil.rmtree(root)
+
+  stats = xattr_cache.stats()
+  print(f"peak {peak / 1024:.0f} kB, hit rate {stats['hit_rate']:.2f}, {stats['evictions']} evictions, "
+        f"{stats['invalidations']} invalidations")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import random
+import unittest
+from datetime import datetime, timezone
+
+from selfdrive.statsd import METRIC_TYPE, SKETCH_ALPHA, MetricAggregator, QuantileSketch, decode_metric, encode_metric
+
+
+def exact_quantile(values, q):
+  return sorted(values)[int(round(q * (len(values) - 1)))]
+
+
+class TestStatsd(unittest.TestCase):
+  def test_wire_format(self):
+    msg = encode_metric("controlsd.loop_time", 1.25, METRIC_TYPE.TIMING)
+    self.assertEqual(len(msg), 9 + len("controlsd.loop_time"))
+    self.assertEqual(decode_metric(msg), ("controlsd.loop_time", 1.25, METRIC_TYPE.TIMING))
+    # text messages from older senders
+    self.assertEqual(decode_metric(b"car_voltage:12.5|g"), ("car_voltage", 12.5, METRIC_TYPE.GAUGE))
+
+  def test_quantile_accuracy(self):
+    random.seed(0)
+    distributions = {
+      'uniform': [random.uniform(0, 100) for _ in range(20000)],
+      'lognormal': [random.lognormvariate(0, 2) for _ in range(20000)],
+      'signed': [random.gauss(0, 10) for _ in range(20000)],
+      'constant': [3.3] * 1000,
+    }
+    for name, values in distributions.items():
+      sketch = QuantileSketch()
+      for v in values:
+        sketch.add(v)
+
+      errors = []
+      for q in (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99):
+        exact = exact_quantile(values, q)
+        errors.append(abs(sketch.quantile(q) - exact) / max(abs(exact), 1e-9))
+      self.assertLessEqual(max(errors), SKETCH_ALPHA + 1e-9, name)
+      self.assertEqual(sketch.count, len(values))
+
+  def test_bounded_memory(self):
+    random.seed(0)
+    values = [10 ** random.uniform(-6, 6) for _ in range(100000)]
+    sketch = QuantileSketch(max_buckets=64)
+    for v in values:
+      sketch.add(v)
+    self.assertLessEqual(len(sketch.pos) + len(sketch.neg), 64)
+    # the upper quantiles are still accurate
+    self.assertLess(abs(sketch.quantile(0.99) - exact_quantile(values, 0.99)) / exact_quantile(values, 0.99), SKETCH_ALPHA)
+
+  def test_aggregate(self):
+    # 50 metrics from 100Hz loops for one flush interval
+    names = [f"loop{i}.time" for i in range(50)]
+    agg = MetricAggregator("0000000000000000")
+    for i in range(50 * 100 * 60):
+      agg.ingest(encode_metric(names[i % 50], random.uniform(0, 20), METRIC_TYPE.TIMING))
+
+    out = agg.flush(datetime.now(timezone.utc), {'started': True})
+    self.assertEqual(out.count("\n"), len(names))
+    self.assertIn("count=6000,", out)
+    self.assertEqual(agg.flush(datetime.now(timezone.utc), {}), "")
+
+
+if __name__ == "__main__":
+  unittest.main()
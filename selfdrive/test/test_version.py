@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import system.version as version
+
+
+class TestVersionMetadata(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+    self.remote = os.path.join(self.tmp, "remote")
+    self.basedir = os.path.join(self.tmp, "openpilot")
+    os.makedirs(os.path.join(self.basedir, "common"))
+    with open(os.path.join(self.basedir, "common", "version.h"), "w") as f:
+      f.write('#define COMMA_VERSION "0.9.1"\n')
+
+    self.git("init", "-q", "-b", "devel")
+    self.git("add", "-A")
+    self.git("commit", "-q", "-m", "init")
+    subprocess.check_call(["git", "clone", "-q", "--bare", self.basedir, self.remote])
+    self.git("remote", "add", "origin", "https://github.com/commaai/openpilot.git")
+    self.git("config", "remote.origin.url", self.remote)
+    self.git("fetch", "-q", "origin")
+    self.git("branch", "-q", "--set-upstream-to=origin/devel")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def git(self, *args, cwd=None):
+    env = dict(os.environ, GIT_AUTHOR_NAME="test", GIT_AUTHOR_EMAIL="test@test", GIT_COMMITTER_NAME="test",
+               GIT_COMMITTER_EMAIL="test@test")
+    return subprocess.check_output(["git", *args], cwd=cwd or self.basedir, env=env, encoding="utf8").strip()
+
+  def load(self, basedir=None):
+    calls = version.subprocess_calls
+    metadata = version.load_metadata(basedir or self.basedir)
+    return metadata, version.subprocess_calls - calls
+
+  def test_snapshot(self):
+    metadata, generate_calls = self.load()
+    self.assertEqual(metadata, {
+      "commit": self.git("rev-parse", "HEAD"),
+      "short_branch": "devel",
+      "branch": "origin/devel",
+      "origin": self.remote,
+    })
+    self.assertGreater(generate_calls, 0)
+
+    # every later reader gets it from the snapshot
+    cached, calls = self.load()
+    self.assertEqual(cached, metadata)
+    self.assertEqual(calls, 0)
+
+  def test_invalidation(self):
+    metadata, _ = self.load()
+
+    # new commit
+    with open(os.path.join(self.basedir, "file"), "w") as f:
+      f.write("change")
+    self.git("add", "file")
+    self.git("commit", "-q", "-m", "change")
+    metadata, calls = self.load()
+    self.assertGreater(calls, 0)
+    self.assertEqual(metadata["commit"], self.git("rev-parse", "HEAD"))
+
+    # branch switch
+    self.git("checkout", "-q", "-b", "release3")
+    metadata, calls = self.load()
+    self.assertGreater(calls, 0)
+    self.assertEqual(metadata["short_branch"], "release3")
+    self.assertEqual(self.load()[1], 0)
+
+  def test_dirty(self):
+    metadata, _ = self.load()
+    def dirty():
+      return version._read_dirty(self.basedir, metadata["origin"], metadata["branch"])
+    self.assertFalse(dirty())
+
+    # checked on the work tree itself, edits don't change the snapshot
+    with open(os.path.join(self.basedir, "common", "version.h"), "a") as f:
+      f.write("\n")
+    self.assertTrue(dirty())
+    self.assertEqual(self.load()[1], 0)
+
+    # without running git on prebuilt builds
+    open(os.path.join(self.basedir, "prebuilt"), "w").close()
+    calls = version.subprocess_calls
+    self.assertFalse(dirty())
+    self.assertEqual(version.subprocess_calls, calls)
+
+  def test_moved_checkout(self):
+    # like a finalized update being swapped in
+    version.write_metadata(self.basedir)
+    moved = os.path.join(self.tmp, "moved")
+    os.rename(self.basedir, moved)
+    metadata, calls = self.load(moved)
+    self.assertEqual(calls, 0)
+    self.assertEqual(metadata["short_branch"], "devel")
+
+  def test_corrupt_snapshot(self):
+    self.load()
+    with open(os.path.join(self.basedir, ".git", version.METADATA_FILE), "w") as f:
+      f.write("{")
+    metadata, calls = self.load()
+    self.assertGreater(calls, 0)
+    self.assertEqual(metadata["short_branch"], "devel")
+    self.assertEqual(self.load()[1], 0)
+
+  def test_no_git(self):
+    shutil.rmtree(os.path.join(self.basedir, ".git"))
+    metadata, calls = self.load()
+    self.assertEqual(calls, 0)
+    self.assertIsNone(metadata["commit"])
+    self.assertTrue(version._read_dirty(self.basedir, metadata["origin"], metadata["branch"]))
+
+  def test_manager_startup(self):
+    # the manager and every process started in a new interpreter each read the version
+    # info once, before they all ran git themselves
+    readers = 4
+    calls = {}
+    for name, read in (("git per reader", version.generate_metadata), ("snapshot", version.load_metadata)):
+      start = version.subprocess_calls
+      for _ in range(readers):
+        read(self.basedir)
+      calls[name] = version.subprocess_calls - start
+
+    # only the first reader generated the snapshot
+    self.assertEqual(calls["snapshot"] * readers, calls["git per reader"])
+
+if __name__ == "__main__":
+  unittest.main()
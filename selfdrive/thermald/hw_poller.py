@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from system.swaglog import cloudlog
+
+POLL_INTERVAL = 0.1  # seconds
+
+
+class Probe:
+  def __init__(self, name: str, fn: Callable[[], Any], interval: float, timeout: float):
+    self.name = name
+    self.fn = fn
+    self.interval = interval
+    self.timeout = timeout
+
+    self.next_run = 0.
+    self.started: Optional[float] = None
+    self.timed_out = False
+
+    # stats
+    self.runs = 0
+    self.timeouts = 0
+    self.errors = 0
+    self.cpu_time = 0.
+
+
+class HardwarePoller:
+  """Runs slow hardware probes on their own cadence in worker threads, and keeps the
+  latest result of each in a snapshot. A probe that takes longer than its timeout is
+  reported and not started again until it returns, so a hung command can't pile up
+  threads, while all other probes keep going. Probe threads are daemons, a hung one
+  does not keep the process from exiting."""
+
+  def __init__(self):
+    self.probes: Dict[str, Probe] = {}
+    self.lock = threading.Lock()
+    self.results: Dict[str, Any] = {}
+    self.updated: Dict[str, float] = {}
+
+  def add(self, name: str, fn: Callable[[], Any], interval: float, timeout: float) -> None:
+    self.probes[name] = Probe(name, fn, interval, timeout)
+
+  def remove(self, name: str) -> None:
+    self.probes.pop(name, None)
+    with self.lock:
+      self.results.pop(name, None)
+      self.updated.pop(name, None)
+
+  def snapshot(self) -> Dict[str, Any]:
+    with self.lock:
+      return dict(self.results)
+
+  def get(self, name: str) -> Tuple[Any, Optional[float]]:
+    """Latest result of a probe and when it was produced"""
+    with self.lock:
+      return self.results.get(name), self.updated.get(name)
+
+  def _run(self, probe: Probe) -> None:
+    t = time.thread_time()
+    try:
+      result = probe.fn()
+    except Exception:
+      probe.errors += 1
+      cloudlog.exception(f"hw_poller: {probe.name} failed")
+    else:
+      with self.lock:
+        self.results[probe.name] = result
+        self.updated[probe.name] = time.monotonic()
+    finally:
+      probe.cpu_time += time.thread_time() - t
+      probe.runs += 1
+      probe.next_run = time.monotonic() + probe.interval
+      probe.started = None
+
+  def step(self) -> None:
+    now = time.monotonic()
+    for probe in self.probes.values():
+      if probe.started is not None:
+        if not probe.timed_out and now - probe.started > probe.timeout:
+          probe.timed_out = True
+          probe.timeouts += 1
+          cloudlog.warning(f"hw_poller: {probe.name} still running after {probe.timeout}s")
+        continue
+
+      if now >= probe.next_run:
+        probe.started = now
+        probe.timed_out = False
+        threading.Thread(target=self._run, args=(probe,), name=f"hw_poller.{probe.name}", daemon=True).start()
+
+  def run(self, end_event: threading.Event) -> None:
+    while not end_event.is_set():
+      self.step()
+      end_event.wait(POLL_INTERVAL)
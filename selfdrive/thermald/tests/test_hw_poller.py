@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import json
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+import unittest
+
+import selfdrive.thermald.thermald as thermald
+from selfdrive.thermald.hw_poller import HardwarePoller
+from system.hardware.sysfs import SysfsReader
+
+ZONES = ["cpu0-silver-usr", "cpu1-silver-usr", "cpu2-silver-usr", "cpu3-silver-usr",
+         "cpu0-gold-usr", "cpu1-gold-usr", "cpu2-gold-usr", "cpu3-gold-usr",
+         "gpu0-usr", "gpu1-usr", "ddr-usr", "xo-therm-adc", "pm8998_tz", "pm8005_tz"]
+
+
+class TestHardwareTelemetry(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+
+    # fake sysfs
+    for i, zone in enumerate(ZONES):
+      self.write(f"sys/devices/virtual/thermal/thermal_zone{i}/type", zone + "\n")
+      self.write(f"sys/devices/virtual/thermal/thermal_zone{i}/temp", f"{40000 + i}\n")
+    thermald.sysfs = SysfsReader(root=self.tmp)
+    thermald.tz_by_type = None
+
+    # fake commands
+    self.bin = os.path.join(self.tmp, "bin")
+    os.mkdir(self.bin)
+    self.command("smartctl", f"echo '{json.dumps({'nvme_smart_health_information_log': {'temperature_sensors': [41, 45]}})}'")
+    self.command("mmcli", "sleep 30")
+
+  def tearDown(self):
+    thermald.sysfs.close()
+    thermald.sysfs = SysfsReader()
+    thermald.tz_by_type = None
+    shutil.rmtree(self.tmp)
+
+  def write(self, path, contents):
+    path = os.path.join(self.tmp, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+      f.write(contents)
+
+  def command(self, name, body):
+    fn = os.path.join(self.bin, name)
+    with open(fn, "w") as f:
+      f.write(f"#!/bin/sh\n{body}\n")
+    os.chmod(fn, os.stat(fn).st_mode | stat.S_IEXEC)
+
+  def test_sysfs_handles(self):
+    self.assertEqual(thermald.read_tz("gpu1-usr"), 40009)
+    self.write("sys/devices/virtual/thermal/thermal_zone9/temp", "55000\n")
+    self.assertEqual(thermald.read_tz("gpu1-usr"), 55000)
+    self.assertEqual(thermald.read_tz(99), 0)
+    self.assertEqual(thermald.read_tz(None), 0)
+
+    # nodes stay open
+    opens = thermald.sysfs.opens
+    for _ in range(10):
+      thermald.read_tz("gpu1-usr")
+    self.assertEqual(thermald.sysfs.opens, opens)
+
+  def test_reads_match_reopen(self):
+    reopened = []
+    for i in range(len(ZONES)):
+      with open(os.path.join(self.tmp, f"sys/devices/virtual/thermal/thermal_zone{i}/temp")) as f:
+        reopened.append(int(f.read()))
+    for _ in range(3):
+      self.assertEqual([thermald.read_tz(z) for z in ZONES], reopened)
+
+  def test_poller(self):
+    def nvme_temps():
+      out = subprocess.check_output([os.path.join(self.bin, "smartctl"), "-aj", "/dev/nvme0"])
+      return json.loads(out)["nvme_smart_health_information_log"]["temperature_sensors"]
+
+    def modem_temps():
+      subprocess.check_output([os.path.join(self.bin, "mmcli")])
+
+    poller = HardwarePoller()
+    poller.add("nvme_temps", nvme_temps, interval=0.2, timeout=1.)
+    poller.add("modem_temps", modem_temps, interval=0.2, timeout=0.3)
+    poller.add("fails", lambda: 1 / 0, interval=0.2, timeout=1.)
+
+    end = time.monotonic() + 1.5
+    while time.monotonic() < end:
+      poller.step()
+      time.sleep(0.05)
+
+    # the hung command is reported once, not restarted, and doesn't hold up the others
+    probes = poller.probes
+    self.assertEqual(probes["modem_temps"].timeouts, 1)
+    self.assertEqual(probes["modem_temps"].runs, 0)
+    self.assertGreaterEqual(probes["nvme_temps"].runs, 2)
+    self.assertGreaterEqual(probes["fails"].errors, 2)
+    self.assertEqual(poller.snapshot(), {"nvme_temps": [41, 45]})
+
+    prev = thermald.HardwareState(network_type=0, network_metered=False, network_strength=0, network_info=None,
+                                  nvme_temps=[], modem_temps=[30])
+    hw_state = thermald.get_hw_state(poller.snapshot(), prev)
+    self.assertEqual(hw_state.nvme_temps, [41, 45])
+    self.assertEqual(hw_state.modem_temps, [30])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 import datetime
 import os
-import queue
 import threading
 import time
 from collections import OrderedDict, namedtuple
@@ -23,6 +22,8 @@ from selfdrive.statsd import statlog
 from system.swaglog import cloudlog
 from selfdrive.thermald.power_monitoring import PowerMonitoring
 from selfdrive.thermald.fan_controller import TiciFanController
+from selfdrive.thermald.hw_poller import POLL_INTERVAL, HardwarePoller
+from system.hardware.sysfs import SysfsReader
 from system.version import terms_version, training_version
 
 ThermalStatus = log.DeviceState.ThermalStatus
@@ -50,15 +51,17 @@ OFFROAD_DANGER_TEMP = 79.5
 
 prev_offroad_states: Dict[str, Tuple[bool, Optional[str]]] = {}
 
+THERMAL_ROOT = "/sys/devices/virtual/thermal"
+sysfs = SysfsReader()
+
 tz_by_type: Optional[Dict[str, int]] = None
 def populate_tz_by_type():
   global tz_by_type
   tz_by_type = {}
-  for n in os.listdir("/sys/devices/virtual/thermal"):
+  for n in os.listdir(sysfs.root + THERMAL_ROOT):
     if not n.startswith("thermal_zone"):
       continue
-    with open(os.path.join("/sys/devices/virtual/thermal", n, "type")) as f:
-      tz_by_type[f.read().strip()] = int(n.lstrip("thermal_zone"))
+    tz_by_type[sysfs.read(os.path.join(THERMAL_ROOT, n, "type")).strip()] = int(n.lstrip("thermal_zone"))
 
 def read_tz(x):
   if x is None:
@@ -70,8 +73,7 @@ def read_tz(x):
     x = tz_by_type[x]
 
   try:
-    with open(f"/sys/devices/virtual/thermal/thermal_zone{x}/temp") as f:
-      return int(f.read())
+    return int(sysfs.read(f"{THERMAL_ROOT}/thermal_zone{x}/temp"))
   except FileNotFoundError:
     return 0
 
@@ -93,72 +95,88 @@ def set_offroad_alert_if_changed(offroad_alert: str, show_alert: bool, extra_tex
   set_offroad_alert(offroad_alert, show_alert, extra_text)
 
 
-def hw_state_thread(end_event, hw_queue):
-  """Handles non critical hardware state, and sends over queue"""
-  count = 0
-  registered_count = 0
-  prev_hw_state = None
+def get_network_state():
+  network_type = HARDWARE.get_network_type()
+  return network_type, HARDWARE.get_network_metered(network_type), HARDWARE.get_network_strength(network_type)
+
+
+def get_sim_id():
+  return HARDWARE.get_sim_info().get('sim_id', '')
+
 
-  modem_version = None
-  modem_nv = None
+def get_modem_version():
+  return HARDWARE.get_modem_version(), HARDWARE.get_modem_nv()  # pylint: disable=assignment-from-none
+
+
+def make_hw_poller():
+  """Probes of non critical hardware state, these are expensive calls"""
+  poller = HardwarePoller()
+  poller.add("network", get_network_state, interval=5., timeout=5.)
+  poller.add("network_info", HARDWARE.get_network_info, interval=10., timeout=5.)
+  poller.add("modem_temps", HARDWARE.get_modem_temperatures, interval=10., timeout=5.)
+  poller.add("nvme_temps", HARDWARE.get_nvme_temperatures, interval=30., timeout=10.)
+  poller.add("sim_id", get_sim_id, interval=10., timeout=5.)
+  if AGNOS:
+    poller.add("modem_version", get_modem_version, interval=60., timeout=10.)
+  return poller
+
+
+def get_hw_state(snapshot, prev_hw_state):
+  """Latest hardware state from the poller snapshot, missing results keep their previous value"""
+  network_type, network_metered, network_strength = snapshot.get("network", (prev_hw_state.network_type, prev_hw_state.network_metered,
+                                                                              prev_hw_state.network_strength))
+  return HardwareState(
+    network_type=network_type,
+    network_metered=network_metered,
+    network_strength=network_strength,
+    network_info=snapshot.get("network_info", prev_hw_state.network_info),
+    nvme_temps=snapshot.get("nvme_temps", prev_hw_state.nvme_temps),
+    modem_temps=snapshot.get("modem_temps") or prev_hw_state.modem_temps,
+  )
+
+
+def hw_state_thread(end_event, hw_poller):
+  """Schedules the hardware probes, and acts on modem state"""
+  registered_count = 0
   modem_configured = False
+  last_network_info = None
 
   while not end_event.is_set():
-    # these are expensive calls. update every 10s
-    if (count % int(10. / DT_TRML)) == 0:
-      try:
-        network_type = HARDWARE.get_network_type()
-        modem_temps = HARDWARE.get_modem_temperatures()
-        if len(modem_temps) == 0 and prev_hw_state is not None:
-          modem_temps = prev_hw_state.modem_temps
-
-        # Log modem version once
-        if AGNOS and ((modem_version is None) or (modem_nv is None)):
-          modem_version = HARDWARE.get_modem_version()  # pylint: disable=assignment-from-none
-          modem_nv = HARDWARE.get_modem_nv()  # pylint: disable=assignment-from-none
-
-          if (modem_version is not None) and (modem_nv is not None):
-            cloudlog.event("modem version", version=modem_version, nv=modem_nv)
-
-        hw_state = HardwareState(
-          network_type=network_type,
-          network_metered=HARDWARE.get_network_metered(network_type),
-          network_strength=HARDWARE.get_network_strength(network_type),
-          network_info=HARDWARE.get_network_info(),
-          nvme_temps=HARDWARE.get_nvme_temperatures(),
-          modem_temps=modem_temps,
-        )
-
-        try:
-          hw_queue.put_nowait(hw_state)
-        except queue.Full:
-          pass
-
-        if AGNOS and (hw_state.network_info is not None) and (hw_state.network_info.get('state', None) == "REGISTERED"):
+    hw_poller.step()
+
+    try:
+      # Log modem version once
+      modem_version, _ = hw_poller.get("modem_version")
+      if modem_version is not None and None not in modem_version:
+        cloudlog.event("modem version", version=modem_version[0], nv=modem_version[1])
+        hw_poller.remove("modem_version")
+
+      network_info, t = hw_poller.get("network_info")
+      if t is not None and t != last_network_info:
+        last_network_info = t
+        if AGNOS and (network_info is not None) and (network_info.get('state', None) == "REGISTERED"):
           registered_count += 1
         else:
           registered_count = 0
 
         if registered_count > 10:
-          cloudlog.warning(f"Modem stuck in registered state {hw_state.network_info}. nmcli conn up lte")
+          cloudlog.warning(f"Modem stuck in registered state {network_info}. nmcli conn up lte")
           os.system("nmcli conn up lte")
           registered_count = 0
 
-        # TODO: remove this once the config is in AGNOS
-        if not modem_configured and len(HARDWARE.get_sim_info().get('sim_id', '')) > 0:
-          cloudlog.warning("configuring modem")
-          HARDWARE.configure_modem()
-          modem_configured = True
+      # TODO: remove this once the config is in AGNOS
+      sim_id, _ = hw_poller.get("sim_id")
+      if not modem_configured and len(sim_id or '') > 0:
+        cloudlog.warning("configuring modem")
+        HARDWARE.configure_modem()
+        modem_configured = True
+    except Exception:
+      cloudlog.exception("Error getting hardware state")
 
-        prev_hw_state = hw_state
-      except Exception:
-        cloudlog.exception("Error getting hardware state")
+    end_event.wait(POLL_INTERVAL)
 
-    count += 1
-    time.sleep(DT_TRML)
 
-
-def thermald_thread(end_event, hw_queue):
+def thermald_thread(end_event, hw_poller):
   pm = messaging.PubMaster(['deviceState'])
   sm = messaging.SubMaster(["peripheralState", "gpsLocationExternal", "controlsState", "pandaStates"], poll=["pandaStates"])
 
@@ -225,10 +243,7 @@ def thermald_thread(end_event, hw_queue):
         onroad_conditions["ignition"] = False
         cloudlog.error("panda timed out onroad")
 
-    try:
-      last_hw_state = hw_queue.get_nowait()
-    except queue.Empty:
-      pass
+    last_hw_state = get_hw_state(hw_poller.snapshot(), last_hw_state)
 
     msg.deviceState.freeSpacePercent = get_available_percent(default=100.0)
     msg.deviceState.memoryUsagePercent = int(round(psutil.virtual_memory().percent))
@@ -412,12 +427,12 @@ def thermald_thread(end_event, hw_queue):
 
 
 def main():
-  hw_queue = queue.Queue(maxsize=1)
+  hw_poller = make_hw_poller()
   end_event = threading.Event()
 
   threads = [
-    threading.Thread(target=hw_state_thread, args=(end_event, hw_queue)),
-    threading.Thread(target=thermald_thread, args=(end_event, hw_queue)),
+    threading.Thread(target=hw_state_thread, args=(end_event, hw_poller)),
+    threading.Thread(target=thermald_thread, args=(end_event, hw_poller)),
   ]
 
   for t in threads:
@@ -40,7 +40,7 @@ from common.params import Params
 from system.hardware import AGNOS, HARDWARE
 from system.swaglog import cloudlog
 from selfdrive.controls.lib.alertmanager import set_offroad_alert
-from system.version import is_tested_branch
+from system.version import is_tested_branch, write_metadata
 
 LOCK_FILE = os.getenv("UPDATER_LOCK_FILE", "/tmp/safe_staging_overlay.lock")
 STAGING_ROOT = os.getenv("UPDATER_STAGING_ROOT", "/data/safe_staging")
@@ -257,6 +257,13 @@ def finalize_update(wait_helper: WaitTimeHelper) -> None:
   except subprocess.CalledProcessError:
     cloudlog.exception(f"Failed git gc, took {time.monotonic() - t:.3f} s")
 
+  # snapshot the version metadata, so nothing has to run git for it after the update is swapped in.
+  # without it, it's generated on first use after the swap, as before
+  try:
+    write_metadata(FINALIZED)
+  except OSError:
+    cloudlog.exception("failed to snapshot version metadata")
+
   if wait_helper.shutdown:
     cloudlog.info("got interrupted finalizing overlay")
   else:
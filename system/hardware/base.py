@@ -3,6 +3,7 @@ from collections import namedtuple
 from typing import Dict
 
 from cereal import log
+from system.hardware.sysfs import SYSFS
 
 ThermalConfig = namedtuple('ThermalConfig', ['cpu', 'gpu', 'mem', 'bat', 'ambient', 'pmic'])
 NetworkType = log.DeviceState.NetworkType
@@ -18,8 +19,7 @@ class HardwareBase(ABC):
   @staticmethod
   def read_param_file(path, parser, default=0):
     try:
-      with open(path) as f:
-        return parser(f.read())
+      return parser(SYSFS.read(path))
     except Exception:
       return default
 
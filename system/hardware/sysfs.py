@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+RETRY_INTERVAL = 10.  # seconds before trying to open a missing node again
+READ_SIZE = 4096
+PERSISTENT_PREFIXES = ("/sys/", "/proc/")
+
+
+class SysfsReader:
+  """Keeps sysfs and procfs nodes open and re-reads them from offset 0, instead of an
+  open, read and close on every poll. Other paths are opened on every read, since
+  regular files can be replaced. `root` is prepended to every path, for fake trees in tests."""
+
+  def __init__(self, root: str = ""):
+    self.root = root
+    self.lock = threading.Lock()
+    self.fds: Dict[str, int] = {}
+    self.failed: Dict[str, Tuple[float, OSError]] = {}
+
+    # stats
+    self.opens = 0
+    self.reads = 0
+
+  def _fd(self, path: str) -> int:
+    fd = self.fds.get(path)
+    if fd is not None:
+      return fd
+
+    with self.lock:
+      if path in self.fds:
+        return self.fds[path]
+
+      failed = self.failed.get(path)
+      if failed is not None and time.monotonic() - failed[0] < RETRY_INTERVAL:
+        raise failed[1]
+
+      try:
+        self.opens += 1
+        fd = os.open(self.root + path, os.O_RDONLY | os.O_CLOEXEC)
+      except OSError as e:
+        self.failed[path] = (time.monotonic(), e)
+        raise
+      self.failed.pop(path, None)
+      self.fds[path] = fd
+      return fd
+
+  def read(self, path: str) -> str:
+    self.reads += 1
+    if not path.startswith(PERSISTENT_PREFIXES):
+      self.opens += 1
+      with open(self.root + path) as f:
+        return f.read()
+
+    fd = self._fd(path)
+    try:
+      return os.pread(fd, READ_SIZE, 0).decode()
+    except OSError:
+      # the node went away, e.g. a hotplugged device
+      self.forget(path)
+      raise
+
+  def read_int(self, path: str, default: int = 0) -> int:
+    try:
+      return int(self.read(path))
+    except (OSError, ValueError):
+      return default
+
+  def forget(self, path: str) -> None:
+    with self.lock:
+      fd = self.fds.pop(path, None)
+      if fd is not None:
+        os.close(fd)
+
+  def close(self) -> None:
+    with self.lock:
+      for fd in self.fds.values():
+        os.close(fd)
+      self.fds.clear()
+      self.failed.clear()
+
+
+SYSFS = SysfsReader()
@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 import zmq
-from typing import NoReturn
+from typing import List, NoReturn, Tuple
 
 import cereal.messaging as messaging
 from common.logging_extra import SwagLogFileFormatter
-from system.swaglog import get_file_handler
+from system.swaglog import SWAGLOG_IPC, get_file_handler
+
+MAX_BATCH = 256  # records written to the log file at once
+
+
+def recv_batch(sock: zmq.Socket) -> List[Tuple[int, str]]:
+  """Levels and records of the next message, and whatever else is already queued"""
+  # block for the first message, then take whatever else is already queued
+  parts = sock.recv_multipart()
+  while len(parts) < MAX_BATCH:
+    try:
+      parts += sock.recv_multipart(zmq.NOBLOCK)
+    except zmq.error.Again:
+      break
+  return [(dat[0], dat[1:].decode("utf-8")) for dat in parts]
 
 
 def main() -> NoReturn:
@@ -14,29 +28,26 @@ def main() -> NoReturn:
 
   ctx = zmq.Context().instance()
   sock = ctx.socket(zmq.PULL)
-  sock.bind("ipc:///tmp/logmessage")
+  sock.bind(SWAGLOG_IPC)
 
   # and we publish them
   log_message_sock = messaging.pub_sock('logMessage')
   error_log_message_sock = messaging.pub_sock('errorLogMessage')
 
   while True:
-    dat = b''.join(sock.recv_multipart())
-    level = dat[0]
-    record = dat[1:].decode("utf-8")
-    if level >= log_level:
-      log_handler.emit(record)
+    records = recv_batch(sock)
+    log_handler.emit_batch([record for level, record in records if level >= log_level])
 
     # then we publish them
-    msg = messaging.new_message()
-    msg.logMessage = record
-    log_message_sock.send(msg.to_bytes())
-
-    if level >= 40:  # logging.ERROR
+    for level, record in records:
       msg = messaging.new_message()
-      msg.errorLogMessage = record
-      error_log_message_sock.send(msg.to_bytes())
+      msg.logMessage = record
+      log_message_sock.send(msg.to_bytes())
 
+      if level >= 40:  # logging.ERROR
+        msg = messaging.new_message()
+        msg.errorLogMessage = record
+        error_log_message_sock.send(msg.to_bytes())
 
 if __name__ == "__main__":
   main()
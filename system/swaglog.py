@@ -1,5 +1,8 @@
+import atexit
 import logging
 import os
+import queue
+import threading
 import time
 from pathlib import Path
 from logging.handlers import BaseRotatingHandler
@@ -14,6 +17,9 @@ if PC:
 else:
   SWAGLOG_DIR = "/data/log/"
 
+SWAGLOG_IPC = "ipc:///tmp/logmessage"
+SEND_BATCH = 64  # records per multipart message
+
 def get_file_handler():
   Path(SWAGLOG_DIR).mkdir(parents=True, exist_ok=True)
   base_filename = os.path.join(SWAGLOG_DIR, "swaglog")
@@ -55,6 +61,17 @@ class SwaglogRotatingFileHandler(BaseRotatingHandler):
     time_exceeded = self.interval > 0 and self.last_rollover + self.interval <= time.monotonic()
     return size_exceeded or time_exceeded
 
+  def emit_batch(self, records):
+    """Formats and writes records with a single write and flush"""
+    if not records:
+      return
+    lines = "".join(self.format(r) + self.terminator for r in records)
+    with self.lock:
+      if self.shouldRollover(None):
+        self.doRollover()
+      self.stream.write(lines)
+      self.stream.flush()
+
   def doRollover(self):
     if self.stream:
       self.stream.close()
@@ -67,31 +84,76 @@ class SwaglogRotatingFileHandler(BaseRotatingHandler):
           os.remove(to_delete)
 
 class UnixDomainSocketHandler(logging.Handler):
-  def __init__(self, formatter):
+  """Encodes records in the calling thread and hands them to a background
+  thread, which sends what has queued up as one multipart message"""
+  def __init__(self, formatter, background=True):
     logging.Handler.__init__(self)
     self.setFormatter(formatter)
+    self.background = background
     self.pid = None
 
   def connect(self):
     self.zctx = zmq.Context()
     self.sock = self.zctx.socket(zmq.PUSH)
     self.sock.setsockopt(zmq.LINGER, 10)
-    self.sock.connect("ipc:///tmp/logmessage")
+    self.sock.connect(SWAGLOG_IPC)
     self.pid = os.getpid()
 
+    # threads don't survive a fork, start a new sender in every process
+    if self.background:
+      self.send_queue = queue.SimpleQueue()
+      threading.Thread(target=self.sender_thread, args=(self.sock, self.send_queue), name="swaglog", daemon=True).start()
+      # the sender is a daemon thread, don't exit with records still queued
+      atexit.register(self.flush)
+
   def emit(self, record):
     if os.getpid() != self.pid:
       self.connect()
 
-    msg = self.format(record).rstrip('\n')
-    # print("SEND".format(repr(msg)))
     try:
-      s = chr(record.levelno)+msg
-      self.sock.send(s.encode('utf8'), zmq.NOBLOCK)
+      s = chr(record.levelno) + self.format(record).rstrip('\n')
+    except Exception:
+      self.handleError(record)
+      return
+
+    if self.background:
+      self.send_queue.put(s.encode('utf8'))
+    else:
+      self.send([s.encode('utf8')], self.sock)
+
+  @staticmethod
+  def send(msgs, sock):
+    try:
+      sock.send_multipart(msgs, zmq.NOBLOCK)
     except zmq.error.Again:
       # drop :/
       pass
 
+  @classmethod
+  def sender_thread(cls, sock, send_queue):
+    while True:
+      msgs = [send_queue.get()]
+      while len(msgs) < SEND_BATCH:
+        try:
+          msgs.append(send_queue.get_nowait())
+        except queue.Empty:
+          break
+
+      # events are flush() markers
+      flushed = [m for m in msgs if isinstance(m, threading.Event)]
+      msgs = [m for m in msgs if not isinstance(m, threading.Event)]
+      if msgs:
+        cls.send(msgs, sock)
+      for ev in flushed:
+        ev.set()
+
+  def flush(self, timeout=1.):
+    """Waits until everything logged so far was handed to zmq"""
+    if self.background and self.pid == os.getpid():
+      ev = threading.Event()
+      self.send_queue.put(ev)
+      ev.wait(timeout)
+
 
 def add_file_handler(log):
   """
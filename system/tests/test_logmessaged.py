@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import zmq
+
+from common.logging_extra import SwagFormatter, SwagLogFileFormatter, SwagLogger
+from system import swaglog
+from system.logmessaged import recv_batch
+from system.swaglog import SwaglogRotatingFileHandler, UnixDomainSocketHandler
+
+
+class TestLogmessaged(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+    self.addr = f"ipc://{self.tmp}/logmessage"
+    self.ctx = zmq.Context()
+    self.sock = self.ctx.socket(zmq.PULL)
+    self.sock.bind(self.addr)
+    self.sock.setsockopt(zmq.RCVTIMEO, 1000)
+
+    self.log = SwagLogger()
+    self.log.setLevel(logging.DEBUG)
+
+  def tearDown(self):
+    self.sock.close()
+    self.ctx.term()
+    shutil.rmtree(self.tmp)
+
+  def add_handler(self, background=True):
+    handler = UnixDomainSocketHandler(SwagFormatter(self.log), background=background)
+    self.log.addHandler(handler)
+    return handler
+
+  def recv_records(self, n):
+    records = []
+    while len(records) < n:
+      records += recv_batch(self.sock)
+    return records
+
+  def test_background_sender(self):
+    with mock.patch.object(swaglog, "SWAGLOG_IPC", self.addr):
+      handler = self.add_handler()
+      for i in range(200):
+        self.log.log(logging.ERROR if i % 10 == 0 else logging.INFO, f"record {i}")
+      handler.flush()
+
+    records = self.recv_records(200)
+    self.assertEqual([json.loads(r)['msg'] for _, r in records], [f"record {i}" for i in range(200)])
+    self.assertEqual([level for level, _ in records], [logging.ERROR if i % 10 == 0 else logging.INFO for i in range(200)])
+
+  def test_flush(self):
+    with mock.patch.object(swaglog, "SWAGLOG_IPC", self.addr):
+      handler = self.add_handler()
+      for i in range(100):
+        self.log.info(f"record {i}")
+      handler.flush()
+
+    # everything logged before flush() returned was already handed to zmq
+    records = []
+    while True:
+      try:
+        records += recv_batch(self.sock)
+      except zmq.error.Again:
+        break
+    self.assertEqual(len(records), 100)
+
+  def test_flush_at_exit(self):
+    # records still queued in the sender thread are sent when the process exits
+    script = f"""
+from system import swaglog
+swaglog.SWAGLOG_IPC = {self.addr!r}
+for i in range(100):
+  swaglog.cloudlog.info(f"record {{i}}")
+"""
+    subprocess.check_call([sys.executable, "-c", script])
+    records = self.recv_records(100)
+    self.assertEqual([json.loads(r)['msg'] for _, r in records], [f"record {i}" for i in range(100)])
+
+  def test_multipart_batch(self):
+    push = self.ctx.socket(zmq.PUSH)
+    push.connect(self.addr)
+    msgs = [[chr(logging.INFO) + json.dumps({'msg': f"{i}.{j}"}) for j in range(i + 1)] for i in range(5)]
+    for parts in msgs:
+      push.send_multipart([p.encode('utf8') for p in parts])
+    push.close()
+
+    records = self.recv_records(sum(len(parts) for parts in msgs))
+    self.assertEqual([json.loads(r)['msg'] for _, r in records], [json.loads(p[1:])['msg'] for parts in msgs for p in parts])
+    self.assertTrue(all(level == logging.INFO for level, _ in records))
+
+  def test_emit_batch(self):
+    handler = SwaglogRotatingFileHandler(os.path.join(self.tmp, "swaglog"))
+    handler.setFormatter(SwagLogFileFormatter(None))
+    handler.emit_batch([json.dumps({'msg': f"record {i}"}) for i in range(10)])
+    handler.emit_batch([])
+    handler.close()
+
+    with open(handler.log_files[0]) as f:
+      lines = f.read().splitlines()
+    self.assertEqual([json.loads(line)['msg$s'] for line in lines], [f"record {i}" for i in range(10)])
+
+
+if __name__ == "__main__":
+  unittest.main()
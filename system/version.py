@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
+import json
 import os
 import subprocess
-from typing import List, Optional
+import time
+from typing import Any, Dict, List, Optional
 from functools import lru_cache
 
 from common.basedir import BASEDIR
+from common.file_helpers import atomic_write_in_dir
 from system.swaglog import cloudlog
 
 TESTED_BRANCHES = ['devel', 'release3-staging', 'dashcam3-staging', 'release3', 'dashcam3']
@@ -13,44 +16,187 @@ training_version: bytes = b"0.2.0"
 terms_version: bytes = b"2"
 
 
+METADATA_FILE = "openpilot_version.json"  # in the checkout's git dir, so it's never tracked and moves with the checkout
+METADATA_VERSION = 2
+
+# subprocesses spawned by this module, for profiling startup
+subprocess_calls = 0
+
+
 def cache(user_function, /):
   return lru_cache(maxsize=None)(user_function)
 
 
-def run_cmd(cmd: List[str]) -> str:
-  return subprocess.check_output(cmd, encoding='utf8').strip()
+def run_cmd(cmd: List[str], cwd: Optional[str] = None) -> str:
+  global subprocess_calls
+  subprocess_calls += 1
+  return subprocess.check_output(cmd, encoding='utf8', cwd=cwd).strip()
 
 
-def run_cmd_default(cmd: List[str], default: Optional[str] = None) -> Optional[str]:
+def run_cmd_default(cmd: List[str], default: Optional[str] = None, cwd: Optional[str] = None) -> Optional[str]:
   try:
-    return run_cmd(cmd)
+    return run_cmd(cmd, cwd=cwd)
   except subprocess.CalledProcessError:
     return default
 
 
+def run_cmd_status(cmd: List[str], cwd: Optional[str] = None) -> int:
+  global subprocess_calls
+  subprocess_calls += 1
+  return subprocess.call(cmd, cwd=cwd)
+
+
+def _read_origin(cwd: str) -> Optional[str]:
+  try:
+    local_branch = run_cmd(["git", "name-rev", "--name-only", "HEAD"], cwd=cwd)
+    tracking_remote = run_cmd(["git", "config", "branch." + local_branch + ".remote"], cwd=cwd)
+    return run_cmd(["git", "config", "remote." + tracking_remote + ".url"], cwd=cwd)
+  except subprocess.CalledProcessError:  # Not on a branch, fallback
+    return run_cmd_default(["git", "config", "--get", "remote.origin.url"], cwd=cwd)
+
+
+def _read_dirty(cwd: str, origin: Optional[str], branch: Optional[str]) -> bool:
+  if (origin is None) or (branch is None):
+    return True
+
+  dirty = False
+  try:
+    # Actually check dirty files
+    if not os.path.exists(os.path.join(cwd, 'prebuilt')):
+      # This is needed otherwise touched files might show up as modified
+      run_cmd_status(["git", "update-index", "--refresh"], cwd=cwd)
+      dirty = (run_cmd_status(["git", "diff-index", "--quiet", branch, "--"], cwd=cwd) != 0)
+  except (OSError, subprocess.CalledProcessError):
+    cloudlog.exception("git subprocess failed while checking dirty")
+    dirty = True
+
+  return dirty
+
+
+def _read_version(basedir: str) -> str:
+  with open(os.path.join(basedir, "common", "version.h")) as _versionf:
+    return _versionf.read().split('"')[1]
+
+
+def _git_dir(basedir: str) -> Optional[str]:
+  path = os.path.join(basedir, ".git")
+  if os.path.isfile(path):
+    # worktree or submodule checkout
+    with open(path) as f:
+      line = f.read().strip()
+    if line.startswith("gitdir:"):
+      return os.path.normpath(os.path.join(basedir, line[len("gitdir:"):].strip()))
+    return None
+  return path if os.path.isdir(path) else None
+
+
+def checkout_key(basedir: str) -> Optional[List[Any]]:
+  """Identifies the state of the checkout without running git: where HEAD points and the
+  stat of every file a commit, checkout, reset, fetch or remote change writes. Edits to
+  the work tree don't change it, so whether the checkout is dirty isn't part of the snapshot."""
+  git_dir = _git_dir(basedir)
+  if git_dir is None:
+    return None
+
+  try:
+    with open(os.path.join(git_dir, "HEAD")) as f:
+      head = f.read().strip()
+  except OSError:
+    return None
+
+  paths = ["HEAD", "config", "packed-refs"]
+  if head.startswith("ref:"):
+    paths.append(head[len("ref:"):].strip())
+  files = [os.path.join(git_dir, p) for p in paths]
+
+  # no paths in the key, the snapshot stays valid when a finalized update is moved into place
+  key: List[Any] = [METADATA_VERSION, head]
+  for fn in files:
+    try:
+      st = os.stat(fn)
+      key.append([st.st_mtime_ns, st.st_size, st.st_ino])
+    except OSError:
+      key.append(None)
+  return key
+
+
+def generate_metadata(basedir: str = BASEDIR) -> Dict[str, Any]:
+  if _git_dir(basedir) is None:
+    return {"commit": None, "short_branch": None, "branch": None, "origin": None}
+
+  return {
+    "commit": run_cmd_default(["git", "rev-parse", "HEAD"], cwd=basedir),
+    "short_branch": run_cmd_default(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=basedir),
+    "branch": run_cmd_default(["git", "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"], cwd=basedir),
+    "origin": _read_origin(basedir),
+  }
+
+
+def write_metadata(basedir: str = BASEDIR) -> Dict[str, Any]:
+  """Generates the metadata snapshot of a checkout and stores it for every later reader.
+  Run after a build or update, otherwise the first reader after a checkout change does it."""
+  t = time.monotonic()
+  calls = subprocess_calls
+  metadata = generate_metadata(basedir)
+
+  key = checkout_key(basedir)
+  git_dir = _git_dir(basedir)
+  if key is not None and git_dir is not None:
+    try:
+      with atomic_write_in_dir(os.path.join(git_dir, METADATA_FILE), overwrite=True) as f:
+        json.dump({"key": key, "metadata": metadata}, f)
+    except OSError:
+      cloudlog.exception("failed to write version metadata")
+
+  cloudlog.event("version metadata generated", basedir=basedir, subprocesses=subprocess_calls - calls,
+                 duration=time.monotonic() - t)
+  return metadata
+
+
+def load_metadata(basedir: str = BASEDIR) -> Dict[str, Any]:
+  """Version metadata of a checkout from its snapshot, regenerated when the checkout changed"""
+  key = checkout_key(basedir)
+  git_dir = _git_dir(basedir)
+  if key is not None and git_dir is not None:
+    try:
+      with open(os.path.join(git_dir, METADATA_FILE)) as f:
+        stored = json.load(f)
+      if stored["key"] == key:
+        return stored["metadata"]
+    except (OSError, ValueError, KeyError, TypeError):
+      pass
+  return write_metadata(basedir)
+
+
+@cache
+def get_metadata() -> Dict[str, Any]:
+  return load_metadata(BASEDIR)
+
+
 @cache
 def get_commit(branch: str = "HEAD", default: Optional[str] = None) -> Optional[str]:
+  if branch == "HEAD":
+    commit = get_metadata()["commit"]
+    return commit if commit is not None else default
   return run_cmd_default(["git", "rev-parse", branch], default=default)
 
 
 @cache
 def get_short_branch(default: Optional[str] = None) -> Optional[str]:
-  return run_cmd_default(["git", "rev-parse", "--abbrev-ref", "HEAD"], default=default)
+  short_branch = get_metadata()["short_branch"]
+  return short_branch if short_branch is not None else default
 
 
 @cache
 def get_branch(default: Optional[str] = None) -> Optional[str]:
-  return run_cmd_default(["git", "rev-parse", "--abbrev-ref", "--symbolic-full-name", "@{u}"], default=default)
+  branch = get_metadata()["branch"]
+  return branch if branch is not None else default
 
 
 @cache
 def get_origin(default: Optional[str] = None) -> Optional[str]:
-  try:
-    local_branch = run_cmd(["git", "name-rev", "--name-only", "HEAD"])
-    tracking_remote = run_cmd(["git", "config", "branch." + local_branch + ".remote"])
-    return run_cmd(["git", "config", "remote." + tracking_remote + ".url"])
-  except subprocess.CalledProcessError:  # Not on a branch, fallback
-    return run_cmd_default(["git", "config", "--get", "remote.origin.url"], default=default)
+  origin = get_metadata()["origin"]
+  return origin if origin is not None else default
 
 
 @cache
@@ -68,9 +214,7 @@ def get_normalized_origin(default: Optional[str] = None) -> Optional[str]:
 
 @cache
 def get_version() -> str:
-  with open(os.path.join(BASEDIR, "common", "version.h")) as _versionf:
-    version = _versionf.read().split('"')[1]
-  return version
+  return _read_version(BASEDIR)
 
 @cache
 def get_short_version() -> str:
@@ -99,27 +243,8 @@ def is_tested_branch() -> bool:
 
 @cache
 def is_dirty() -> bool:
-  origin = get_origin()
-  branch = get_branch()
-  if (origin is None) or (branch is None):
-    return True
-
-  dirty = False
-  try:
-    # Actually check dirty files
-    if not is_prebuilt():
-      # This is needed otherwise touched files might show up as modified
-      try:
-        subprocess.check_call(["git", "update-index", "--refresh"])
-      except subprocess.CalledProcessError:
-        pass
-
-      dirty = (subprocess.call(["git", "diff-index", "--quiet", branch, "--"]) != 0)
-  except subprocess.CalledProcessError:
-    cloudlog.exception("git subprocess failed while checking dirty")
-    dirty = True
-
-  return dirty
+  # not snapshotted, edits to tracked files don't change the checkout key. runs git unless prebuilt
+  return _read_dirty(BASEDIR, get_origin(), get_branch())
 
 
 if __name__ == "__main__":
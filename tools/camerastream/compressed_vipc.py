@@ -1,108 +1,295 @@
 #!/usr/bin/env python3
-import av
 import os
 import sys
+import json
+import queue
+import signal
 import argparse
+import threading
 import numpy as np
-import multiprocessing
 import time
+from collections import deque
 
 import cereal.messaging as messaging
 from cereal.visionipc import VisionIpcServer, VisionStreamType
+from tools.lib.colorspace import ColorspaceConverter
 
 W, H = 1928, 1208
 V4L2_BUF_FLAG_KEYFRAME = 8
+PIPELINE_DEPTH = 4  # packets waiting on a frame out of the decoder, older ones are counted as dropped
+MAX_BACKLOG = 10  # queued packets of a stream before skipping ahead to its latest keyframe
+LATENCY_WINDOW = 1200  # samples of each latency kept, a minute at 20 fps
+HISTOGRAM_BINS = (0, 5, 10, 20, 50, 100, 200, 500, np.inf)  # ms
+STATS_INTERVAL = 5.  # s between printed summaries
 
-def decoder(addr, sock_name, vipc_server, vst, nvidia):
-  print("start decoder for %s" % sock_name)
-  if nvidia:
+ALL_CAMS = [
+  ("roadEncodeData", VisionStreamType.VISION_STREAM_ROAD),
+  ("wideRoadEncodeData", VisionStreamType.VISION_STREAM_WIDE_ROAD),
+  ("driverEncodeData", VisionStreamType.VISION_STREAM_DRIVER),
+]
+
+
+class RollingLatency:
+  """The last LATENCY_WINDOW samples of a latency in ms"""
+  def __init__(self, size=LATENCY_WINDOW):
+    self.samples = np.zeros(size)
+    self.count = 0
+
+  def add(self, ms):
+    self.samples[self.count % len(self.samples)] = ms
+    self.count += 1
+
+  @property
+  def window(self):
+    return self.samples[:min(self.count, len(self.samples))]
+
+  def summary(self):
+    w = self.window
+    if not len(w):
+      return None
+    p50, p95, p99 = np.percentile(w, [50, 95, 99])
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'max': float(w.max()),
+            'histogram': np.histogram(w, HISTOGRAM_BINS)[0].tolist()}
+
+
+class StreamStats:
+  def __init__(self):
+    self.packets = 0
+    self.frames = 0
+    self.lost_packets = 0  # gaps in encodeId, lost by the encoder or on the network
+    self.skipped_packets = 0  # waiting for a keyframe or skipped to catch up
+    self.dropped_frames = 0  # packets the decoder gave no frame for within PIPELINE_DEPTH packets
+    # encode: sensor to encoded on the device, network: device to here, decode: here to decoded,
+    # publish: into VisionIpc, total: all of them
+    self.latency = {k: RollingLatency() for k in ('encode', 'network', 'decode', 'publish', 'total')}
+    self.frame_times = deque(maxlen=LATENCY_WINDOW)
+
+  def fps(self):
+    if len(self.frame_times) < 2:
+      return 0.
+    return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+  def summary(self):
+    return {
+      'packets': self.packets,
+      'frames': self.frames,
+      'lost_packets': self.lost_packets,
+      'skipped_packets': self.skipped_packets,
+      'dropped_frames': self.dropped_frames,
+      'fps': self.fps(),
+      'latency_ms': {k: v.summary() for k, v in self.latency.items() if v.count},
+    }
+
+
+class FfmpegDecoder:
+  def __init__(self):
+    import av  # pylint: disable=import-error
+    self.av = av
+    self.codec = av.CodecContext.create("hevc", "r")
+    self.conv = ColorspaceConverter(W, H)
+    self.fmt = av.video.format.VideoFormat('yuv420p')
+
+  def decode(self, data, out):
+    frames = self.codec.decode(self.av.packet.Packet(data))
+    if len(frames) == 0:
+      return False
+    assert len(frames) == 1
+    self.conv.yuv420_to_nv12(frames[0].to_ndarray(format=self.fmt), out=out)
+    return True
+
+
+class NvidiaDecoder:
+  def __init__(self):
     os.environ["NV_LOW_LATENCY"] = "3"    # both bLowLatency and CUVID_PKT_ENDOFPICTURE
     sys.path += os.environ["LD_LIBRARY_PATH"].split(":")
     import PyNvCodec as nvc # pylint: disable=import-error
 
-    nvDec = nvc.PyNvDecoder(W, H, nvc.PixelFormat.NV12, nvc.CudaVideoCodec.HEVC, 0)
-    cc1 = nvc.ColorspaceConversionContext(nvc.ColorSpace.BT_709, nvc.ColorRange.JPEG)
-    conv_yuv = nvc.PySurfaceConverter(W, H, nvc.PixelFormat.NV12, nvc.PixelFormat.YUV420, 0)
-    nvDwn_yuv = nvc.PySurfaceDownloader(W, H, nvc.PixelFormat.YUV420, 0)
-    img_yuv = np.ndarray((H*W//2*3), dtype=np.uint8)
-  else:
-    codec = av.CodecContext.create("hevc", "r")
+    self.nvDec = nvc.PyNvDecoder(W, H, nvc.PixelFormat.NV12, nvc.CudaVideoCodec.HEVC, 0)
+    self.cc1 = nvc.ColorspaceConversionContext(nvc.ColorSpace.BT_709, nvc.ColorRange.JPEG)
+    self.conv_yuv = nvc.PySurfaceConverter(W, H, nvc.PixelFormat.NV12, nvc.PixelFormat.YUV420, 0)
+    self.nvDwn_yuv = nvc.PySurfaceDownloader(W, H, nvc.PixelFormat.YUV420, 0)
+
+  def decode(self, data, out):
+    rawSurface = self.nvDec.DecodeSurfaceFromPacket(np.frombuffer(data, dtype=np.uint8))
+    if rawSurface.Empty():
+      return False
+    convSurface = self.conv_yuv.Execute(rawSurface, self.cc1)
+    self.nvDwn_yuv.DownloadSingleSurface(convSurface, out)
+    return True
+
+
+class StreamDecoder:
+  """Decodes one encoded camera stream into a VisionIpc stream, one output buffer for every
+  frame. Packets are timestamped as they're handed over, pass live=False for packets that
+  weren't just received, like ones from a log, to leave out the network latency."""
+  def __init__(self, name, vipc_server, vst, decoder, live=True):
+    self.name = name
+    self.vipc_server = vipc_server
+    self.vst = vst
+    self.decoder = decoder
+    self.live = live
+
+    self.img_yuv = np.empty(W * H * 3 // 2, dtype=np.uint8)
+    self.pending = deque()  # arrival times of packets in the decoder
+    self.stats = StreamStats()
+    self.last_idx = -1
+    self.seen_iframe = False
+    self.frame_id = 0
+
+  def process(self, msgs):
+    if len(msgs) > MAX_BACKLOG:
+      # decoding fell behind, the frames before the latest keyframe can be skipped
+      keyframes = [i for i, evt in enumerate(msgs) if getattr(evt, evt.which()).idx.flags & V4L2_BUF_FLAG_KEYFRAME]
+      if len(keyframes) and keyframes[-1] > 0:
+        skip = keyframes[-1]
+        self.stats.packets += skip
+        self.stats.skipped_packets += skip
+        self.last_idx = getattr(msgs[skip - 1], msgs[skip - 1].which()).idx.encodeId
+        self.stats.dropped_frames += len(self.pending)
+        self.pending.clear()
+        msgs = msgs[skip:]
+
+    for evt in msgs:
+      self.process_packet(evt)
+
+  def process_packet(self, evt):
+    arrival = time.monotonic()
+    evta = getattr(evt, evt.which())
+    self.stats.packets += 1
+    if evta.idx.encodeId != 0 and evta.idx.encodeId != (self.last_idx+1):
+      self.stats.lost_packets += max(evta.idx.encodeId - self.last_idx - 1, 1)
+    self.last_idx = evta.idx.encodeId
+
+    if not self.seen_iframe:
+      if not (evta.idx.flags & V4L2_BUF_FLAG_KEYFRAME):
+        self.stats.skipped_packets += 1
+        return
+      # put in header (first)
+      self.decoder.decode(evta.header, self.img_yuv)
+      self.seen_iframe = True
+
+    encode_latency = (evt.logMonoTime - evta.idx.timestampEof) / 1e6
+    network_latency = (time.time_ns() - evta.unixTimestampNanos) / 1e6 if self.live else 0.
+    self.stats.latency['encode'].add(encode_latency)
+    if self.live:
+      self.stats.latency['network'].add(network_latency)
 
+    if len(self.pending) == PIPELINE_DEPTH:
+      # no frame came out for it by now, a delaying decoder only holds a few
+      self.pending.popleft()
+      self.stats.dropped_frames += 1
+    self.pending.append(arrival)
+    if not self.decoder.decode(evta.data, self.img_yuv):
+      return
+    decoded = time.monotonic()
+    # a decoder with delay outputs the frame of an earlier packet
+    arrival = self.pending.popleft()
+
+    self.vipc_server.send(self.vst, self.img_yuv.data, self.frame_id, int(arrival*1e9), int(decoded*1e9))
+    published = time.monotonic()
+    self.frame_id += 1
+    self.stats.frames += 1
+    self.stats.frame_times.append(published)
+
+    self.stats.latency['decode'].add((decoded - arrival) * 1e3)
+    self.stats.latency['publish'].add((published - decoded) * 1e3)
+    self.stats.latency['total'].add(encode_latency + network_latency + (published - arrival) * 1e3)
+
+
+def stats(decoders):
+  return {d.name: d.stats.summary() for d in decoders.values()}
+
+
+def print_stats(decoders):
+  for d in decoders.values():
+    s = d.stats
+    total = s.latency['total'].summary()
+    latency = f"latency p50 {total['p50']:6.2f} ms p95 {total['p95']:6.2f} ms" if total is not None else "no frames"
+    print(f"{d.name:<20} {s.fps():5.1f} fps, {s.frames} frames, {s.lost_packets} lost, {s.skipped_packets} skipped, "
+          f"{s.dropped_frames} dropped, {latency}")
+
+
+def receive(d, addr):
+  sock = messaging.sub_sock(d.name, None, addr=addr, conflate=False)
+  while 1:
+    d.process(messaging.drain_sock(sock, wait_for_one=True))
+
+
+def decode_live(addr, decoders):
   os.environ["ZMQ"] = "1"
   messaging.context = messaging.Context()
-  sock = messaging.sub_sock(sock_name, None, addr=addr, conflate=False)
-  cnt = 0
-  last_idx = -1
-  seen_iframe = False
+  # a thread per stream, the decoders release the GIL so the streams are decoded in parallel
+  for d in decoders.values():
+    threading.Thread(target=receive, args=(d, addr), name=d.name, daemon=True).start()
 
-  time_q = []
   while 1:
-    msgs = messaging.drain_sock(sock, wait_for_one=True)
-    for evt in msgs:
-      evta = getattr(evt, evt.which())
-      if evta.idx.encodeId != 0 and evta.idx.encodeId != (last_idx+1):
-        print("DROP PACKET!")
-      last_idx = evta.idx.encodeId
-      if not seen_iframe and not (evta.idx.flags & V4L2_BUF_FLAG_KEYFRAME):
-        print("waiting for iframe")
+    time.sleep(STATS_INTERVAL)
+    print_stats(decoders)
+
+
+def feed(d, q):
+  for evt in iter(q.get, None):
+    d.process([evt])
+
+
+def decode_logs(logs, decoders, realtime):
+  from tools.lib.logreader import LogReader
+
+  # a thread per stream like when decoding live, fed the stream's packets in log order
+  queues = {name: queue.Queue(maxsize=MAX_BACKLOG) for name in decoders}
+  threads = [threading.Thread(target=feed, args=(d, queues[name]), name=name, daemon=True) for name, d in decoders.items()]
+  for t in threads:
+    t.start()
+
+  start = None
+  for fn in logs:
+    for evt in LogReader(fn):
+      which = evt.which()
+      if which not in decoders:
         continue
-      time_q.append(time.monotonic())
-      network_latency = (int(time.time()*1e9) - evta.unixTimestampNanos)/1e6
-      frame_latency = ((evta.idx.timestampEof/1e9) - (evta.idx.timestampSof/1e9))*1000
-      process_latency = ((evt.logMonoTime/1e9) - (evta.idx.timestampEof/1e9))*1000
+      if realtime:
+        if start is None:
+          start = (time.monotonic(), evt.logMonoTime)
+        time.sleep(max((evt.logMonoTime - start[1]) / 1e9 - (time.monotonic() - start[0]), 0.))
+      queues[which].put(evt)
 
-      # put in header (first)
-      if not seen_iframe:
-        if nvidia:
-          nvDec.DecodeSurfaceFromPacket(np.frombuffer(evta.header, dtype=np.uint8))
-        else:
-          codec.decode(av.packet.Packet(evta.header))
-        seen_iframe = True
-
-      if nvidia:
-        rawSurface = nvDec.DecodeSurfaceFromPacket(np.frombuffer(evta.data, dtype=np.uint8))
-        if rawSurface.Empty():
-          print("DROP SURFACE")
-          continue
-        convSurface = conv_yuv.Execute(rawSurface, cc1)
-        nvDwn_yuv.DownloadSingleSurface(convSurface, img_yuv)
-      else:
-        frames = codec.decode(av.packet.Packet(evta.data))
-        if len(frames) == 0:
-          print("DROP SURFACE")
-          continue
-        assert len(frames) == 1
-        img_yuv = frames[0].to_ndarray(format=av.video.format.VideoFormat('yuv420p')).flatten()
-        uv_offset = H*W
-        y = img_yuv[:uv_offset]
-        uv = img_yuv[uv_offset:].reshape(2, -1).ravel('F')
-        img_yuv = np.hstack((y, uv))
-
-      vipc_server.send(vst, img_yuv.data, cnt, int(time_q[0]*1e9), int(time.monotonic()*1e9))
-      cnt += 1
-
-      pc_latency = (time.monotonic()-time_q[0])*1000
-      time_q = time_q[1:]
-      print("%2d %4d %.3f %.3f roll %6.2f ms latency %6.2f ms + %6.2f ms + %6.2f ms = %6.2f ms" % (len(msgs), evta.idx.encodeId, evt.logMonoTime/1e9, evta.idx.timestampEof/1e6, frame_latency, process_latency, network_latency, pc_latency, process_latency+network_latency+pc_latency ), len(evta.data), sock_name)
+  for q in queues.values():
+    q.put(None)
+  for t in threads:
+    t.join()
 
-if __name__ == "__main__":
+
+def main():
   parser = argparse.ArgumentParser(description="Decode video streams and broacast on VisionIPC")
-  parser.add_argument("addr", help="Address of comma three")
+  parser.add_argument("addr", nargs='?', help="Address of comma three")
   parser.add_argument("--nvidia", action="store_true", help="Use nvidia instead of ffmpeg")
   parser.add_argument("--cams", default="0,1,2", help="Cameras to decode")
+  parser.add_argument("--log", nargs='+', help="Decode the encoded packets in these logs instead, as fast as possible")
+  parser.add_argument("--realtime", action="store_true", help="Decode the logs' packets at the rate they were recorded")
   args = parser.parse_args()
+  if (args.addr is None) == (args.log is None):
+    parser.error("decode either from an address or from logs")
 
-  all_cams = [
-    ("roadEncodeData", VisionStreamType.VISION_STREAM_ROAD),
-    ("wideRoadEncodeData", VisionStreamType.VISION_STREAM_WIDE_ROAD),
-    ("driverEncodeData", VisionStreamType.VISION_STREAM_DRIVER),
-  ]
-  cams = dict([all_cams[int(x)] for x in args.cams.split(",")])
+  cams = dict([ALL_CAMS[int(x)] for x in args.cams.split(",")])
 
   vipc_server = VisionIpcServer("camerad")
   for vst in cams.values():
     vipc_server.create_buffers(vst, 4, False, W, H)
   vipc_server.start_listener()
 
-  for k,v in cams.items():
-    multiprocessing.Process(target=decoder, args=(args.addr, k, vipc_server, v, args.nvidia)).start()
+  decoder_type = NvidiaDecoder if args.nvidia else FfmpegDecoder
+  decoders = {name: StreamDecoder(name, vipc_server, vst, decoder_type(), live=args.log is None) for name, vst in cams.items()}
+  signal.signal(signal.SIGUSR1, lambda signum, frame: print(json.dumps(stats(decoders)), flush=True))
+
+  if args.log is not None:
+    t = time.monotonic()
+    decode_logs(args.log, decoders, args.realtime)
+    print(f"decoded {sum(d.stats.frames for d in decoders.values())} frames in {time.monotonic() - t:.1f} s")
+    print_stats(decoders)
+    print(json.dumps(stats(decoders)))
+  else:
+    decode_live(args.addr, decoders)
+
+
+if __name__ == "__main__":
+  main()
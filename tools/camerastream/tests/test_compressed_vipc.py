@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from tools.camerastream.compressed_vipc import LATENCY_WINDOW, MAX_BACKLOG, PIPELINE_DEPTH, V4L2_BUF_FLAG_KEYFRAME, \
+                                              RollingLatency, StreamDecoder, decode_logs
+
+
+def make_packet(encode_id, keyframe=False, which='roadEncodeData'):
+  now = time.monotonic_ns()
+  idx = SimpleNamespace(encodeId=encode_id, flags=V4L2_BUF_FLAG_KEYFRAME if keyframe else 0, timestampEof=now - 30_000_000)
+  data = SimpleNamespace(idx=idx, header=b'header', data=bytes([encode_id % 256]), unixTimestampNanos=time.time_ns())
+  return SimpleNamespace(which=lambda: which, logMonoTime=now, **{which: data})
+
+
+class FakeDecoder:
+  # outputs each packet's byte as a frame, delay packets late
+  def __init__(self, delay=0):
+    self.queue = []
+    self.delay = delay
+    self.threads = set()
+
+  def decode(self, data, out):
+    self.threads.add(threading.current_thread().name)
+    if data == b'header':
+      return False
+    self.queue.append(data[0])
+    if len(self.queue) <= self.delay:
+      return False
+    out[:] = self.queue.pop(0)
+    return True
+
+
+class FakeVipcServer:
+  def __init__(self):
+    self.sent = []
+
+  def send(self, vst, data, frame_id, sof, eof):
+    self.sent.append((data.obj, data[0], frame_id, sof, eof))
+
+
+class TestCompressedVipc(unittest.TestCase):
+  def setUp(self):
+    self.vipc_server = FakeVipcServer()
+
+  def stream(self, **kwargs):
+    return StreamDecoder('roadEncodeData', self.vipc_server, 0, FakeDecoder(**kwargs))
+
+  def test_decode(self):
+    d = self.stream()
+    for i in range(30):
+      d.process([make_packet(i, keyframe=i % 20 == 0)])
+    self.assertEqual(d.stats.frames, 30)
+    self.assertEqual([s[1:3] for s in self.vipc_server.sent], [(i, i) for i in range(30)])
+    # one output buffer for every frame
+    self.assertTrue(all(s[0] is d.img_yuv for s in self.vipc_server.sent))
+    self.assertTrue(all(s[3] <= s[4] for s in self.vipc_server.sent))
+
+    summary = d.stats.summary()
+    self.assertEqual(summary['lost_packets'] + summary['skipped_packets'] + summary['dropped_frames'], 0)
+    self.assertAlmostEqual(summary['latency_ms']['encode']['p50'], 30.)
+    self.assertEqual(sum(summary['latency_ms']['total']['histogram']), 30)
+    self.assertGreater(summary['fps'], 0.)
+
+  def test_wait_for_keyframe(self):
+    d = self.stream()
+    d.process([make_packet(i, keyframe=i == 3) for i in range(6)])
+    self.assertEqual(d.stats.skipped_packets, 3)
+    self.assertEqual([s[1] for s in self.vipc_server.sent], [3, 4, 5])
+    self.assertEqual([s[2] for s in self.vipc_server.sent], [0, 1, 2])
+
+  def test_lost_packets(self):
+    d = self.stream()
+    for i in (0, 1, 2, 5, 6, 9):
+      d.process([make_packet(i, keyframe=i == 0)])
+    self.assertEqual(d.stats.lost_packets, 4)
+    self.assertEqual(d.stats.frames, 6)
+
+  def test_decoder_delay(self):
+    d = self.stream(delay=1)
+    d.process([make_packet(i, keyframe=i == 0) for i in range(10)])
+    # the last frame is still in the decoder, not dropped
+    self.assertEqual(d.stats.dropped_frames, 0)
+    self.assertEqual([s[1] for s in self.vipc_server.sent], list(range(9)))
+    self.assertEqual(len(d.pending), 1)
+
+  def test_bounded_pipeline(self):
+    d = self.stream(delay=1000)
+    for i in range(100):
+      d.process([make_packet(i, keyframe=i == 0)])
+    self.assertEqual(d.stats.dropped_frames, 100 - PIPELINE_DEPTH)
+    self.assertEqual(len(d.pending), PIPELINE_DEPTH)
+
+  def test_backlog(self):
+    d = self.stream()
+    d.process([make_packet(i, keyframe=i in (0, 12)) for i in range(MAX_BACKLOG + 5)])
+    self.assertEqual(d.stats.skipped_packets, 12)
+    self.assertEqual(d.stats.lost_packets, 0)
+    self.assertEqual(d.stats.packets, MAX_BACKLOG + 5)
+    self.assertEqual([s[1] for s in self.vipc_server.sent], list(range(12, MAX_BACKLOG + 5)))
+
+  def test_not_live(self):
+    d = StreamDecoder('roadEncodeData', self.vipc_server, 0, FakeDecoder(), live=False)
+    d.process([make_packet(0, keyframe=True)])
+    self.assertNotIn('network', d.stats.summary()['latency_ms'])
+
+  def test_decode_logs(self):
+    names = ('roadEncodeData', 'driverEncodeData')
+    decoders = {name: StreamDecoder(name, self.vipc_server, 0, FakeDecoder(), live=False) for name in names}
+    log = [make_packet(i, keyframe=i == 0, which=name) for i in range(20) for name in names]
+    with mock.patch.dict('sys.modules', {'tools.lib.logreader': SimpleNamespace(LogReader=lambda fn: log)}):
+      decode_logs(['rlog'], decoders, realtime=False)
+
+    # every stream is decoded completely, in a thread of its own
+    for name, d in decoders.items():
+      self.assertEqual(d.stats.frames, 20)
+      self.assertEqual(d.decoder.threads, {name})
+
+  def test_rolling_latency(self):
+    latency = RollingLatency()
+    self.assertIsNone(latency.summary())
+    for ms in range(2 * LATENCY_WINDOW):
+      latency.add(1000. + ms)
+    summary = latency.summary()
+    self.assertEqual(len(latency.window), LATENCY_WINDOW)
+    self.assertEqual(summary['histogram'][-1], LATENCY_WINDOW)
+    self.assertEqual(summary['max'], 1000. + 2 * LATENCY_WINDOW - 1)
+    self.assertGreater(summary['p50'], 1000. + LATENCY_WINDOW)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Pixel format conversions between the camera, video and simulator formats.
+
+All conversions write into an optional preallocated output and keep their intermediate
+results in scratch buffers, allocated on the first conversion that needs them, so
+converting a stream of frames doesn't allocate. Scratch buffers make a converter not
+thread safe, use one per thread. Outputs are bit exact with the implementations they replaced."""
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+MAX_CONVERTERS = 2  # resolutions with cached converters per thread
+
+YUV_FROM_RGB = np.array([[ 0.299     ,  0.587     ,  0.114      ],
+                         [-0.14714119, -0.28886916,  0.43601035 ],
+                         [ 0.61497538, -0.51496512, -0.10001026 ]])
+
+
+class ColorspaceConverter:
+  def __init__(self, w, h):
+    assert w % 2 == 0 and h % 2 == 0, "chroma is subsampled 2x2"
+    self.w, self.h = w, h
+    self.y_size = w * h
+    self.uv_size = self.y_size // 4
+    self.yuv_size = self.y_size + 2 * self.uv_size
+    self.scratch = {}
+
+  def _scratch(self, name, shape, dtype):
+    buf = self.scratch.get(name)
+    if buf is None:
+      buf = self.scratch[name] = np.empty(shape, dtype=dtype)
+    return buf
+
+  def _out(self, out, shape):
+    if out is None:
+      return np.empty(shape, dtype=np.uint8)
+    assert out.shape == shape and out.dtype == np.uint8, (out.shape, out.dtype)
+    return out
+
+  def _rgb24_to_float(self, rgb):
+    h, w = self.h, self.w
+    rgbf = self._scratch('rgbf', (self.y_size, 3), np.float64)
+    img = self._scratch('img', (h, w, 3), np.float64)
+    rgbf[:] = rgb.reshape(-1, 3)
+    np.dot(rgbf, YUV_FROM_RGB.T, out=img.reshape(-1, 3))
+
+    # both chroma channels at once, summed in the same order as always
+    uv = self._scratch('uvf', (h // 2, w // 2, 2), np.float64)
+    np.add(img[::2, ::2, 1:], img[1::2, ::2, 1:], out=uv)
+    uv += img[::2, 1::2, 1:]
+    uv += img[1::2, 1::2, 1:]
+    uv /= 4
+    uv += 128
+    us = self._scratch('us', (h // 2, w // 2), np.float64)
+    vs = self._scratch('vs', (h // 2, w // 2), np.float64)
+    np.copyto(us, uv[:, :, 0])
+    np.copyto(vs, uv[:, :, 1])
+    return img[:, :, 0], us, vs
+
+  def rgb24_to_yuv(self, rgb):
+    """Full range float Y, U and V planes of an RGB image, U and V averaged over 2x2
+    blocks. Views into scratch buffers, valid until the next conversion."""
+    ys, us, vs = self._rgb24_to_float(rgb)
+    ys_out = self._scratch('ys', (self.h, self.w), np.float64)
+    np.copyto(ys_out, ys)
+    return ys_out, us, vs
+
+  def rgb24_to_yuv420(self, rgb, out=None):
+    """I420 frame of an RGB image"""
+    out = self._out(out, (self.yuv_size,))
+    ys, us, vs = self._rgb24_to_float(rgb)
+    # cast, not clipped, like the float planes always were. y and u are always in range,
+    # v of saturated colors isn't and is cast from the same contiguous layout as before
+    out[:self.y_size].reshape(self.h, self.w)[:] = ys
+    out[self.y_size:self.y_size + self.uv_size] = us.reshape(-1)
+    out[self.y_size + self.uv_size:] = vs.reshape(-1)
+    return out
+
+  def rgb24_to_nv12(self, rgb, out=None):
+    """NV12 frame of an RGB image"""
+    out = self._out(out, (self.yuv_size,))
+    ys, us, vs = self._rgb24_to_float(rgb)
+    out[:self.y_size].reshape(self.h, self.w)[:] = ys
+    out[self.y_size::2] = us.reshape(-1)
+    out[self.y_size + 1::2] = vs.reshape(-1)
+    return out
+
+  def bgr24_to_yuv420_fixed(self, bgr, out=None):
+    """I420 frame of a BGR image, fixed point limited range BT.601. Bit exact with the
+    rgb_to_yuv.cl kernel the simulator's camerad uses."""
+    out = self._out(out, (self.yuv_size,))
+    h, w = self.h, self.w
+    # every intermediate fits a short
+    planar = self._scratch('planar', (3, h, w), np.int16)
+    b, g, r = planar
+    np.copyto(planar, np.moveaxis(bgr, 2, 0))
+
+    y, tmp = self._scratch('y16', (h, w), np.int16), self._scratch('tmp16', (h, w), np.int16)
+    np.multiply(b, 13, out=y)
+    np.multiply(g, 65, out=tmp)
+    y += tmp
+    np.multiply(r, 33, out=tmp)
+    y += tmp
+    y += 64
+    y >>= 7
+    y += 16
+    out[:self.y_size].reshape(self.h, self.w)[:] = y
+
+    # the kernel halves the sum of each 2x2 block, twice the average
+    rows = self._scratch('rows16', (3, h // 2, w), np.int16)
+    avg = self._scratch('avg16', (3, h // 2, w // 2), np.int16)
+    np.add(planar[:, 0::2], planar[:, 1::2], out=rows)
+    np.add(rows[:, :, 0::2], rows[:, :, 1::2], out=avg)
+    avg += 1
+    avg >>= 1
+    ab, ag, ar = avg
+
+    # (x + 0x8080) >> 8 as ((x + 0x80) >> 8) + 0x80 keeps x in a short
+    uv, tmp = self._scratch('uv16', (h // 2, w // 2), np.int16), self._scratch('uvtmp16', (h // 2, w // 2), np.int16)
+    for i, (c0, c1, c2, k0, k1, k2) in enumerate(((ab, ag, ar, 56, 37, 19), (ar, ag, ab, 56, 47, 9))):
+      np.multiply(c0, k0, out=uv)
+      np.multiply(c1, k1, out=tmp)
+      uv -= tmp
+      np.multiply(c2, k2, out=tmp)
+      uv -= tmp
+      uv += 0x80
+      uv >>= 8
+      uv += 0x80
+      start = self.y_size + i * self.uv_size
+      out[start:start + self.uv_size].reshape(uv.shape)[:] = uv
+    return out
+
+  def yuv420_to_nv12(self, yuv, out=None):
+    """NV12 frame of an I420 frame, interleaving the chroma planes"""
+    out = self._out(out, (self.yuv_size,))
+    yuv = yuv.reshape(-1)
+    out[:self.y_size] = yuv[:self.y_size]
+    out[self.y_size::2] = yuv[self.y_size:self.y_size + self.uv_size]
+    out[self.y_size + 1::2] = yuv[self.y_size + self.uv_size:]
+    return out
+
+  def nv12_to_yuv420(self, nv12, out=None):
+    """I420 frame of an NV12 frame, splitting the chroma planes"""
+    out = self._out(out, (self.yuv_size,))
+    nv12 = nv12.reshape(-1)
+    out[:self.y_size] = nv12[:self.y_size]
+    out[self.y_size:self.y_size + self.uv_size] = nv12[self.y_size::2]
+    out[self.y_size + self.uv_size:] = nv12[self.y_size + 1::2]
+    return out
+
+  def debayer(self, raw, out=None):
+    """RGB image of a raw frame with twice the resolution, one pixel per 2x2 bayer block
+    with the two greens averaged"""
+    out = self._out(out, (self.h, self.w, 3))
+    raw = raw.reshape(self.h * 2, self.w * 2)
+    out[:, :, 0] = raw[0::2, 1::2]
+    green = self._scratch('green16', (self.h, self.w), np.uint16)
+    np.add(raw[0::2, 0::2], raw[1::2, 1::2], out=green, dtype=np.uint16)
+    green >>= 1
+    out[:, :, 1] = green
+    out[:, :, 2] = raw[1::2, 0::2]
+    return out
+
+
+_converters = threading.local()
+
+def get_converter(w, h):
+  """Converter for a resolution, shared by the calls of the current thread. Only the
+  MAX_CONVERTERS most recently used resolutions keep theirs."""
+  if not hasattr(_converters, 'lru'):
+    _converters.lru = OrderedDict()
+  lru = _converters.lru
+  conv = lru.get((w, h))
+  if conv is None:
+    conv = lru[(w, h)] = ColorspaceConverter(w, h)
+    while len(lru) > MAX_CONVERTERS:
+      lru.popitem(last=False)
+  lru.move_to_end((w, h))
+  return conv
+
+
+def benchmark(w, h, frames):
+  conv = ColorspaceConverter(w, h)
+  rgb = np.random.randint(0, 256, (h, w, 3), dtype=np.uint8)
+  yuv = np.random.randint(0, 256, conv.yuv_size, dtype=np.uint8)
+  raw = np.random.randint(0, 256, (h * 2, w * 2), dtype=np.uint8)
+  out = np.empty(conv.yuv_size, dtype=np.uint8)
+  out_rgb = np.empty((h, w, 3), dtype=np.uint8)
+
+  conversions = [
+    ("rgb24_to_yuv420", lambda: conv.rgb24_to_yuv420(rgb, out)),
+    ("rgb24_to_nv12", lambda: conv.rgb24_to_nv12(rgb, out)),
+    ("bgr24_to_yuv420_fixed", lambda: conv.bgr24_to_yuv420_fixed(rgb, out)),
+    ("yuv420_to_nv12", lambda: conv.yuv420_to_nv12(yuv, out)),
+    ("nv12_to_yuv420", lambda: conv.nv12_to_yuv420(yuv, out)),
+    ("debayer", lambda: conv.debayer(raw, out_rgb)),
+  ]
+  print(f"{w}x{h}, {frames} frames")
+  print(f"{'conversion':<22} {'ms/frame':>9} {'fps':>7}")
+  for name, f in conversions:
+    f()
+    t = time.perf_counter()
+    for _ in range(frames):
+      f()
+    dt = (time.perf_counter() - t) / frames
+    print(f"{name:<22} {dt * 1e3:9.2f} {1 / dt:7.1f}")
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Throughput of the colorspace conversions, the road camera needs 20 fps")
+  parser.add_argument("--width", type=int, default=1928)
+  parser.add_argument("--height", type=int, default=1208)
+  parser.add_argument("--frames", type=int, default=20)
+  args = parser.parse_args()
+  benchmark(args.width, args.height, args.frames)
@@ -14,6 +14,7 @@ from lru import LRU
 
 import _io
 from tools.lib.cache import cache_path_for_file_path
+from tools.lib.colorspace import get_converter
 from tools.lib.exceptions import DataUnreadableError
 from common.file_helpers import atomic_write_in_dir
 
@@ -186,46 +187,16 @@ def read_file_check_size(f, sz, cookie):
 
 
 def rgb24toyuv(rgb):
-  yuv_from_rgb = np.array([[ 0.299     ,  0.587     ,  0.114      ],
-                           [-0.14714119, -0.28886916,  0.43601035 ],
-                           [ 0.61497538, -0.51496512, -0.10001026 ]])
-  img = np.dot(rgb.reshape(-1, 3), yuv_from_rgb.T).reshape(rgb.shape)
-
-
-
-  ys = img[:, :, 0]
-  us = (img[::2, ::2, 1] + img[1::2, ::2, 1] + img[::2, 1::2, 1] + img[1::2, 1::2, 1]) / 4 + 128
-  vs = (img[::2, ::2, 2] + img[1::2, ::2, 2] + img[::2, 1::2, 2] + img[1::2, 1::2, 2]) / 4 + 128
-
-  return ys, us, vs
+  ys, us, vs = get_converter(rgb.shape[1], rgb.shape[0]).rgb24_to_yuv(rgb)
+  return ys.copy(), us.copy(), vs.copy()
 
 
 def rgb24toyuv420(rgb):
-  ys, us, vs = rgb24toyuv(rgb)
-
-  y_len = rgb.shape[0] * rgb.shape[1]
-  uv_len = y_len // 4
-
-  yuv420 = np.empty(y_len + 2 * uv_len, dtype=rgb.dtype)
-  yuv420[:y_len] = ys.reshape(-1)
-  yuv420[y_len:y_len + uv_len] = us.reshape(-1)
-  yuv420[y_len + uv_len:y_len + 2 * uv_len] = vs.reshape(-1)
-
-  return yuv420.clip(0, 255).astype('uint8')
+  return get_converter(rgb.shape[1], rgb.shape[0]).rgb24_to_yuv420(rgb)
 
 
 def rgb24tonv12(rgb):
-  ys, us, vs = rgb24toyuv(rgb)
-
-  y_len = rgb.shape[0] * rgb.shape[1]
-  uv_len = y_len // 4
-
-  nv12 = np.empty(y_len + 2 * uv_len, dtype=rgb.dtype)
-  nv12[:y_len] = ys.reshape(-1)
-  nv12[y_len::2] = us.reshape(-1)
-  nv12[y_len+1::2] = vs.reshape(-1)
-
-  return nv12.clip(0, 255).astype('uint8')
+  return get_converter(rgb.shape[1], rgb.shape[0]).rgb24_to_nv12(rgb)
 
 
 def decompress_video_data(rawdat, vid_fmt, w, h, pix_fmt):
@@ -320,9 +291,7 @@ class RawFrameReader(BaseFrameReader):
     self.w, self.h = 640, 480
 
   def load_and_debayer(self, img):
-    img = np.frombuffer(img, dtype='uint8').reshape(960, 1280)
-    cimg = np.dstack([img[0::2, 1::2], ((img[0::2, 0::2].astype("uint16") + img[1::2, 1::2].astype("uint16")) >> 1).astype("uint8"), img[1::2, 0::2]])
-    return cimg
+    return get_converter(self.w, self.h).debayer(np.frombuffer(img, dtype='uint8'))
 
   def get(self, num, count=1, pix_fmt="yuv420p"):
     assert self.frame_count is not None
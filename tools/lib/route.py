@@ -3,7 +3,7 @@ import re
 from urllib.parse import urlparse
 from collections import defaultdict
 from itertools import chain
-from typing import Optional
+from typing import List, Optional
 
 from tools.lib.auth_config import get_token
 from tools.lib.api import CommaApi
@@ -229,3 +229,15 @@ class SegmentName:
   def data_dir(self) -> Optional[str]: return self._data_dir
 
   def __str__(self) -> str: return self._canonical_name
+
+
+def get_log_paths(name: str, qlog: bool = False) -> List[str]:
+  """Log files of a log file path, a segment or a whole route, local or remote"""
+  if os.path.exists(name):
+    return [name]
+  sn = SegmentName(name, allow_route_name=True)
+  route = Route(sn.route_name.canonical_name, data_dir=sn.data_dir)
+  paths = route.qlog_paths() if qlog else route.log_paths()
+  if sn.segment_num >= 0:
+    paths = paths[sn.segment_num:sn.segment_num + 1]
+  return [p for p in paths if p is not None]
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import threading
+import unittest
+
+import numpy as np
+
+from tools.lib.colorspace import MAX_CONVERTERS, ColorspaceConverter, get_converter
+
+# the implementations the converter replaced, as they were
+
+def rgb24toyuv(rgb):
+  yuv_from_rgb = np.array([[ 0.299     ,  0.587     ,  0.114      ],
+                           [-0.14714119, -0.28886916,  0.43601035 ],
+                           [ 0.61497538, -0.51496512, -0.10001026 ]])
+  img = np.dot(rgb.reshape(-1, 3), yuv_from_rgb.T).reshape(rgb.shape)
+  ys = img[:, :, 0]
+  us = (img[::2, ::2, 1] + img[1::2, ::2, 1] + img[::2, 1::2, 1] + img[1::2, 1::2, 1]) / 4 + 128
+  vs = (img[::2, ::2, 2] + img[1::2, ::2, 2] + img[::2, 1::2, 2] + img[1::2, 1::2, 2]) / 4 + 128
+  return ys, us, vs
+
+
+def rgb24toyuv420(rgb):
+  ys, us, vs = rgb24toyuv(rgb)
+  y_len = rgb.shape[0] * rgb.shape[1]
+  uv_len = y_len // 4
+  yuv420 = np.empty(y_len + 2 * uv_len, dtype=rgb.dtype)
+  yuv420[:y_len] = ys.reshape(-1)
+  yuv420[y_len:y_len + uv_len] = us.reshape(-1)
+  yuv420[y_len + uv_len:y_len + 2 * uv_len] = vs.reshape(-1)
+  return yuv420.clip(0, 255).astype('uint8')
+
+
+def rgb24tonv12(rgb):
+  ys, us, vs = rgb24toyuv(rgb)
+  y_len = rgb.shape[0] * rgb.shape[1]
+  uv_len = y_len // 4
+  nv12 = np.empty(y_len + 2 * uv_len, dtype=rgb.dtype)
+  nv12[:y_len] = ys.reshape(-1)
+  nv12[y_len::2] = us.reshape(-1)
+  nv12[y_len+1::2] = vs.reshape(-1)
+  return nv12.clip(0, 255).astype('uint8')
+
+
+def load_and_debayer(img, w, h):
+  img = np.frombuffer(img, dtype='uint8').reshape(h * 2, w * 2)
+  return np.dstack([img[0::2, 1::2], ((img[0::2, 0::2].astype("uint16") + img[1::2, 1::2].astype("uint16")) >> 1).astype("uint8"), img[1::2, 0::2]])
+
+
+def decoder_shuffle(img_yuv, w, h):
+  # tools/camerastream/compressed_vipc.py
+  uv_offset = h * w
+  y = img_yuv[:uv_offset]
+  uv = img_yuv[uv_offset:].reshape(2, -1).ravel('F')
+  return np.hstack((y, uv))
+
+
+def rgb_to_yuv_kernel(bgr):
+  # one pixel and one 2x2 block at a time, straight from the macros in rgb_to_yuv.cl
+  h, w = bgr.shape[:2]
+  bgr = bgr.astype(int)
+  y = np.zeros((h, w), dtype=int)
+  u = np.zeros((h // 2, w // 2), dtype=int)
+  v = np.zeros((h // 2, w // 2), dtype=int)
+  for i in range(h):
+    for j in range(w):
+      b, g, r = bgr[i, j]
+      y[i, j] = ((b * 13 + g * 65 + r * 33 + 64) >> 7) + 16
+  for i in range(h // 2):
+    for j in range(w // 2):
+      block = bgr[2 * i:2 * i + 2, 2 * j:2 * j + 2].reshape(4, 3)
+      ab, ag, ar = ((block.sum(axis=0) + 1) >> 1)
+      u[i, j] = (ab * 56 - ag * 37 - ar * 19 + 0x8080) >> 8
+      v[i, j] = (ar * 56 - ag * 47 - ab * 9 + 0x8080) >> 8
+  return np.concatenate([y.ravel(), u.ravel(), v.ravel()]).astype(np.uint8)
+
+
+def images(w, h):
+  np.random.seed(0)
+  yield np.random.randint(0, 256, (h, w, 3), dtype=np.uint8)
+  # saturated colors push the float chroma out of range
+  for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255), (0, 0, 0), (255, 255, 255)):
+    yield np.tile(np.array(color, dtype=np.uint8), (h, w, 1))
+
+
+class TestColorspace(unittest.TestCase):
+  def setUp(self):
+    self.w, self.h = 64, 48
+    self.conv = ColorspaceConverter(self.w, self.h)
+
+  def test_rgb24_to_yuv(self):
+    out = np.empty(self.conv.yuv_size, dtype=np.uint8)
+    for rgb in images(self.w, self.h):
+      for _ in range(2):
+        np.testing.assert_array_equal(self.conv.rgb24_to_yuv420(rgb), rgb24toyuv420(rgb))
+        np.testing.assert_array_equal(self.conv.rgb24_to_nv12(rgb, out), rgb24tonv12(rgb))
+
+      for plane, expected in zip(self.conv.rgb24_to_yuv(rgb), rgb24toyuv(rgb)):
+        np.testing.assert_array_equal(plane, expected)
+
+  def test_bgr24_to_yuv420_fixed(self):
+    for w, h in ((64, 48), (6, 10), (34, 50)):
+      conv = ColorspaceConverter(w, h)
+      for bgr in images(w, h):
+        np.testing.assert_array_equal(conv.bgr24_to_yuv420_fixed(bgr), rgb_to_yuv_kernel(bgr))
+
+  def test_nv12(self):
+    yuv = np.random.randint(0, 256, self.conv.yuv_size, dtype=np.uint8)
+    nv12 = self.conv.yuv420_to_nv12(yuv)
+    np.testing.assert_array_equal(nv12, decoder_shuffle(yuv, self.w, self.h))
+    np.testing.assert_array_equal(self.conv.nv12_to_yuv420(nv12), yuv)
+    # decoded frames come as a (h * 3 / 2, w) image
+    np.testing.assert_array_equal(self.conv.yuv420_to_nv12(yuv.reshape(-1, self.w)), nv12)
+
+  def test_debayer(self):
+    raw = np.random.randint(0, 256, (self.h * 2, self.w * 2), dtype=np.uint8).tobytes()
+    out = np.empty((self.h, self.w, 3), dtype=np.uint8)
+    self.conv.debayer(np.frombuffer(raw, dtype=np.uint8), out)
+    np.testing.assert_array_equal(out, load_and_debayer(raw, self.w, self.h))
+
+  def test_allocation_free(self):
+    # with an output, the result is written into it and returned
+    rgb = next(images(self.w, self.h))
+    out = np.empty(self.conv.yuv_size, dtype=np.uint8)
+    self.assertIs(self.conv.bgr24_to_yuv420_fixed(rgb, out), out)
+    self.assertIs(self.conv.rgb24_to_yuv420(rgb, out), out)
+    with self.assertRaises(AssertionError):
+      self.conv.rgb24_to_yuv420(rgb, np.empty(self.conv.yuv_size - 1, dtype=np.uint8))
+
+  def test_scratch_on_use(self):
+    # a converter only holds the buffers of the conversions it ran
+    raw = np.random.randint(0, 256, (self.h * 2, self.w * 2), dtype=np.uint8)
+    self.conv.debayer(raw)
+    self.assertEqual(list(self.conv.scratch), ['green16'])
+
+  def test_get_converter(self):
+    conv = get_converter(self.w, self.h)
+    self.assertIs(get_converter(self.w, self.h), conv)
+
+    # one per thread, scratch buffers aren't shared
+    other = []
+    t = threading.Thread(target=lambda: other.append(get_converter(self.w, self.h)))
+    t.start()
+    t.join()
+    self.assertIsNot(other[0], conv)
+
+    # only the most recently used resolutions are kept
+    for i in range(MAX_CONVERTERS):
+      get_converter(self.w + 2 * (i + 1), self.h)
+    self.assertIsNot(get_converter(self.w, self.h), conv)
+
+
+if __name__ == "__main__":
+  unittest.main()
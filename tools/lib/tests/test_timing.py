@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from tools.lib import timing
+from tools.lib.timing import FLUSH_SIZE, ORIGINS_KEPT, Histogram, TimingAnalyzer, analyze, compare_reports
+
+SERVICE_LIST = {'carState': SimpleNamespace(frequency=100.), 'modelV2': SimpleNamespace(frequency=20.)}
+
+
+def make_msg(which, t, valid=True, **fields):
+  return SimpleNamespace(which=lambda: which, logMonoTime=int(t * 1e9), valid=valid, **{which: SimpleNamespace(**fields)})
+
+
+def make_proc(pid, name, cpu):
+  return SimpleNamespace(pid=pid, name=name, cmdline=[name], cpuUser=cpu, cpuSystem=0., cpuChildrenUser=0., cpuChildrenSystem=0.)
+
+
+def make_core(n, busy, idle):
+  return SimpleNamespace(cpuNum=n, user=busy, nice=0., system=0., idle=idle, iowait=0., irq=0., softirq=0.)
+
+
+def drive(seconds=10.):
+  # camera frames at 20Hz, the model 40ms after them, the planners 10ms after the model and controls at 100Hz
+  msgs = []
+  for i in range(1, int(seconds * 20) + 1):
+    frame = i * 0.05
+    model = frame + 0.04
+    msgs.append(make_msg('modelV2', model, timestampEof=int(frame * 1e9), modelExecutionTime=0.03, gpuExecutionTime=0.))
+    msgs.append(make_msg('lateralPlan', model + 0.01, modelMonoTime=int(model * 1e9), solverExecutionTime=0.002))
+  for i in range(int(seconds * 100) + 10):
+    msgs.append(make_msg('controlsState', i * 0.01 + 0.005, lateralPlanMonoTime=0, longitudinalPlanMonoTime=0))
+  msgs.sort(key=lambda m: m.logMonoTime)
+
+  plan = 0
+  for m in msgs:
+    if m.which() == 'lateralPlan':
+      plan = m.logMonoTime
+    elif m.which() == 'controlsState':
+      m.controlsState.lateralPlanMonoTime = plan
+  return msgs
+
+
+class TestTiming(unittest.TestCase):
+  def test_histogram(self):
+    x = np.random.default_rng(0).lognormal(np.log(0.01), 0.5, 3 * FLUSH_SIZE + 10)
+    h = Histogram()
+    for v in x:
+      h.add(v)
+    s = h.summary()
+    self.assertEqual(s['count'], len(x))
+    self.assertAlmostEqual(s['mean'], np.mean(x) * 1e3)
+    self.assertAlmostEqual(s['std'], np.std(x) * 1e3)
+    self.assertEqual(s['max'], np.max(x) * 1e3)
+    # within half a bin of the sample at that rank
+    for q in timing.PERCENTILES:
+      np.testing.assert_allclose(s[f'p{q:g}'], np.sort(x)[int(q / 100 * (len(x) - 1))] * 1e3, rtol=0.006)
+    self.assertEqual(Histogram().summary(), {'count': 0})
+
+  @mock.patch.object(timing, 'service_list', SERVICE_LIST)
+  def test_services(self):
+    rng = np.random.default_rng(0)
+    t = np.cumsum(0.01 + rng.normal(0, 0.001, 1001))
+    report = analyze(make_msg('carState', x, valid=i % 100 != 0) for i, x in enumerate(t))
+    s = report['services']['carState']
+    self.assertEqual(s['count'], 1001)
+    self.assertAlmostEqual(s['valid'], 1 - 11 / 1001)
+    self.assertAlmostEqual(s['frequency'], 1000 / (t[-1] - t[0]), places=3)
+    self.assertAlmostEqual(s['rsd'], np.std(np.diff(t)) / 0.01, places=3)
+    self.assertAlmostEqual(s['dt']['p50'], np.median(np.diff(t)) * 1e3, delta=0.15)
+    self.assertAlmostEqual(report['duration'], t[-1] - t[0], places=6)
+
+  def test_lag(self):
+    report = analyze(drive())
+    for link, lag in (('frame->modelV2', 40.), ('modelV2->lateralPlan', 10.)):
+      self.assertEqual(report['lag'][link]['count'], 200)
+      self.assertAlmostEqual(report['lag'][link]['mean'], lag, places=3)
+    # controls only count the first time they use a plan
+    controls = report['lag']['lateralPlan->controlsState']
+    self.assertEqual(controls['count'], 200)
+    self.assertAlmostEqual(controls['mean'], 5., places=3)
+    self.assertAlmostEqual(report['e2e']['lateralPlan->controlsState']['mean'], 55., places=3)
+    self.assertAlmostEqual(report['execution']['modelV2.modelExecutionTime']['p50'], 30., delta=0.3)
+    self.assertNotIn('longitudinalPlan->controlsState', report['lag'])
+
+  def test_bounded(self):
+    analyzer = TimingAnalyzer()
+    for msg in drive(60.):
+      analyzer.update(msg)
+    self.assertTrue(all(len(o) <= ORIGINS_KEPT for o in analyzer.origins.values()))
+    self.assertEqual(analyzer.report()['lag']['frame->modelV2']['count'], 1200)
+
+  def test_cpu(self):
+    msgs = []
+    for i in range(11):
+      procs = [make_proc(1, "./camerad", 0.1 * i), make_proc(2, "selfdrive.controls.controlsd", 0.3 * i)]
+      if i >= 5:
+        # restarted, a new pid
+        procs.append(make_proc(3, "./camerad", 0.05 * (i - 5)))
+      cores = [make_core(0, 0.5 * i, 0.5 * i), make_core(1, 0.25 * i, 0.75 * i)]
+      msgs.append(make_msg('procLog', i, procs=procs, cpuTimes=cores))
+    report = analyze(msgs)
+    self.assertAlmostEqual(report['cpu']['./camerad'], 15.)
+    self.assertAlmostEqual(report['cpu']['selfdrive.controls.controlsd'], 30.)
+    self.assertEqual(list(report['cpu']), ['selfdrive.controls.controlsd', './camerad'])
+    np.testing.assert_allclose(report['cores'], [50., 25.])
+
+  def test_compare(self):
+    base = analyze(drive())
+    self.assertEqual(compare_reports(base, base), [])
+
+    slow = [m for m in drive()]
+    for m in slow:
+      if m.which() == 'modelV2':
+        m.modelV2.modelExecutionTime = 0.045
+    diffs = compare_reports(base, analyze(slow))
+    self.assertEqual(len(diffs), 2, diffs)
+    self.assertTrue(all(d.startswith("execution modelV2.modelExecutionTime") for d in diffs))
+
+    base['cpu'] = {'./camerad': 10.}
+    self.assertEqual(compare_reports(base, dict(base, cpu={'./camerad': 11.})), [])
+    self.assertEqual(len(compare_reports(base, dict(base, cpu={'./camerad': 12.}))), 1)
+    self.assertEqual(compare_reports(base, dict(base, services={})), [f"{s}: missing" for s in base['services']])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,280 @@
+"""Timing health of a log in one pass: service frequencies and inter-arrival jitter, execution
+times, lag from camera frame to controls and per process CPU usage.
+
+Distributions are kept as counts in log spaced bins and only the first and latest procLog of
+each process are kept, so memory doesn't grow with the length of the log. Reports are plain
+json serializable dicts, times in ms, so reports of different runs can be compared."""
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from cereal.services import service_list
+
+HISTOGRAM_EDGES = np.geomspace(1e-6, 1e3, 1801)  # s, bins 1.2% wide
+FLUSH_SIZE = 4096  # samples batched before they're binned
+ORIGINS_KEPT = 100  # recent messages of each service remembered as the start of a lag chain
+PERCENTILES = (50, 90, 99, 99.9)
+
+# fields with how long producing a message took, in s
+EXECUTION_TIMES = {
+  'roadCameraState': ['processingTime'],
+  'wideRoadCameraState': ['processingTime'],
+  'driverCameraState': ['processingTime'],
+  'modelV2': ['modelExecutionTime', 'gpuExecutionTime'],
+  'driverStateV2': ['modelExecutionTime', 'gpuExecutionTime'],
+  'lateralPlan': ['solverExecutionTime'],
+  'longitudinalPlan': ['solverExecutionTime'],
+}
+
+# messages and the field with the time of the message or frame they were computed from
+LAG_LINKS = {
+  'modelV2': [('frame', 'timestampEof')],
+  'lateralPlan': [('modelV2', 'modelMonoTime')],
+  'longitudinalPlan': [('modelV2', 'modelMonoTime')],
+  'controlsState': [('lateralPlan', 'lateralPlanMonoTime'), ('longitudinalPlan', 'longitudinalPlanMonoTime')],
+}
+
+
+def proc_cputime_total(ct):
+  return ct.cpuUser + ct.cpuSystem + ct.cpuChildrenUser + ct.cpuChildrenSystem
+
+
+def cputime_total(ct):
+  return ct.user + ct.nice + ct.system + ct.idle + ct.iowait + ct.irq + ct.softirq
+
+
+def cputime_busy(ct):
+  return ct.user + ct.nice + ct.system + ct.irq + ct.softirq
+
+
+def proc_name(proc):
+  return proc.cmdline[0] if len(proc.cmdline) else proc.name
+
+
+class Histogram:
+  """Distribution of durations in s, percentiles to within a bin"""
+  def __init__(self):
+    self.counts = np.zeros(len(HISTOGRAM_EDGES) + 1, dtype=np.int64)
+    self.batch = []
+    self.n = 0
+    self.sum = self.sum_sq = 0.
+    self.min, self.max = np.inf, -np.inf
+
+  def add(self, x):
+    self.batch.append(x)
+    if len(self.batch) >= FLUSH_SIZE:
+      self.flush()
+
+  def flush(self):
+    if not len(self.batch):
+      return
+    x = np.array(self.batch, dtype=np.float64)
+    self.batch = []
+    self.counts += np.bincount(np.searchsorted(HISTOGRAM_EDGES, x), minlength=len(self.counts))
+    self.n += len(x)
+    self.sum += x.sum()
+    self.sum_sq += np.dot(x, x)
+    self.min, self.max = min(self.min, x.min()), max(self.max, x.max())
+
+  @property
+  def mean(self):
+    return self.sum / self.n
+
+  @property
+  def std(self):
+    return np.sqrt(max(self.sum_sq / self.n - self.mean ** 2, 0.))
+
+  def percentile(self, q):
+    rank = q / 100 * (self.n - 1)
+    i = int(np.searchsorted(np.cumsum(self.counts), rank, side='right'))
+    if i == 0:
+      return self.min
+    if i == len(HISTOGRAM_EDGES):
+      return self.max
+    return float(np.clip(np.sqrt(HISTOGRAM_EDGES[i - 1] * HISTOGRAM_EDGES[i]), self.min, self.max))
+
+  def summary(self):
+    """Count, mean, std, min, max and percentiles in ms"""
+    self.flush()
+    if self.n == 0:
+      return {'count': 0}
+    s = {'count': self.n, 'mean': self.mean * 1e3, 'std': self.std * 1e3, 'min': self.min * 1e3, 'max': self.max * 1e3}
+    for q in PERCENTILES:
+      s[f'p{q:g}'] = self.percentile(q) * 1e3
+    return s
+
+
+class ServiceTiming:
+  def __init__(self, name):
+    self.name = name
+    self.frequency = service_list[name].frequency if name in service_list else 0.
+    self.count = 0
+    self.invalid = 0
+    self.first = self.last = None
+    self.dt = Histogram()
+
+  def update(self, msg):
+    t = msg.logMonoTime
+    if self.last is not None:
+      self.dt.add((t - self.last) / 1e9)
+    else:
+      self.first = t
+    self.last = t
+    self.count += 1
+    self.invalid += not msg.valid
+
+  def summary(self):
+    s = {'count': self.count, 'valid': 1. - self.invalid / self.count, 'expected_frequency': self.frequency, 'frequency': 0.,
+         'dt': self.dt.summary()}
+    if self.count > 1:
+      s['frequency'] = (self.count - 1) / ((self.last - self.first) / 1e9)
+      if self.frequency > 0:
+        dt = 1e3 / self.frequency
+        # relative to the expected period, like test_onroad's timing checks
+        s['rsd'] = s['dt']['std'] / dt
+        s['max_deviation'] = max(abs(s['dt']['max'] / dt - 1), abs(s['dt']['min'] / dt - 1))
+    return s
+
+
+class TimingAnalyzer:
+  """Feed every message of a log in order with update, then get the report"""
+  def __init__(self):
+    self.services = {}
+    self.execution = defaultdict(Histogram)
+    self.lag = defaultdict(Histogram)
+    self.e2e = defaultdict(Histogram)  # from the camera frame at the start of each chain
+    self.origins = defaultdict(OrderedDict)  # service -> logMonoTime -> time of the frame it's from
+    self.last_upstream = {}
+
+    self.first_proclog = {}  # (pid, name) -> logMonoTime, cpu time
+    self.last_proclog = {}
+    self.first_cores = None
+    self.last_cores = None
+    self.first_t = self.last_t = None
+
+  def update(self, msg):
+    which = msg.which()
+    t = msg.logMonoTime
+    if self.first_t is None:
+      self.first_t = t
+    self.last_t = t
+
+    if which not in self.services:
+      self.services[which] = ServiceTiming(which)
+    self.services[which].update(msg)
+
+    if which in EXECUTION_TIMES or which in LAG_LINKS or which == 'procLog':
+      m = getattr(msg, which)
+      for field in EXECUTION_TIMES.get(which, []):
+        self.execution[f'{which}.{field}'].add(getattr(m, field))
+      if which in LAG_LINKS:
+        self._update_lag(which, t, m)
+      if which == 'procLog':
+        self._update_cpu(t, m)
+
+  def _update_lag(self, which, t, m):
+    origin = None
+    for upstream, field in LAG_LINKS[which]:
+      upstream_t = getattr(m, field)
+      # only the first message computed from each upstream message, 0 is before there was one
+      if upstream_t == 0 or self.last_upstream.get((which, field)) == upstream_t:
+        continue
+      self.last_upstream[(which, field)] = upstream_t
+
+      link = f'{upstream}->{which}'
+      self.lag[link].add((t - upstream_t) / 1e9)
+      start = upstream_t if upstream == 'frame' else self.origins[upstream].get(upstream_t)
+      if start is not None:
+        self.e2e[link].add((t - start) / 1e9)
+        origin = start if origin is None else origin
+
+    if origin is not None:
+      origins = self.origins[which]
+      origins[t] = origin
+      if len(origins) > ORIGINS_KEPT:
+        origins.popitem(last=False)
+
+  def _update_cpu(self, t, m):
+    for p in m.procs:
+      key = (p.pid, proc_name(p))
+      self.last_proclog[key] = (t, proc_cputime_total(p))
+      if key not in self.first_proclog:
+        self.first_proclog[key] = self.last_proclog[key]
+
+    cores = {c.cpuNum: (cputime_busy(c), cputime_total(c)) for c in m.cpuTimes}
+    if self.first_cores is None:
+      self.first_cores = cores
+    self.last_cores = cores
+
+  def cpu_usage(self):
+    """CPU usage of each process in %, processes with the same name added up"""
+    usage = defaultdict(float)
+    for key, (t0, cpu0) in self.first_proclog.items():
+      t1, cpu1 = self.last_proclog[key]
+      if t1 > t0:
+        usage[key[1]] += (cpu1 - cpu0) / ((t1 - t0) / 1e9) * 100.
+    return dict(sorted(usage.items(), key=lambda x: -x[1]))
+
+  def core_usage(self):
+    """Busy % of each core"""
+    if self.first_cores is None:
+      return []
+    usage = []
+    for n in sorted(self.last_cores):
+      busy0, total0 = self.first_cores.get(n, (0., 0.))
+      busy1, total1 = self.last_cores[n]
+      usage.append((busy1 - busy0) / (total1 - total0) * 100. if total1 > total0 else 0.)
+    return usage
+
+  def report(self):
+    return {
+      'duration': (self.last_t - self.first_t) / 1e9 if self.first_t is not None else 0.,
+      'services': {k: v.summary() for k, v in sorted(self.services.items())},
+      'execution': {k: v.summary() for k, v in sorted(self.execution.items())},
+      'lag': {k: v.summary() for k, v in sorted(self.lag.items())},
+      'e2e': {k: v.summary() for k, v in sorted(self.e2e.items())},
+      'cpu': self.cpu_usage(),
+      'cores': self.core_usage(),
+    }
+
+
+def analyze(msgs):
+  """Report of an iterable of messages in log order"""
+  analyzer = TimingAnalyzer()
+  for msg in msgs:
+    analyzer.update(msg)
+  return analyzer.report()
+
+
+def _regression(new, base, rtol, atol):
+  return new > base * (1 + rtol) and new > base + atol
+
+
+def compare_reports(base, new, rtol=0.15, atol=1.0):
+  """Regressions in a report from a baseline: services that got slower, less regular, or late
+  and processes using more CPU, by more than rtol relative and atol in ms or %"""
+  diffs = []
+  for s, b in base['services'].items():
+    n = new['services'].get(s)
+    if n is None:
+      diffs.append(f"{s}: missing")
+      continue
+    if b['frequency'] > 0 and abs(n['frequency'] / b['frequency'] - 1) > rtol:
+      diffs.append(f"{s}: frequency {b['frequency']:.2f} Hz -> {n['frequency']:.2f} Hz")
+    if b['dt']['count'] and n['dt']['count'] and _regression(n['dt']['p99'], b['dt']['p99'], rtol, atol):
+      diffs.append(f"{s}: dt p99 {b['dt']['p99']:.2f} ms -> {n['dt']['p99']:.2f} ms")
+
+  for section in ('execution', 'lag', 'e2e'):
+    for k, b in base[section].items():
+      n = new[section].get(k)
+      if n is None or not n['count'] or not b['count']:
+        continue
+      for p in ('p50', 'p99'):
+        if _regression(n[p], b[p], rtol, atol):
+          diffs.append(f"{section} {k}: {p} {b[p]:.2f} ms -> {n[p]:.2f} ms")
+
+  for proc, b in base['cpu'].items():
+    n = new['cpu'].get(proc, 0.)
+    if _regression(n, b, rtol, atol):
+      diffs.append(f"cpu {proc}: {b:.2f}% -> {n:.2f}%")
+  return diffs
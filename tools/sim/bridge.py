@@ -1,35 +1,26 @@
 #!/usr/bin/env python3
 import argparse
 import math
-import os
 import signal
 import threading
-import time
 from multiprocessing import Process, Queue
 from typing import Any
 
 import carla  # pylint: disable=import-error
 import numpy as np
-import pyopencl as cl
-import pyopencl.array as cl_array
 
 import cereal.messaging as messaging
-from cereal import log
-from cereal.visionipc import VisionIpcServer, VisionStreamType
-from common.basedir import BASEDIR
 from common.numpy_fast import clip
 from common.params import Params
-from common.realtime import DT_DMON, Ratekeeper
+from common.realtime import Ratekeeper
 from selfdrive.car.honda.values import CruiseButtons
 from selfdrive.test.helpers import set_params_enabled
-from tools.sim.lib.can import can_function
+from tools.sim.lib.camerad import Camerad
+from tools.sim.lib.common import H, STEER_RATIO, W, VehicleState, fake_car_threads, gps_callback, imu_callback, steer_rate_limit
 
-W, H = 1928, 1208
 REPEAT_COUNTER = 5
 PRINT_DECIMATION = 100
-STEER_RATIO = 15.
 
-pm = messaging.PubMaster(['roadCameraState', 'wideRoadCameraState', 'sensorEvents', 'can', "gpsLocationExternal"])
 sm = messaging.SubMaster(['carControl', 'controlsState'])
 
 def parse_args(add_args=None):
@@ -37,192 +28,19 @@ def parse_args(add_args=None):
   parser.add_argument('--joystick', action='store_true')
   parser.add_argument('--high_quality', action='store_true')
   parser.add_argument('--dual_camera', action='store_true')
+  parser.add_argument('--cpu', action='store_true', help='convert camera frames on the CPU instead of with OpenCL')
   parser.add_argument('--town', type=str, default='Town04_Opt')
   parser.add_argument('--spawn_point', dest='num_selected_spawn_point', type=int, default=16)
 
   return parser.parse_args(add_args)
 
 
-class VehicleState:
-  def __init__(self):
-    self.speed = 0.0
-    self.angle = 0.0
-    self.bearing_deg = 0.0
-    self.vel = carla.Vector3D()
-    self.cruise_button = 0
-    self.is_engaged = False
-    self.ignition = True
-
-
-def steer_rate_limit(old, new):
-  # Rate limiting to 0.5 degrees per step
-  limit = 0.5
-  if new > old + limit:
-    return old + limit
-  elif new < old - limit:
-    return old - limit
-  else:
-    return new
-
-
-class Camerad:
-  def __init__(self):
-    self.frame_road_id = 0
-    self.frame_wide_id = 0
-    self.vipc_server = VisionIpcServer("camerad")
-
-    self.vipc_server.create_buffers(VisionStreamType.VISION_STREAM_ROAD, 5, False, W, H)
-    self.vipc_server.create_buffers(VisionStreamType.VISION_STREAM_WIDE_ROAD, 5, False, W, H)
-    self.vipc_server.start_listener()
-
-    # set up for pyopencl rgb to yuv conversion
-    self.ctx = cl.create_some_context()
-    self.queue = cl.CommandQueue(self.ctx)
-    cl_arg = f" -DHEIGHT={H} -DWIDTH={W} -DRGB_STRIDE={W * 3} -DUV_WIDTH={W // 2} -DUV_HEIGHT={H // 2} -DRGB_SIZE={W * H} -DCL_DEBUG "
-
-    # TODO: move rgb_to_yuv.cl to local dir once the frame stream camera is removed
-    kernel_fn = os.path.join(BASEDIR, "system", "camerad", "transforms", "rgb_to_yuv.cl")
-    with open(kernel_fn) as f:
-      prg = cl.Program(self.ctx, f.read()).build(cl_arg)
-      self.krnl = prg.rgb_to_yuv
-    self.Wdiv4 = W // 4 if (W % 4 == 0) else (W + (4 - W % 4)) // 4
-    self.Hdiv4 = H // 4 if (H % 4 == 0) else (H + (4 - H % 4)) // 4
-
-  def cam_callback_road(self, image):
-    self._cam_callback(image, self.frame_road_id, 'roadCameraState', VisionStreamType.VISION_STREAM_ROAD)
-    self.frame_road_id += 1
-
-  def cam_callback_wide_road(self, image):
-    self._cam_callback(image, self.frame_wide_id, 'wideRoadCameraState', VisionStreamType.VISION_STREAM_WIDE_ROAD)
-    self.frame_wide_id += 1
-
-  def _cam_callback(self, image, frame_id, pub_type, yuv_type):
+def carla_image(callback):
+  # CARLA's images are BGRA
+  def cam_callback(image):
     img = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
-    img = np.reshape(img, (H, W, 4))
-    img = img[:, :, [0, 1, 2]].copy()
-
-    # convert RGB frame to YUV
-    rgb = np.reshape(img, (H, W * 3))
-    rgb_cl = cl_array.to_device(self.queue, rgb)
-    yuv_cl = cl_array.empty_like(rgb_cl)
-    self.krnl(self.queue, (np.int32(self.Wdiv4), np.int32(self.Hdiv4)), None, rgb_cl.data, yuv_cl.data).wait()
-    yuv = np.resize(yuv_cl.get(), rgb.size // 2)
-    eof = int(frame_id * 0.05 * 1e9)
-
-    self.vipc_server.send(yuv_type, yuv.data.tobytes(), frame_id, eof, eof)
-
-    dat = messaging.new_message(pub_type)
-    msg = {
-      "frameId": frame_id,
-      "transform": [1.0, 0.0, 0.0,
-                    0.0, 1.0, 0.0,
-                    0.0, 0.0, 1.0]
-    }
-    setattr(dat, pub_type, msg)
-    pm.send(pub_type, dat)
-
-def imu_callback(imu, vehicle_state):
-  vehicle_state.bearing_deg = math.degrees(imu.compass)
-  dat = messaging.new_message('sensorEvents', 2)
-  dat.sensorEvents[0].sensor = 4
-  dat.sensorEvents[0].type = 0x10
-  dat.sensorEvents[0].init('acceleration')
-  dat.sensorEvents[0].acceleration.v = [imu.accelerometer.x, imu.accelerometer.y, imu.accelerometer.z]
-  # copied these numbers from locationd
-  dat.sensorEvents[1].sensor = 5
-  dat.sensorEvents[1].type = 0x10
-  dat.sensorEvents[1].init('gyroUncalibrated')
-  dat.sensorEvents[1].gyroUncalibrated.v = [imu.gyroscope.x, imu.gyroscope.y, imu.gyroscope.z]
-  pm.send('sensorEvents', dat)
-
-
-def panda_state_function(vs: VehicleState, exit_event: threading.Event):
-  pm = messaging.PubMaster(['pandaStates'])
-  while not exit_event.is_set():
-    dat = messaging.new_message('pandaStates', 1)
-    dat.valid = True
-    dat.pandaStates[0] = {
-      'ignitionLine': vs.ignition,
-      'pandaType': "blackPanda",
-      'controlsAllowed': True,
-      'safetyModel': 'hondaNidec'
-    }
-    pm.send('pandaStates', dat)
-    time.sleep(0.5)
-
-
-def peripheral_state_function(exit_event: threading.Event):
-  pm = messaging.PubMaster(['peripheralState'])
-  while not exit_event.is_set():
-    dat = messaging.new_message('peripheralState')
-    dat.valid = True
-    # fake peripheral state data
-    dat.peripheralState = {
-      'pandaType': log.PandaState.PandaType.blackPanda,
-      'voltage': 12000,
-      'current': 5678,
-      'fanSpeedRpm': 1000
-    }
-    pm.send('peripheralState', dat)
-    time.sleep(0.5)
-
-
-def gps_callback(gps, vehicle_state):
-  dat = messaging.new_message('gpsLocationExternal')
-
-  # transform vel from carla to NED
-  # north is -Y in CARLA
-  velNED = [
-    -vehicle_state.vel.y,  # north/south component of NED is negative when moving south
-    vehicle_state.vel.x,  # positive when moving east, which is x in carla
-    vehicle_state.vel.z,
-  ]
-
-  dat.gpsLocationExternal = {
-    "timestamp": int(time.time() * 1000),
-    "flags": 1,  # valid fix
-    "accuracy": 1.0,
-    "verticalAccuracy": 1.0,
-    "speedAccuracy": 0.1,
-    "bearingAccuracyDeg": 0.1,
-    "vNED": velNED,
-    "bearingDeg": vehicle_state.bearing_deg,
-    "latitude": gps.latitude,
-    "longitude": gps.longitude,
-    "altitude": gps.altitude,
-    "speed": vehicle_state.speed,
-    "source": log.GpsLocationData.SensorSource.ublox,
-  }
-
-  pm.send('gpsLocationExternal', dat)
-
-
-def fake_driver_monitoring(exit_event: threading.Event):
-  pm = messaging.PubMaster(['driverStateV2', 'driverMonitoringState'])
-  while not exit_event.is_set():
-    # dmonitoringmodeld output
-    dat = messaging.new_message('driverStateV2')
-    dat.driverStateV2.leftDriverData.faceProb = 1.0
-    pm.send('driverStateV2', dat)
-
-    # dmonitoringd output
-    dat = messaging.new_message('driverMonitoringState')
-    dat.driverMonitoringState = {
-      "faceDetected": True,
-      "isDistracted": False,
-      "awarenessStatus": 1.,
-    }
-    pm.send('driverMonitoringState', dat)
-
-    time.sleep(DT_DMON)
-
-
-def can_function_runner(vs: VehicleState, exit_event: threading.Event):
-  i = 0
-  while not exit_event.is_set():
-    can_function(pm, vs.speed, vs.angle, i, vs.cruise_button, vs.is_engaged)
-    time.sleep(0.01)
-    i += 1
+    callback(np.reshape(img, (H, W, 4))[:, :, :3])
+  return cam_callback
 
 
 def connect_carla_client():
@@ -334,13 +152,13 @@ class CarlaBridge:
       camera.listen(callback)
       return camera
 
-    self._camerad = Camerad()
+    self._camerad = Camerad(cpu=self._args.cpu)
 
     if self._args.dual_camera:
-      road_camera = create_camera(fov=40, callback=self._camerad.cam_callback_road)
+      road_camera = create_camera(fov=40, callback=carla_image(self._camerad.cam_callback_road))
       self._carla_objects.append(road_camera)
 
-    road_wide_camera = create_camera(fov=120, callback=self._camerad.cam_callback_wide_road)  # fov bigger than 120 shows unwanted artifacts
+    road_wide_camera = create_camera(fov=120, callback=carla_image(self._camerad.cam_callback_wide_road))  # fov bigger than 120 shows unwanted artifacts
     self._carla_objects.append(road_wide_camera)
 
     vehicle_state = VehicleState()
@@ -356,10 +174,7 @@ class CarlaBridge:
 
     self._carla_objects.extend([imu, gps])
     # launch fake car threads
-    self._threads.append(threading.Thread(target=panda_state_function, args=(vehicle_state, self._exit_event,)))
-    self._threads.append(threading.Thread(target=peripheral_state_function, args=(self._exit_event,)))
-    self._threads.append(threading.Thread(target=fake_driver_monitoring, args=(self._exit_event,)))
-    self._threads.append(threading.Thread(target=can_function_runner, args=(vehicle_state, self._exit_event,)))
+    self._threads.extend(fake_car_threads(vehicle_state, self._exit_event))
     for t in self._threads:
       t.start()
 
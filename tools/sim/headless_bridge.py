@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+import argparse
+import signal
+import threading
+from multiprocessing import Process, Queue
+from typing import Any
+
+import numpy as np
+
+import cereal.messaging as messaging
+from common.numpy_fast import clip
+from common.params import Params
+from common.realtime import DT_CTRL, Ratekeeper, sec_since_boot
+from selfdrive.car.honda.values import CruiseButtons
+from selfdrive.test.helpers import set_params_enabled
+from tools.sim.lib.camerad import Camerad
+from tools.sim.lib.common import STEER_RATIO, VehicleState, fake_car_threads, gps_callback, imu_callback, steer_rate_limit
+from tools.sim.lib.simple_world import MAX_ACCEL, MAX_DECEL, KinematicVehicle, RecordedFrames, RoadRenderer
+
+CAMERA_FREQ = 20
+SENSOR_DECIMATION = 5  # imu and gps at 20Hz, like CARLA's sensors
+REPEAT_COUNTER = 5  # ticks a keyboard input is held for
+PRINT_DECIMATION = 100
+REPORT_INTERVAL = 10.  # s between frame rate and latency reports
+MAX_STEER = 45 * STEER_RATIO  # deg, steering wheel at full manual input
+
+
+def parse_args(add_args=None):
+  parser = argparse.ArgumentParser(description='Bridge between a headless kinematic world and openpilot, runs without CARLA or a GPU.')
+  parser.add_argument('--joystick', action='store_true')
+  parser.add_argument('--dual_camera', action='store_true')
+  parser.add_argument('--frames', type=str, help='loop a recorded road camera video instead of the synthetic road, open loop')
+  parser.add_argument('--speed', type=float, default=0., help='initial speed in m/s')
+
+  return parser.parse_args(add_args)
+
+
+class LatencyTracker:
+  """Follows camera frames through modelV2 and lateralPlan to the first carControl
+  published after them, using the log mono times. Times in seconds since boot."""
+
+  def __init__(self):
+    self.frames = {}  # frame id -> send time
+    self.models = {}  # modelV2 logMonoTime -> frame send time
+    self.plan = None  # lateralPlan logMonoTime and frame send time waiting for a carControl
+    self.model_latency = []
+    self.control_latency = []
+    self.frame_times = []
+
+  def frame_sent(self, frame_id, t):
+    self.frames[frame_id] = t
+    self.frame_times.append(t)
+
+  def update(self, sm):
+    if sm.updated['modelV2']:
+      frame_id = sm['modelV2'].frameId
+      t = self.frames.get(frame_id)
+      # frames the model skipped are never matched
+      self.frames = {f: ft for f, ft in self.frames.items() if f > frame_id}
+      if t is not None:
+        self.model_latency.append(sm.logMonoTime['modelV2'] * 1e-9 - t)
+        self.models[sm.logMonoTime['modelV2']] = t
+
+    if sm.updated['lateralPlan']:
+      t = self.models.pop(sm['lateralPlan'].modelMonoTime, None)
+      self.models = {m: mt for m, mt in self.models.items() if m > sm['lateralPlan'].modelMonoTime}
+      if t is not None:
+        self.plan = (sm.logMonoTime['lateralPlan'], t)
+
+    if sm.updated['carControl'] and self.plan is not None and sm.logMonoTime['carControl'] > self.plan[0]:
+      self.control_latency.append(sm.logMonoTime['carControl'] * 1e-9 - self.plan[1])
+      self.plan = None
+
+  def report(self):
+    """Camera frame rate and latencies since the last report"""
+    fps = 0.
+    if len(self.frame_times) > 1:
+      fps = (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+    stats = {'fps': fps}
+    for name, latency in (('model', self.model_latency), ('control', self.control_latency)):
+      if len(latency):
+        stats[name] = (np.percentile(latency, 50) * 1e3, np.percentile(latency, 95) * 1e3)
+    self.frame_times = self.frame_times[-1:]
+    self.model_latency, self.control_latency = [], []
+    return stats
+
+
+def latency_function(tracker: LatencyTracker, exit_event: threading.Event):
+  sm = messaging.SubMaster(['modelV2', 'lateralPlan', 'carControl'])
+  last_report = sec_since_boot()
+  while not exit_event.is_set():
+    sm.update(100)
+    tracker.update(sm)
+
+    if sec_since_boot() - last_report > REPORT_INTERVAL:
+      last_report = sec_since_boot()
+      stats = tracker.report()
+      msg = f"camera {stats['fps']:.1f} fps"
+      for name in ('model', 'control'):
+        if name in stats:
+          msg += f"; frame to {name} p50 {stats[name][0]:.0f} ms, p95 {stats[name][1]:.0f} ms"
+      print(msg)
+
+
+def camera_function(camerad: Camerad, vehicle: KinematicVehicle, frames, dual_camera, tracker: LatencyTracker,
+                    exit_event: threading.Event):
+  road = RoadRenderer(fov=40) if dual_camera and frames is None else None
+  wide = RoadRenderer(fov=120) if frames is None else None
+  rk = Ratekeeper(CAMERA_FREQ, print_delay_threshold=None)
+  while not exit_event.is_set():
+    if frames is not None:
+      # a recorded road camera, shown on both
+      yuv = frames.next()
+      if dual_camera:
+        camerad.send_road(yuv)
+      frame_id = camerad.send_wide_road(yuv)
+    else:
+      if dual_camera:
+        camerad.send_road(road.render_yuv(vehicle))
+      frame_id = camerad.send_wide_road(wide.render_yuv(vehicle))
+    tracker.frame_sent(frame_id, sec_since_boot())
+    rk.keep_time()
+
+
+class HeadlessBridge:
+
+  def __init__(self, arguments):
+    set_params_enabled()
+
+    msg = messaging.new_message('liveCalibration')
+    msg.liveCalibration.validBlocks = 20
+    msg.liveCalibration.rpyCalib = [0.0, 0.0, 0.0]
+    Params().put("CalibrationParams", msg.to_bytes())
+    Params().put_bool("WideCameraOnly", not arguments.dual_camera)
+
+    self._args = arguments
+    self._exit_event = threading.Event()
+    self._threads = []
+    self._keep_alive = True
+    self.started = False
+    signal.signal(signal.SIGTERM, self._on_shutdown)
+
+  def _on_shutdown(self, signal, frame):
+    self._keep_alive = False
+
+  def bridge_keep_alive(self, q: Queue):
+    try:
+      self._run(q)
+    finally:
+      self.close()
+
+  def _run(self, q: Queue):
+    vehicle = KinematicVehicle(speed=self._args.speed)
+    frames = RecordedFrames(self._args.frames) if self._args.frames else None
+    camerad = Camerad(cpu=True)
+    tracker = LatencyTracker()
+    sm = messaging.SubMaster(['carControl', 'controlsState'])
+
+    vehicle_state = VehicleState()
+    self._threads = fake_car_threads(vehicle_state, self._exit_event)
+    self._threads.append(threading.Thread(target=camera_function, args=(camerad, vehicle, frames, self._args.dual_camera,
+                                                                        tracker, self._exit_event)))
+    self._threads.append(threading.Thread(target=latency_function, args=(tracker, self._exit_event)))
+    for t in self._threads:
+      t.start()
+
+    is_openpilot_engaged = False
+    steer_out = accel_out = 0.
+    steer_manual = accel_manual = 0.
+    manual_counter = 0
+
+    rk = Ratekeeper(1. / DT_CTRL, print_delay_threshold=0.05)
+    while self._keep_alive:
+      # 1. Read the steering angle and acceleration from op or manual controls
+      # 2. Step the vehicle
+      # 3. Send current carstate to op via can, imu and gps
+      cruise_button = 0
+
+      # --------------Step 1-------------------------------
+      if not q.empty():
+        message = q.get()
+        m = message.split('_')
+        if m[0] in ("steer", "throttle", "brake"):
+          steer_manual = accel_manual = 0.
+          if m[0] == "steer":
+            steer_manual = float(m[1]) * MAX_STEER
+          elif m[0] == "throttle":
+            accel_manual = float(m[1]) * MAX_ACCEL
+          else:
+            accel_manual = -float(m[1]) * MAX_DECEL
+          manual_counter = REPEAT_COUNTER
+          is_openpilot_engaged = False
+        elif m[0] == "reverse":
+          cruise_button = CruiseButtons.CANCEL
+          is_openpilot_engaged = False
+        elif m[0] == "cruise":
+          if m[1] == "down":
+            cruise_button = CruiseButtons.DECEL_SET
+            is_openpilot_engaged = True
+          elif m[1] == "up":
+            cruise_button = CruiseButtons.RES_ACCEL
+            is_openpilot_engaged = True
+          elif m[1] == "cancel":
+            cruise_button = CruiseButtons.CANCEL
+            is_openpilot_engaged = False
+        elif m[0] == "ignition":
+          vehicle_state.ignition = not vehicle_state.ignition
+        elif m[0] == "quit":
+          break
+
+      if is_openpilot_engaged:
+        sm.update(0)
+        accel_out = sm['carControl'].actuators.accel
+        steer_out = steer_rate_limit(steer_out, sm['carControl'].actuators.steeringAngleDeg)
+      elif manual_counter > 0:
+        steer_out, accel_out = steer_manual, accel_manual
+        manual_counter -= 1
+      else:
+        steer_out = accel_out = 0.
+
+      # --------------Step 2-------------------------------
+      steer_out = clip(steer_out, -MAX_STEER, MAX_STEER)
+      vehicle.step(DT_CTRL, steer_out, accel_out)
+
+      # --------------Step 3-------------------------------
+      vehicle_state.speed = vehicle.speed
+      vehicle_state.vel = vehicle.velocity
+      vehicle_state.angle = steer_out
+      vehicle_state.cruise_button = cruise_button
+      vehicle_state.is_engaged = is_openpilot_engaged
+
+      if rk.frame % SENSOR_DECIMATION == 0:
+        imu_callback(vehicle.imu(), vehicle_state)
+        gps_callback(vehicle.gnss(), vehicle_state)
+
+      if rk.frame % PRINT_DECIMATION == 0:
+        print("frame: ", "engaged:", is_openpilot_engaged, "; speed: ", round(vehicle.speed, 2), "; accel: ", round(accel_out, 3),
+              "; steer(deg): ", round(steer_out, 3), "; offset: ", round(vehicle.offset, 2))
+
+      rk.keep_time()
+      self.started = True
+
+  def close(self):
+    self.started = False
+    self._exit_event.set()
+    for t in reversed(self._threads):
+      t.join()
+
+  def run(self, queue):
+    bridge_p = Process(target=self.bridge_keep_alive, args=(queue,), daemon=True)
+    bridge_p.start()
+    return bridge_p
+
+
+if __name__ == "__main__":
+  q: Any = Queue()
+  args = parse_args()
+
+  try:
+    headless_bridge = HeadlessBridge(args)
+    p = headless_bridge.run(q)
+
+    if args.joystick:
+      # start input poll for joystick
+      from tools.sim.lib.manual_ctrl import wheel_poll_thread
+
+      wheel_poll_thread(q)
+    else:
+      # start input poll for keyboard
+      from tools.sim.lib.keyboard_ctrl import keyboard_poll_thread
+
+      keyboard_poll_thread(q)
+    p.join()
+
+  finally:
+    # Try cleaning up the wide camera param
+    # in case users want to use replay after
+    Params().delete("WideCameraOnly")
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+import cereal.messaging as messaging
+from cereal.visionipc import VisionIpcServer, VisionStreamType
+from common.basedir import BASEDIR
+from tools.lib.colorspace import ColorspaceConverter
+from tools.sim.lib.common import H, W, pm
+
+
+class Camerad:
+  def __init__(self, cpu=False):
+    self.frame_road_id = 0
+    self.frame_wide_id = 0
+    self.vipc_server = VisionIpcServer("camerad")
+
+    self.vipc_server.create_buffers(VisionStreamType.VISION_STREAM_ROAD, 5, False, W, H)
+    self.vipc_server.create_buffers(VisionStreamType.VISION_STREAM_WIDE_ROAD, 5, False, W, H)
+    self.vipc_server.start_listener()
+
+    self.cpu = cpu
+    if cpu:
+      self.converter = ColorspaceConverter(W, H)
+    else:
+      self._init_opencl()
+
+  def _init_opencl(self):
+    import pyopencl as cl  # pylint: disable=import-error
+    import pyopencl.array as cl_array  # pylint: disable=import-error
+    self.cl_array = cl_array
+
+    # set up for pyopencl rgb to yuv conversion
+    self.ctx = cl.create_some_context()
+    self.queue = cl.CommandQueue(self.ctx)
+    cl_arg = f" -DHEIGHT={H} -DWIDTH={W} -DRGB_STRIDE={W * 3} -DUV_WIDTH={W // 2} -DUV_HEIGHT={H // 2} -DRGB_SIZE={W * H} -DCL_DEBUG "
+
+    # TODO: move rgb_to_yuv.cl to local dir once the frame stream camera is removed
+    kernel_fn = os.path.join(BASEDIR, "system", "camerad", "transforms", "rgb_to_yuv.cl")
+    with open(kernel_fn) as f:
+      prg = cl.Program(self.ctx, f.read()).build(cl_arg)
+      self.krnl = prg.rgb_to_yuv
+    self.Wdiv4 = W // 4 if (W % 4 == 0) else (W + (4 - W % 4)) // 4
+    self.Hdiv4 = H // 4 if (H % 4 == 0) else (H + (4 - H % 4)) // 4
+
+  def rgb_to_yuv(self, bgr):
+    if self.cpu:
+      return self.converter.bgr24_to_yuv420_fixed(bgr)
+
+    rgb = np.reshape(np.ascontiguousarray(bgr), (H, W * 3))
+    rgb_cl = self.cl_array.to_device(self.queue, rgb)
+    yuv_cl = self.cl_array.empty_like(rgb_cl)
+    self.krnl(self.queue, (np.int32(self.Wdiv4), np.int32(self.Hdiv4)), None, rgb_cl.data, yuv_cl.data).wait()
+    return np.resize(yuv_cl.get(), rgb.size // 2)
+
+  def cam_callback_road(self, bgr):
+    return self.send_road(self.rgb_to_yuv(bgr))
+
+  def cam_callback_wide_road(self, bgr):
+    return self.send_wide_road(self.rgb_to_yuv(bgr))
+
+  def send_road(self, yuv):
+    self._send_yuv(yuv, self.frame_road_id, 'roadCameraState', VisionStreamType.VISION_STREAM_ROAD)
+    self.frame_road_id += 1
+    return self.frame_road_id - 1
+
+  def send_wide_road(self, yuv):
+    self._send_yuv(yuv, self.frame_wide_id, 'wideRoadCameraState', VisionStreamType.VISION_STREAM_WIDE_ROAD)
+    self.frame_wide_id += 1
+    return self.frame_wide_id - 1
+
+  def _send_yuv(self, yuv, frame_id, pub_type, yuv_type):
+    eof = int(frame_id * 0.05 * 1e9)
+    self.vipc_server.send(yuv_type, yuv.data.tobytes(), frame_id, eof, eof)
+
+    dat = messaging.new_message(pub_type)
+    msg = {
+      "frameId": frame_id,
+      "transform": [1.0, 0.0, 0.0,
+                    0.0, 1.0, 0.0,
+                    0.0, 0.0, 1.0]
+    }
+    setattr(dat, pub_type, msg)
+    pm.send(pub_type, dat)
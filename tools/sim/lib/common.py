@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+from typing import NamedTuple
+
+import cereal.messaging as messaging
+from cereal import log
+from common.realtime import DT_DMON
+from tools.sim.lib.can import can_function
+
+W, H = 1928, 1208
+STEER_RATIO = 15.
+
+pm = messaging.PubMaster(['roadCameraState', 'wideRoadCameraState', 'sensorEvents', 'can', "gpsLocationExternal"])
+
+
+class Vec3(NamedTuple):
+  x: float = 0.
+  y: float = 0.
+  z: float = 0.
+
+
+class VehicleState:
+  def __init__(self):
+    self.speed = 0.0
+    self.angle = 0.0
+    self.bearing_deg = 0.0
+    self.vel = Vec3()
+    self.cruise_button = 0
+    self.is_engaged = False
+    self.ignition = True
+
+
+def steer_rate_limit(old, new):
+  # Rate limiting to 0.5 degrees per step
+  limit = 0.5
+  if new > old + limit:
+    return old + limit
+  elif new < old - limit:
+    return old - limit
+  else:
+    return new
+
+
+def imu_callback(imu, vehicle_state):
+  vehicle_state.bearing_deg = math.degrees(imu.compass)
+  dat = messaging.new_message('sensorEvents', 2)
+  dat.sensorEvents[0].sensor = 4
+  dat.sensorEvents[0].type = 0x10
+  dat.sensorEvents[0].init('acceleration')
+  dat.sensorEvents[0].acceleration.v = [imu.accelerometer.x, imu.accelerometer.y, imu.accelerometer.z]
+  # copied these numbers from locationd
+  dat.sensorEvents[1].sensor = 5
+  dat.sensorEvents[1].type = 0x10
+  dat.sensorEvents[1].init('gyroUncalibrated')
+  dat.sensorEvents[1].gyroUncalibrated.v = [imu.gyroscope.x, imu.gyroscope.y, imu.gyroscope.z]
+  pm.send('sensorEvents', dat)
+
+
+def panda_state_function(vs: VehicleState, exit_event: threading.Event):
+  pm = messaging.PubMaster(['pandaStates'])
+  while not exit_event.is_set():
+    dat = messaging.new_message('pandaStates', 1)
+    dat.valid = True
+    dat.pandaStates[0] = {
+      'ignitionLine': vs.ignition,
+      'pandaType': "blackPanda",
+      'controlsAllowed': True,
+      'safetyModel': 'hondaNidec'
+    }
+    pm.send('pandaStates', dat)
+    time.sleep(0.5)
+
+
+def peripheral_state_function(exit_event: threading.Event):
+  pm = messaging.PubMaster(['peripheralState'])
+  while not exit_event.is_set():
+    dat = messaging.new_message('peripheralState')
+    dat.valid = True
+    # fake peripheral state data
+    dat.peripheralState = {
+      'pandaType': log.PandaState.PandaType.blackPanda,
+      'voltage': 12000,
+      'current': 5678,
+      'fanSpeedRpm': 1000
+    }
+    pm.send('peripheralState', dat)
+    time.sleep(0.5)
+
+
+def gps_callback(gps, vehicle_state):
+  dat = messaging.new_message('gpsLocationExternal')
+
+  # transform vel from carla to NED
+  # north is -Y in CARLA
+  velNED = [
+    -vehicle_state.vel.y,  # north/south component of NED is negative when moving south
+    vehicle_state.vel.x,  # positive when moving east, which is x in carla
+    vehicle_state.vel.z,
+  ]
+
+  dat.gpsLocationExternal = {
+    "timestamp": int(time.time() * 1000),
+    "flags": 1,  # valid fix
+    "accuracy": 1.0,
+    "verticalAccuracy": 1.0,
+    "speedAccuracy": 0.1,
+    "bearingAccuracyDeg": 0.1,
+    "vNED": velNED,
+    "bearingDeg": vehicle_state.bearing_deg,
+    "latitude": gps.latitude,
+    "longitude": gps.longitude,
+    "altitude": gps.altitude,
+    "speed": vehicle_state.speed,
+    "source": log.GpsLocationData.SensorSource.ublox,
+  }
+
+  pm.send('gpsLocationExternal', dat)
+
+
+def fake_driver_monitoring(exit_event: threading.Event):
+  pm = messaging.PubMaster(['driverStateV2', 'driverMonitoringState'])
+  while not exit_event.is_set():
+    # dmonitoringmodeld output
+    dat = messaging.new_message('driverStateV2')
+    dat.driverStateV2.leftDriverData.faceProb = 1.0
+    pm.send('driverStateV2', dat)
+
+    # dmonitoringd output
+    dat = messaging.new_message('driverMonitoringState')
+    dat.driverMonitoringState = {
+      "faceDetected": True,
+      "isDistracted": False,
+      "awarenessStatus": 1.,
+    }
+    pm.send('driverMonitoringState', dat)
+
+    time.sleep(DT_DMON)
+
+
+def can_function_runner(vs: VehicleState, exit_event: threading.Event):
+  i = 0
+  while not exit_event.is_set():
+    can_function(pm, vs.speed, vs.angle, i, vs.cruise_button, vs.is_engaged)
+    time.sleep(0.01)
+    i += 1
+
+
+def fake_car_threads(vs: VehicleState, exit_event: threading.Event):
+  return [
+    threading.Thread(target=panda_state_function, args=(vs, exit_event,)),
+    threading.Thread(target=peripheral_state_function, args=(exit_event,)),
+    threading.Thread(target=fake_driver_monitoring, args=(exit_event,)),
+    threading.Thread(target=can_function_runner, args=(vs, exit_event,)),
+  ]
@@ -0,0 +1,198 @@
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from tools.lib.colorspace import ColorspaceConverter
+from tools.sim.lib.common import H, STEER_RATIO, W, Vec3
+
+# road
+ROAD_CURVATURE = 1 / 400.  # 1/m, sharpest point of the bends
+ROAD_PERIOD = 800.  # m, one left and one right bend
+LANE_WIDTH = 3.7
+LANES = 3
+LINE_WIDTH = 0.15
+DASH_LENGTH = 3.  # m of paint in every DASH_PERIOD of the lane lines
+DASH_PERIOD = 12.
+SHOULDER = 0.5  # m of asphalt past the outer lines
+
+# rendering
+CAMERA_HEIGHT = 1.22  # m
+RENDER_SCALE = 4  # render at a quarter of the resolution, then upscale
+MAX_DISTANCE = 400.  # m, ground past this is drawn at this distance
+SKY = (235, 206, 135)  # BGR
+GRASS = (60, 110, 70)
+ASPHALT = (80, 80, 80)
+PAINT = (230, 230, 230)
+
+# vehicle
+WHEELBASE = 2.7
+MAX_ACCEL = 2.0  # m/s^2 at full throttle
+MAX_DECEL = 8.0  # m/s^2 at full brake
+DRAG = 4e-4  # 1/m, aerodynamic drag as a deceleration per speed squared
+GRAVITY = 9.81
+
+# gps
+LAT0, LON0, ALTITUDE = 32.7157, -117.1611, 20.
+EARTH_RADIUS = 6378137.
+
+
+class IMUMeasurement(NamedTuple):
+  accelerometer: Vec3
+  gyroscope: Vec3
+  compass: float
+
+
+class GNSSMeasurement(NamedTuple):
+  latitude: float
+  longitude: float
+  altitude: float
+
+
+def road_curvature(s):
+  """Curvature [1/m] at distance s along the road, left positive"""
+  return ROAD_CURVATURE * np.sin(2 * np.pi * s / ROAD_PERIOD)
+
+
+class KinematicVehicle:
+  """Kinematic bicycle driving on an endless road of alternating bends. The pose is kept
+  both relative to the road, for rendering, and in a local east-north frame for gps."""
+
+  def __init__(self, speed=0., offset=0.):
+    self.speed = speed
+    self.accel = 0.
+    self.steering_angle = 0.  # deg, steering wheel, left positive
+    self.yaw_rate = 0.  # rad/s, left positive
+
+    # distance along the road, offset to the left of its center and heading relative to it
+    self.s, self.offset, self.heading = 0., offset, 0.
+    # east, north and yaw counter clockwise from east
+    self.x, self.y, self.yaw = 0., offset, 0.
+
+  def step(self, dt, steering_angle, accel):
+    self.steering_angle = steering_angle
+    self.accel = accel - DRAG * self.speed ** 2 if self.speed > 0 else max(accel, 0.)
+    speed = max(self.speed + self.accel * dt, 0.)
+    v = (self.speed + speed) / 2
+    self.speed = speed
+
+    self.yaw_rate = v * math.tan(math.radians(steering_angle) / STEER_RATIO) / WHEELBASE
+    curvature = float(road_curvature(self.s))
+    s_rate = v * math.cos(self.heading) / (1. - curvature * self.offset)
+    self.offset += v * math.sin(self.heading) * dt
+    self.heading += (self.yaw_rate - curvature * s_rate) * dt
+    self.s += s_rate * dt
+
+    yaw = self.yaw + self.yaw_rate * dt / 2
+    self.x += v * math.cos(yaw) * dt
+    self.y += v * math.sin(yaw) * dt
+    self.yaw += self.yaw_rate * dt
+
+  @property
+  def velocity(self):
+    """Velocity in CARLA's frame, x east and y south"""
+    return Vec3(self.speed * math.cos(self.yaw), -self.speed * math.sin(self.yaw), 0.)
+
+  def imu(self):
+    # CARLA's vehicle frame: x forward, y right, z up, yaw rate positive to the right
+    accelerometer = Vec3(self.accel, -self.speed * self.yaw_rate, GRAVITY)
+    gyroscope = Vec3(0., 0., -self.yaw_rate)
+    compass = (math.pi / 2 - self.yaw) % (2 * math.pi)
+    return IMUMeasurement(accelerometer, gyroscope, compass)
+
+  def gnss(self):
+    latitude = LAT0 + math.degrees(self.y / EARTH_RADIUS)
+    longitude = LON0 + math.degrees(self.x / (EARTH_RADIUS * math.cos(math.radians(LAT0))))
+    return GNSSMeasurement(latitude, longitude, ALTITUDE)
+
+
+class RoadRenderer:
+  """Flat ground pinhole camera at the front of the car looking straight ahead, drawing
+  the road's asphalt and lane lines. Every pixel of the quarter resolution render is one of
+  a few flat colors, upscaled they make uniform 2x2 chroma blocks. So the I420 frame is
+  upscaled straight from per color lookup tables, exactly what converting the BGR image
+  would give at a fraction of the cost."""
+
+  def __init__(self, fov):
+    w, h = W // RENDER_SCALE, H // RENDER_SCALE
+    self.focal = w / 2 / math.tan(math.radians(fov) / 2)
+    rows = np.arange(h) + 0.5 - h / 2
+    self.horizon = int(np.sum(rows < 0))
+    # distance ahead seen by each row below the horizon, pixels right of center by column
+    self.distance = np.minimum(self.focal * CAMERA_HEIGHT / rows[self.horizon:], MAX_DISTANCE)[:, None]
+    self.columns = (np.arange(w) + 0.5 - w / 2)[None, :]
+    self.grid = np.arange(0., MAX_DISTANCE + 1.)
+
+    # color of each pixel as an index into these
+    self.colors = np.array([SKY, GRASS, ASPHALT, PAINT], dtype=np.uint8)
+    self.pixels = np.zeros((h, w), dtype=np.uint8)
+    n = len(self.colors)
+    blocks = np.repeat(np.repeat(self.colors[None], 2, axis=0), 2, axis=1)
+    lut = ColorspaceConverter(2 * n, 2).bgr24_to_yuv420_fixed(blocks)
+    self.y_lut, self.u_lut, self.v_lut = lut[:2 * n:2], lut[4 * n:5 * n], lut[5 * n:]
+
+  def center(self, vehicle):
+    """Road center to the left of the camera at each row's distance"""
+    # integrate the road's curvature over the distance ahead, small angles
+    curvature = road_curvature(vehicle.s + self.grid)
+    heading = np.concatenate(([0.], np.cumsum(curvature[1:] + curvature[:-1]) / 2))
+    lateral = np.concatenate(([0.], np.cumsum(heading[1:] + heading[:-1]) / 2))
+    return np.interp(self.distance, self.grid, lateral) - vehicle.offset - vehicle.heading * self.distance
+
+  def draw(self, vehicle):
+    z = self.distance
+    center = self.center(vehicle)
+
+    def columns_from(lateral):
+      return np.abs(self.columns + self.focal * (center + lateral) / z)
+
+    half_road = LANES * LANE_WIDTH / 2
+    line_px = self.focal * LINE_WIDTH / 2 / z
+    dashes = (vehicle.s + z) % DASH_PERIOD < DASH_LENGTH
+
+    ground = self.pixels[self.horizon:]
+    ground[:] = 1 + (columns_from(0.) < self.focal * (half_road + SHOULDER) / z)
+    for i in range(LANES + 1):
+      lateral = i * LANE_WIDTH - half_road
+      paint = columns_from(lateral) < line_px
+      if 0 < i < LANES:
+        paint &= dashes
+      ground[paint] = 3
+    return self.pixels
+
+  def render(self, vehicle):
+    """BGR image of the road from the vehicle's current pose"""
+    pixels = self.draw(vehicle)
+    s = RENDER_SCALE
+    image = np.empty((H, W, 3), dtype=np.uint8)
+    image.reshape(H // s, s, W, 3)[:] = np.repeat(self.colors[pixels], s, axis=1)[:, None]
+    return image
+
+  def render_yuv(self, vehicle):
+    """I420 frame of the road from the vehicle's current pose"""
+    pixels = self.draw(vehicle)
+    s = RENDER_SCALE
+    yuv = np.empty(H * W * 3 // 2, dtype=np.uint8)
+    # widen the rows, then copy each one down, numpy is slow at upscaling both at once
+    yuv[:H * W].reshape(H // s, s, W)[:] = np.repeat(self.y_lut[pixels], s, axis=1)[:, None]
+    for i, lut in enumerate((self.u_lut, self.v_lut)):
+      plane = yuv[H * W + i * H * W // 4:H * W + (i + 1) * H * W // 4]
+      plane.reshape(H // s, s // 2, W // 2)[:] = np.repeat(lut[pixels], s // 2, axis=1)[:, None]
+    return yuv
+
+
+class RecordedFrames:
+  """Frames of a recorded road camera video, looped. Open loop: steering doesn't change
+  what the camera sees."""
+
+  def __init__(self, fn):
+    from tools.lib.framereader import FrameReader
+    self.fr = FrameReader(fn, readahead=True)
+    assert (self.fr.w, self.fr.h) == (W, H), f"recorded frames are {self.fr.w}x{self.fr.h}, the bridge sends {W}x{H}"
+    self.frame = 0
+
+  def next(self):
+    """Next frame, already I420"""
+    yuv = self.fr.get(self.frame % self.fr.frame_count, pix_fmt='yuv420p')[0]
+    self.frame += 1
+    return np.ravel(yuv)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import subprocess
+import time
+import unittest
+import os
+from multiprocessing import Queue
+
+from cereal import messaging
+from common.basedir import BASEDIR
+from selfdrive.manager.helpers import unblock_stdout
+from tools.sim import headless_bridge
+from tools.sim.headless_bridge import HeadlessBridge
+
+SIM_DIR = os.path.join(BASEDIR, "tools/sim")
+
+class TestHeadlessIntegration(unittest.TestCase):
+  """
+  Same as the CARLA integration test, on the headless world. Runs without a GPU
+  """
+  processes = None
+
+  def setUp(self):
+    self.processes = []
+    # Too many lagging messages in the bridge can cause a crash. This prevents it.
+    unblock_stdout()
+
+  def test_engage(self):
+    # Startup manager and the bridge. Check processes are running, then engage and verify.
+    p_manager = subprocess.Popen("./launch_openpilot.sh", cwd=SIM_DIR)
+    self.processes.append(p_manager)
+
+    sm = messaging.SubMaster(['controlsState', 'carEvents', 'managerState'])
+    q = Queue()
+    bridge = HeadlessBridge(headless_bridge.parse_args([]))
+    p_bridge = bridge.run(q)
+    self.processes.append(p_bridge)
+
+    max_time_per_step = 60
+
+    start_time = time.monotonic()
+    no_car_events_issues_once = False
+    car_event_issues = []
+    not_running = []
+    while time.monotonic() < start_time + max_time_per_step:
+      sm.update()
+
+      not_running = [p.name for p in sm['managerState'].processes if not p.running and p.shouldBeRunning]
+      car_event_issues = [event.name for event in sm['carEvents'] if any([event.noEntry, event.softDisable, event.immediateDisable])]
+
+      if sm.all_alive() and len(car_event_issues) == 0 and len(not_running) == 0:
+        no_car_events_issues_once = True
+        break
+
+    self.assertEqual(p_bridge.exitcode, None, f"Bridge process should be running, but exited with code {p_bridge.exitcode}")
+    self.assertTrue(no_car_events_issues_once, f"Failed because no messages received, or CarEvents '{car_event_issues}' or processes not running '{not_running}'")
+
+    start_time = time.monotonic()
+    min_counts_control_active = 100
+    control_active = 0
+
+    while time.monotonic() < start_time + max_time_per_step:
+      sm.update()
+
+      q.put("cruise_up")  # Try engaging
+
+      if sm.all_alive() and sm['controlsState'].active:
+        control_active += 1
+
+        if control_active == min_counts_control_active:
+          break
+
+    self.assertEqual(min_counts_control_active, control_active, f"Simulator did not engage a minimal of {min_counts_control_active} steps was {control_active}")
+
+  def tearDown(self):
+    print("Test shutting down. CommIssues are acceptable")
+    for p in reversed(self.processes):
+      p.terminate()
+
+    for p in reversed(self.processes):
+      if isinstance(p, subprocess.Popen):
+        p.wait(15)
+      else:
+        p.join(15)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import math
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from tools.lib.colorspace import ColorspaceConverter
+from tools.sim.headless_bridge import LatencyTracker
+from tools.sim.lib.common import H, STEER_RATIO, W
+from tools.sim.lib.simple_world import WHEELBASE, KinematicVehicle, RoadRenderer, road_curvature
+
+
+class TestSimpleWorld(unittest.TestCase):
+  def test_render_yuv(self):
+    # the lookup table frame is exactly the converted image
+    vehicle = KinematicVehicle(speed=20., offset=0.5)
+    vehicle.s, vehicle.heading = 150., 0.02
+    conv = ColorspaceConverter(W, H)
+    for fov in (40, 120):
+      renderer = RoadRenderer(fov)
+      np.testing.assert_array_equal(renderer.render_yuv(vehicle), conv.bgr24_to_yuv420_fixed(renderer.render(vehicle)))
+
+  def test_lane_lines(self):
+    # straight ahead in the lane center, the ego lane lines are symmetric
+    renderer = RoadRenderer(120)
+    vehicle = KinematicVehicle(speed=20.)
+    pixels = renderer.draw(vehicle)
+    paint = np.nonzero(pixels[-1] == 3)[0]
+    np.testing.assert_array_equal(paint, pixels.shape[1] - 1 - paint[::-1])
+
+    # to the left of the center the left line moves right
+    vehicle.offset = 0.5
+    moved = np.nonzero(renderer.draw(vehicle)[-1] == 3)[0]
+    self.assertGreater(moved.min(), paint.min())
+
+  def test_kinematic_circle(self):
+    vehicle = KinematicVehicle(speed=10.)
+    steering_angle = 90.
+    radius = WHEELBASE / math.tan(math.radians(steering_angle) / STEER_RATIO)
+    for _ in range(1000):
+      vehicle.step(0.01, steering_angle, 0.)
+    self.assertAlmostEqual(vehicle.speed, 10. - 0.4, delta=0.1)
+    # turning left around (0, radius)
+    self.assertAlmostEqual(math.hypot(vehicle.x, vehicle.y - radius), radius, delta=0.01)
+
+  def test_follows_road(self):
+    # steering at the road's curvature keeps the car in the lane
+    vehicle = KinematicVehicle(speed=20.)
+    for _ in range(3000):
+      curvature = float(road_curvature(vehicle.s))
+      steering_angle = math.degrees(math.atan(curvature * WHEELBASE)) * STEER_RATIO
+      vehicle.step(0.01, steering_angle, 0.)
+    self.assertGreater(vehicle.s, 500.)
+    self.assertLess(abs(vehicle.offset), 0.05)
+    self.assertLess(abs(vehicle.heading), 1e-3)
+
+  def test_latency_tracker(self):
+    tracker = LatencyTracker()
+
+    def update(t, **msgs):
+      updated = {name: name in msgs for name in ('modelV2', 'lateralPlan', 'carControl')}
+      tracker.update(FakeSubMaster(msgs, updated, {name: int(t * 1e9) for name in msgs}))
+
+    tracker.frame_sent(0, 1.00)
+    tracker.frame_sent(1, 1.05)
+    update(1.03, carControl=SimpleNamespace())
+    update(1.08, modelV2=SimpleNamespace(frameId=1))
+    update(1.09, lateralPlan=SimpleNamespace(modelMonoTime=int(1.08e9)))
+    update(1.10, carControl=SimpleNamespace())
+    update(1.11, carControl=SimpleNamespace())
+
+    np.testing.assert_allclose(tracker.model_latency, [0.03])
+    np.testing.assert_allclose(tracker.control_latency, [0.05])
+    self.assertAlmostEqual(tracker.report()['fps'], 20.)
+
+
+class FakeSubMaster:
+  def __init__(self, msgs, updated, log_mono_time):
+    self.msgs, self.updated, self.logMonoTime = msgs, updated, log_mono_time
+
+  def __getitem__(self, name):
+    return self.msgs[name]
+
+
+if __name__ == "__main__":
+  unittest.main()